@@ -35,13 +35,14 @@ const apiService = {
 
   /**
    * 2단계: AI 분석 요청 (스트리밍)
+   * sessionId를 넘기면 이전 분석에서 바뀐 조항만 다시 판별합니다. (onSession으로 세션 ID 전달)
    */
-  analyzeTextStream: async (text, apiKey, onProgress) => {
+  analyzeTextStream: async (text, apiKey, onProgress, sessionId = null, onSession = () => {}) => {
     try {
       const response = await fetch(`${API_BASE_URL}/analyze`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ text, api_key: apiKey }),
+        body: JSON.stringify({ text, api_key: apiKey, session_id: sessionId }),
       });
 
       if (!response.ok) {
@@ -68,6 +69,8 @@ const apiService = {
             
             if (data.status === 'progress') {
               onProgress(data.current, data.total, data.message);
+            } else if (data.status === 'session') {
+              onSession(data.session_id);
             } else if (data.status === 'complete') {
               return data.results;
             } else if (data.status === 'error') {
@@ -96,6 +99,7 @@ function App() {
   const [pdfFile, setPdfFile] = useState(null);       
   const [pdfText, setPdfText] = useState('');         
   const [resultList, setResultList] = useState([]);   
+  const [sessionId, setSessionId] = useState(null);   // 같은 계약서를 다시 분석할 때 바뀐 조항만 판별
 
   // UI 상태
   const [step, setStep] = useState('upload'); // 'upload' | 'review' | 'result'
@@ -139,6 +143,7 @@ function App() {
       console.log("파일 전송 중:", file.name);
       const data = await apiService.uploadPDF(file, apiKey);
       setPdfText(data.text);
+      setSessionId(null); // 새 계약서는 새 세션으로 분석
       setStep('review');
     } catch (error) {
       alert(error.message);
@@ -158,7 +163,9 @@ function App() {
         apiKey, 
         (current, total, msg) => {
           setProgressStatus({ current, total, message: msg });
-        }
+        },
+        sessionId,
+        setSessionId
       );
 
       setResultList(results);
@@ -371,6 +378,12 @@ function App() {
                   <FileText className="w-4 h-4 text-slate-500" />
                   <span className="text-xs font-bold text-slate-500 uppercase">Text View</span>
                 </div>
+                {/* 결과 확인 후 조항을 고쳐 다시 분석 (바뀐 조항만 다시 판별) */}
+                {step === 'result' && (
+                  <button onClick={() => setStep('review')} className="text-xs font-medium text-blue-600 hover:text-blue-800">
+                    텍스트 수정
+                  </button>
+                )}
               </div>
 
               {step === 'review' ? (
@@ -478,6 +491,12 @@ function App() {
                       <span className={`text-[10px] font-bold px-2 py-0.5 rounded border ${colors.badge}`}>
                         Risk: {riskScore}
                       </span>
+                      {/* 이전 분석 결과를 그대로 사용한 조항 */}
+                      {item.carried_over && (
+                        <span className="text-[10px] font-medium px-2 py-0.5 rounded border border-slate-200 bg-white text-slate-500">
+                          이전 결과
+                        </span>
+                      )}
                     </div>
                     {/* 독소 조항인 경우에만 화살표 표시 */}
                     {isToxic && (isExpanded ? <ChevronUp className="w-4 h-4 text-slate-400"/> : <ChevronDown className="w-4 h-4 text-slate-400"/>)}
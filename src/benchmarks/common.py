@@ -0,0 +1,86 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """선형 보간 백분위수 (values가 비어 있으면 0.0)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(values: List[float]) -> Dict:
+    """지연 시간 리스트(초)를 요약 통계 dict로 변환"""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "min": min(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def peak_rss_mb() -> float:
+    """현재 프로세스의 최대 RSS(MB). Linux는 KB, macOS는 byte 단위로 돌려준다."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def current_rss_mb() -> float:
+    """현재 프로세스의 RSS(MB). /proc이 없으면 최대 RSS로 대신한다."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def run_metadata(args) -> Dict:
+    """결과 비교를 위해 실행 환경 정보를 함께 기록"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+    }
+
+
+def write_report(path, report):
+    """결과를 JSON 파일로 저장 (path가 '-'이면 표준출력)"""
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if path == "-":
+        print(payload)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(payload)
+    print(f"📝 벤치마크 결과 저장: {os.path.abspath(path)}")
@@ -0,0 +1,51 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import asyncio
+import random
+import time
+
+from deepeval.models.base_model import DeepEvalBaseLLM
+
+from benchmarks.fake_responses import fake_completion
+
+
+class FakeJudgeLLM(DeepEvalBaseLLM):
+    """
+    네트워크 없이 벤치마크를 돌리기 위한 결정적(deterministic) DeepEval 모델.
+    같은 프롬프트에는 항상 같은 점수/응답을 돌려주며, latency_sec(+jitter_sec) 만큼 응답을 지연시켜
+    실제 LLM 호출 시간을 흉내 냅니다.
+    """
+    def __init__(self, model_name="fake-judge", latency_sec=0.0, jitter_sec=0.0, seed=0):
+        self.model_name = model_name
+        self.latency_sec = latency_sec
+        self.jitter_sec = jitter_sec
+        self._random = random.Random(seed)
+        self.call_count = 0
+
+    def load_model(self):
+        return self.model_name
+
+    def _delay(self):
+        if not self.latency_sec and not self.jitter_sec:
+            return 0.0
+        return max(0.0, self.latency_sec + self._random.uniform(-self.jitter_sec, self.jitter_sec))
+
+    def _respond(self, prompt: str) -> str:
+        self.call_count += 1
+        return fake_completion(prompt)
+
+    def generate(self, prompt: str) -> str:
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._respond(prompt)
+
+    async def a_generate(self, prompt: str) -> str:
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._respond(prompt)
+
+    def get_model_name(self):
+        return self.model_name
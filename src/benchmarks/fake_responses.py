@@ -0,0 +1,28 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+가짜 LLM 응답 (표준 라이브러리만 사용).
+DeepEval용 FakeJudgeLLM(fake_llm.py)과 로컬 대역 HTTP 서버(standins.py)가 같은 응답을 쓰며,
+대역 서버만 쓰는 테스트는 deepeval 없이도 돌 수 있도록 따로 둔다.
+"""
+import hashlib
+import json
+
+
+def fake_completion(prompt: str) -> str:
+    """
+    프롬프트 해시로 정해지는 결정적 응답.
+    G-Eval 채점 프롬프트에는 JSON으로(점수만 요청하면 점수만), 그 외(개선안 생성 등)에는 마크다운으로 답한다.
+    """
+    digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+    if '"score"' in prompt and '"reason"' not in prompt:
+        # 점수만 요청한 프롬프트 (2단계 판별의 1단계)
+        return json.dumps({"score": digest % 11})
+    if '"score"' in prompt or "JSON" in prompt:
+        score = digest % 11
+        return json.dumps({"score": score, "reason": f"[fake] 결정적 채점 결과 {score}점"}, ensure_ascii=False)
+    return (
+        "1. **⚠️ 쉬운 해석**: [fake] 근로자에게 불리할 수 있는 조항입니다.\n"
+        "2. **💡 수정 제안**: [fake] 관련 법령에 맞게 수정하세요."
+    )
@@ -0,0 +1,145 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+판별 방식별 출력 토큰/지연 비교: G-Eval(점수+이유 한 번에) vs 2단계 판별(점수 먼저, 이유는 필요할 때만)
+
+    cd src
+    python -m benchmarks.judge_tokens --backend ollama --clauses 20                      # 실제 Ollama (OLLAMA_HOST)
+    python -m benchmarks.judge_tokens --backend gemini --api-key $GEMINI_API_KEY
+    python -m benchmarks.judge_tokens --standin --fake-embeddings --output -             # 대역 서버로 동작만 확인
+
+같은 합성 조항을 방식마다 detect하고, usage_scope로 모은 단계별 출력 토큰을 G-Eval 기준과 비교해
+절약된 출력 토큰과 판별 결과(독소 여부) 일치율을 보고합니다.
+--with-suggestions면 독소조항 개선안까지 생성하므로, reason_mode=suggestion에서 개선안으로 옮겨 간 토큰도 포함됩니다.
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("DEEPEVAL_TELEMETRY_OPT_OUT", "YES")
+
+from benchmarks.common import run_metadata, write_report
+from benchmarks.synthetic import generate_clauses
+
+EMBEDDING_DIM = 768
+
+# (이름, judge_mode, reason_mode)
+MODES = (
+    ("geval", "geval", None),
+    ("two-phase/call", "two-phase", "call"),
+    ("two-phase/suggestion", "two-phase", "suggestion"),
+)
+
+
+def run_mode(args, clauses, judge_mode, reason_mode):
+    from detectors import create_detector
+    from usage import UsageTracker, usage_scope
+
+    detector = create_detector(args.backend, model_name=args.model, api_key=args.api_key, judge_mode=judge_mode)
+    if reason_mode:
+        detector.two_phase.reason_mode = reason_mode
+    if args.reason_threshold is not None and detector.two_phase:
+        detector.two_phase.reason_threshold = args.reason_threshold
+
+    tracker = UsageTracker()
+    start = time.perf_counter()
+    with usage_scope(tracker):
+        results = detector.detect(clauses, max_concurrent=args.max_concurrent)
+    judge_sec = time.perf_counter() - start
+    if args.with_suggestions:
+        with usage_scope(tracker):
+            for res in results:
+                if res["is_toxic"]:
+                    detector.generate_easy_suggestion(res)
+
+    usage = tracker.summary()
+    by_stage = usage["by_stage"]
+    return {
+        "judge_sec": judge_sec,
+        "judge_calls": by_stage.get("judge", {}).get("calls", 0),
+        "judge_output_tokens": by_stage.get("judge", {}).get("output_tokens", 0),
+        "suggestion_output_tokens": by_stage.get("suggestion", {}).get("output_tokens", 0),
+        "output_tokens": usage["output_tokens"],
+        "toxic": sum(1 for res in results if res["is_toxic"]),
+        "judged": len(results),
+        "verdicts": {res["clause"]: (res["risk_score"], res["is_toxic"]) for res in results},
+    }
+
+
+def compare(baseline, row):
+    """G-Eval 결과 대비 절약된 출력 토큰과 판별 일치율"""
+    saved = baseline["output_tokens"] - row["output_tokens"]
+    shared = [clause for clause in row["verdicts"] if clause in baseline["verdicts"]]
+    agree = sum(1 for c in shared if row["verdicts"][c][1] == baseline["verdicts"][c][1])
+    score_diff = [abs(row["verdicts"][c][0] - baseline["verdicts"][c][0]) for c in shared]
+    return {
+        "saved_output_tokens": saved,
+        "saved_ratio": saved / baseline["output_tokens"] if baseline["output_tokens"] else 0.0,
+        "toxic_agreement": agree / len(shared) if shared else 0.0,
+        "mean_abs_score_diff": sum(score_diff) / len(score_diff) if score_diff else 0.0,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="G-Eval vs 2단계 판별 출력 토큰 비교")
+    parser.add_argument("--backend", choices=["ollama", "gemini"], default="ollama")
+    parser.add_argument("--model", default=None, help="Ollama 판별 모델 (기본: SAFESIGN_OLLAMA_MODEL)")
+    parser.add_argument("--api-key", default=os.getenv("GEMINI_API_KEY"))
+    parser.add_argument("--clauses", type=int, default=20, help="합성 조항 개수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-concurrent", type=int, default=1)
+    parser.add_argument("--reason-threshold", type=float, default=None, help="이유 생성 기준 점수 (기본: SAFESIGN_REASON_THRESHOLD)")
+    parser.add_argument("--modes", default=",".join(name for name, _, _ in MODES), help="비교할 방식 (쉼표 구분, 첫 번째가 기준)")
+    parser.add_argument("--with-suggestions", action="store_true", help="독소조항 개선안 생성까지 포함")
+    parser.add_argument("--standin", action="store_true", help="실제 모델 대신 Ollama/Gemini 대역 서버 사용")
+    parser.add_argument("--fake-embeddings", action="store_true", help="임베딩 모델 대신 결정적 가짜 임베딩 사용")
+    parser.add_argument("--output", default="-", help="결과 JSON 경로 ('-'면 표준출력)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    modes = {name: (judge_mode, reason_mode) for name, judge_mode, reason_mode in MODES}
+    selected = [name.strip() for name in args.modes.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in modes]
+    if unknown:
+        raise SystemExit(f"알 수 없는 방식: {unknown} (가능: {', '.join(modes)})")
+
+    standins = []
+    if args.standin:
+        from benchmarks.standins import GeminiStandIn, OllamaStandIn
+        standins = [OllamaStandIn().start(), GeminiStandIn().start()]
+        # 클라이언트는 detector를 만들 때 처음 생성되므로 그 전에 주소를 바꿔 둔다
+        os.environ["OLLAMA_HOST"] = standins[0].url
+        os.environ["GEMINI_BASE_URL"] = standins[1].url
+        args.api_key = args.api_key or "standin"
+    if args.fake_embeddings:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from law.shared_resources import set_default_embeddings
+        set_default_embeddings(DeterministicFakeEmbedding(size=EMBEDDING_DIM))
+
+    clauses = generate_clauses(args.clauses, seed=args.seed)
+    report = {"meta": run_metadata(args), "modes": {}}
+    try:
+        for name in selected:
+            print(f"\n⚖️ [{name}] 판별 중... ({len(clauses)}개 조항)")
+            report["modes"][name] = run_mode(args, clauses, *modes[name])
+    finally:
+        for server in standins:
+            server.stop()
+
+    baseline = report["modes"][selected[0]]
+    print(f"\n{'mode':<22} {'calls':>6} {'judge out':>10} {'sugg out':>9} {'total out':>10} {'saved':>8} {'agree':>7} {'judge s':>8}")
+    for name in selected:
+        row = report["modes"][name]
+        row.update(compare(baseline, row))
+        print(f"{name:<22} {row['judge_calls']:>6} {row['judge_output_tokens']:>10} {row['suggestion_output_tokens']:>9}"
+              f" {row['output_tokens']:>10} {row['saved_ratio']:>8.1%} {row['toxic_agreement']:>7.1%} {row['judge_sec']:>8.2f}")
+    for row in report["modes"].values():
+        row.pop("verdicts")
+    write_report(args.output, report)
+
+
+if __name__ == "__main__":
+    main()
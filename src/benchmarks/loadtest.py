@@ -0,0 +1,291 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+FastAPI 서비스(fast_api.app) 부하 테스트
+
+실제 ASGI 앱을 uvicorn 서브프로세스로 띄우고, Ollama/Gemini 대신 로컬 대역 서버(standins)를 연결한 뒤
+동시 접속 수를 단계적으로 올리면서 /upload, /analyze(NDJSON 스트리밍) 요청을 보냅니다.
+
+    cd src
+    python -m benchmarks.loadtest --levels 1,2,4,8 --requests-per-level 16 --output ../loadtest_results.json
+    python -m benchmarks.loadtest --fake-embeddings --ollama-latency 0.5 --upload-ratio 0.5
+    python -m benchmarks.loadtest --fake-embeddings --ollama-hosts 3 --levels 4,8,16     # Ollama 서버 풀 분산 확인
+
+단계별로 time-to-first-event / time-to-complete 의 p50/p95/p99, 오류율, 처리량, 서버 RSS를 기록하고
+처리량이 더 이상 늘지 않는 지점을 포화(saturation) 지점으로 보고합니다.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import run_metadata, summarize, write_report
+from benchmarks.standins import GeminiStandIn, OllamaStandIn
+from benchmarks.synthetic import generate_contract
+
+EMBEDDING_DIM = 768
+
+
+def serve(args):
+    """(서브프로세스) fast_api.app을 uvicorn으로 실행"""
+    if args.fake_embeddings:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from law.shared_resources import set_default_embeddings
+
+        set_default_embeddings(DeterministicFakeEmbedding(size=EMBEDDING_DIM))
+
+    import uvicorn
+    import fast_api
+    uvicorn.run(fast_api.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def start_server(args, env):
+    port = _free_port()
+    command = [sys.executable, "-m", "benchmarks.loadtest", "--serve", "--port", str(port)]
+    if args.fake_embeddings:
+        command.append("--fake-embeddings")
+    process = subprocess.Popen(command, env=env)
+
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"서버 프로세스가 종료되었습니다. (exit code {process.returncode})")
+        try:
+            if httpx.get(f"{base_url}/openapi.json", timeout=1.0).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("서버가 제한 시간 안에 시작되지 않았습니다.")
+
+
+async def run_upload(client, request_id):
+    # 요청마다 내용이 달라야 추출 캐시에 걸리지 않는다.
+    pdf_bytes = b"%PDF-1.4\n% safesign loadtest " + str(request_id).encode() + b"\n%%EOF\n"
+    start = time.perf_counter()
+    response = await client.post(
+        "/upload",
+        files={"file": ("contract.pdf", pdf_bytes, "application/pdf")},
+        data={"api_key": "loadtest"},
+    )
+    elapsed = time.perf_counter() - start
+    # /upload은 JSON 한 번에 응답하므로 첫 이벤트 = 완료
+    return {"endpoint": "upload", "ok": response.status_code == 200, "ttfe": elapsed, "ttc": elapsed}
+
+
+async def run_analyze(client, text):
+    start = time.perf_counter()
+    first_event = None
+    ok = False
+    async with client.stream("POST", "/analyze", json={"api_key": "loadtest", "text": text}) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return {"endpoint": "analyze", "ok": False, "ttfe": None, "ttc": time.perf_counter() - start}
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            if first_event is None:
+                first_event = time.perf_counter() - start
+            event = json.loads(line)
+            if event.get("status") == "error":
+                ok = False
+                break
+            if event.get("status") == "complete":
+                ok = True
+    return {"endpoint": "analyze", "ok": ok, "ttfe": first_event, "ttc": time.perf_counter() - start}
+
+
+async def sample_rss(pid, samples, stop_event, interval=0.25):
+    while not stop_event.is_set():
+        rss = _rss_mb(pid)
+        if rss is not None:
+            samples.append(rss)
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_level(base_url, server_pid, concurrency, args, contract_text):
+    records = []
+    counter = {"next": 0}
+    rss_samples = []
+    stop_event = asyncio.Event()
+
+    async def worker(client):
+        while counter["next"] < args.requests_per_level:
+            request_id = counter["next"]
+            counter["next"] += 1
+            # upload_ratio 비율만큼 /upload, 나머지는 /analyze
+            is_upload = (request_id % 100) < args.upload_ratio * 100
+            try:
+                if is_upload:
+                    records.append(await run_upload(client, f"{concurrency}-{request_id}"))
+                else:
+                    records.append(await run_analyze(client, contract_text))
+            except Exception as e:
+                records.append({"endpoint": "upload" if is_upload else "analyze", "ok": False,
+                                "ttfe": None, "ttc": None, "error": str(e)})
+
+    timeout = httpx.Timeout(args.request_timeout)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        sampler = asyncio.ensure_future(sample_rss(server_pid, rss_samples, stop_event))
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall_sec = time.perf_counter() - start
+        stop_event.set()
+        await sampler
+
+    def describe(subset):
+        errors = sum(1 for r in subset if not r["ok"])
+        return {
+            "requests": len(subset),
+            "errors": errors,
+            "error_rate": errors / len(subset) if subset else 0.0,
+            "ttfe_sec": summarize([r["ttfe"] for r in subset if r["ok"] and r["ttfe"] is not None]),
+            "ttc_sec": summarize([r["ttc"] for r in subset if r["ok"] and r["ttc"] is not None]),
+        }
+
+    level = {
+        "concurrency": concurrency,
+        "wall_sec": wall_sec,
+        "throughput_rps": len(records) / wall_sec if wall_sec else 0.0,
+        **describe(records),
+        "by_endpoint": {
+            endpoint: describe([r for r in records if r["endpoint"] == endpoint])
+            for endpoint in ("upload", "analyze")
+        },
+        "server_rss_mb": {
+            "max": max(rss_samples) if rss_samples else None,
+            "mean": sum(rss_samples) / len(rss_samples) if rss_samples else None,
+        },
+        "errors_sample": [r["error"] for r in records if r.get("error")][:5],
+    }
+    return level
+
+
+def find_saturation(levels, min_gain=0.1, max_error_rate=0.01):
+    """처리량 증가율이 min_gain 미만이거나 오류율이 기준을 넘는 첫 단계의 직전 동시성"""
+    previous = None
+    for level in levels:
+        if level["error_rate"] > max_error_rate:
+            return previous["concurrency"] if previous else level["concurrency"]
+        if previous and level["throughput_rps"] < previous["throughput_rps"] * (1 + min_gain):
+            return previous["concurrency"]
+        previous = level
+    return None
+
+
+def print_table(levels):
+    print(f"\n{'동시성':>6} {'rps':>8} {'오류율':>8} {'TTFE p50':>10} {'TTFE p95':>10} {'TTC p95':>10} {'TTC p99':>10} {'RSS(MB)':>9}")
+    for level in levels:
+        ttfe, ttc = level["ttfe_sec"], level["ttc_sec"]
+        rss = level["server_rss_mb"]["max"]
+        print(f"{level['concurrency']:>6} {level['throughput_rps']:>8.2f} {level['error_rate']:>8.1%} "
+              f"{ttfe.get('p50', 0):>10.3f} {ttfe.get('p95', 0):>10.3f} {ttc.get('p95', 0):>10.3f} "
+              f"{ttc.get('p99', 0):>10.3f} {rss if rss is not None else float('nan'):>9.1f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="SafeSign FastAPI 부하 테스트")
+    parser.add_argument("--levels", default="1,2,4,8", help="단계별 동시 접속 수 (쉼표 구분)")
+    parser.add_argument("--requests-per-level", type=int, default=16)
+    parser.add_argument("--upload-ratio", type=float, default=0.25, help="/upload 요청 비율 (나머지는 /analyze)")
+    parser.add_argument("--articles", type=int, default=10, help="/analyze에 보낼 합성 계약서 조항 수")
+    parser.add_argument("--ollama-latency", type=float, default=0.2, help="Ollama 대역 서버 응답 지연(초)")
+    parser.add_argument("--ollama-hosts", type=int, default=1, help="Ollama 대역 서버 수 (2 이상이면 SAFESIGN_OLLAMA_HOSTS 풀로 분산)")
+    parser.add_argument("--gemini-latency", type=float, default=0.5, help="Gemini 대역 서버 응답 지연(초)")
+    parser.add_argument("--gemini-rpm", type=int, default=0, help="Gemini 대역 서버 분당 요청 한도 (넘으면 429, 0이면 제한 없음)")
+    parser.add_argument("--fake-embeddings", action="store_true", help="서버에서 임베딩 모델 대신 가짜 임베딩 사용")
+    parser.add_argument("--request-timeout", type=float, default=600.0)
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--output", default="-", help="결과 JSON 경로 ('-'면 표준출력)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.serve:
+        serve(args)
+        return
+
+    levels = [int(c) for c in args.levels.split(",") if c.strip()]
+    contract_text = generate_contract(args.articles)
+
+    ollama_hosts = [OllamaStandIn(latency_sec=args.ollama_latency).start() for _ in range(max(1, args.ollama_hosts))]
+    gemini = GeminiStandIn(latency_sec=args.gemini_latency, rpm_limit=args.gemini_rpm).start()
+    cache_dir = tempfile.mkdtemp(prefix="safesign-loadtest-cache-")
+    env = {
+        **os.environ,
+        "OLLAMA_HOST": ollama_hosts[0].url,
+        "SAFESIGN_OLLAMA_HOSTS": ",".join(server.url for server in ollama_hosts),
+        "GEMINI_BASE_URL": gemini.url,
+        "SAFESIGN_EXTRACTION_CACHE_DIR": cache_dir,
+        "DEEPEVAL_TELEMETRY_OPT_OUT": "YES",
+    }
+
+    print(f"🧪 대역 서버: Ollama={', '.join(server.url for server in ollama_hosts)}, Gemini={gemini.url}")
+    process, base_url = start_server(args, env)
+    print(f"🚀 서버 시작: {base_url} (pid {process.pid})")
+
+    report = {"meta": run_metadata(args), "levels": []}
+    try:
+        for concurrency in levels:
+            print(f"\n📈 동시성 {concurrency} 단계 실행 중... ({args.requests_per_level}건)")
+            level = asyncio.run(run_level(base_url, process.pid, concurrency, args, contract_text))
+            report["levels"].append(level)
+        # 서버 쪽 단계별 지표 (/metrics) 도 함께 남겨서 병목 단계를 확인
+        try:
+            report["server_metrics"] = httpx.get(f"{base_url}/metrics", timeout=10.0).text
+        except httpx.HTTPError as e:
+            print(f"⚠️ /metrics 수집 실패: {e}")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        for server in ollama_hosts:
+            server.stop()
+        gemini.stop()
+
+    report["saturation_concurrency"] = find_saturation(report["levels"])
+    report["standin_requests"] = {"ollama": [server.request_count for server in ollama_hosts], "gemini": gemini.request_count,
+                                  "gemini_rate_limited": gemini.rate_limited_count}
+    print_table(report["levels"])
+    print(f"\n📌 포화 지점(추정): 동시성 {report['saturation_concurrency']}")
+    write_report(args.output, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+오프라인 마이크로벤치마크 (Gemini 키, Ollama 없이 실행)
+
+    cd src
+    python -m benchmarks.microbench --output ../bench_results.json
+    python -m benchmarks.microbench --fake-embeddings --clauses 50 --concurrency 1,4,8 --latency 0.2
+
+측정 항목
+  1. 조항당/배치 검색(retrieval) 지연 시간 (_retrieve_context, 법령/판례 출처 각각)
+  2. max_concurrent 값에 따른 detect 처리량
+  3. detector 생성 시간 및 새 프로세스 기준 cold-start 시간
+  4. 단계별 최대 메모리 (RSS, 선택 시 tracemalloc)
+
+--cassette를 주면 가짜 LLM 대신 실제 실행에서 녹화한 응답(llm_cassette.py)을 재생합니다.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("DEEPEVAL_TELEMETRY_OPT_OUT", "YES")
+
+from benchmarks.common import current_rss_mb, peak_rss_mb, run_metadata, summarize, write_report
+from benchmarks.fake_llm import FakeJudgeLLM
+from benchmarks.synthetic import generate_clauses
+
+EMBEDDING_DIM = 768  # jhgan/ko-sbert-nli 출력 차원 (기존 FAISS 인덱스와 동일해야 함)
+
+
+def make_embeddings(fake_embeddings):
+    """--fake-embeddings면 모델 다운로드 없이 쓸 수 있는 결정적 임베딩을 사용"""
+    if not fake_embeddings:
+        return None
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    return DeterministicFakeEmbedding(size=EMBEDDING_DIM)
+
+
+def build_detector(backend, llm, embeddings):
+    if backend == "gemini":
+        from toxic_detector import ToxicClauseDetector
+        return ToxicClauseDetector(api_key="offline-benchmark", evaluator_llm=llm, embeddings=embeddings)
+    from ollama_detctor import ToxicClauseDetectorOllama
+    return ToxicClauseDetectorOllama(model_name=llm.get_model_name(), evaluator_llm=llm, embeddings=embeddings)
+
+
+class _Phase:
+    """단계별 소요 시간/메모리 측정용 컨텍스트 매니저"""
+    def __init__(self, name, report, use_tracemalloc):
+        self.name = name
+        self.report = report
+        self.use_tracemalloc = use_tracemalloc
+
+    def __enter__(self):
+        print(f"\n⏱️ [{self.name}] 측정 시작...")
+        if self.use_tracemalloc:
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        memory = {
+            "elapsed_sec": time.perf_counter() - self.start,
+            "rss_mb": current_rss_mb(),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        if self.use_tracemalloc:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            memory["tracemalloc_peak_mb"] = peak / (1024 * 1024)
+        self.report.setdefault("memory", {})[self.name] = memory
+        return False
+
+
+def probe_cold_start(args):
+    """새 프로세스에서 import + detector 생성까지의 시간을 잰다. (부모 프로세스가 JSON 마지막 줄을 읽음)"""
+    start = time.perf_counter()
+    if args.backend == "gemini":
+        import toxic_detector  # noqa: F401
+    else:
+        import ollama_detctor  # noqa: F401
+    import_sec = time.perf_counter() - start
+
+    build_start = time.perf_counter()
+    build_detector(args.backend, FakeJudgeLLM(), make_embeddings(args.fake_embeddings))
+    construct_sec = time.perf_counter() - build_start
+
+    print(json.dumps({
+        "import_sec": import_sec,
+        "construct_sec": construct_sec,
+        "total_sec": time.perf_counter() - start,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def bench_cold_start(args):
+    command = [sys.executable, "-m", "benchmarks.microbench", "--probe-cold-start", "--backend", args.backend]
+    if args.fake_embeddings:
+        command.append("--fake-embeddings")
+
+    runs = []
+    for _ in range(args.cold_start_runs):
+        start = time.perf_counter()
+        completed = subprocess.run(command, capture_output=True, text=True)
+        wall_sec = time.perf_counter() - start
+        if completed.returncode != 0:
+            print(f"⚠️ cold-start 측정 실패:\n{completed.stderr[-2000:]}")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        result["process_wall_sec"] = wall_sec
+        runs.append(result)
+
+    return {
+        "runs": runs,
+        "import_sec": summarize([r["import_sec"] for r in runs]),
+        "construct_sec": summarize([r["construct_sec"] for r in runs]),
+        "process_wall_sec": summarize([r["process_wall_sec"] for r in runs]),
+    }
+
+
+def bench_retrieval(detector, clauses):
+    per_clause, law_times, precedent_times = [], [], []
+    batch_start = time.perf_counter()
+    for clause in clauses:
+        start = time.perf_counter()
+        detector._retrieve_context(clause)
+        per_clause.append(time.perf_counter() - start)
+    batch_sec = time.perf_counter() - batch_start
+
+    # 출처별 검색 시간을 따로 잰다 (어느 출처가 느린지 확인용)
+    for clause in clauses:
+        start = time.perf_counter()
+        detector.law_manager.search_relevant_laws(clause, k=2)
+        law_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        detector.precedent_manager.search_relevant_precedents(clause, k=1)
+        precedent_times.append(time.perf_counter() - start)
+
+    return {
+        "clauses": len(clauses),
+        "per_clause_sec": summarize(per_clause),
+        "batch_sec": batch_sec,
+        "law_search_sec": summarize(law_times),
+        "precedent_search_sec": summarize(precedent_times),
+    }
+
+
+def bench_detect(detector, clauses, concurrency_levels, repeats):
+    results = []
+    for max_concurrent in concurrency_levels:
+        elapsed = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            detector.detect(clauses, max_concurrent=max_concurrent)
+            elapsed.append(time.perf_counter() - start)
+        best = min(elapsed)
+        results.append({
+            "max_concurrent": max_concurrent,
+            "elapsed_sec": summarize(elapsed),
+            "clauses_per_sec": len(clauses) / best if best else 0.0,
+        })
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="SafeSign 오프라인 마이크로벤치마크")
+    parser.add_argument("--backend", choices=["ollama", "gemini"], default="ollama",
+                        help="벤치마크할 detector 종류 (LLM은 항상 가짜 모델 사용)")
+    parser.add_argument("--clauses", type=int, default=20, help="합성 조항 개수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.05, help="가짜 LLM 응답 지연(초)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="가짜 LLM 지연 편차(초)")
+    parser.add_argument("--cassette", default=None,
+                        help="가짜 LLM 대신 재생할 카세트 경로 (llm_cassette.py record와 같은 --clauses/--seed로 녹화)")
+    parser.add_argument("--replay-timing", choices=["instant", "original"], default="instant",
+                        help="카세트 재생 시 녹화된 지연 시간을 재현할지 여부")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="detect max_concurrent 값 목록 (쉼표 구분)")
+    parser.add_argument("--repeats", type=int, default=1, help="detect 반복 횟수")
+    parser.add_argument("--cold-start-runs", type=int, default=1, help="cold-start 측정 프로세스 수 (0이면 생략)")
+    parser.add_argument("--fake-embeddings", action="store_true", help="임베딩 모델 대신 결정적 가짜 임베딩 사용")
+    parser.add_argument("--tracemalloc", action="store_true", help="단계별 Python 할당 최대치도 기록 (느려짐)")
+    parser.add_argument("--output", default="-", help="결과 JSON 경로 ('-'면 표준출력)")
+    parser.add_argument("--probe-cold-start", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.probe_cold_start:
+        probe_cold_start(args)
+        return
+
+    concurrency_levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    clauses = generate_clauses(args.clauses, seed=args.seed)
+    report = {"meta": run_metadata(args), "results": {}}
+
+    if args.cold_start_runs > 0:
+        report["results"]["cold_start"] = bench_cold_start(args)
+
+    if args.cassette:
+        from llm_cassette import ReplayLLM
+        llm = ReplayLLM(args.cassette, timing=args.replay_timing)
+    else:
+        llm = FakeJudgeLLM(latency_sec=args.latency, jitter_sec=args.jitter, seed=args.seed)
+    embeddings = make_embeddings(args.fake_embeddings)
+
+    # 같은 프로세스에서 두 번째 생성은 import/모델 캐시가 데워진 상태의 비용
+    with _Phase("construct", report, args.tracemalloc):
+        detector = build_detector(args.backend, llm, embeddings)
+    with _Phase("construct_again", report, args.tracemalloc):
+        build_detector(args.backend, llm, embeddings)
+    report["results"]["construction"] = {
+        "first_sec": report["memory"]["construct"]["elapsed_sec"],
+        "second_sec": report["memory"]["construct_again"]["elapsed_sec"],
+    }
+
+    with _Phase("retrieval", report, args.tracemalloc):
+        report["results"]["retrieval"] = bench_retrieval(detector, clauses)
+
+    with _Phase("detect", report, args.tracemalloc):
+        report["results"]["detect"] = bench_detect(detector, clauses, concurrency_levels, args.repeats)
+
+    if args.cassette:
+        report["results"]["llm_calls"] = llm.hits + llm.misses
+        report["results"]["cassette_misses"] = llm.misses
+    else:
+        report["results"]["llm_calls"] = llm.call_count
+    report["results"]["peak_rss_mb"] = peak_rss_mb()
+    write_report(args.output, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Ollama / Gemini / 법제처 판례 REST API를 흉내 내는 로컬 대역(stand-in) HTTP 서버.
+부하 테스트에서 실제 모델 대신 사용하며, 응답 지연과 스트리밍 속도를 조절할 수 있습니다.
+
+    ollama = OllamaStandIn(latency_sec=0.3).start()     # OLLAMA_HOST=ollama.url
+    gemini = GeminiStandIn(latency_sec=1.0).start()     # GEMINI_BASE_URL=gemini.url
+    moleg = MolegStandIn(precedents=500).start()        # MOLEG_BASE_URL=moleg.url (판례 수집기)
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+from benchmarks.fake_responses import fake_completion
+from benchmarks.synthetic import generate_contract
+
+
+def _approx_tokens(text):
+    return max(1, len(text) // 2)
+
+
+class _StandInServer:
+    """ThreadingHTTPServer를 백그라운드 스레드에서 돌리는 공통 부분"""
+    def __init__(self, latency_sec=0.0, stream_chunk_chars=40, stream_interval_sec=0.01, host="127.0.0.1", port=0):
+        self.latency_sec = latency_sec
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_interval_sec = stream_interval_sec
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self):
+        with self._lock:
+            self.request_count += 1
+
+    def _chunks(self, text):
+        for i in range(0, len(text), self.stream_chunk_chars):
+            yield text[i:i + self.stream_chunk_chars]
+
+    def _make_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def read_json(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                return json.loads(body or b"{}")
+
+            def send_json(self, payload, status=200):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def start_chunked(self, content_type):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            def write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def end_chunked(self):
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                stand_in.handle_get(self)
+
+            def do_POST(self):
+                stand_in._count()
+                stand_in.handle_post(self)
+
+        return Handler
+
+    def handle_get(self, handler):
+        handler.send_json({"error": "not found"}, status=404)
+
+    def handle_post(self, handler):
+        handler.send_json({"error": "not found"}, status=404)
+
+
+def _keep_alive_sec(value, default_sec):
+    """Ollama keep_alive 값(초 숫자, "30m"/"10s"/"1h", 음수=무기한)을 초로 (None이면 무기한)"""
+    if value is None or value == "":
+        return default_sec
+    if isinstance(value, str) and value[-1:] in ("s", "m", "h"):
+        seconds = float(value[:-1]) * {"s": 1, "m": 60, "h": 3600}[value[-1]]
+    else:
+        seconds = float(value)
+    return None if seconds < 0 else seconds
+
+
+class OllamaStandIn(_StandInServer):
+    """
+    /api/chat, /api/generate, /api/tags, /api/ps 를 흉내 내는 Ollama 대역 서버.
+    load_sec > 0 이면 적재되지 않은 모델을 처음 부를 때 그만큼 기다리고 load_duration으로 알려 준다.
+    적재된 모델은 요청의 keep_alive(없으면 default_keep_alive_sec, Ollama 기본 5분) 동안 유휴 상태로 남는다.
+    available = False 로 두면 모든 요청에 503을 돌려준다 (여러 서버 풀에서 장애 서버 흉내).
+    """
+    def __init__(self, models=("hf.co/LiquidAI/LFM2-8B-A1B-GGUF:Q4_K_M",), load_sec=0.0, default_keep_alive_sec=300.0, **kwargs):
+        super().__init__(**kwargs)
+        self.models = list(models)
+        self.load_sec = load_sec
+        self.default_keep_alive_sec = default_keep_alive_sec
+        self.load_count = 0
+        self.available = True
+        # model -> 언로드 시각 (time.monotonic 기준, None이면 무기한)
+        self._loaded = {}
+
+    def _ensure_loaded(self, model, keep_alive):
+        """모델이 없으면 적재(대기)하고 keep_alive를 갱신. 적재에 걸린 시간(초)을 반환"""
+        now = time.monotonic()
+        with self._lock:
+            expires = self._loaded.get(model, 0)
+            loaded = model in self._loaded and (expires is None or expires > now)
+            if not loaded:
+                self.load_count += 1
+        if not loaded and self.load_sec:
+            time.sleep(self.load_sec)
+        keep_sec = _keep_alive_sec(keep_alive, self.default_keep_alive_sec)
+        with self._lock:
+            self._loaded[model] = None if keep_sec is None else time.monotonic() + keep_sec
+        return 0.0 if loaded else self.load_sec
+
+    def _loaded_models(self):
+        now = time.monotonic()
+        with self._lock:
+            return [m for m, expires in self._loaded.items() if expires is None or expires > now]
+
+    def _base(self, model):
+        return {"model": model, "created_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")}
+
+    def _done_stats(self, prompt, content, elapsed, load_sec=0.0):
+        elapsed_ns = int(elapsed * 1e9)
+        return {
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": elapsed_ns,
+            "load_duration": int(load_sec * 1e9),
+            "prompt_eval_count": _approx_tokens(prompt),
+            "prompt_eval_duration": elapsed_ns // 4,
+            "eval_count": _approx_tokens(content),
+            "eval_duration": elapsed_ns - elapsed_ns // 4,
+        }
+
+    def handle_get(self, handler):
+        if not self.available:
+            handler.send_json({"error": "service unavailable"}, status=503)
+        elif handler.path.startswith("/api/tags"):
+            handler.send_json({"models": [{"name": m, "model": m, "size": 0, "digest": "", "details": {}} for m in self.models]})
+        elif handler.path.startswith("/api/ps"):
+            handler.send_json({"models": [{"name": m, "model": m, "size": 0, "size_vram": 0} for m in self._loaded_models()]})
+        elif handler.path == "/":
+            handler.send_response(200)
+            handler.send_header("Content-Length", "17")
+            handler.end_headers()
+            handler.wfile.write(b"Ollama is running")
+        else:
+            super().handle_get(handler)
+
+    def handle_post(self, handler):
+        start = time.perf_counter()
+        request = handler.read_json()
+        model = request.get("model", self.models[0])
+        if not self.available:
+            handler.send_json({"error": "service unavailable"}, status=503)
+            return
+
+        if handler.path.startswith("/api/chat"):
+            messages = request.get("messages") or []
+            prompt = messages[-1].get("content", "") if messages else ""
+        elif handler.path.startswith("/api/generate"):
+            prompt = request.get("prompt") or ""
+        else:
+            super().handle_post(handler)
+            return
+
+        load_sec = self._ensure_loaded(model, request.get("keep_alive"))
+        if not prompt and handler.path.startswith("/api/generate"):
+            # 빈 프롬프트는 모델 로딩(preload) 요청
+            handler.send_json({**self._base(model), "response": "", **self._done_stats("", "", time.perf_counter() - start, load_sec)})
+            return
+
+        content = fake_completion(prompt)
+        is_chat = handler.path.startswith("/api/chat")
+
+        def body(text):
+            return {"message": {"role": "assistant", "content": text}} if is_chat else {"response": text}
+
+        if not request.get("stream", True):
+            time.sleep(self.latency_sec)
+            handler.send_json({**self._base(model), **body(content), **self._done_stats(prompt, content, time.perf_counter() - start, load_sec)})
+            return
+
+        time.sleep(self.latency_sec)
+        handler.start_chunked("application/x-ndjson")
+        for piece in self._chunks(content):
+            handler.write_chunk((json.dumps({**self._base(model), **body(piece), "done": False}, ensure_ascii=False) + "\n").encode("utf-8"))
+            time.sleep(self.stream_interval_sec)
+        final = {**self._base(model), **body(""), **self._done_stats(prompt, content, time.perf_counter() - start, load_sec)}
+        handler.write_chunk((json.dumps(final, ensure_ascii=False) + "\n").encode("utf-8"))
+        handler.end_chunked()
+
+
+class GeminiStandIn(_StandInServer):
+    """
+    models/{model}:generateContent, :streamGenerateContent 를 흉내 내는 Gemini 대역 서버.
+    PDF(inlineData)가 포함된 요청에는 합성 계약서 텍스트를, 그 외에는 fake_completion 결과를 돌려준다.
+    rpm_limit > 0 이면 최근 60초 동안 그보다 많이 들어온 요청에 429(RESOURCE_EXHAUSTED)를 돌려준다.
+    """
+    _PATH_PATTERN = re.compile(r'/v1beta/models/([^:/]+):(generateContent|streamGenerateContent)')
+
+    def __init__(self, contract_articles=20, rpm_limit=0, **kwargs):
+        super().__init__(**kwargs)
+        self.contract_text = generate_contract(contract_articles)
+        self.rpm_limit = rpm_limit
+        self.rate_limited_count = 0
+        self._recent = deque()
+
+    def _over_limit(self):
+        if not self.rpm_limit:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.rpm_limit:
+                self.rate_limited_count += 1
+                return True
+            self._recent.append(now)
+            return False
+
+    @staticmethod
+    def _prompt_and_pdf(request):
+        texts, has_pdf = [], False
+        for content in request.get("contents") or []:
+            for part in content.get("parts") or []:
+                if "text" in part:
+                    texts.append(part["text"])
+                if "inlineData" in part or "inline_data" in part:
+                    has_pdf = True
+        return "\n".join(texts), has_pdf
+
+    @staticmethod
+    def _response(model, text, prompt, finished=True):
+        candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+        if finished:
+            candidate["finishReason"] = "STOP"
+        prompt_tokens, output_tokens = _approx_tokens(prompt), _approx_tokens(text)
+        return {
+            "candidates": [candidate],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens,
+            },
+            "modelVersion": model,
+        }
+
+    def handle_post(self, handler):
+        match = self._PATH_PATTERN.search(handler.path)
+        if not match:
+            super().handle_post(handler)
+            return
+
+        model, method = match.groups()
+        request = handler.read_json()
+        if self._over_limit():
+            handler.send_json({"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).", "status": "RESOURCE_EXHAUSTED"}}, status=429)
+            return
+        prompt, has_pdf = self._prompt_and_pdf(request)
+        content = self.contract_text if has_pdf else fake_completion(prompt)
+        time.sleep(self.latency_sec)
+
+        if method == "generateContent":
+            handler.send_json(self._response(model, content, prompt))
+            return
+
+        # 스트리밍 응답은 SSE(data: {...}) 형식
+        handler.start_chunked("text/event-stream")
+        pieces = list(self._chunks(content))
+        for i, piece in enumerate(pieces):
+            event = self._response(model, piece, prompt, finished=(i == len(pieces) - 1))
+            handler.write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+            time.sleep(self.stream_interval_sec)
+        handler.end_chunked()
+
+
+class MolegStandIn(_StandInServer):
+    """
+    법제처 판례 목록(/DRF/lawSearch.do, JSON)과 상세(/DRF/lawService.do, XML) API를 흉내 내는 대역 서버.
+    합성 판례마다 키워드 두 개가 사건명에 들어가므로, 여러 검색어로 수집하면 같은 판례가 겹쳐 나온다 (중복 제거 확인용).
+    fail_rate 비율만큼 요청에 500을 돌려준다 (재시도 확인용).
+    scripted_failures에 넣은 상태 코드(429, 503 등)는 다음 요청부터 차례로 하나씩 돌려준다.
+    """
+    KEYWORDS = ("해고", "임금", "퇴직금", "손해배상", "근로시간")
+
+    def __init__(self, precedents=200, fail_rate=0.0, seed=0, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_rate = fail_rate
+        self.scripted_failures = deque()
+        self.detail_requests = 0
+        self._random = random.Random(seed)
+        self.precedents = [self._precedent(i) for i in range(precedents)]
+        self._by_id = {p["판례일련번호"]: p for p in self.precedents}
+
+    def _precedent(self, i):
+        first, second = self.KEYWORDS[i % len(self.KEYWORDS)], self.KEYWORDS[(i * 3 + 1) % len(self.KEYWORDS)]
+        return {
+            "판례일련번호": str(100000 + i),
+            "사건명": f"{first} 및 {second} 관련 청구 사건 {i}",
+            "사건번호": f"20{10 + i % 15}다{1000 + i}",
+            "선고일자": f"20{10 + i % 15}.0{1 + i % 9}.1{i % 10}",
+            "법원명": "대법원" if i % 3 == 0 else "서울고등법원",
+        }
+
+    def _fail(self):
+        """이번 요청에 돌려줄 오류 상태 코드 (정상이면 None)"""
+        with self._lock:
+            if self.scripted_failures:
+                return self.scripted_failures.popleft()
+            return 500 if self._random.random() < self.fail_rate else None
+
+    def handle_get(self, handler):
+        self._count()
+        url = urlparse(handler.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        time.sleep(self.latency_sec)
+        status = self._fail()
+        if status is not None:
+            handler.send_json({"error": "rate limited" if status == 429 else "internal error"}, status=status)
+        elif url.path == "/DRF/lawSearch.do":
+            self._send_list(handler, params)
+        elif url.path == "/DRF/lawService.do":
+            self._send_detail(handler, params)
+        else:
+            super().handle_get(handler)
+
+    def _send_list(self, handler, params):
+        query = params.get("query", "")
+        matched = [p for p in self.precedents if query in p["사건명"]]
+        display, page = int(params.get("display", 20)), int(params.get("page", 1))
+        items = matched[(page - 1) * display:page * display]
+        handler.send_json({"PrecSearch": {"totalCnt": str(len(matched)), "page": str(page), "prec": items}})
+
+    def _send_detail(self, handler, params):
+        with self._lock:
+            self.detail_requests += 1
+        precedent = self._by_id.get(params.get("ID", ""))
+        if precedent is None:
+            handler.send_json({"error": "not found"}, status=404)
+            return
+        xml = (
+            "<PrecService>"
+            f"<판례정보일련번호>{precedent['판례일련번호']}</판례정보일련번호>"
+            f"<사건명>{escape(precedent['사건명'])}</사건명>"
+            # 실제 API처럼 본문 안의 <br/>은 이스케이프된 텍스트로 들어간다
+            f"<판시사항>{escape(precedent['사건명'] + '에서 사용자의 책임 범위<br/>근로기준법 적용 여부')}</판시사항>"
+            f"<판결요지>{escape(precedent['사건명'])}에 관하여 근로자에게 불리한 약정은 무효이다.</판결요지>"
+            "</PrecService>"
+        ).encode("utf-8")
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/xml; charset=utf-8")
+        handler.send_header("Content-Length", str(len(xml)))
+        handler.end_headers()
+        handler.wfile.write(xml)
@@ -0,0 +1,80 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import random
+
+# (제목, 본문) 템플릿. 독소조항과 정상 조항을 섞어 실제 근로계약서와 비슷한 분포를 만든다.
+ARTICLE_TEMPLATES = [
+    ("목적", "본 계약은 사용자 (주){company}(이하 \"갑\")와 근로자 {name}(이하 \"을\")의 근로조건을 정함을 목적으로 한다."),
+    ("근로시간", "근로시간은 09:00부터 18:00까지로 하며, 휴게시간은 12:00부터 13:00까지로 한다."),
+    ("연장근로", "\"갑\"은 업무상 필요한 경우 \"을\"에게 연장근로를 명할 수 있으며 \"을\"은 이에 포괄적으로 동의한다."),
+    ("임금", "월 급여는 {wage}만원으로 하며, 이는 연장/야간/휴일 근로수당을 모두 포함한 포괄임금으로 한다."),
+    ("수습", "수습기간 {months}개월 동안은 최저임금의 {ratio}%만 지급한다."),
+    ("퇴직금", "1년 미만 근무 시 퇴직금은 지급하지 않으며, 퇴사 시 교육비 명목으로 {penalty}만원을 배상한다."),
+    ("해고", "\"갑\"은 \"을\"의 업무 성과가 저조하다고 판단될 경우 즉시 해고할 수 있다."),
+    ("손해배상", "퇴사 시 후임자를 구하지 못하면 그로 인한 모든 손해를 배상해야 한다."),
+    ("휴가", "연차유급휴가는 근로기준법에 따라 부여한다."),
+    ("기타", "본 계약에 정하지 않은 사항은 회사의 취업규칙 및 관례에 따른다."),
+]
+
+PARAGRAPH_TEMPLATES = [
+    "회사는 필요하다고 인정하는 경우 근무 장소 및 업무를 변경할 수 있다.",
+    "근로자는 회사의 사전 승인 없이 겸업할 수 없으며, 위반 시 징계할 수 있다.",
+    "임금은 매월 {day}일에 근로자 명의의 계좌로 지급한다.",
+    "회사의 영업비밀을 누설한 경우 퇴직 후에도 {penalty}만원의 위약금을 지급한다.",
+    "업무상 재해에 대하여는 관계 법령에 따라 보상한다.",
+]
+
+COMPANIES = ["악덕상사", "세이프테크", "한빛물산", "가온산업"]
+NAMES = ["홍길동", "김철수", "이영희", "박민수"]
+
+
+def _fill(template, rng):
+    return template.format(
+        company=rng.choice(COMPANIES),
+        name=rng.choice(NAMES),
+        wage=rng.randint(180, 400),
+        months=rng.randint(1, 6),
+        ratio=rng.choice([50, 70, 80, 90]),
+        penalty=rng.choice([100, 300, 500]),
+        day=rng.randint(1, 28),
+    )
+
+
+def generate_clauses(n_clauses, seed=0):
+    """'제N조 (제목) 본문' 형태의 조항 문자열 n_clauses개를 만듭니다."""
+    rng = random.Random(seed)
+    clauses = []
+    for i in range(n_clauses):
+        title, body = rng.choice(ARTICLE_TEMPLATES)
+        clauses.append(f"제{i + 1}조 ({title}) {_fill(body, rng)}")
+    return clauses
+
+
+def generate_contract(n_articles=20, seed=0, long_article_ratio=0.2, paragraphs_per_long_article=8):
+    """
+    조항 수, 긴 조항(①② 항이 많은 조항) 비율을 조절할 수 있는 합성 근로계약서 텍스트를 만듭니다.
+    같은 seed면 항상 같은 텍스트가 나옵니다.
+    """
+    rng = random.Random(seed)
+    lines = [
+        "근로계약서",
+        f"(주){rng.choice(COMPANIES)}(이하 \"갑\")와 {rng.choice(NAMES)}(이하 \"을\")은 다음과 같이 근로계약을 체결한다.",
+        "",
+    ]
+    circled = "①②③④⑤⑥⑦⑧⑨⑩⑪⑫⑬⑭⑮⑯⑰⑱⑲⑳"
+
+    for i in range(n_articles):
+        title, body = rng.choice(ARTICLE_TEMPLATES)
+        lines.append(f"제{i + 1}조 ({title})")
+        if rng.random() < long_article_ratio:
+            for p in range(min(paragraphs_per_long_article, len(circled))):
+                lines.append(f"{circled[p]} {_fill(rng.choice(PARAGRAPH_TEMPLATES), rng)}")
+                if rng.random() < 0.3:
+                    lines.append(f"1. {_fill(rng.choice(PARAGRAPH_TEMPLATES), rng)}")
+                    lines.append(f"2. {_fill(rng.choice(PARAGRAPH_TEMPLATES), rng)}")
+        else:
+            lines.append(_fill(body, rng))
+        lines.append("")
+
+    return "\n".join(lines)
@@ -0,0 +1,374 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import copy
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from usage import merge_summaries
+
+# 판별 1회에 넣을 최대 글자 수. 이보다 긴 조항은 항/호 단위로 나누어 병렬 판별한다.
+MAX_JUDGE_UNIT_CHARS = 1500
+
+# 줄 맨 앞의 '제N조' / '제N조의M' 제목 ("제1조.", "제2조:"처럼 구두점이 붙은 표기 포함).
+# "제3조에 따라"처럼 본문에서 인용하는 경우는 제외한다.
+_ARTICLE_HEADER_PATTERN = re.compile(
+    r'^[ \t]*제\s*(\d+)\s*조(?:\s*의\s*(\d+))?(?:[ \t]*[.:·．：]|(?=[\s(\[【]|$))(?:[ \t]*\(([^)\n]*)\))?',
+    re.MULTILINE
+)
+_CIRCLED_NUMBERS = "①②③④⑤⑥⑦⑧⑨⑩⑪⑫⑬⑭⑮⑯⑰⑱⑲⑳"
+# 항/호 표시는 줄 맨 앞(또는 조항 제목 바로 뒤)에 있을 때만 본다. 본문 중의 "①항에 따라" 같은 인용은 제외
+_CIRCLED_MARK_PATTERN = re.compile(rf'^[ \t]*([{_CIRCLED_NUMBERS}])', re.MULTILINE)
+_NUMBER_MARK_PATTERN = re.compile(r'^[ \t]*(\d+)[.)][ \t]', re.MULTILINE)
+_HANGUL_MARK_PATTERN = re.compile(r'^[ \t]*([가나다라마바사아자차카타파하])[.)][ \t]', re.MULTILINE)
+_SENTENCE_END_PATTERN = re.compile(r'(?<=[.다])\s+')
+
+
+@dataclass
+class Segment:
+    """
+    계약서의 구조 단위 (조/항/호) 레코드.
+    start, end는 원문 전체 기준 문자 위치이며 text == 원문[start:end] 입니다.
+    """
+    level: str                   # "preamble" | "article" | "paragraph" | "item"
+    number: Optional[str]        # 조 번호("3", "3의2"), 항 번호("①", "1"), 호 번호("1", "가")
+    text: str
+    start: int
+    end: int
+    title: str = ""              # 조항 제목 (article만)
+    header_end: int = 0          # 조항 제목이 끝나는 위치 (article만)
+    children: List["Segment"] = field(default_factory=list)
+
+    def iter_records(self):
+        """자기 자신과 하위 레코드를 문서 순서대로 돌려줍니다."""
+        yield self
+        for child in self.children:
+            yield from child.iter_records()
+
+
+@dataclass
+class JudgeUnit:
+    """판별 모델에 한 번에 넣는 단위. 긴 조항은 여러 개의 JudgeUnit으로 나뉜다."""
+    article_index: int
+    part: int
+    parts: int
+    text: str
+    start: int
+    end: int
+
+
+def _trimmed_span(text, start, end):
+    """[start, end) 구간에서 앞뒤 공백을 뺀 구간을 반환"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _make_segment(text, level, number, start, end, **kwargs):
+    start, end = _trimmed_span(text, start, end)
+    return Segment(level=level, number=number, text=text[start:end], start=start, end=end, **kwargs)
+
+
+def _shift(segment, offset):
+    """레코드와 하위 레코드의 위치를 offset만큼 옮긴다 (일부 텍스트 기준으로 만든 레코드를 원문 기준으로, 또는 그 반대로)"""
+    for record in segment.iter_records():
+        record.start += offset
+        record.end += offset
+        if record.level == "article":
+            record.header_end += offset
+    return segment
+
+
+def _marker_spans(text, pattern, start, end):
+    """
+    [start, end) 구간에서 pattern이 시작하는 위치마다 (번호, 시작, 끝) 구간을 만든다.
+    구간을 잘라서 찾으므로 start(조항 제목 바로 뒤 등)도 줄 맨 앞으로 본다.
+    """
+    marks = [(m.group(1), start + m.start()) for m in pattern.finditer(text[start:end])]
+    spans = []
+    for i, (number, mark_start) in enumerate(marks):
+        mark_end = marks[i + 1][1] if i + 1 < len(marks) else end
+        spans.append((number, mark_start, mark_end))
+    return spans
+
+
+def _parse_article_body(text, article):
+    """조항 본문을 항/호 레코드로 나누어 article.children에 채운다."""
+    body_start, body_end = article.header_end, article.end
+
+    # 원형 숫자(①)가 있으면 그것이 항, 숫자 목록(1.)이 호.
+    # 없으면 계약서에서 흔한 "1. 2." 목록을 항으로, "가. 나."를 호로 본다.
+    paragraph_spans = _marker_spans(text, _CIRCLED_MARK_PATTERN, body_start, body_end)
+    if paragraph_spans:
+        item_pattern = _NUMBER_MARK_PATTERN
+    else:
+        paragraph_spans = _marker_spans(text, _NUMBER_MARK_PATTERN, body_start, body_end)
+        item_pattern = _HANGUL_MARK_PATTERN
+
+    for number, start, end in paragraph_spans:
+        paragraph = _make_segment(text, "paragraph", number, start, end)
+        for item_number, item_start, item_end in _marker_spans(text, item_pattern, start, end):
+            if item_start == start:
+                continue
+            paragraph.children.append(_make_segment(text, "item", item_number, item_start, item_end))
+        article.children.append(paragraph)
+
+
+def _build_article(text, start, end):
+    # 스트림 중에는 제목의 괄호 부분이 늦게 들어올 수 있어, 조항이 끝난 시점에 제목을 다시 읽는다.
+    match = _ARTICLE_HEADER_PATTERN.match(text, start)
+    number = match.group(1) + (f"의{match.group(2)}" if match.group(2) else "")
+    article = _make_segment(
+        text, "article", number, match.start(), end,
+        title=(match.group(3) or "").strip(), header_end=match.end()
+    )
+    _parse_article_body(text, article)
+    return article
+
+
+class ClauseSegmenter:
+    """
+    '제N조' 단위 조항을 조/항/호 레코드(문자 위치 포함)로 나누는 분할기입니다.
+    feed()로 텍스트를 조금씩 넣으면 완성된 조항부터 돌려주므로 OCR 스트림에도 쓸 수 있고,
+    이미 본 구간은 다시 검색하지 않아 전체 길이에 대해 선형 시간으로 동작합니다.
+    """
+    def __init__(self, min_preamble_length=10):
+        self.min_preamble_length = min_preamble_length
+        # 완성된 조항까지의 텍스트는 조각 리스트로 두고, 진행 중인 조항(또는 서문)부터만 문자열 버퍼로 이어 붙인다
+        # (입력마다 전체 텍스트를 다시 만들지 않도록)
+        self._chunks: List[str] = []
+        self._buffer = ""         # 원문[_base:]
+        self._base = 0
+        self._joined = None       # text 캐시 (입력이 들어오면 비움)
+        self._in_article = False  # 진행 중인 구간이 조항인지 (False면 서문)
+        self._segment_start = 0   # 진행 중인 조항(또는 서문)의 시작 위치
+        self._scan_from = 0
+
+    @property
+    def text(self):
+        """지금까지 입력된 전체 텍스트 (레코드의 위치는 이 텍스트 기준)"""
+        if self._joined is None:
+            prefix = "".join(self._chunks)
+            self._chunks = [prefix] if prefix else []
+            self._joined = prefix + self._buffer
+        return self._joined
+
+    def _close_segment(self, end, segments):
+        # 버퍼 기준 위치로 레코드를 만든 뒤 원문 기준으로 옮긴다
+        start, end = self._segment_start - self._base, end - self._base
+        if self._in_article:
+            segments.append(_shift(_build_article(self._buffer, start, end), self._base))
+            return
+        preamble = _make_segment(self._buffer, "preamble", None, start, end)
+        if len(preamble.text) > self.min_preamble_length:
+            segments.append(_shift(preamble, self._base))
+
+    def _advance(self, position):
+        """position 이전의 텍스트(완성된 조항)를 버퍼에서 조각 리스트로 옮긴다"""
+        cut = position - self._base
+        if cut > 0:
+            self._chunks.append(self._buffer[:cut])
+            self._buffer = self._buffer[cut:]
+            self._base = position
+
+    def feed(self, text: str, final: bool = False) -> List[Segment]:
+        """텍스트 조각을 추가하고 이번에 완성된 조항(서문 포함) 레코드를 반환합니다."""
+        self._buffer += text
+        self._joined = None
+        segments = []
+
+        for match in _ARTICLE_HEADER_PATTERN.finditer(self._buffer, self._scan_from - self._base):
+            # 스트림 중간에서는 제목이 덜 들어왔을 수 있으므로 버퍼 끝에 닿은 제목은 다음 입력을 기다린다.
+            if not final and match.end() >= len(self._buffer):
+                break
+            self._close_segment(self._base + match.start(), segments)
+            self._in_article = True
+            self._segment_start = self._base + match.start()
+            self._scan_from = self._base + match.end()
+
+        if final:
+            end = self._base + len(self._buffer)
+            self._close_segment(end, segments)
+            self._in_article = False
+            self._segment_start = self._scan_from = end
+        else:
+            # 제목은 줄 맨 앞에서 시작하므로 마지막 줄바꿈 이전은 다시 볼 필요가 없다.
+            last_newline = self._buffer.rfind("\n", self._scan_from - self._base)
+            if last_newline >= self._scan_from - self._base:
+                self._scan_from = self._base + last_newline + 1
+        self._advance(self._segment_start)
+        return segments
+
+    def flush(self) -> List[Segment]:
+        """스트림이 끝났을 때 남아 있는 마지막 조항을 반환합니다."""
+        return self.feed("", final=True)
+
+
+def segment_contract(text: str) -> List[Segment]:
+    """계약서 전체 텍스트를 조항(서문 포함) 레코드 리스트로 나눕니다."""
+    if not text:
+        return []
+    return ClauseSegmenter().feed(text, final=True)
+
+
+def parse_text_to_chunks(text):
+    """텍스트를 '제N조' 기준으로 자르는 파서 (조항 원문 문자열 리스트)"""
+    return [segment.text for segment in segment_contract(text)]
+
+
+def _split_long_span(text, start, end, limit):
+    """항/호로도 나눌 수 없는 긴 구간은 문장 경계(없으면 글자 수) 기준으로 자른다."""
+    spans = []
+    while end - start > limit:
+        cut = start + limit
+        boundary = None
+        for m in _SENTENCE_END_PATTERN.finditer(text, start, cut):
+            boundary = m.end()
+        if not boundary or boundary <= start:
+            whitespace = text.rfind(" ", start, cut)
+            boundary = whitespace + 1 if whitespace > start else cut
+        spans.append((start, boundary))
+        start = boundary
+    if end > start:
+        spans.append((start, end))
+    return spans
+
+
+def _article_pieces(text, article, limit):
+    """조항 본문을 limit 이하의 연속 구간들로 나눈다. (항 → 호 → 문장 순으로 잘게)"""
+    pieces = []
+
+    def add_span(start, end, children):
+        if end - start <= limit:
+            pieces.append((start, end))
+            return
+        if children:
+            lead_end = children[0].start
+            if lead_end > start:
+                add_span(start, lead_end, [])
+            for i, child in enumerate(children):
+                child_end = children[i + 1].start if i + 1 < len(children) else end
+                add_span(child.start, child_end, child.children)
+            return
+        pieces.extend(_split_long_span(text, start, end, limit))
+
+    add_span(article.header_end, article.end, article.children)
+    return pieces
+
+
+def build_judge_units(segments: List[Segment], max_unit_chars: int = MAX_JUDGE_UNIT_CHARS) -> List[JudgeUnit]:
+    """
+    조항 레코드를 판별 단위로 변환합니다.
+    max_unit_chars보다 긴 조항은 항/호 단위 조각으로 나누고, 각 조각 앞에 조항 제목을 붙여
+    모델이 어느 조항의 일부인지 알 수 있게 합니다.
+    조항 레코드의 text만 쓰므로 원문 전체가 필요 없습니다. (판별 단위의 위치는 원문 기준)
+    """
+    units = []
+    for article_index, segment in enumerate(segments):
+        if segment.level != "article" or len(segment.text) <= max_unit_chars:
+            units.append(JudgeUnit(article_index, 1, 1, segment.text, segment.start, segment.end))
+            continue
+
+        # 조항 텍스트 기준 위치로 옮긴 복사본으로 조각을 나눈다
+        text, offset = segment.text, segment.start
+        article = _shift(copy.deepcopy(segment), -offset)
+        header = text[:article.header_end].strip()
+        limit = max(1, max_unit_chars - len(header) - 1)
+
+        # 조각들을 limit 안에서 최대한 이어 붙인다.
+        packed = []
+        for start, end in _article_pieces(text, article, limit):
+            if packed and end - packed[-1][0] <= limit:
+                packed[-1] = (packed[-1][0], end)
+            else:
+                packed.append((start, end))
+
+        article_units = []
+        for start, end in packed:
+            start, end = _trimmed_span(text, start, end)
+            if start < end:
+                article_units.append((start, end))
+        for part, (start, end) in enumerate(article_units, start=1):
+            units.append(JudgeUnit(
+                article_index, part, len(article_units),
+                f"{header}\n{text[start:end]}", start + offset, end + offset
+            ))
+    return units
+
+
+def unjudged_result(segment: Segment, reason: str = "판별 결과를 받지 못했습니다.") -> Dict:
+    """판별 결과가 돌아오지 않은 조항의 자리 표시 결과 (outcome=error, 세션에 기억하지 않아 다음 분석에서 다시 판별)"""
+    return {
+        "clause": segment.text,
+        "is_toxic": False,
+        "risk_score": 0,
+        "reason": reason,
+        "context_used": "",
+        "outcome": "error",
+        "start": segment.start,
+        "end": segment.end,
+    }
+
+
+def aggregate_unit_results(segments: List[Segment], units: List[JudgeUnit], unit_results: List[Dict]) -> List[Dict]:
+    """
+    판별 단위별 결과를 조항 단위 결과로 합칩니다.
+    조항의 위험도는 가장 위험한 조각의 점수이며, 조각 중 하나라도 독소조항이면 조항 전체를 독소조항으로 봅니다.
+    unit_results는 units의 텍스트로 호출한 detector.detect() 결과이며, 'index'(입력 순서) 값으로 판별 단위와 연결합니다.
+    ('index'가 없으면 결과 순서를 입력 순서로 본다. 같은 텍스트의 판별 단위가 여러 개여도 섞이지 않도록 텍스트로 찾지 않는다)
+    """
+    result_by_index = {res.get('index', i): res for i, res in enumerate(unit_results)}
+    units_by_article = {}
+    for unit_index, unit in enumerate(units):
+        units_by_article.setdefault(unit.article_index, []).append((unit_index, unit))
+
+    article_results = []
+    for article_index, segment in enumerate(segments):
+        scored = [(unit, result_by_index[unit_index]) for unit_index, unit in units_by_article.get(article_index, [])
+                  if unit_index in result_by_index]
+        if not scored:
+            continue
+
+        best_unit, best = max(scored, key=lambda pair: pair[1]['risk_score'])
+        article_result = dict(best)
+        # 판별 단위의 입력 순서는 조항 결과에 남기지 않는다
+        article_result.pop("index", None)
+        article_result.update({
+            "clause": segment.text,
+            "is_toxic": any(res['is_toxic'] for _, res in scored),
+            "start": segment.start,
+            "end": segment.end,
+        })
+        # 판별 결과 상태: 조각 하나라도 실패(timeout/error)했거나 결과가 빠졌으면 조항 전체를 판별 실패로 본다
+        if any("outcome" in res for _, res in scored):
+            failed = [res['outcome'] for _, res in scored if res.get('outcome') not in ("safe", "toxic")]
+            if failed:
+                article_result["outcome"] = failed[0]
+            elif len(scored) < len(units_by_article[article_index]):
+                article_result["outcome"] = "error"
+            else:
+                article_result["outcome"] = "toxic" if article_result["is_toxic"] else "safe"
+
+        # 판별 단위별 LLM 사용량이 있으면 조항 단위로 합친다
+        if any("usage" in res for _, res in scored):
+            article_result["usage"] = merge_summaries([res.get("usage") for _, res in scored])
+
+        if len(scored) > 1:
+            toxic_reasons = [f"[{unit.part}/{unit.parts}] {res['reason']}" for unit, res in scored if res['is_toxic']]
+            article_result["reason"] = "\n".join(toxic_reasons) if toxic_reasons else best['reason']
+            article_result["units"] = [
+                {
+                    "part": unit.part,
+                    "start": unit.start,
+                    "end": unit.end,
+                    "is_toxic": res['is_toxic'],
+                    "risk_score": res['risk_score'],
+                    "reason": res['reason'],
+                }
+                for unit, res in scored
+            ]
+        article_results.append(article_result)
+    return article_results
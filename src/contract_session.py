@@ -0,0 +1,167 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import copy
+import hashlib
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from metrics import CACHE_LOOKUPS
+
+# 계약서 세션 보관 기간(초)과 최대 개수 (프로세스 메모리에 보관, 오래 쓰지 않은 세션부터 삭제)
+SESSION_TTL_SEC = float(os.getenv("SAFESIGN_SESSION_TTL_SEC", "3600"))
+SESSION_MAX = int(os.getenv("SAFESIGN_SESSION_MAX", "1000"))
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+# 세션에 기억할 판별 결과 (detector 결과의 'outcome', timeout / error는 제외)
+JUDGED_OUTCOMES = ("safe", "toxic")
+
+
+def clause_hash(text: str) -> str:
+    """조항 본문 해시 (줄바꿈/공백만 바뀐 조항은 같은 조항으로 본다)"""
+    normalized = _WHITESPACE_PATTERN.sub(" ", text).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _api_key_hash(api_key: str) -> str:
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+def _clause_key(segment):
+    """수정/추가를 구분하는 조항 식별자 (같은 조 번호의 본문이 바뀌었으면 수정)"""
+    return segment.level, segment.number
+
+
+@dataclass
+class ClauseDiff:
+    """새 조항 목록을 이전 분석과 비교한 결과 (인덱스는 새 조항 목록 기준, removed는 이전 조항 수)"""
+    added: List[int] = field(default_factory=list)
+    modified: List[int] = field(default_factory=list)
+    unchanged: List[int] = field(default_factory=list)
+    removed: int = 0
+
+    @property
+    def changed(self) -> List[int]:
+        """다시 검색/판별해야 하는 조항 (문서 순서)"""
+        return sorted(self.added + self.modified)
+
+    def summary(self) -> Dict:
+        return {"added": len(self.added), "modified": len(self.modified),
+                "unchanged": len(self.unchanged), "removed": self.removed}
+
+
+@dataclass
+class ContractSession:
+    """
+    한 계약서의 직전 분석 결과. 조항 해시 -> 판별 결과(개선안 포함)와 조항 식별자 -> 해시를 기억합니다.
+    config(판별 백엔드/모델/판별 단위 길이)가 바뀌면 이전 결과를 쓰지 않는다.
+    """
+    session_id: str
+    api_key_hash: str
+    config: str = ""
+    results: Dict[str, Dict] = field(default_factory=dict)      # 조항 해시 -> 조항 결과
+    hashes_by_key: Dict[tuple, str] = field(default_factory=dict)
+    revision: int = 0
+    updated_at: float = field(default_factory=time.time)
+
+    def diff(self, segments, config: str) -> ClauseDiff:
+        """새 조항 목록 중 이전 결과를 그대로 쓸 수 있는 조항과 다시 판별할 조항을 나눈다"""
+        if config != self.config:
+            return ClauseDiff(added=list(range(len(segments))), removed=len(self.results))
+        diff = ClauseDiff()
+        new_hashes = set()
+        for i, segment in enumerate(segments):
+            digest = clause_hash(segment.text)
+            new_hashes.add(digest)
+            if digest in self.results:
+                diff.unchanged.append(i)
+            elif _clause_key(segment) in self.hashes_by_key:
+                diff.modified.append(i)
+            else:
+                diff.added.append(i)
+        diff.removed = len(set(self.results) - new_hashes)
+        CACHE_LOOKUPS.inc(len(diff.unchanged), cache="clause_session", result="hit")
+        CACHE_LOOKUPS.inc(len(diff.changed), cache="clause_session", result="miss")
+        return diff
+
+    def carried_result(self, segment, clause_id) -> Dict:
+        """
+        이전 판별 결과를 새 조항 위치에 맞춰 돌려준다 (carried_over=True).
+        이번 요청에서 LLM을 호출하지 않았으므로 사용량(usage)은 뺀다.
+        """
+        result = copy.deepcopy(self.results[clause_hash(segment.text)])
+        result.pop("usage", None)
+        result.update({"id": clause_id, "clause": segment.text, "start": segment.start, "end": segment.end,
+                       "carried_over": True})
+        return result
+
+    def remember(self, segments, results: List[Dict], config: str):
+        """
+        이번 분석의 조항 결과로 세션을 교체 (개선안까지 채워진 최종 결과를 넘긴다).
+        실제로 판별된 조항(outcome이 safe / toxic)만 기억하고, 시간 초과나 모델 오류로 채운 결과는
+        다음 분석에서 다시 판별한다.
+        """
+        by_start = {res["start"]: res for res in results if "start" in res and res.get("outcome") in JUDGED_OUTCOMES}
+        self.results, self.hashes_by_key = {}, {}
+        for segment in segments:
+            res = by_start.get(segment.start)
+            if res is None:
+                continue
+            digest = clause_hash(segment.text)
+            stored = {key: value for key, value in res.items() if key not in ("id", "carried_over")}
+            self.results[digest] = copy.deepcopy(stored)
+            self.hashes_by_key[_clause_key(segment)] = digest
+        self.config = config
+        self.revision += 1
+        self.updated_at = time.time()
+
+
+class ContractSessionStore:
+    """
+    계약서 세션 저장소 (프로세스 메모리). 세션 ID는 추측할 수 없는 임의 값이고,
+    같은 API Key로 보낸 요청에만 이전 결과를 돌려준다.
+    """
+    def __init__(self, ttl_sec=SESSION_TTL_SEC, max_sessions=SESSION_MAX):
+        self.ttl_sec = ttl_sec
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, ContractSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id: Optional[str], api_key: str) -> ContractSession:
+        """
+        세션을 찾아 돌려주고, 없거나 만료되었거나 다른 API Key의 세션이면 새 세션을 만든다.
+        (새 세션은 revision이 0이라 모든 조항을 판별)
+        """
+        key_hash = _api_key_hash(api_key)
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None and session.api_key_hash == key_hash:
+                self._sessions.move_to_end(session_id)
+                session.updated_at = time.time()
+                return session
+            session = ContractSession(session_id=secrets.token_urlsafe(16), api_key_hash=key_hash)
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def _expire(self):
+        if self.ttl_sec <= 0:
+            return
+        cutoff = time.time() - self.ttl_sec
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.updated_at >= cutoff:
+                break
+            self._sessions.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
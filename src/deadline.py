@@ -0,0 +1,81 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+요청 지연 예산(deadline)과 조항별 타임아웃
+
+요청마다 지연 예산을 두고(request_deadline), 조항 판별마다 남은 예산을 남은 조항 수로 나눈 타임아웃을 준다(clause_deadline).
+느리거나 멈춘 ollama.chat 호출 하나가 순차 detect 루프와 /analyze 스트림 전체를 붙잡지 않게 하기 위함이며,
+실제로 기다리는 쪽은 hedging.HedgedLLM 입니다. (fast_api가 import하므로 무거운 모듈을 불러오지 않는다)
+
+    deadline = deadline_after(90)
+    with request_deadline(deadline):
+        detector.detect(clauses)          # 조항마다 clause_deadline(남은 조항 수) 안에서 판별
+
+환경변수
+  SAFESIGN_REQUEST_BUDGET_SEC       요청 하나의 지연 예산 (초, 기본 0 = 제한 없음)
+  SAFESIGN_CLAUSE_TIMEOUT_SEC       판별 호출 하나의 최대 시간 (기본 120)
+  SAFESIGN_MIN_CLAUSE_TIMEOUT_SEC   예산을 나눠도 이보다 짧게 주지 않음 (기본 5, 남은 예산보다 길지는 않음)
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+REQUEST_BUDGET_SEC = float(os.getenv("SAFESIGN_REQUEST_BUDGET_SEC", "0"))
+CLAUSE_TIMEOUT_SEC = float(os.getenv("SAFESIGN_CLAUSE_TIMEOUT_SEC", "120"))
+MIN_CLAUSE_TIMEOUT_SEC = float(os.getenv("SAFESIGN_MIN_CLAUSE_TIMEOUT_SEC", "5"))
+
+_request_deadline: ContextVar[Optional[float]] = ContextVar("safesign_request_deadline", default=None)
+_clause_deadline: ContextVar[Optional[float]] = ContextVar("safesign_clause_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """요청 예산 또는 조항 타임아웃 안에 LLM 응답을 받지 못한 경우"""
+
+
+def deadline_after(budget_sec) -> Optional[float]:
+    """지금부터 budget_sec 뒤의 마감 시각 (time.monotonic 기준, 0/None이면 마감 없음)"""
+    return time.monotonic() + budget_sec if budget_sec else None
+
+
+@contextmanager
+def request_deadline(deadline: Optional[float]):
+    """
+    블록 안의 LLM 호출에 요청 마감 시각을 적용합니다. (deadline_after()로 만든 값, None이면 제한 없음)
+    스트리밍 응답처럼 yield 사이에 블록이 나뉘는 경우 같은 마감 시각으로 여러 번 열면 된다.
+    """
+    token = _request_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _request_deadline.reset(token)
+
+
+def _remaining(deadline) -> Optional[float]:
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def clause_deadline(remaining_clauses: int = 1):
+    """
+    조항 하나의 판별 타임아웃: min(CLAUSE_TIMEOUT_SEC, 남은 요청 예산 / 남은 조항 수).
+    단, MIN_CLAUSE_TIMEOUT_SEC보다 짧게 주지 않으며 남은 요청 예산은 넘지 않는다.
+    """
+    timeout = CLAUSE_TIMEOUT_SEC
+    remaining = _remaining(_request_deadline.get())
+    if remaining is not None:
+        fair_share = max(MIN_CLAUSE_TIMEOUT_SEC, remaining / max(1, remaining_clauses))
+        timeout = max(0.0, min(timeout, fair_share, remaining))
+    token = _clause_deadline.set(time.monotonic() + timeout)
+    try:
+        yield timeout
+    finally:
+        _clause_deadline.reset(token)
+
+
+def remaining_sec() -> Optional[float]:
+    """요청/조항 마감 중 가까운 쪽까지 남은 시간 (마감이 없으면 None)"""
+    deadlines = [d for d in (_request_deadline.get(), _clause_deadline.get()) if d is not None]
+    return _remaining(min(deadlines)) if deadlines else None
@@ -0,0 +1,47 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+판별 백엔드 선택
+
+deepeval, langchain, ollama, google.genai는 import만으로 수 초가 걸리므로
+fast_api는 detector 모듈을 직접 import하지 않고, 백엔드가 정해진 뒤 여기서 해당 모듈만 불러온다.
+
+환경변수
+  SAFESIGN_DETECTOR_BACKEND  ollama(기본) / gemini
+  SAFESIGN_OLLAMA_MODEL      Ollama 판별 모델
+"""
+import os
+
+DETECTOR_BACKENDS = ("ollama", "gemini")
+DETECTOR_BACKEND = os.getenv("SAFESIGN_DETECTOR_BACKEND", "ollama").lower()
+DEFAULT_OLLAMA_MODEL = os.getenv("SAFESIGN_OLLAMA_MODEL", "hf.co/LiquidAI/LFM2-8B-A1B-GGUF:Q4_K_M")
+
+
+def _check_backend(backend):
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"지원하지 않는 판별 백엔드입니다: {backend} (가능: {', '.join(DETECTOR_BACKENDS)})")
+
+
+def detector_class(backend=None):
+    """백엔드에 해당하는 detector 클래스 (해당 모듈은 이때 처음 import됨)"""
+    backend = backend or DETECTOR_BACKEND
+    _check_backend(backend)
+    if backend == "gemini":
+        from toxic_detector import ToxicClauseDetector
+        return ToxicClauseDetector
+    from ollama_detctor import ToxicClauseDetectorOllama
+    return ToxicClauseDetectorOllama
+
+
+def create_detector(backend=None, model_name=None, api_key=None, **kwargs):
+    """
+    판별기 생성. 임베딩 모델과 FAISS DB는 law.shared_resources에서 프로세스당 한 번만 불러오므로
+    요청마다 만들어도 첫 요청(또는 warmup) 이후에는 가볍다.
+    """
+    backend = backend or DETECTOR_BACKEND
+    cls = detector_class(backend)
+    if backend == "gemini":
+        return cls(api_key=api_key, **kwargs)
+    # Ollama 판별기는 Gemini 키를 헤징용 예비 백엔드에 쓴다 (SAFESIGN_HEDGE_BACKEND=gemini일 때)
+    return cls(model_name=model_name or DEFAULT_OLLAMA_MODEL, hedge_api_key=api_key, **kwargs)
@@ -0,0 +1,101 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import hashlib
+import os
+import threading
+from typing import Optional
+
+from metrics import CACHE_LOOKUPS
+
+# 로컬 캐시 저장 경로 및 최대 용량 (환경변수로 변경 가능)
+CACHE_DIR = os.getenv("SAFESIGN_EXTRACTION_CACHE_DIR", "../data/extraction_cache")
+CACHE_MAX_MB = float(os.getenv("SAFESIGN_EXTRACTION_CACHE_MAX_MB", "256"))
+
+
+class ExtractionCache:
+    """
+    PDF 텍스트 추출 결과를 로컬 디스크에 저장하는 캐시입니다.
+    키는 SHA-256(pdf_bytes) + 추출 모델 + 프롬프트 버전이며,
+    전체 용량이 max_bytes를 넘으면 가장 오래 사용하지 않은 파일부터 삭제합니다.
+    """
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=int(CACHE_MAX_MB * 1024 * 1024)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(pdf_bytes: bytes, model: str, prompt_version: str) -> str:
+        pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
+        return hashlib.sha256(f"{pdf_hash}|{model}|{prompt_version}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            CACHE_LOOKUPS.inc(cache="extraction", result="miss")
+            return None
+        except OSError as e:
+            print(f"⚠️ 추출 캐시 읽기 실패 ({key[:12]}): {e}")
+            CACHE_LOOKUPS.inc(cache="extraction", result="miss")
+            return None
+        CACHE_LOOKUPS.inc(cache="extraction", result="hit")
+
+        # LRU 판단을 위해 마지막 사용 시각 갱신
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return text
+
+    def put(self, key: str, text: str):
+        if text is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            # 쓰는 도중의 파일을 다른 요청이 읽지 않도록 임시 파일에 쓰고 교체
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ 추출 캐시 저장 실패 ({key[:12]}): {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict()
+
+    def _evict(self):
+        """전체 용량이 max_bytes 이하가 될 때까지 오래된 항목부터 삭제"""
+        with self._lock:
+            entries = []
+            total_bytes = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".txt"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_bytes += stat.st_size
+
+            if total_bytes <= self.max_bytes:
+                return
+
+            entries.sort()
+            for _, size, path in entries:
+                if total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total_bytes -= size
+                except FileNotFoundError:
+                    continue
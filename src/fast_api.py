@@ -1,21 +1,42 @@
 # Copyright (c) 2025 SafeSign
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
+# .env는 다른 모듈이 import 시점에 os.getenv로 설정을 읽기 전에 한 번 불러온다 (deadline, detectors, hedging, ollama_manager 등)
+from dotenv import load_dotenv
+load_dotenv()
+
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from starlette.middleware.cors import CORSMiddleware
-from llm_service import LLM_gemini
+from extraction_cache import ExtractionCache
+from pdf_splitter import count_pdf_pages
+from clause_segmenter import MAX_JUDGE_UNIT_CHARS, segment_contract, build_judge_units, aggregate_unit_results, unjudged_result
+from contract_session import ContractSessionStore
+from streaming_pipeline import iterate_in_thread, stream_upload_and_analyze
+from metrics import CONTENT_TYPE, FAILURES, REGISTRY, STAGE_SECONDS, InFlightMiddleware
+from tracing import end_span_after, start_root_span, use_span
+from usage import UsageTracker, merge_summaries, usage_scope
+from detectors import DEFAULT_OLLAMA_MODEL, DETECTOR_BACKEND, create_detector
+from deadline import REQUEST_BUDGET_SEC, deadline_after, request_deadline
 from pydantic import BaseModel
+from typing import Optional
 
 # 실시간 전송용
+import contextvars
 import json
 import asyncio
-import re
-from toxic_detector import ToxicClauseDetector
-from ollama_detctor import ToxicClauseDetectorOllama
-from fastapi.responses import StreamingResponse # 스트리밍 응답용
+import os
+import threading
+from fastapi.responses import Response, StreamingResponse # 스트리밍 응답용
 
 app = FastAPI()
-model_name = "hf.co/LiquidAI/LFM2-8B-A1B-GGUF:Q4_K_M"
+model_name = DEFAULT_OLLAMA_MODEL
+# 판별 백엔드 (SAFESIGN_DETECTOR_BACKEND=ollama/gemini). detector 모듈은 첫 분석 요청(또는 warmup) 때 불러온다.
+detector_backend = DETECTOR_BACKEND
+ocr_model_name = "gemini-2.5-flash"
+# 같은 PDF 재업로드 시 Gemini 추출을 건너뛰기 위한 디스크 캐시
+extraction_cache = ExtractionCache()
+# 검토 단계에서 조항 몇 개만 고쳐 다시 분석할 때 바뀐 조항만 판별하기 위한 계약서 세션 (프로세스 메모리)
+contract_sessions = ContractSessionStore()
 # 통신을 허용할 포트 선택
 origins = [
     "http://127.0.0.1:5173","http://localhost:5173"
@@ -28,64 +49,240 @@ app.add_middleware(
     allow_methods = ["*"],      # GET, POST 등 모든 방식 허용
     allow_headers=["*"],        # 어떤 헤더 정보도 허용
 )
+# 처리 중인 요청 수 (스트리밍 응답은 마지막 이벤트 전송까지 포함)
+app.add_middleware(InFlightMiddleware, endpoints=["/upload", "/upload/stream", "/upload/analyze", "/analyze"])
+
+@app.on_event("startup")
+def warmup_on_startup():
+    """
+    SAFESIGN_WARMUP_ON_STARTUP=1 이면 임베딩/FAISS DB/LLM을 백그라운드로 미리 불러온다 (요청 처리는 바로 시작).
+    warmup을 하지 않더라도 ollama 백엔드면 판별 모델은 시작 시 적재해 keep_alive로 고정한다. (SAFESIGN_OLLAMA_PRELOAD=0이면 생략)
+    """
+    if os.getenv("SAFESIGN_WARMUP_ON_STARTUP", "0") == "1":
+        from warmup import run_warmup
+        threading.Thread(target=run_warmup, args=(detector_backend, model_name, os.getenv("GEMINI_API_KEY")), daemon=True).start()
+    elif detector_backend == "ollama":
+        from ollama_manager import OLLAMA_PRELOAD, get_ollama_manager
+        if OLLAMA_PRELOAD:
+            threading.Thread(target=get_ollama_manager().preload, daemon=True).start()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 텍스트 형식 지표 (단계별 지연 시간, 조항 처리 수, 캐시 적중, 실패, 처리 중 요청)"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+def _extraction_metadata(cache_key, cache_hit, prompt_version):
+    return {
+        "cache_hit": cache_hit,
+        "cache_key": cache_key,
+        "model": ocr_model_name,
+        "prompt_version": prompt_version
+    }
 
 @app.post("/upload")
-async def upload_pdf(file: UploadFile = File(...) ,api_key: str = Form(...)):
+async def upload_pdf(file: UploadFile = File(...) ,api_key: str = Form(...), pages_per_chunk: int = Form(0), max_concurrent: int = Form(4)):
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="PDF 파일만 업로드 가능합니다.")
     pdf_bytes = await file.read()
+    # google.genai는 PDF 추출 요청이 처음 들어올 때 불러온다
+    from llm_service import LLM_gemini, extraction_prompt_version
+    prompt_version = extraction_prompt_version(pages_per_chunk or None)
+    cache_key = ExtractionCache.make_key(pdf_bytes, ocr_model_name, prompt_version)
     try:
-        extractor = LLM_gemini(gemini_api_key=api_key,model="gemini-2.5-flash")
-        extracted_text = extractor.pdf_to_text(pdf_bytes)
+        extracted_text = extraction_cache.get(cache_key)
+        cache_hit = extracted_text is not None
+        if not cache_hit:
+            extractor = LLM_gemini(gemini_api_key=api_key,model=ocr_model_name)
+            # pages_per_chunk > 0 이면 페이지 분할 병렬 추출
+            extracted_text = await asyncio.to_thread(
+                extractor.pdf_to_text, pdf_bytes, pages_per_chunk=pages_per_chunk or None, max_concurrent=max_concurrent
+            )
+            extraction_cache.put(cache_key, extracted_text)
 
         # 4. 결과 반환 (JSON)
         return {
             "status": "success",
             "filename": file.filename,
-            "text": extracted_text
+            "text": extracted_text,
+            "metadata": _extraction_metadata(cache_key, cache_hit, prompt_version)
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def parse_text_to_chunks(text):
-    """텍스트를 '제N조' 기준으로 자르는 파서"""
-    if not text:
-        return []
-    split_pattern = r'(?=\n\s*제\s*\d+\s*조)'
-    chunks = re.split(split_pattern, text)
-    # 공백 제거 및 유효한 조항만 필터링
-    clean_chunks = [c.strip() for c in chunks if len(c.strip()) > 10]
-    return clean_chunks
+@app.post("/upload/stream")
+async def upload_pdf_stream(file: UploadFile = File(...), api_key: str = Form(...), pages_per_chunk: int = Form(2), max_concurrent: int = Form(4)):
+    """대용량 스캔본용: 페이지 범위별로 병렬 추출하면서 페이지 단위 진행률을 NDJSON으로 전송"""
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="PDF 파일만 업로드 가능합니다.")
+    if pages_per_chunk < 1:
+        raise HTTPException(status_code=400, detail="pages_per_chunk는 1 이상이어야 합니다.")
+    pdf_bytes = await file.read()
+    from llm_service import LLM_gemini, extraction_prompt_version
+    prompt_version = extraction_prompt_version(pages_per_chunk)
+    cache_key = ExtractionCache.make_key(pdf_bytes, ocr_model_name, prompt_version)
+
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        progress_queue = asyncio.Queue()
+
+        # 워커 스레드에서 호출되므로 이벤트 루프로 안전하게 넘긴다
+        def on_progress(done_pages, total_pages, page_range):
+            loop.call_soon_threadsafe(progress_queue.put_nowait, (done_pages, total_pages, page_range))
+
+        try:
+            cached_text = extraction_cache.get(cache_key)
+            if cached_text is not None:
+                yield json.dumps({"status": "complete", "filename": file.filename, "text": cached_text,
+                                  "metadata": _extraction_metadata(cache_key, True, prompt_version)}) + "\n"
+                return
+
+            total_pages = count_pdf_pages(pdf_bytes)
+            yield json.dumps({"status": "progress", "current": 0, "total": total_pages, "message": f"총 {total_pages}페이지 텍스트 추출 시작..."}) + "\n"
+
+            extractor = LLM_gemini(gemini_api_key=api_key, model=ocr_model_name)
+            extract_task = asyncio.ensure_future(asyncio.to_thread(
+                extractor.pdf_to_text_parallel, pdf_bytes, pages_per_chunk, max_concurrent, on_progress
+            ))
+
+            while True:
+                getter = asyncio.ensure_future(progress_queue.get())
+                done, _ = await asyncio.wait({getter, extract_task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                done_pages, total_pages, (start, end) = getter.result()
+                yield json.dumps({"status": "progress", "current": done_pages, "total": total_pages, "message": f"{start}~{end}페이지 추출 완료 ({done_pages}/{total_pages})"}) + "\n"
+
+            # 추출 완료 직전에 도착한 진행률 이벤트 마저 전송
+            while not progress_queue.empty():
+                done_pages, total_pages, (start, end) = progress_queue.get_nowait()
+                yield json.dumps({"status": "progress", "current": done_pages, "total": total_pages, "message": f"{start}~{end}페이지 추출 완료 ({done_pages}/{total_pages})"}) + "\n"
+
+            extracted_text = await extract_task
+            extraction_cache.put(cache_key, extracted_text)
+            yield json.dumps({"status": "complete", "filename": file.filename, "text": extracted_text,
+                              "metadata": _extraction_metadata(cache_key, False, prompt_version)}) + "\n"
+        except Exception as e:
+            yield json.dumps({"status": "error", "message": f"텍스트 추출 오류: {str(e)}"}) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+@app.post("/upload/analyze")
+async def upload_and_analyze(file: UploadFile = File(...), api_key: str = Form(...), judge_concurrency: int = Form(1), max_unit_chars: int = Form(MAX_JUDGE_UNIT_CHARS),
+                             budget_sec: float = Form(REQUEST_BUDGET_SEC)):
+    """업로드 + 분석 통합 스트리밍: OCR 스트림에서 완성된 조항부터 바로 판별을 시작"""
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="PDF 파일만 업로드 가능합니다.")
+    pdf_bytes = await file.read()
+    from llm_service import LLM_gemini, extraction_prompt_version
+    prompt_version = extraction_prompt_version()
+    cache_key = ExtractionCache.make_key(pdf_bytes, ocr_model_name, prompt_version)
+    cache_state = {"hit": False}
+
+    async def text_stream():
+        cached_text = extraction_cache.get(cache_key)
+        if cached_text is not None:
+            cache_state["hit"] = True
+            yield cached_text
+            return
+
+        extractor = LLM_gemini(gemini_api_key=api_key, model=ocr_model_name)
+        parts = []
+        async for text in iterate_in_thread(lambda: extractor.pdf_to_text_stream(pdf_bytes)):
+            parts.append(text)
+            yield text
+        extraction_cache.put(cache_key, "".join(parts))
+
+    root_span = start_root_span("upload_analyze", **{"request.pdf_bytes": len(pdf_bytes), "request.judge_concurrency": judge_concurrency})
+
+    async def event_stream():
+        async for event in stream_upload_and_analyze(
+            text_stream(), lambda: create_detector(detector_backend, model_name=model_name, api_key=api_key), judge_concurrency, max_unit_chars,
+            parent_span=root_span, deadline=deadline_after(budget_sec)
+        ):
+            if event["status"] == "complete":
+                event["filename"] = file.filename
+                event["metadata"] = _extraction_metadata(cache_key, cache_state["hit"], prompt_version)
+                root_span.set_attributes({"analyze.clauses": len(event["results"]), "extraction.cache_hit": cache_state["hit"]})
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(end_span_after(root_span, event_stream()), media_type="application/x-ndjson")
+
 
 class AnalyzeRequest(BaseModel):
     api_key: str
     text: str
+    max_unit_chars: int = MAX_JUDGE_UNIT_CHARS  # 이보다 긴 조항은 항/호 단위로 나누어 판별
+    budget_sec: float = REQUEST_BUDGET_SEC  # 요청 전체 지연 예산(초, 0이면 제한 없음). 조항별 타임아웃이 여기서 나뉜다
+    session_id: Optional[str] = None  # 이전 분석의 session_id를 주면 추가/수정된 조항만 다시 판별
 @app.post("/analyze")
 async def analyze_contract(request: AnalyzeRequest):
+    # 요청 전체를 덮는 루트 span (조항별 검색/판별/개선안 span이 이 아래에 붙는다)
+    root_span = start_root_span("analyze", **{"request.text_length": len(request.text), "request.max_unit_chars": request.max_unit_chars})
+    # 요청 전체의 LLM 토큰/시간 사용량 (조항별 사용량은 각 결과의 'usage')
+    request_usage = UsageTracker()
+    # 판별/개선안 블록마다 같은 마감 시각을 다시 적용한다 (yield 사이에 contextvar를 걸쳐 두지 않음)
+    deadline = deadline_after(request.budget_sec)
+    # 판별 결과가 달라지는 설정이 바뀌면 세션의 이전 결과를 쓰지 않는다
+    session_config = f"{detector_backend}|{model_name}|{request.max_unit_chars}"
+
     # 제너레이터 함수: 데이터를 조금씩 나누어 보냅니다.
     async def event_stream():
         try:
             yield json.dumps({"status": "progress","message": "법령, 판례 DB 불러오는 중..."}) + "\n"
-            # detector = ToxicClauseDetector(api_key=request.api_key)
-            detector = ToxicClauseDetectorOllama(model_name=model_name)
-            chunks  = parse_text_to_chunks(request.text)
-            yield json.dumps({"status": "progress","message": f"총 {len(chunks)}개의 조항을 분석 중..."}) + "\n"
-            raw_results = detector.detect(chunks, max_concurrent=5)
+            with use_span(root_span, end_on_exit=False):
+                with STAGE_SECONDS.time(stage="chunking", backend="local"):
+                    segments = segment_contract(request.text)
+                    # 같은 세션의 재분석이면 이전 결과와 비교해 추가/수정된 조항만 검색/판별한다
+                    session = contract_sessions.get_or_create(request.session_id, request.api_key)
+                    diff = session.diff(segments, session_config)
+                    changed_segments = [segments[i] for i in diff.changed]
+                    units = build_judge_units(changed_segments, request.max_unit_chars)
+                # 바뀐 조항이 없으면 판별기(임베딩 모델/DB)를 준비할 필요도 없다
+                detector = create_detector(detector_backend, model_name=model_name, api_key=request.api_key) if units else None
+                root_span.set_attributes({"analyze.clauses": len(segments), "analyze.judge_units": len(units),
+                                          "analyze.carried_over": len(diff.unchanged)})
+            yield json.dumps({"status": "session", "session_id": session.session_id, "revision": session.revision,
+                              "diff": diff.summary()}) + "\n"
+            if diff.unchanged:
+                message = f"총 {len(segments)}개의 조항 중 변경된 {len(changed_segments)}개를 분석 중..."
+            else:
+                message = f"총 {len(segments)}개의 조항을 분석 중..."
+            yield json.dumps({"status": "progress","message": message}) + "\n"
+            unit_results = []
+            if units:
+                # 판별은 스레드에서 실행해 느린 LLM 호출이 이벤트 루프(다른 요청의 스트림)를 막지 않게 한다
+                with use_span(root_span, end_on_exit=False), usage_scope(request_usage), request_deadline(deadline):
+                    unit_results = await asyncio.to_thread(detector.detect, [unit.text for unit in units], 5)
+            # 나누어 판별한 긴 조항은 조항 단위 결과로 다시 합친다
+            judged_by_start = {res['start']: res for res in aggregate_unit_results(changed_segments, units, unit_results)}
+            unchanged = set(diff.unchanged)
 
             processed_results = []
             toxic_indices = [] # 개선안 생성이 필요한 인덱스들
 
-            for i, res in enumerate(raw_results):
+            for i, segment in enumerate(segments):
+                if i in unchanged:
+                    # 이전 분석 결과(개선안 포함)를 그대로 사용 (carried_over=True)
+                    processed_results.append(session.carried_result(segment, len(processed_results) + 1))
+                    continue
+                res = judged_by_start.get(segment.start)
+                if res is None:
+                    # 판별 결과가 빠진 조항도 목록에서 지우지 않고 판별 실패(outcome=error)로 남긴다
+                    res = unjudged_result(segment)
                 # detect 함수에서 나온 결과에 ID(조항 번호) 추가
-                res['id'] = i + 1
+                res['id'] = len(processed_results) + 1
                 res['suggestion'] = "" # 초기화
+                res['carried_over'] = False
                 processed_results.append(res)
             
                 if res['is_toxic']:
-                    toxic_indices.append(i)
+                    toxic_indices.append(len(processed_results) - 1)
         except Exception as e:
+            FAILURES.inc(stage="analyze", backend=detector_backend)
             yield json.dumps({"status": "error", "message": f"분석 단계 오류: {str(e)}"}) + "\n"
             return 
         
@@ -97,15 +294,27 @@ async def analyze_contract(request: AnalyzeRequest):
                     # 해당 결과 가져오기
                     target_result = processed_results[list_idx]
                     
-                    # 개선안 생성 호출
+                    # 개선안 생성 호출: 토큰이 생성되는 대로 suggestion_delta 이벤트로 보내고, 합친 결과는 complete 이벤트에 담는다
                     try:
-                        suggestion = detector.generate_easy_suggestion(target_result)
-                        processed_results[list_idx]['suggestion'] = suggestion
+                        with use_span(root_span, end_on_exit=False), usage_scope(request_usage), usage_scope() as suggestion_usage, \
+                                request_deadline(deadline):
+                            # yield는 블록 밖에서 하고, 블록 안의 context(span/사용량 범위/마감 시각)는 스트림 스레드로 넘긴다
+                            suggestion_context = contextvars.copy_context()
+                        pieces = []
+                        async for delta in iterate_in_thread(lambda: detector.generate_easy_suggestion_stream(target_result), suggestion_context):
+                            pieces.append(delta)
+                            yield json.dumps({"status": "suggestion_delta", "id": target_result['id'], "delta": delta}) + "\n"
+                        processed_results[list_idx]['suggestion'] = "".join(pieces)
+                        target_result['usage'] = merge_summaries([target_result.get('usage'), suggestion_usage.summary()])
                     except Exception as e:
+                        FAILURES.inc(stage="suggestion", backend=detector_backend)
                         processed_results[list_idx]['suggestion'] = "개선안 생성 실패"
             
             
-            yield json.dumps({"status": "complete", "results": processed_results}) + "\n"
+            # 개선안 생성에 실패한 조항은 기억하지 않는다 (다음 분석에서 다시 판별)
+            session.remember(segments, [res for res in processed_results if res['suggestion'] != "개선안 생성 실패"], session_config)
+            yield json.dumps({"status": "complete", "results": processed_results, "usage": request_usage.summary(),
+                              "session_id": session.session_id}) + "\n"
                
         except Exception as e:
             yield json.dumps({"status": "error", "message": f"개선안 생성 오류: {str(e)}"}) + "\n"
@@ -117,4 +326,4 @@ async def analyze_contract(request: AnalyzeRequest):
         
 
     # StreamingResponse로 감싸서 반환 (media_type 중요)
-    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+    return StreamingResponse(end_span_after(root_span, event_stream()), media_type="application/x-ndjson")
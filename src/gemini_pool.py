@@ -0,0 +1,149 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from google import genai
+from google.genai import types
+
+# API Key당 동시 요청 상한 / 유휴 클라이언트 정리 기준 (환경변수로 변경 가능)
+MAX_CONCURRENT_PER_KEY = int(os.getenv("GEMINI_MAX_CONCURRENT_PER_KEY", "8"))
+IDLE_TIMEOUT_SEC = float(os.getenv("GEMINI_CLIENT_IDLE_TIMEOUT", "300"))
+EVICT_INTERVAL_SEC = 30
+# Gemini API 주소를 바꿀 때 사용 (부하 테스트용 로컬 대역 서버 등). 비어 있으면 기본 주소.
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "")
+
+
+class _PooledClient:
+    def __init__(self, client):
+        self.client = client
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+
+class _KeySlots:
+    """API Key 하나의 동시 요청 슬롯 (holders: 슬롯을 잡았거나 기다리는 호출 수)"""
+    def __init__(self, limit):
+        self.semaphore = threading.BoundedSemaphore(limit)
+        self.holders = 0
+        self.last_used = time.monotonic()
+
+
+class GeminiClientPool:
+    """
+    (API Key, 모델) 단위로 genai.Client를 재사용하는 풀입니다.
+    - 같은 클라이언트를 재사용하므로 내부 HTTP 커넥션(TLS 세션)도 재사용됩니다.
+    - API Key마다 동시 요청 수를 max_concurrent_per_key로 제한합니다.
+    - idle_timeout 동안 사용되지 않은 클라이언트와 API Key별 슬롯은 풀에서 제거합니다. (사용자 Key가 계속 쌓이지 않도록)
+    """
+    def __init__(self, max_concurrent_per_key=MAX_CONCURRENT_PER_KEY, idle_timeout=IDLE_TIMEOUT_SEC):
+        self.max_concurrent_per_key = max_concurrent_per_key
+        self.idle_timeout = idle_timeout
+        self._clients = {}
+        self._key_slots = {}
+        self._lock = threading.Lock()
+        self._last_evict = time.monotonic()
+
+    def _entry_for(self, api_key, model):
+        # self._lock을 잡은 상태에서 호출해야 한다.
+        entry = self._clients.get((api_key, model))
+        if entry is None:
+            http_options = types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None
+            entry = _PooledClient(genai.Client(api_key=api_key, http_options=http_options))
+            self._clients[(api_key, model)] = entry
+        entry.last_used = time.monotonic()
+        return entry
+
+    def get_client(self, api_key, model):
+        """풀에서 클라이언트를 꺼내거나, 없으면 새로 만들어 등록합니다."""
+        self._maybe_evict()
+        with self._lock:
+            return self._entry_for(api_key, model).client
+
+    def _slots_for(self, api_key) -> _KeySlots:
+        """API Key의 슬롯을 꺼내 holders를 올린다 (lease가 끝나면 내려서 유휴 정리 대상이 되게 한다)"""
+        with self._lock:
+            slots = self._key_slots.get(api_key)
+            if slots is None:
+                slots = self._key_slots[api_key] = _KeySlots(self.max_concurrent_per_key)
+            slots.holders += 1
+            return slots
+
+    @contextmanager
+    def lease(self, api_key, model):
+        """
+        API Key의 동시 요청 슬롯을 하나 잡고 클라이언트를 빌려줍니다.
+        with 블록이 끝날 때까지는 유휴 정리 대상에서 제외됩니다.
+        """
+        slots = self._slots_for(api_key)
+        try:
+            with slots.semaphore:
+                self._maybe_evict()
+                with self._lock:
+                    entry = self._entry_for(api_key, model)
+                    entry.in_use += 1
+                try:
+                    yield entry.client
+                finally:
+                    with self._lock:
+                        entry.in_use -= 1
+                        entry.last_used = time.monotonic()
+        finally:
+            with self._lock:
+                slots.holders -= 1
+                slots.last_used = time.monotonic()
+
+    def _maybe_evict(self):
+        now = time.monotonic()
+        if now - self._last_evict < EVICT_INTERVAL_SEC:
+            return
+        self._last_evict = now
+        self.evict_idle()
+
+    def evict_idle(self):
+        """idle_timeout 이상 사용되지 않은 클라이언트와 API Key별 슬롯을 정리합니다."""
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            for pool_key, entry in list(self._clients.items()):
+                if entry.in_use == 0 and now - entry.last_used >= self.idle_timeout:
+                    evicted.append(self._clients.pop(pool_key).client)
+            for api_key, slots in list(self._key_slots.items()):
+                if slots.holders == 0 and now - slots.last_used >= self.idle_timeout:
+                    del self._key_slots[api_key]
+        for client in evicted:
+            self._close_client(client)
+        return len(evicted)
+
+    def close_all(self):
+        with self._lock:
+            clients = [entry.client for entry in self._clients.values()]
+            self._clients.clear()
+        for client in clients:
+            self._close_client(client)
+
+    @staticmethod
+    def _close_client(client):
+        close = getattr(client, "close", None)
+        if close is None:
+            return
+        try:
+            close()
+        except Exception as e:
+            print(f"⚠️ Gemini 클라이언트 종료 실패: {e}")
+
+
+# 프로세스 전체에서 공유하는 기본 풀
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_client_pool() -> GeminiClientPool:
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = GeminiClientPool()
+        return _default_pool
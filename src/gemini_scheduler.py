@@ -0,0 +1,304 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+API Key별 Gemini 호출 스케줄러 (요청/토큰 분당 한도 + 적응형 동시 호출 수 + 재시도)
+
+LLM_gemini의 모든 호출(generate, pdf_to_text*, 개선안)은 이 스케줄러를 거칩니다.
+- 토큰 버킷: 분당 요청 수(RPM)와 분당 토큰 수(TPM)를 넘지 않도록 호출 전에 기다립니다.
+  토큰 수는 프롬프트 길이로 추정해 먼저 차감하고, 응답의 usage_metadata로 실제 값과의 차이를 맞춥니다.
+- AIMD 동시 호출 수: 성공하면 1/limit씩 늘리고, 429/5xx를 받으면 절반으로 줄입니다.
+  지연이 같은 종류 호출의 기준 지연(최근 최소값)의 LATENCY_TOLERANCE배를 넘어도 조금(x0.9) 줄입니다.
+- 429 / 5xx / 타임아웃은 지수 백오프(full jitter)로 최대 GEMINI_MAX_RETRIES번 다시 호출합니다.
+  백오프는 요청/조항 마감(deadline.py)까지 남은 시간을 넘지 않고, 마감이 지났으면 더 재시도하지 않습니다.
+- 스케줄러는 API Key마다 하나씩 두되, 오래 쓰지 않은 Key부터 정리합니다 (사용자 Key를 받으므로 개수 제한).
+
+detect(max_concurrent)는 이제 상한일 뿐이고, 실제로 동시에 나가는 호출 수는 Key별 limit이 정합니다.
+
+환경변수
+  GEMINI_RPM_PER_KEY          분당 요청 수 한도 (기본 0 = 제한 없음, AIMD만 적용)
+  GEMINI_TPM_PER_KEY          분당 토큰 수 한도 (기본 0 = 제한 없음)
+  GEMINI_INITIAL_CONCURRENCY  시작 동시 호출 수 (기본 4, 상한은 GEMINI_MAX_CONCURRENT_PER_KEY)
+  GEMINI_MAX_RETRIES          429/5xx/타임아웃 재시도 횟수 (기본 4)
+  GEMINI_BACKOFF_BASE_SEC     백오프 기본 간격 (기본 1, 최대 GEMINI_BACKOFF_MAX_SEC=30)
+  GEMINI_SCHEDULER_IDLE_SEC   이 시간(초) 동안 쓰지 않은 Key의 스케줄러 정리 (기본 600)
+  GEMINI_SCHEDULER_MAX_KEYS   스케줄러를 유지할 최대 Key 수 (기본 1000, 넘으면 오래 쓰지 않은 Key부터 정리)
+"""
+import itertools
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict
+
+import httpx
+
+from deadline import remaining_sec
+from gemini_pool import MAX_CONCURRENT_PER_KEY
+from metrics import GEMINI_CONCURRENCY_LIMIT, GEMINI_RETRIES, GEMINI_SCHEDULER_WAIT
+
+GEMINI_RPM_PER_KEY = int(os.getenv("GEMINI_RPM_PER_KEY", "0"))
+GEMINI_TPM_PER_KEY = int(os.getenv("GEMINI_TPM_PER_KEY", "0"))
+GEMINI_INITIAL_CONCURRENCY = int(os.getenv("GEMINI_INITIAL_CONCURRENCY", "4"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_BACKOFF_BASE_SEC = float(os.getenv("GEMINI_BACKOFF_BASE_SEC", "1"))
+GEMINI_BACKOFF_MAX_SEC = float(os.getenv("GEMINI_BACKOFF_MAX_SEC", "30"))
+GEMINI_SCHEDULER_IDLE_SEC = float(os.getenv("GEMINI_SCHEDULER_IDLE_SEC", "600"))
+GEMINI_SCHEDULER_MAX_KEYS = int(os.getenv("GEMINI_SCHEDULER_MAX_KEYS", "1000"))
+
+# 지연이 기준 지연의 이 배수를 넘으면 혼잡으로 보고 동시 호출 수를 조금 줄인다
+LATENCY_TOLERANCE = 3.0
+LATENCY_BACKOFF = 0.9
+# 기준 지연(최소값)이 오래된 값에 묶이지 않도록 호출마다 조금씩 올린다
+BASELINE_DRIFT = 1.01
+# 호출 전 TPM 차감용 추정값: PDF는 페이지당 약 258 입력 토큰으로 과금되고, 추출 결과는 페이지당 수백 토큰
+PDF_TOKENS_PER_PAGE = 258
+PDF_OUTPUT_TOKENS_PER_PAGE = 600
+OUTPUT_TOKENS_ESTIMATE = 512
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def estimate_tokens(text: str, max_output_tokens=None) -> int:
+    """프롬프트 호출의 대략적인 토큰 수 (한국어는 글자 2개당 1토큰 정도 + 출력 상한 또는 기본 추정값)"""
+    return max(1, len(text or "") // 2) + (max_output_tokens or OUTPUT_TOKENS_ESTIMATE)
+
+
+def estimate_pdf_tokens(pages: int) -> int:
+    """PDF 추출 호출의 대략적인 토큰 수 (입력 + 추출 결과)"""
+    return max(1, pages) * (PDF_TOKENS_PER_PAGE + PDF_OUTPUT_TOKENS_PER_PAGE)
+
+
+def key_class(api_key: str) -> str:
+    """
+    지표 label용 Key 종류: 서버 설정 Key(GEMINI_API_KEY)면 server, 요청마다 받은 사용자 Key면 user.
+    (Key별 label은 사용자 수만큼 시계열이 늘어나므로 쓰지 않는다)
+    """
+    return "server" if api_key and api_key == os.getenv("GEMINI_API_KEY") else "user"
+
+
+def _status_code(error):
+    """google-genai APIError(code), httpx 응답 오류(status_code)에서 HTTP 상태 코드"""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(error, "response", None)
+    return getattr(error, "status_code", None) or getattr(response, "status_code", None)
+
+
+def retry_reason(error):
+    """다시 호출할 만한 오류면 사유(rate_limited/server_error/timeout), 아니면 None"""
+    status = _status_code(error)
+    if status == 429:
+        return "rate_limited"
+    if status in RETRYABLE_STATUS:
+        return "server_error"
+    if isinstance(error, (httpx.TimeoutException, httpx.NetworkError, TimeoutError, ConnectionError)):
+        return "timeout"
+    return None
+
+
+def backoff_sec(attempt, base=GEMINI_BACKOFF_BASE_SEC, cap=GEMINI_BACKOFF_MAX_SEC) -> float:
+    """full jitter: 0 ~ min(cap, base * 2^attempt) 사이 임의 값 (동시에 실패한 호출들이 같은 순간에 다시 몰리지 않게)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """분당 per_minute개가 채워지는 버킷. 먼저 차감하고 모자란 만큼 기다릴 시간을 돌려준다 (도착 순서대로 대기)"""
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self):
+        return self.capacity <= 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount) -> float:
+        """amount를 차감하고, 잔량이 음수면 다시 0이 될 때까지의 시간(초)"""
+        if self.unlimited:
+            return 0.0
+        self._refill(time.monotonic())
+        self.tokens -= min(amount, self.capacity)
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def adjust(self, delta):
+        """추정값과 실제 사용량의 차이를 반영 (더 썼으면 양수)"""
+        if not self.unlimited:
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class KeyScheduler:
+    """API Key 하나의 요청/토큰 버킷과 AIMD 동시 호출 수"""
+    def __init__(self, api_key, rpm=GEMINI_RPM_PER_KEY, tpm=GEMINI_TPM_PER_KEY,
+                 initial_concurrency=GEMINI_INITIAL_CONCURRENCY, max_concurrency=MAX_CONCURRENT_PER_KEY, max_retries=GEMINI_MAX_RETRIES):
+        self.key_class = key_class(api_key)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(min(max(1, initial_concurrency), self.max_concurrency))
+        self.max_retries = max_retries
+        self.in_flight = 0
+        self.last_used = time.monotonic()
+        # 호출 종류별 기준 지연 (판별과 PDF 추출은 걸리는 시간이 달라 따로 본다)
+        self.baseline_sec: Dict[str, float] = {}
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        # 지표에는 Key 종류별 한도 합계로 더해 두었다가 정리할 때 뺀다
+        self._reported_limit = 0.0
+        self._report_limit()
+
+    def _report_limit(self):
+        # self._cond를 잡은 상태에서(또는 생성 중에) 호출해야 한다.
+        GEMINI_CONCURRENCY_LIMIT.inc(self.limit - self._reported_limit, key_class=self.key_class)
+        self._reported_limit = self.limit
+
+    def close(self):
+        """스케줄러를 정리할 때 지표에서 이 Key의 한도를 뺀다"""
+        with self._cond:
+            GEMINI_CONCURRENCY_LIMIT.dec(self._reported_limit, key_class=self.key_class)
+            self._reported_limit = 0.0
+
+    def acquire(self, kind, estimated_tokens):
+        """동시 호출 자리와 RPM/TPM 여유가 생길 때까지 기다린다"""
+        start = time.perf_counter()
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+            self.last_used = time.monotonic()
+            wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if wait > 0:
+            time.sleep(wait)
+        GEMINI_SCHEDULER_WAIT.observe(time.perf_counter() - start, kind=kind)
+
+    def release(self, kind, estimated_tokens, used_tokens=None, latency_sec=None, error=None):
+        with self._cond:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+            if used_tokens is not None:
+                self.tokens.adjust(used_tokens - estimated_tokens)
+            if error is not None:
+                if retry_reason(error) in ("rate_limited", "server_error"):
+                    self._decrease(kind, 0.5)
+            elif latency_sec is not None:
+                self._on_success(kind, latency_sec)
+            self._report_limit()
+            self._cond.notify_all()
+
+    def _on_success(self, kind, latency_sec):
+        # self._cond를 잡은 상태에서 호출해야 한다.
+        baseline = self.baseline_sec.get(kind)
+        self.baseline_sec[kind] = latency_sec if baseline is None else min(latency_sec, baseline * BASELINE_DRIFT)
+        if baseline is not None and latency_sec > baseline * LATENCY_TOLERANCE:
+            self._decrease(kind, LATENCY_BACKOFF)
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def _decrease(self, kind, factor):
+        # 동시에 나갔던 호출들이 한꺼번에 실패해도 한 번만 줄이도록, 직전 감소 후 기준 지연(없으면 1초)만큼은 다시 줄이지 않는다
+        now = time.monotonic()
+        cooldown = self.baseline_sec.get(kind, 1.0)
+        if now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(1.0, self.limit * factor)
+
+    @contextmanager
+    def slot(self, kind, estimated_tokens):
+        """
+        호출 하나의 자리를 잡고 끝나면 돌려준다. 블록 안에서 usage["tokens"]에 실제 토큰 수를 넣으면 TPM 버킷을 맞춘다.
+        블록이 예외로 끝나면 오류로 기록한다 (429/5xx면 동시 호출 수 감소)
+        """
+        self.acquire(kind, estimated_tokens)
+        start = time.perf_counter()
+        usage = {}
+        try:
+            yield usage
+        except BaseException as e:
+            self.release(kind, estimated_tokens, error=e)
+            raise
+        self.release(kind, estimated_tokens, usage.get("tokens"), time.perf_counter() - start)
+
+    def retry_after_error(self, kind, error, attempt) -> bool:
+        """
+        재시도할 만한 오류이고 횟수가 남았으면 백오프만큼 기다린 뒤 True.
+        백오프는 요청/조항 마감까지 남은 시간으로 줄이고, 마감이 지났으면(기다린 뒤 지나도) 재시도하지 않는다
+        """
+        reason = retry_reason(error)
+        if reason is None or attempt >= self.max_retries:
+            return False
+        remaining = remaining_sec()
+        if remaining is not None and remaining <= 0:
+            return False
+        delay = backoff_sec(attempt)
+        if remaining is not None:
+            delay = min(delay, remaining)
+        GEMINI_RETRIES.inc(kind=kind, reason=reason)
+        print(f"⏳ Gemini {kind} 호출 실패({reason}), {delay:.1f}초 후 재시도 ({attempt + 1}/{self.max_retries}): {error}")
+        time.sleep(delay)
+        remaining = remaining_sec()
+        return remaining is None or remaining > 0
+
+    def run(self, kind, estimated_tokens, call, used_tokens=None):
+        """
+        call()을 스케줄링해서 실행하고, 재시도할 만한 오류면 백오프 후 다시 호출합니다.
+        used_tokens(결과)로 실제 토큰 수를 알 수 있으면 TPM 버킷을 맞춥니다.
+        """
+        for attempt in itertools.count():
+            try:
+                with self.slot(kind, estimated_tokens) as usage:
+                    result = call()
+                    usage["tokens"] = used_tokens(result) if used_tokens else None
+                return result
+            except Exception as e:
+                if not self.retry_after_error(kind, e, attempt):
+                    raise
+
+    def status(self):
+        with self._cond:
+            return {"limit": self.limit, "in_flight": self.in_flight, "baseline_sec": dict(self.baseline_sec)}
+
+
+# API Key -> 스케줄러 (최근에 꺼낸 Key가 뒤쪽)
+_schedulers: "OrderedDict[str, KeyScheduler]" = OrderedDict()
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(api_key) -> KeyScheduler:
+    """
+    프로세스 전체에서 API Key마다 하나씩 공유 (같은 Key를 쓰는 detector/추출기가 한도를 함께 쓰도록).
+    GEMINI_SCHEDULER_IDLE_SEC 동안 쓰지 않았거나 GEMINI_SCHEDULER_MAX_KEYS를 넘은 오래된 Key의 스케줄러는 정리한다
+    """
+    with _schedulers_lock:
+        scheduler = _schedulers.get(api_key)
+        if scheduler is None:
+            scheduler = _schedulers[api_key] = KeyScheduler(api_key)
+        _schedulers.move_to_end(api_key)
+        _evict_schedulers()
+        return scheduler
+
+
+def _evict_schedulers(idle_sec=GEMINI_SCHEDULER_IDLE_SEC, max_keys=GEMINI_SCHEDULER_MAX_KEYS):
+    # _schedulers_lock을 잡은 상태에서 호출해야 한다. 호출 중인 스케줄러는 남겨 둔다 (Key 하나에 스케줄러가 둘이 되지 않도록)
+    now = time.monotonic()
+    for api_key, scheduler in list(_schedulers.items())[:-1]:
+        over_limit = len(_schedulers) > max_keys
+        if not over_limit and now - scheduler.last_used < idle_sec:
+            break
+        if scheduler.in_flight > 0:
+            continue
+        del _schedulers[api_key]
+        scheduler.close()
+
+
+def total_tokens(response) -> int:
+    """Gemini 응답의 usage_metadata.total_token_count (없으면 None)"""
+    metadata = getattr(response, "usage_metadata", None)
+    return getattr(metadata, "total_token_count", None) if metadata is not None else None
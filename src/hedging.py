@@ -0,0 +1,196 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+예비 백엔드 헤징(hedging) + 마감 시각 적용
+
+HedgedLLM은 LLM 호출을 deadline.py의 요청/조항 마감 시각까지만 기다립니다.
+primary(Ollama)가 최근 지연 시간의 백분위(기본 p95)만큼 기다려도 답하지 않으면
+secondary(Gemini)에 같은 요청을 한 번 더 보내고 먼저 온 답을 씁니다. primary가 바로 실패해도 secondary로 넘깁니다.
+(진 쪽 호출은 취소할 수 없어 끝까지 돌고 결과만 버린다. 토큰 사용량은 실제 비용이므로 그대로 기록됨)
+
+헤징 비율과 승자 통계는 safesign_hedge_calls_total{outcome=...}과 hedge_stats()로 확인합니다.
+  outcome: primary(헤징 없이 primary 응답) / primary_won / secondary_won(헤징 후 승자) / timeout / error
+
+환경변수
+  SAFESIGN_HEDGE_BACKEND            gemini면 Ollama 판별을 Gemini로 헤징 (기본: 끔)
+  SAFESIGN_HEDGE_MODEL              헤징에 쓸 Gemini 모델 (기본 gemini-2.5-flash-lite)
+  SAFESIGN_HEDGE_PERCENTILE         헤징 지연으로 쓸 primary 지연 백분위 (기본 95)
+  SAFESIGN_HEDGE_MIN_SAMPLES        백분위를 쓰기 전 최소 표본 수 (기본 20, 그 전에는 초기 지연)
+  SAFESIGN_HEDGE_INITIAL_DELAY_SEC  표본이 모이기 전 헤징 지연 (기본 15)
+"""
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Optional
+
+from deepeval.models.base_model import DeepEvalBaseLLM
+
+from deadline import DeadlineExceeded, remaining_sec
+from metrics import HEDGE_CALLS, HEDGE_DELAY
+from structured_output import accepts_schema
+from tracing import set_attributes
+
+HEDGE_BACKEND = os.getenv("SAFESIGN_HEDGE_BACKEND", "").lower()
+HEDGE_MODEL = os.getenv("SAFESIGN_HEDGE_MODEL", "gemini-2.5-flash-lite")
+HEDGE_PERCENTILE = float(os.getenv("SAFESIGN_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("SAFESIGN_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_INITIAL_DELAY_SEC = float(os.getenv("SAFESIGN_HEDGE_INITIAL_DELAY_SEC", "15"))
+# 백분위 계산에 쓰는 최근 primary 지연 표본 수
+LATENCY_WINDOW = 200
+
+
+class LatencyTracker:
+    """최근 LATENCY_WINDOW개 primary 응답 시간의 백분위"""
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * pct / 100) - 1)]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+
+_lock = threading.Lock()
+# detector는 요청마다 만들어지므로 지연 기록과 통계는 primary 모델 단위로 프로세스 전체에서 공유
+_trackers: Dict[str, LatencyTracker] = {}
+_stats: Dict[str, Dict[str, int]] = {}
+_OUTCOMES = ("primary", "primary_won", "secondary_won", "timeout", "error")
+# 진 쪽 호출이나 멈춘 호출이 끝날 때까지 자리를 차지하므로 넉넉하게 둔다
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="safesign-hedge")
+
+
+def hedge_stats() -> Dict[str, Dict]:
+    """primary 모델별 헤징 통계: 호출 수, 헤징 비율, 승자 비율, 현재 헤징 지연"""
+    report = {}
+    with _lock:
+        snapshot = {name: dict(counts) for name, counts in _stats.items()}
+    for name, counts in snapshot.items():
+        calls = sum(counts.values())
+        hedged = counts["primary_won"] + counts["secondary_won"]
+        report[name] = {
+            **counts,
+            "calls": calls,
+            "hedge_rate": hedged / calls if calls else 0.0,
+            "secondary_win_rate": counts["secondary_won"] / hedged if hedged else 0.0,
+        }
+    return report
+
+
+class HedgedLLM(DeepEvalBaseLLM):
+    """
+    primary 호출에 타임아웃(remaining_sec)을 걸고, 늦으면 secondary로 헤징하는 DeepEval 모델.
+    secondary가 없으면 타임아웃만 적용합니다. schema / contextvar(사용량 범위, 우선순위, 출력 토큰 상한)는 양쪽에 그대로 전달됩니다.
+    """
+    def __init__(self, primary: DeepEvalBaseLLM, secondary: DeepEvalBaseLLM = None, primary_backend="ollama", secondary_backend="gemini",
+                 percentile=HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES, initial_delay_sec=HEDGE_INITIAL_DELAY_SEC):
+        self.primary = primary
+        self.secondary = secondary
+        self.primary_backend = primary_backend
+        self.secondary_backend = secondary_backend if secondary is not None else ""
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay_sec = initial_delay_sec
+        self.model_name = primary.get_model_name()
+        with _lock:
+            self.latency = _trackers.setdefault(self.model_name, LatencyTracker())
+            _stats.setdefault(self.model_name, {outcome: 0 for outcome in _OUTCOMES})
+
+    def load_model(self):
+        return self.primary.load_model()
+
+    def get_model_name(self):
+        return self.model_name
+
+    def hedge_delay(self) -> float:
+        """primary를 이만큼 기다려도 답이 없으면 헤징 (표본이 모이기 전에는 초기 지연)"""
+        if len(self.latency) < self.min_samples:
+            return self.initial_delay_sec
+        return self.latency.percentile(self.percentile)
+
+    def _record(self, outcome, hedged, delay):
+        with _lock:
+            _stats[self.model_name][outcome] += 1
+        HEDGE_CALLS.inc(primary=self.primary_backend, secondary=self.secondary_backend, outcome=outcome)
+        set_attributes(**{"hedge.outcome": outcome, "hedge.fired": hedged, "hedge.delay_sec": float(delay)})
+
+    def _submit(self, llm, prompt, schema):
+        kwargs = {"schema": schema} if schema is not None and accepts_schema(llm) else {}
+        # 호출마다 context를 복사해 사용량 집계 범위/span/우선순위가 워커 스레드에도 적용되게 한다
+        return _executor.submit(contextvars.copy_context().run, llm.generate, prompt, **kwargs)
+
+    def generate(self, prompt: str, schema=None):
+        budget = remaining_sec()
+        if budget is not None and budget <= 0:
+            self._record("timeout", False, 0.0)
+            raise DeadlineExceeded("요청 지연 예산을 모두 써서 판별을 건너뜁니다.")
+
+        start = time.monotonic()
+        primary = self._submit(self.primary, prompt, schema)
+        # 헤징 여부와 관계없이 primary가 성공하면 지연 시간을 기록 (늦게 끝난 호출도 포함해야 백분위가 낮게 치우치지 않음)
+        primary.add_done_callback(lambda f: f.exception() is None and self.latency.observe(time.monotonic() - start))
+
+        delay = self.hedge_delay()
+        HEDGE_DELAY.set(delay, primary=self.primary_backend)
+        first_wait = delay if self.secondary is not None else None
+        if budget is not None:
+            first_wait = budget if first_wait is None else min(first_wait, budget)
+        done, _ = wait([primary], timeout=first_wait)
+        if primary in done and primary.exception() is None:
+            self._record("primary", False, delay)
+            return primary.result()
+        # 예비 백엔드가 없거나, 헤징 지연보다 먼저 마감 시각이 왔으면 헤징하지 않고 끝낸다
+        deadline_first = primary not in done and budget is not None and budget <= delay
+        if self.secondary is None or deadline_first:
+            self._finish_without_hedge(primary, done, delay)
+
+        # primary가 늦거나 실패 -> secondary로 같은 요청을 보내고 먼저 성공한 쪽을 쓴다
+        secondary = self._submit(self.secondary, prompt, schema)
+        pending = {secondary} if primary in done else {primary, secondary}
+        errors = [primary.exception()] if primary in done else []
+        while pending:
+            done, pending = wait(pending, timeout=remaining_sec(), return_when=FIRST_COMPLETED)
+            if not done:
+                self._record("timeout", True, delay)
+                raise DeadlineExceeded(f"{time.monotonic() - start:.1f}초 안에 {self.primary_backend}/{self.secondary_backend} 모두 응답하지 않았습니다.")
+            for future in done:
+                if future.exception() is None:
+                    self._record("primary_won" if future is primary else "secondary_won", True, delay)
+                    return future.result()
+                errors.append(future.exception())
+        self._record("error", True, delay)
+        raise errors[-1]
+
+    def _finish_without_hedge(self, primary, done, delay):
+        """헤징하지 않을 때: primary 실패는 그대로 올리고, 아직 안 끝났으면 타임아웃"""
+        if primary in done:
+            self._record("error", False, delay)
+            raise primary.exception()
+        self._record("timeout", False, delay)
+        raise DeadlineExceeded(f"{self.primary_backend} 판별이 제한 시간 안에 끝나지 않았습니다.")
+
+    @property
+    def generate_stream(self):
+        """
+        스트리밍(개선안)은 헤징하지 않고 primary에 그대로 맡긴다 (이미 내보낸 조각을 다른 백엔드 결과로 바꿀 수 없음).
+        primary가 스트리밍을 지원하지 않으면 AttributeError라서 getattr(llm, "generate_stream", None)으로 확인할 수 있다.
+        """
+        return self.primary.generate_stream
+
+    async def a_generate(self, prompt: str, schema=None):
+        return self.generate(prompt, schema)
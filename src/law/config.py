@@ -0,0 +1,15 @@
+import os
+
+from dotenv import load_dotenv
+
+# 법제처 Open API 설정. API 키는 실제로 API를 호출할 때 .env에서 읽는다 (import 시점에 파일을 읽지 않도록)
+_dotenv_loaded = False
+
+
+def moleg_api_key():
+    """법제처 Open API 인증키(MOLEG_API_KEY). 처음 부를 때 .env를 한 번 읽는다"""
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        load_dotenv()
+        _dotenv_loaded = True
+    return os.getenv("MOLEG_API_KEY")
@@ -0,0 +1,493 @@
+import argparse
+import json
+import mmap
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Dict, Optional
+
+import numpy as np
+import zstandard
+
+# 검색 결과 문서 저장 방식: memory(기본, langchain docstore의 Document를 그대로 들고 있음) / zstd(CompressedDocStore)
+DOC_STORE_KINDS = ("memory", "zstd")
+DOC_STORE = os.getenv("SAFESIGN_DOC_STORE", "memory").lower()
+# 압축 저장소 폴더 (각 FAISS DB 폴더 안에 만든다)
+DOC_STORE_DIR = "docstore"
+COMPRESSION_LEVEL = int(os.getenv("SAFESIGN_DOC_STORE_LEVEL", "9"))
+# 문서 하나(~2KB)는 단독으로 압축하면 효율이 낮아서, 문서 표본으로 학습한 zstd 사전을 함께 쓴다
+DICT_SIZE = 64 * 1024
+DICT_MIN_SAMPLES = 100
+DICT_MAX_SAMPLES = 2000
+
+HEADER_FILE = "header.json"
+BODIES_FILE = "bodies.zst"
+RECORDS_FILE = "records.bin"
+STRINGS_FILE = "strings.bin"
+STRING_INDEX_FILE = "strings.idx"
+DICT_FILE = "dict.zstd"
+FORMAT_VERSION = 1
+
+# 문자열 표의 위치 (문자열 ID 0은 값 없음, 1부터 순서대로)
+_STRING_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4")])
+
+
+def _record_dtype(n_fields):
+    """문서 한 건의 고정 길이 레코드: 본문 frame 위치/길이, 원본 길이, doc_id와 메타데이터 값의 문자열 ID"""
+    return np.dtype([("offset", "<u8"), ("length", "<u4"), ("raw_length", "<u4"), ("doc_id", "<u4")]
+                    + [(f"f{i}", "<u4") for i in range(n_fields)])
+
+
+class _AppendOnlyFile:
+    """
+    뒤에 덧붙이기만 하는 파일. 읽기는 mmap으로 (파일이 커지면 다시 매핑).
+    검색은 여러 스레드에서 동시에 읽으므로 다시 매핑은 잠금 안에서 한 번만 하고,
+    이전 매핑은 닫지 않고 참조가 없어질 때 정리되게 둔다 (다른 스레드가 아직 읽는 중일 수 있음).
+    """
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        self.size = os.path.getsize(path)
+        self._writer = None
+        # (mmap, 매핑한 크기)를 한 번에 바꿔 읽는 쪽이 서로 다른 시점의 값을 섞어 보지 않게 한다
+        self._mapping = (None, 0)
+        self._lock = threading.Lock()
+
+    def truncate(self, size):
+        """마지막 레코드가 쓰이기 전에 멈춰 남은 꼬리를 잘라낸다"""
+        if size < self.size:
+            self.close()
+            os.truncate(self.path, size)
+            self.size = size
+
+    def append(self, data) -> int:
+        if self._writer is None:
+            self._writer = open(self.path, "ab")
+        offset = self.size
+        self._writer.write(data)
+        self.size += len(data)
+        return offset
+
+    def read(self, offset, length):
+        end = offset + length
+        mapped, mapped_size = self._mapping
+        if end > mapped_size:
+            with self._lock:
+                # 기다리는 동안 다른 스레드가 이미 다시 매핑했을 수 있다
+                mapped, mapped_size = self._mapping
+                if end > mapped_size:
+                    self.flush()
+                    with open(self.path, "rb") as f:
+                        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+                    self._mapping = (mapped, self.size)
+        # 복사해서 돌려준다 (memoryview를 넘기면 매핑이 정리되지 않음)
+        return mapped[offset:end]
+
+    def flush(self):
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        with self._lock:
+            mapped, _ = self._mapping
+            self._mapping = (None, 0)
+        if mapped is not None:
+            mapped.close()
+
+
+class CompressedDocStore:
+    """
+    검색용 문서를 담는 추가 전용(append-only) 저장소입니다.
+    - 본문: 문서마다 zstd frame 하나 (bodies.zst), 디스크에서 mmap으로 읽고 요청받은 문서만 압축을 푼다
+    - 메타데이터: 값마다 문자열 표(strings.bin)에 한 번만 저장하고, 문서 레코드(records.bin)에는 문자열 ID만 둔다
+    - 메모리에 상주하는 것은 고정 길이 레코드 배열, 문자열 위치 표, zstd 사전뿐 (resident_bytes)
+    레코드 i는 FAISS 인덱스 위치 i의 문서입니다.
+    """
+    def __init__(self, path):
+        with open(os.path.join(path, HEADER_FILE), encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"지원하지 않는 문서 저장소 형식입니다: {header.get('version')} ({path})")
+        self.path = path
+        self.fields = header["fields"]
+        self.level = header.get("level", COMPRESSION_LEVEL)
+        self._dtype = _record_dtype(len(self.fields))
+        dict_path = os.path.join(path, DICT_FILE)
+        self._dict_data = None
+        if os.path.exists(dict_path):
+            with open(dict_path, "rb") as f:
+                self._dict_data = zstandard.ZstdCompressionDict(f.read())
+
+        self._bodies = _AppendOnlyFile(os.path.join(path, BODIES_FILE))
+        self._strings = _AppendOnlyFile(os.path.join(path, STRINGS_FILE))
+        self._records_file = _AppendOnlyFile(os.path.join(path, RECORDS_FILE))
+        self._string_index_file = _AppendOnlyFile(os.path.join(path, STRING_INDEX_FILE))
+        # 레코드/문자열 위치 표는 고정 길이라 파일 크기로 개수를 알 수 있다 (쓰다 멈춘 꼬리는 버림)
+        self._records = self._load_array(self._records_file, self._dtype)
+        self._string_index = self._load_array(self._string_index_file, _STRING_DTYPE)
+        self._pending_records = []
+        self._pending_strings = []
+        self._interned = None       # 값 -> 문자열 ID (처음 append할 때 만든다)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_array(file, dtype):
+        count = file.size // dtype.itemsize
+        file.truncate(count * dtype.itemsize)
+        return np.fromfile(file.path, dtype=dtype, count=count)
+
+    @classmethod
+    def create(cls, path, fields, samples=None, level=COMPRESSION_LEVEL):
+        """
+        빈 저장소를 만듭니다. fields는 메타데이터 키 순서,
+        samples(본문 byte 표본)가 DICT_MIN_SAMPLES개 이상이면 zstd 사전을 학습해 함께 저장합니다.
+        """
+        os.makedirs(path, exist_ok=True)
+        if samples and len(samples) >= DICT_MIN_SAMPLES:
+            try:
+                dict_data = zstandard.train_dictionary(DICT_SIZE, list(samples[:DICT_MAX_SAMPLES]), level=level)
+                with open(os.path.join(path, DICT_FILE), "wb") as f:
+                    f.write(dict_data.as_bytes())
+            except zstandard.ZstdError as e:
+                print(f"⚠️ zstd 사전 학습 실패, 사전 없이 압축합니다: {e}")
+        with open(os.path.join(path, HEADER_FILE), "w", encoding="utf-8") as f:
+            json.dump({"version": FORMAT_VERSION, "fields": list(fields), "level": level}, f, ensure_ascii=False)
+        return cls(path)
+
+    # --- 쓰기 ---
+    def _compressor(self):
+        if getattr(self._local, "compressor", None) is None:
+            self._local.compressor = zstandard.ZstdCompressor(level=self.level, dict_data=self._dict_data)
+        return self._local.compressor
+
+    def _decompressor(self):
+        # ZstdDecompressor는 스레드 간에 공유할 수 없어 스레드마다 만든다
+        if getattr(self._local, "decompressor", None) is None:
+            self._local.decompressor = zstandard.ZstdDecompressor(dict_data=self._dict_data)
+        return self._local.decompressor
+
+    def _intern(self, value) -> int:
+        """메타데이터 값을 문자열 표에 한 번만 저장 (JSON으로 저장해 숫자/None도 그대로 돌아온다)"""
+        if value is None:
+            return 0
+        if self._interned is None:
+            self._interned = {self._read_string(i): i for i in range(1, self._string_count() + 1)}
+        encoded = json.dumps(value, ensure_ascii=False)
+        string_id = self._interned.get(encoded)
+        if string_id is None:
+            data = encoded.encode("utf-8")
+            offset = self._strings.append(data)
+            self._pending_strings.append((offset, len(data)))
+            self._string_index_file.append(np.array([(offset, len(data))], dtype=_STRING_DTYPE).tobytes())
+            string_id = self._interned[encoded] = self._string_count()
+        return string_id
+
+    def append(self, text, metadata=None, doc_id=None) -> int:
+        """문서 한 건을 덧붙이고 위치를 반환 (fields에 없는 메타데이터 키는 저장하지 않음)"""
+        metadata = metadata or {}
+        raw = text.encode("utf-8")
+        with self._lock:
+            frame = self._compressor().compress(raw)
+            offset = self._bodies.append(frame)
+            record = (offset, len(frame), len(raw), self._intern(doc_id),
+                      *(self._intern(metadata.get(field)) for field in self.fields))
+            # 본문과 문자열을 먼저 쓰고 레코드를 마지막에 쓴다 (중간에 멈추면 레코드가 없는 꼬리만 남음)
+            self._records_file.append(np.array([record], dtype=self._dtype).tobytes())
+            self._pending_records.append(record)
+            return len(self._records) + len(self._pending_records) - 1
+
+    def flush(self):
+        with self._lock:
+            self._merge_pending()
+            for file in (self._bodies, self._strings, self._string_index_file, self._records_file):
+                file.flush()
+
+    def close(self):
+        self.flush()
+        for file in (self._bodies, self._strings, self._string_index_file, self._records_file):
+            file.close()
+
+    def _merge_pending(self):
+        if self._pending_records:
+            self._records = np.concatenate([self._records, np.array(self._pending_records, dtype=self._dtype)])
+            self._pending_records = []
+        if self._pending_strings:
+            self._string_index = np.concatenate([self._string_index, np.array(self._pending_strings, dtype=_STRING_DTYPE)])
+            self._pending_strings = []
+
+    # --- 읽기 ---
+    def __len__(self):
+        return len(self._records) + len(self._pending_records)
+
+    def _string_count(self):
+        return len(self._string_index) + len(self._pending_strings)
+
+    def _record(self, position):
+        if self._pending_records:
+            self.flush()
+        return self._records[position]
+
+    def _read_string(self, string_id):
+        if self._pending_strings:
+            self._merge_pending()
+        entry = self._string_index[string_id - 1]
+        return self._strings.read(int(entry["offset"]), int(entry["length"])).decode("utf-8")
+
+    def _value(self, string_id):
+        return None if string_id == 0 else json.loads(self._read_string(int(string_id)))
+
+    def text(self, position, max_chars=None) -> str:
+        """
+        본문을 돌려줍니다. max_chars를 주면 앞부분만 필요한 만큼 스트리밍으로 풀어 잘라낸다 (발췌용).
+        """
+        record = self._record(position)
+        frame = self._bodies.read(int(record["offset"]), int(record["length"]))
+        if max_chars is None:
+            return self._decompressor().decompress(frame, max_output_size=int(record["raw_length"])).decode("utf-8")
+        # UTF-8은 글자당 최대 4byte라 그만큼만 풀고, 잘린 마지막 글자는 버린다
+        wanted = min(int(record["raw_length"]), max_chars * 4)
+        chunks, size = [], 0
+        with self._decompressor().stream_reader(frame) as reader:
+            while size < wanted:
+                chunk = reader.read(wanted - size)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+        return b"".join(chunks).decode("utf-8", errors="ignore")[:max_chars]
+
+    def metadata(self, position) -> Dict:
+        record = self._record(position)
+        metadata = {}
+        for i, field in enumerate(self.fields):
+            string_id = record[f"f{i}"]
+            if string_id:
+                metadata[field] = self._value(string_id)
+        return metadata
+
+    def doc_id(self, position) -> Optional[str]:
+        return self._value(self._record(position)["doc_id"])
+
+    def get(self, position, max_chars=None):
+        """langchain Document로 꺼내기 (page_content는 max_chars까지만)"""
+        from langchain_core.documents import Document
+        return Document(page_content=self.text(position, max_chars), metadata=self.metadata(position), id=self.doc_id(position))
+
+    # --- 통계 ---
+    def resident_bytes(self) -> int:
+        """프로세스 메모리에 상주하는 크기 (본문/문자열은 mmap이라 필요한 페이지만 page cache에 올라감)"""
+        self.flush()
+        dict_bytes = len(self._dict_data.as_bytes()) if self._dict_data is not None else 0
+        return int(self._records.nbytes + self._string_index.nbytes + dict_bytes)
+
+    def disk_bytes(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path))
+
+    def raw_bytes(self) -> int:
+        """압축 전 본문 크기 합"""
+        self.flush()
+        return int(self._records["raw_length"].sum())
+
+
+def build_doc_store(path, documents, doc_ids=None, level=COMPRESSION_LEVEL) -> CompressedDocStore:
+    """
+    Document 리스트로 저장소를 새로 만듭니다. (임시 폴더에 다 쓴 뒤 교체하므로 중간에 멈춰도 기존 저장소는 그대로)
+    메타데이터 키는 문서에 처음 나온 순서대로 fields가 된다.
+    """
+    fields = list(dict.fromkeys(key for doc in documents for key in doc.metadata))
+    samples = [doc.page_content.encode("utf-8") for doc in documents[:DICT_MAX_SAMPLES]]
+    tmp_path = path.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    store = CompressedDocStore.create(tmp_path, fields, samples, level)
+    for i, doc in enumerate(documents):
+        store.append(doc.page_content, doc.metadata, doc_ids[i] if doc_ids is not None else doc.id)
+    store.close()
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return CompressedDocStore(path)
+
+
+def load_doc_store(db_path, vectorstore) -> CompressedDocStore:
+    """
+    FAISS DB 폴더의 압축 저장소를 엽니다. 없거나 DB를 다시 구축해 문서가 달라졌으면 vectorstore의 docstore로 새로 만든다.
+    (DB를 새로 만들면 docstore ID(uuid)가 바뀌므로 처음/마지막 ID로 확인)
+    """
+    path = os.path.join(db_path, DOC_STORE_DIR)
+    n = vectorstore.index.ntotal
+    ids = [vectorstore.index_to_docstore_id[i] for i in range(n)]
+    if os.path.exists(os.path.join(path, HEADER_FILE)):
+        try:
+            store = CompressedDocStore(path)
+            if len(store) == n and (n == 0 or (store.doc_id(0) == ids[0] and store.doc_id(n - 1) == ids[-1])):
+                return store
+            store.close()
+        except (ValueError, OSError, zstandard.ZstdError) as e:
+            print(f"⚠️ 문서 저장소 로드 실패: {e}. 새로 만듭니다.")
+    start = time.time()
+    store = build_doc_store(path, [vectorstore.docstore.search(doc_id) for doc_id in ids], ids)
+    print(f"🗜️ 문서 저장소 생성 완료: {path} ({len(store)}건, {store.raw_bytes() / 1024:.0f}KB -> "
+          f"{store.disk_bytes() / 1024:.0f}KB, {time.time() - start:.1f}초)")
+    return store
+
+
+# ==========================================
+# 🛠️ 변환 / 보고서 도구
+# ==========================================
+def _read_docstore(db_path):
+    """index.pkl(docstore, index_to_docstore_id)만 읽는다 (임베딩 모델이 필요 없음)"""
+    with open(os.path.join(db_path, "index.pkl"), "rb") as f:
+        payload = f.read()
+    docstore, index_to_docstore_id = pickle.loads(payload)
+    ids = [index_to_docstore_id[i] for i in range(len(index_to_docstore_id))]
+    return payload, [docstore.search(doc_id) for doc_id in ids], ids
+
+
+def _synthetic_documents(n, seed=0):
+    """precedent_context.py와 같은 형식의 합성 판례 문서 (판결요지/전문 ~2KB)"""
+    from langchain_core.documents import Document
+    from benchmarks.synthetic import generate_clauses
+    rng = random.Random(seed)
+    clauses = generate_clauses(max(200, n // 10), seed=seed)
+    courts = ["대법원", "서울고등법원", "서울중앙지방법원", "부산지방법원"]
+    docs = []
+    for i in range(n):
+        case_name = rng.choice(["해고무효확인", "임금", "퇴직금", "손해배상(기)", "부당해고구제재심판정취소"])
+        case_number = f"20{rng.randint(10, 24)}다{rng.randint(1000, 99999)}"
+        summary = " ".join(rng.choices(clauses, k=4))
+        content = " ".join(rng.choices(clauses, k=30))
+        page_content = f"[사건번호] {case_number}\n[사건명] {case_name}\n[판결요지] {summary}\n[전문] {content[:2000]}...".strip()
+        docs.append(Document(page_content=page_content, metadata={
+            "case_name": case_name, "source": "HuggingFace Precedent DB", "case_number": case_number,
+            "court": rng.choice(courts),
+        }))
+    return docs, [f"synthetic-{i}" for i in range(n)]
+
+
+def build(args):
+    """기존 FAISS DB의 docstore(index.pkl)를 압축 저장소로 변환"""
+    _, docs, ids = _read_docstore(args.db)
+    path = os.path.join(args.db, DOC_STORE_DIR)
+    store = build_doc_store(path, docs, ids, args.level)
+    print(f"✅ {path} ({len(store)}건, {store.raw_bytes() / 1024:.0f}KB -> {store.disk_bytes() / 1024:.0f}KB)")
+
+
+def report(args):
+    """
+    pickle된 docstore(Document dict)와 압축 저장소의 상주 메모리, 디스크 크기, top-k 꺼내기 시간을 비교하고
+    문서 100만 건당 상주 메모리로 환산해 출력합니다.
+    """
+    from benchmarks.common import run_metadata, summarize, write_report
+
+    if args.db:
+        payload, docs, ids = _read_docstore(args.db)
+        source = args.db
+    else:
+        docs, ids = _synthetic_documents(args.synthetic, args.seed)
+        payload = pickle.dumps(({doc_id: doc for doc_id, doc in zip(ids, docs)}, dict(enumerate(ids))))
+        source = f"synthetic:{args.synthetic}"
+    n = len(docs)
+    if n == 0:
+        print("❌ 문서가 없습니다.")
+        return
+
+    # 기존 방식: index.pkl을 풀어 Document를 모두 메모리에 올림
+    tracemalloc.start()
+    loaded = pickle.loads(payload)
+    pickled_resident, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del loaded
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, DOC_STORE_DIR)
+        start = time.perf_counter()
+        build_doc_store(path, docs, ids, args.level).close()
+        build_sec = time.perf_counter() - start
+        tracemalloc.start()
+        store = CompressedDocStore(path)
+        store_traced, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        rng = random.Random(args.seed)
+        full_latencies, snippet_latencies = [], []
+        for _ in range(args.lookups):
+            positions = rng.sample(range(n), min(args.k, n))
+            start = time.perf_counter()
+            hits = [store.get(p) for p in positions]
+            full_latencies.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            [store.get(p, max_chars=args.snippet_chars) for p in positions]
+            snippet_latencies.append(time.perf_counter() - start)
+        assert all(hit.page_content == docs[p].page_content for hit, p in zip(hits, positions))
+
+        resident = store.resident_bytes()
+        result = {
+            "metadata": run_metadata(args),
+            "source": source,
+            "documents": n,
+            "fields": store.fields,
+            "raw_text_bytes": store.raw_bytes(),
+            "pickle_bytes": len(payload),
+            "store_disk_bytes": store.disk_bytes(),
+            "compression_ratio": store.raw_bytes() / max(1, os.path.getsize(os.path.join(path, BODIES_FILE))),
+            "pickled_resident_bytes": pickled_resident,
+            "store_resident_bytes": resident,
+            "store_traced_bytes": store_traced,
+            "resident_mb_per_million": {
+                "pickled": pickled_resident / n * 1e6 / (1024 * 1024),
+                "store": resident / n * 1e6 / (1024 * 1024),
+            },
+            "build_sec": build_sec,
+            f"top{args.k}_full_latency_sec": summarize(full_latencies),
+            f"top{args.k}_snippet_latency_sec": summarize(snippet_latencies),
+        }
+        store.close()
+
+    per_million = result["resident_mb_per_million"]
+    print(f"\n📦 {source} ({n}건, 본문 {result['raw_text_bytes'] / 1024:.0f}KB, index.pkl {len(payload) / 1024:.0f}KB)")
+    print(f"    - 압축 저장소 디스크: {result['store_disk_bytes'] / 1024:.0f}KB (본문 압축률 {result['compression_ratio']:.1f}x)")
+    print(f"    - 상주 메모리: pickle {pickled_resident / 1024:.0f}KB -> 저장소 {resident / 1024:.0f}KB")
+    print(f"    - 100만 건당 상주 메모리: pickle {per_million['pickled']:.0f}MB -> 저장소 {per_million['store']:.1f}MB")
+    print(f"    - top{args.k} 꺼내기 p50: 전체 {result[f'top{args.k}_full_latency_sec']['p50'] * 1000:.2f}ms, "
+          f"발췌({args.snippet_chars}자) {result[f'top{args.k}_snippet_latency_sec']['p50'] * 1000:.2f}ms")
+    if args.output:
+        write_report(args.output, result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="zstd 압축 문서 저장소 변환 및 메모리 보고")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = sub.add_parser("build", help="기존 FAISS DB의 docstore를 압축 저장소로 변환")
+    build_parser.add_argument("--db", required=True)
+    build_parser.add_argument("--level", type=int, default=COMPRESSION_LEVEL)
+
+    report_parser = sub.add_parser("report", help="pickle docstore 대비 상주 메모리/디스크/꺼내기 시간 보고")
+    source = report_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--db", help="FAISS DB 경로 (index.pkl 사용)")
+    source.add_argument("--synthetic", type=int, help="합성 판례 문서 개수")
+    report_parser.add_argument("--level", type=int, default=COMPRESSION_LEVEL)
+    report_parser.add_argument("--k", type=int, default=5)
+    report_parser.add_argument("--lookups", type=int, default=200)
+    report_parser.add_argument("--snippet-chars", type=int, default=300)
+    report_parser.add_argument("--seed", type=int, default=0)
+    report_parser.add_argument("--output", help="결과 JSON 경로 ('-'이면 표준출력)")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build(args)
+    else:
+        report(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,27 @@
 import os
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.documents import Document
 from .legal_search import get_law_content_xml, parse_articles_from_xml, search_law_id
-from dotenv import load_dotenv
-
-load_dotenv()
+from .quantized_index import INDEX_STORAGE, index_storage, load_full_vectors, quantize_vectorstore, search_by_vector
+from .shared_resources import get_embeddings, load_vectorstore, remember_vectorstore
+from metrics import STAGE_SECONDS, embedding_labels
+from tracing import set_attributes, start_span
 
 # 로컬 DB 저장 경로 및 대상 법령 정의
 DB_PATH = "../data/faiss_law_db" 
 TARGET_LAWS = ["근로기준법", "최저임금법", "근로자퇴직급여 보장법"]
 
 class LawContextManager:
-    def __init__(self):
+    def __init__(self, embeddings=None, storage=INDEX_STORAGE):
         self.vectorstore = None
+        # 양자화(sq8/fp16) DB의 재정렬용 원본 벡터 (mmap, flat DB면 None)
+        self.full_vectors = None
+        # 새로 구축할 때의 벡터 저장 방식 (flat / sq8 / fp16)
+        self.storage = storage
         # 근로계약서 분석에 필수적인 '3대장 법령'을 미리 정의
         self.target_laws = TARGET_LAWS
-        # 임베딩 모델은 한 번만 로드
-        self.embeddings = HuggingFaceEmbeddings(model_name="jhgan/ko-sbert-nli")
+        # 임베딩 모델은 프로세스당 한 번만 로드 (외부에서 넘겨주면 그대로 사용)
+        self.embeddings = embeddings or get_embeddings()
 
     def initialize_database(self):
         """
@@ -31,8 +35,9 @@ class LawContextManager:
         if os.path.exists(DB_PATH) and os.path.isdir(DB_PATH):
             print(f"✅ [초기화] 기존 법령 DB 로드 중... (경로: {DB_PATH})")
             try:
-                # 로컬 DB 로드 (allow_dangerous_deserialization=True 설정)
-                self.vectorstore = FAISS.load_local(DB_PATH, self.embeddings, allow_dangerous_deserialization=True)
+                # 이미 다른 detector가 불러온 DB면 재사용
+                self.vectorstore = load_vectorstore(DB_PATH, self.embeddings)
+                self.full_vectors = load_full_vectors(DB_PATH)
                 print("✅ [초기화] 법령 DB 로드 완료!")
                 return
             except Exception as e:
@@ -77,7 +82,10 @@ class LawContextManager:
         
         # 로컬 저장
         os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+        quantize_vectorstore(self.vectorstore, DB_PATH, self.storage)
         self.vectorstore.save_local(DB_PATH)
+        remember_vectorstore(DB_PATH, self.embeddings, self.vectorstore)
+        self.full_vectors = load_full_vectors(DB_PATH)
         
         print(f"✅ 법령 DB 신규 구축 및 저장 완료! (총 {len(all_docs)}개 조항, 경로: {os.path.abspath(DB_PATH)})")
 
@@ -95,7 +103,17 @@ class LawContextManager:
             return []
         
         print(f"🔍 DB에서 '{query[:20]}...' 관련 법령 {k}개 검색 중...")
-        # 유사도 검색
-        docs = self.vectorstore.similarity_search(query, k=k)
+        with start_span("retrieval.law", **{"retrieval.k": k, "retrieval.query_length": len(query),
+                                                "retrieval.index_storage": index_storage(self.vectorstore.index)}):
+            # 유사도 검색 (임베딩과 FAISS 검색 시간을 따로 기록하기 위해 두 단계로 나눔)
+            with STAGE_SECONDS.time(stage="embedding", store="law", **embedding_labels(self.embeddings)):
+                query_vector = self.embeddings.embed_query(query)
+            with STAGE_SECONDS.time(stage="faiss_search", backend="faiss", store="law"):
+                # 양자화 DB면 후보를 넉넉히 뽑아 원본 벡터로 재정렬
+                docs = search_by_vector(self.vectorstore, query_vector, k, self.full_vectors)
+            # 문서 ID가 없는 예전 DB는 '법령명:조문 앞부분'으로 대신 표시
+            set_attributes(**{"retrieval.doc_ids": [
+                doc.id or f"{doc.metadata.get('source', '')}:{doc.page_content[:12]}" for doc in docs
+            ]})
         # 조항 내용만 반환
         return [doc.page_content for doc in docs]
\ No newline at end of file
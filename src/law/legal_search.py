@@ -1,19 +1,16 @@
-import os
 import requests
 import xml.etree.ElementTree as ET
 import json 
-from dotenv import load_dotenv
 
-# 1. 환경 설정: API 키 로드
-load_dotenv()
-MOLEG_API_KEY = os.getenv("MOLEG_API_KEY") 
+# 1. 환경 설정: API 키는 실제로 API를 호출할 때 .env에서 읽는다 (law/config.py)
+from .config import moleg_api_key
 
 def search_law_id(law_name):
     """
     법령 이름으로 ID를 검색하고 법령명(real_name)과 ID를 반환합니다. (JSON 응답 파싱)
     사용 API: lawSearch (type=json)
     """
-    url = f"http://www.law.go.kr/DRF/lawSearch.do?OC={MOLEG_API_KEY}&target=eflaw&nw=3&query={law_name}&type=json" 
+    url = f"http://www.law.go.kr/DRF/lawSearch.do?OC={moleg_api_key()}&target=eflaw&nw=3&query={law_name}&type=json" 
     
     try:
         response = requests.get(url, timeout=5)
@@ -52,7 +49,7 @@ def get_law_content_xml(law_id):
     if not law_id: return None
     
     # 법령 본문은 XML 포맷으로 요청
-    url = f"http://www.law.go.kr/DRF/lawService.do?OC={MOLEG_API_KEY}&target=eflaw&ID={law_id}&type=XML" 
+    url = f"http://www.law.go.kr/DRF/lawService.do?OC={moleg_api_key()}&target=eflaw&ID={law_id}&type=XML" 
     
     try:
         response = requests.get(url, timeout=10)
@@ -0,0 +1,204 @@
+import argparse
+import os
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .shared_resources import EMBEDDING_MODEL_NAME
+
+# int8 ONNX 인코더 저장 경로 (export 명령으로 생성)
+ONNX_DIR = os.getenv("SAFESIGN_ONNX_DIR", "../data/onnx_encoder")
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+# jhgan/ko-sbert-nli의 sentence-transformers 설정값 (HuggingFaceEmbeddings와 같은 길이에서 자른다)
+MAX_SEQ_LENGTH = 128
+
+
+def _missing(e):
+    return ImportError(f"ONNX 인코더에는 onnxruntime(및 export 시 onnx, torch)이 필요합니다: {e}")
+
+
+def export_quantized(model_name=EMBEDDING_MODEL_NAME, out_dir=ONNX_DIR, opset=17):
+    """
+    HuggingFace 모델을 ONNX로 내보낸 뒤 가중치를 int8로 동적 양자화합니다.
+    토크나이저도 같은 폴더에 저장하므로 실행 시에는 모델 다운로드가 필요 없습니다.
+    """
+    try:
+        import torch
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        from transformers import AutoModel, AutoTokenizer
+    except ImportError as e:
+        raise _missing(e)
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["근로계약서 조항"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = os.path.join(out_dir, FP32_FILE)
+    int8_path = os.path.join(out_dir, INT8_FILE)
+    print(f"📦 ONNX 변환 중... ({model_name})")
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[name] for name in input_names), fp32_path,
+            input_names=input_names, output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False,
+        )
+    print("🗜️ int8 동적 양자화 중...")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(out_dir)
+
+    fp32_mb, int8_mb = (os.path.getsize(path) / (1024 * 1024) for path in (fp32_path, int8_path))
+    print(f"✅ 저장 완료: {int8_path} ({fp32_mb:.1f}MB -> {int8_mb:.1f}MB)")
+    return int8_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    int8 ONNX 모델을 ONNX Runtime(CPU)으로 실행하는 임베딩.
+    HuggingFaceEmbeddings(sentence-transformers)와 같은 mean pooling / 비정규화 출력이라
+    기존 FAISS 인덱스에 그대로 질의할 수 있습니다.
+    """
+    def __init__(self, model_dir=ONNX_DIR, model_file=INT8_FILE, threads=0, batch_size=32):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise _missing(e)
+
+        path = os.path.join(model_dir, model_file)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"ONNX 인코더가 없습니다: {path} (python -m law.onnx_embeddings export 로 생성)")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads  # 0이면 코어 수만큼
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+        # 지표 label (metrics.embedding_labels)에서 PyTorch 인코더와 구분되도록
+        self.model_name = f"{EMBEDDING_MODEL_NAME}@{os.path.splitext(model_file)[0]}"
+
+    def _encode(self, texts):
+        batch = self.tokenizer(texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="np")
+        feeds = {name: batch[name].astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(None, feeds)[0]
+        # 패딩 토큰을 제외한 mean pooling
+        mask = batch["attention_mask"][..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def embed_documents(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._encode(list(texts[start:start + self.batch_size])).tolist())
+        return vectors
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+
+def _cosine(a, b):
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-12))
+
+
+def _doc_key(doc):
+    # 문서 ID가 없는 예전 DB는 본문 앞부분으로 대신 비교
+    return doc.id or doc.page_content[:64]
+
+
+def check_agreement(args):
+    """
+    PyTorch 인코더와 ONNX 인코더의 질의 벡터 cosine 유사도, FAISS top-k 결과 겹침, 질의당 인코딩 시간을 비교합니다.
+    기준(--min-cosine, --min-overlap)에 못 미치면 0이 아닌 코드로 종료합니다.
+    """
+    from benchmarks.common import run_metadata, summarize, write_report
+    from benchmarks.synthetic import generate_clauses
+    from .shared_resources import load_vectorstore
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    reference = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    candidate = OnnxEmbeddings(args.model_dir, args.model_file, threads=args.threads)
+    queries = generate_clauses(args.queries, seed=args.seed)
+
+    def encode_all(embeddings):
+        embeddings.embed_query(queries[0])  # 첫 호출 초기화 비용 제외
+        vectors, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            vectors.append(embeddings.embed_query(query))
+            latencies.append(time.perf_counter() - start)
+        return vectors, latencies
+
+    ref_vectors, ref_latency = encode_all(reference)
+    onnx_vectors, onnx_latency = encode_all(candidate)
+    cosines = [_cosine(a, b) for a, b in zip(ref_vectors, onnx_vectors)]
+
+    overlaps = {}
+    for db_path in args.db:
+        vectorstore = load_vectorstore(db_path, reference)
+        if vectorstore is None:
+            print(f"⚠️ DB가 없어 top-k 비교를 건너뜁니다: {db_path}")
+            continue
+        values = []
+        for ref_vector, onnx_vector in zip(ref_vectors, onnx_vectors):
+            ref_ids = {_doc_key(doc) for doc in vectorstore.similarity_search_by_vector(ref_vector, k=args.k)}
+            onnx_ids = {_doc_key(doc) for doc in vectorstore.similarity_search_by_vector(onnx_vector, k=args.k)}
+            values.append(len(ref_ids & onnx_ids) / max(len(ref_ids), 1))
+        overlaps[db_path] = sum(values) / len(values)
+
+    report = {
+        "metadata": run_metadata(args),
+        "cosine": summarize(cosines),
+        f"top{args.k}_overlap": overlaps,
+        "encode_latency_sec": {"torch": summarize(ref_latency), "onnx": summarize(onnx_latency)},
+    }
+    speedup = report["encode_latency_sec"]["torch"]["p50"] / max(report["encode_latency_sec"]["onnx"]["p50"], 1e-9)
+    print(f"📐 cosine 평균 {report['cosine']['mean']:.4f} / 최소 {report['cosine']['min']:.4f}")
+    for db_path, overlap in overlaps.items():
+        print(f"🔎 top-{args.k} 겹침 {overlap:.3f} ({db_path})")
+    print(f"⏱️ 질의 인코딩 p50: torch {report['encode_latency_sec']['torch']['p50'] * 1000:.1f}ms"
+          f" / onnx {report['encode_latency_sec']['onnx']['p50'] * 1000:.1f}ms (x{speedup:.2f})")
+    if args.output:
+        write_report(args.output, report)
+
+    failed = report["cosine"]["min"] < args.min_cosine or any(v < args.min_overlap for v in overlaps.values())
+    print("❌ 기준 미달" if failed else "✅ 기준 통과")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="int8 ONNX 질의 인코더 생성/검증")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub.add_parser("export", help="ONNX 변환 + int8 동적 양자화")
+    export_parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    export_parser.add_argument("--out", default=ONNX_DIR)
+    export_parser.add_argument("--opset", type=int, default=17)
+
+    check_parser = sub.add_parser("check", help="PyTorch 인코더와 cosine / top-k 일치도 비교")
+    check_parser.add_argument("--model-dir", default=ONNX_DIR)
+    check_parser.add_argument("--model-file", default=INT8_FILE)
+    check_parser.add_argument("--db", nargs="*", default=["../data/faiss_law_db", "../data/faiss_precedent_db"])
+    check_parser.add_argument("--queries", type=int, default=100, help="합성 조항 질의 수")
+    check_parser.add_argument("--seed", type=int, default=0)
+    check_parser.add_argument("--k", type=int, default=5)
+    check_parser.add_argument("--threads", type=int, default=0)
+    check_parser.add_argument("--min-cosine", type=float, default=0.98)
+    check_parser.add_argument("--min-overlap", type=float, default=0.8)
+    check_parser.add_argument("--output", help="결과 JSON 경로 ('-'이면 표준출력)")
+
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        export_quantized(args.model, args.out, args.opset)
+        return 0
+    return check_agreement(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,35 +1,49 @@
 import os
 import time
-from datasets import load_dataset
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings # Deprecation 경고를 피하기 위해 수정
 from langchain_core.documents import Document
+from .precedent_crawler import CRAWL_DIR, iter_shard_records
+from .quantized_index import INDEX_STORAGE, index_storage, load_full_vectors, quantize_vectorstore, search_by_vector
+from .shared_resources import EMBEDDING_MODEL_NAME, get_embeddings, load_vectorstore, remember_vectorstore
+from metrics import STAGE_SECONDS, embedding_labels
+from tracing import set_attributes, start_span
 
 # --- 설정 ---
 # ⭐️ DB_PATH를 판례 전용으로 변경
 DB_PATH = "../data/faiss_precedent_db" 
-EMBEDDING_MODEL_NAME = "jhgan/ko-sbert-nli" # 사용할 임베딩 모델 이름
 # ⭐️ 판례 데이터셋 ID
 DATASET_ID = "joonhok-exo-ai/korean_law_open_data_precedents" 
 SAMPLE_SIZE = 1000 # 테스트/구축용 데이터 개수 (전체 사용 시 None)
+# DB 구축 입력: huggingface(위 데이터셋) / crawl(precedent_crawler.py로 법제처 API에서 수집한 JSONL 샤드)
+PRECEDENT_SOURCE = os.getenv("SAFESIGN_PRECEDENT_SOURCE", "huggingface")
 
 class PrecedentContextManager:
     """
     판례 데이터셋을 기반으로 벡터 DB를 구축하고 관리하는 클래스입니다.
     """
-    def __init__(self):
+    def __init__(self, embeddings=None, storage=INDEX_STORAGE):
         self.vectorstore = None
-        # 임베딩 모델 객체는 한 번만 생성
-        self.embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        # 양자화(sq8/fp16) DB의 재정렬용 원본 벡터 (mmap, flat DB면 None)
+        self.full_vectors = None
+        # 새로 구축할 때의 벡터 저장 방식 (flat / sq8 / fp16)
+        self.storage = storage
+        # 임베딩 모델 객체는 프로세스당 한 번만 생성 (외부에서 넘겨주면 그대로 사용)
+        self.embeddings = embeddings or get_embeddings(EMBEDDING_MODEL_NAME)
         # ⚠️ 참고: self.embeddings 객체를 생성할 때 네트워크 연결이 필요할 수 있습니다.
 
     def create_database(self):
         """
         Hugging Face 데이터셋에서 판례를 다운로드하고 Document 객체로 변환합니다.
+        (SAFESIGN_PRECEDENT_SOURCE=crawl이면 수집한 샤드를 대신 사용)
         """
+        if PRECEDENT_SOURCE == "crawl":
+            return self.create_database_from_crawl()
+
         print(f"📥 판례 데이터셋 다운로드 중... ({DATASET_ID})")
         
         try:
+            # datasets는 DB를 새로 구축할 때만 필요하므로 여기서 불러온다
+            from datasets import load_dataset
             dataset = load_dataset(DATASET_ID, split="train") 
             
             if SAMPLE_SIZE and len(dataset) > SAMPLE_SIZE:
@@ -70,6 +84,27 @@ class PrecedentContextManager:
         print(f"    - 변환된 유효 문서: {len(documents)}개")
         return documents
 
+    def create_database_from_crawl(self, crawl_dir=CRAWL_DIR):
+        """
+        precedent_crawler.py가 법제처 API에서 수집한 JSONL 샤드를 Document 객체로 변환합니다.
+        (샤드는 수집할 때 판례일련번호로 중복을 제거해 두었음)
+        """
+        print(f"📥 수집한 판례 샤드 읽는 중... ({crawl_dir})")
+        documents = []
+        for record in iter_shard_records(crawl_dir):
+            metadata = record.get("metadata") or {}
+            documents.append(Document(page_content=record["text"], metadata={
+                "case_name": metadata.get("title", "사건명 정보 없음"),
+                "source": "법제처 판례 API",
+                "case_number": metadata.get("사건번호", "N/A"),
+            }))
+            if SAMPLE_SIZE and len(documents) >= SAMPLE_SIZE:
+                print(f"    - (설정) 상위 {SAMPLE_SIZE}개만 벡터화합니다.")
+                break
+
+        print(f"    - 변환된 유효 문서: {len(documents)}개")
+        return documents
+
     def initialize_database(self):
         """
         로컬 DB 경로를 확인하여 DB를 로드하거나 새로 구축 후 저장합니다.
@@ -82,12 +117,9 @@ class PrecedentContextManager:
         if os.path.exists(DB_PATH) and os.path.isdir(DB_PATH):
             print(f"✅ [초기화] 기존 판례 DB 로드 중... (경로: {DB_PATH})")
             try:
-                # 로컬 DB 로드 (allow_dangerous_deserialization=True 설정)
-                self.vectorstore = FAISS.load_local(
-                    DB_PATH, 
-                    self.embeddings, 
-                    allow_dangerous_deserialization=True
-                )
+                # 이미 다른 detector가 불러온 DB면 재사용
+                self.vectorstore = load_vectorstore(DB_PATH, self.embeddings)
+                self.full_vectors = load_full_vectors(DB_PATH)
                 print(f"✅ [초기화] 판례 DB 로드 완료! (총 {len(self.vectorstore.docstore._dict)}건)")
                 return
             except Exception as e:
@@ -109,17 +141,21 @@ class PrecedentContextManager:
         
         # 로컬 저장
         os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+        quantize_vectorstore(self.vectorstore, DB_PATH, self.storage)
         self.vectorstore.save_local(DB_PATH)
+        remember_vectorstore(DB_PATH, self.embeddings, self.vectorstore)
+        self.full_vectors = load_full_vectors(DB_PATH)
         
         elapsed_time = time.time() - start_time
         print(f"✅ 판례 DB 신규 구축 및 저장 완료! (소요시간: {elapsed_time:.1f}초, 경로: {os.path.abspath(DB_PATH)})")
         
-    def search_relevant_precedents(self, query, k=2):
+    def search_relevant_precedents(self, query, k=2, max_chars=None):
         """
         로컬에 로드된 DB에서 사용자 질문과 관련된 판례를 검색합니다.
         
         :param query: 검색을 위한 사용자 질문(텍스트)
         :param k: 반환할 검색 결과(Document)의 최대 개수입니다. (기본값: 2)
+        :param max_chars: 주면 판례 내용을 앞부분 max_chars자만 반환합니다. (발췌용)
         :return: 검색된 판례 내용(page_content) 리스트
         """
         # DB가 로드되지 않았으면 로드 시도
@@ -131,12 +167,19 @@ class PrecedentContextManager:
             return []
         
         print(f"🔍 판례 DB에서 '{query[:20]}...' 관련 판례 {k}개 검색 중...")
-        # 유사도 검색 수행
-        docs = self.vectorstore.similarity_search(query, k=k)
+        with start_span("retrieval.precedent", **{"retrieval.k": k, "retrieval.query_length": len(query),
+                                                "retrieval.index_storage": index_storage(self.vectorstore.index)}):
+            # 유사도 검색 수행 (임베딩과 FAISS 검색 시간을 따로 기록하기 위해 두 단계로 나눔)
+            with STAGE_SECONDS.time(stage="embedding", store="precedent", **embedding_labels(self.embeddings)):
+                query_vector = self.embeddings.embed_query(query)
+            with STAGE_SECONDS.time(stage="faiss_search", backend="faiss", store="precedent"):
+                # 양자화 DB면 후보를 넉넉히 뽑아 원본 벡터로 재정렬
+                docs = search_by_vector(self.vectorstore, query_vector, k, self.full_vectors)
+            set_attributes(**{"retrieval.doc_ids": [doc.metadata.get("case_number") or doc.id or "" for doc in docs]})
         
         # 
         
-        return [doc.page_content for doc in docs]
+        return [doc.page_content if max_chars is None else doc.page_content[:max_chars] for doc in docs]
 
 # ==========================================
 # 🧪 테스트 코드
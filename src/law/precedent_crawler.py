@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List
+from urllib.parse import urlencode
+
+import aiohttp
+
+from .config import moleg_api_key
+from .precedent_search import MOLEG_BASE_URL, parse_precedent_content, parse_precedent_detail, parse_precedent_list
+
+# 법제처 판례 수집기: 검색어별로 목록 API를 페이지 순서대로 넘기면서, 페이지 안의 상세 조회는 동시에 보낸다.
+# - 커넥션 풀(aiohttp) + 동시 요청 수 상한 + 초당 요청 수 상한
+# - 페이지의 상세 조회가 모두 기록된 뒤에 checkpoint.json을 갱신하므로, 중간에 멈추면 마지막 페이지부터 다시 시작
+# - 판례일련번호 기준으로 중복을 제거해 precedents-00000.jsonl 형식의 샤드에 기록 (판례 DB 구축 입력)
+#
+#     cd src
+#     python -m law.precedent_crawler --query 해고 --query 임금 --concurrency 8 --rate 5
+#     python -m law.precedent_crawler --standin --query 해고 --query 임금 --max-pages 3     # 로컬 대역 서버로 동작 확인
+CRAWL_DIR = os.getenv("SAFESIGN_PRECEDENT_CRAWL_DIR", "../data/precedent_crawl")
+CHECKPOINT_FILE = "checkpoint.json"
+SHARD_PATTERN = "precedents-{:05d}.jsonl"
+# 재시도할 만한 응답 (요청 한도 초과 / 서버 오류)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CrawlError(Exception):
+    """재시도 후에도 실패한 요청"""
+
+
+class RateLimiter:
+    """초당 rate개 이하로 요청 시작 시각을 벌려 준다 (0이면 제한 없음)"""
+    def __init__(self, rate_per_sec: float):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class ShardWriter:
+    """판례 레코드를 shard_size건씩 JSONL 샤드로 기록 (이어서 실행하면 마지막 샤드 뒤에 이어 쓴다)"""
+    def __init__(self, output_dir, shard_size=1000):
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        os.makedirs(output_dir, exist_ok=True)
+        shards = shard_paths(output_dir)
+        self.shard_index = len(shards) - 1 if shards else 0
+        self.count = _count_lines(shards[-1]) if shards else 0
+        self._file = None
+
+    def write(self, record: Dict):
+        if self._file is None or self.count >= self.shard_size:
+            self._rotate()
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        if self.count >= self.shard_size:
+            self.shard_index += 1
+            self.count = 0
+        self._file = open(os.path.join(self.output_dir, SHARD_PATTERN.format(self.shard_index)), "a", encoding="utf-8")
+
+    def flush(self):
+        """체크포인트를 쓰기 전에 호출 (체크포인트에 기록된 위치까지의 판례는 디스크에 있어야 한다)"""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+
+def _count_lines(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def shard_paths(output_dir) -> List[str]:
+    if not os.path.isdir(output_dir):
+        return []
+    names = sorted(n for n in os.listdir(output_dir) if n.startswith("precedents-") and n.endswith(".jsonl"))
+    return [os.path.join(output_dir, n) for n in names]
+
+
+def iter_shard_records(output_dir=CRAWL_DIR) -> Iterator[Dict]:
+    """수집한 샤드의 판례 레코드를 순서대로 (중단 중 잘린 마지막 줄은 건너뜀)"""
+    for path in shard_paths(output_dir):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+class PrecedentCrawler:
+    """
+    법제처 판례 목록/상세 API 수집기.
+    queries마다 목록을 display건씩 넘기고, 처음 보는 판례의 상세만 최대 concurrency개씩 동시에 조회합니다.
+    """
+    def __init__(self, queries, output_dir=CRAWL_DIR, display=100, concurrency=8, rate_per_sec=5.0, shard_size=1000,
+                 max_pages=None, max_retries=3, timeout_sec=10.0, base_url=None, api_key=None):
+        self.queries = list(queries)
+        self.output_dir = output_dir
+        self.display = display
+        self.concurrency = max(1, concurrency)
+        self.max_pages = max_pages
+        self.max_retries = max_retries
+        self.timeout = aiohttp.ClientTimeout(total=timeout_sec)
+        self.base_url = (base_url or MOLEG_BASE_URL).rstrip("/")
+        self.api_key = api_key
+        self.rate = RateLimiter(rate_per_sec)
+        self.shard_size = shard_size
+        self.checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+        self.stats = {"list_requests": 0, "detail_requests": 0, "written": 0, "duplicates": 0, "empty": 0, "failed": 0, "retries": 0}
+
+    # --- 체크포인트 ---
+    def _load_checkpoint(self) -> Dict:
+        if not os.path.exists(self.checkpoint_path):
+            return {"queries": {}, "failed": {}}
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_checkpoint(self, checkpoint):
+        # 쓰는 도중에 멈춰도 이전 체크포인트가 남도록 임시 파일에 쓴 뒤 교체
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # --- HTTP ---
+    async def _get(self, session, path, params, kind):
+        """GET + 재시도 (429/5xx/연결 오류는 지수 백오프 + jitter)"""
+        url = f"{self.base_url}{path}?{urlencode({'OC': self.api_key or moleg_api_key() or '', **params})}"
+        for attempt in range(self.max_retries + 1):
+            await self.rate.wait()
+            self.stats[f"{kind}_requests"] += 1
+            try:
+                async with session.get(url) as response:
+                    if response.status not in RETRYABLE_STATUS:
+                        response.raise_for_status()
+                        return await response.read()
+                    error = f"HTTP {response.status}"
+            except aiohttp.ClientResponseError as e:
+                raise CrawlError(f"{kind} 요청 실패 ({e.status}): {url}") from e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {e}"
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+                await asyncio.sleep(random.uniform(0, min(10.0, 0.5 * 2 ** attempt)))
+        raise CrawlError(f"{kind} 요청 {self.max_retries + 1}회 실패 ({error}): {url}")
+
+    async def _fetch_list(self, session, query, page):
+        body = await self._get(session, "/DRF/lawSearch.do",
+                               {"target": "prec", "type": "JSON", "query": query, "display": self.display, "page": page}, "list")
+        return parse_precedent_list(json.loads(body))
+
+    async def _fetch_record(self, session, semaphore, prec_info, query):
+        """상세 조회 -> 샤드에 쓸 레코드 (내용이 없으면 None, 실패하면 CrawlError)"""
+        prec_id = str(prec_info.get("판례일련번호", ""))
+        async with semaphore:
+            body = await self._get(session, "/DRF/lawService.do", {"target": "prec", "ID": prec_id, "type": "XML"}, "detail")
+        try:
+            summary_list, holding = parse_precedent_detail(body)
+        except ET.ParseError as e:
+            raise CrawlError(f"판례 상세 XML 파싱 실패 (ID:{prec_id})") from e
+        text, metadata = parse_precedent_content(summary_list, holding, prec_info)
+        if text is None:
+            return None
+        return {"id": prec_id, "query": query, "text": text, "metadata": metadata}
+
+    # --- 수집 ---
+    async def _crawl_items(self, session, semaphore, writer, seen, items, query, failed):
+        """목록 한 페이지(또는 지난번 실패분)의 상세를 동시에 조회해 기록. 이번에도 실패한 판례는 failed에 남긴다"""
+        new_items = []
+        for prec_info in items:
+            prec_id = str(prec_info.get("판례일련번호", ""))
+            if not prec_id or prec_id in seen:
+                self.stats["duplicates"] += 1
+                continue
+            # 같은 페이지에 같은 판례가 두 번 나와도 한 번만 조회
+            seen.add(prec_id)
+            new_items.append(prec_info)
+
+        results = await asyncio.gather(*(self._fetch_record(session, semaphore, info, query) for info in new_items), return_exceptions=True)
+        for prec_info, result in zip(new_items, results):
+            prec_id = str(prec_info["판례일련번호"])
+            if isinstance(result, Exception):
+                seen.discard(prec_id)
+                failed[prec_id] = {"query": query, "info": prec_info}
+                self.stats["failed"] += 1
+                print(f"⚠️ 판례 상세 수집 실패 (ID:{prec_id}): {result}")
+            elif result is None:
+                failed.pop(prec_id, None)
+                self.stats["empty"] += 1
+            else:
+                failed.pop(prec_id, None)
+                writer.write(result)
+                self.stats["written"] += 1
+
+    async def run(self) -> Dict:
+        os.makedirs(self.output_dir, exist_ok=True)
+        checkpoint = self._load_checkpoint()
+        seen = {record["id"] for record in iter_shard_records(self.output_dir)}
+        if seen:
+            print(f"♻️ 기존 수집분 {len(seen)}건을 이어서 수집합니다. ({self.output_dir})")
+        writer = ShardWriter(self.output_dir, self.shard_size)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency + 1)
+        start = time.perf_counter()
+        try:
+            async with aiohttp.ClientSession(connector=connector, timeout=self.timeout) as session:
+                # 지난 실행에서 실패한 상세 조회부터 다시 시도
+                failed = checkpoint.setdefault("failed", {})
+                for prec_id, entry in list(failed.items()):
+                    await self._crawl_items(session, semaphore, writer, seen, [entry["info"]], entry["query"], failed)
+                for query in self.queries:
+                    await self._crawl_query(session, semaphore, writer, seen, checkpoint, query)
+        finally:
+            writer.close()
+        self.stats["elapsed_sec"] = time.perf_counter() - start
+        self.stats["total_records"] = len(seen)
+        return self.stats
+
+    async def _crawl_query(self, session, semaphore, writer, seen, checkpoint, query):
+        state = checkpoint["queries"].setdefault(query, {"next_page": 1, "total": None, "done": False})
+        if state["done"]:
+            print(f"✅ [{query}] 이미 수집 완료 (총 {state['total']}건)")
+            return
+        pages_this_run = 0
+        while self.max_pages is None or pages_this_run < self.max_pages:
+            page = state["next_page"]
+            try:
+                items, total = await self._fetch_list(session, query, page)
+            except CrawlError as e:
+                # 목록 조회가 실패하면 이 검색어는 여기서 멈추고 다음 실행에서 같은 페이지부터 다시 시작
+                print(f"⚠️ [{query}] 목록 {page}페이지 수집 실패, 다음 실행에서 이어서 수집합니다: {e}")
+                return
+            state["total"] = total
+            await self._crawl_items(session, semaphore, writer, seen, items, query, checkpoint["failed"])
+            pages_this_run += 1
+            state["next_page"] = page + 1
+            state["done"] = not items or page * self.display >= total
+            # 이 페이지의 판례가 디스크에 기록된 뒤에 위치를 저장
+            writer.flush()
+            self._save_checkpoint(checkpoint)
+            print(f"📄 [{query}] {page}페이지 완료 ({min(page * self.display, total)}/{total}, 누적 {len(seen)}건)")
+            if state["done"]:
+                return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="법제처 판례 목록/상세 API 수집 (이어서 실행 가능)")
+    parser.add_argument("--query", action="append", required=True, help="검색어 (여러 번 지정 가능)")
+    parser.add_argument("--output", default=CRAWL_DIR, help="샤드/체크포인트 디렉터리")
+    parser.add_argument("--display", type=int, default=100, help="목록 페이지당 판례 수")
+    parser.add_argument("--concurrency", type=int, default=8, help="동시 상세 조회 수")
+    parser.add_argument("--rate", type=float, default=5.0, help="초당 최대 요청 수 (0이면 제한 없음)")
+    parser.add_argument("--shard-size", type=int, default=1000, help="샤드 파일당 판례 수")
+    parser.add_argument("--max-pages", type=int, default=None, help="이번 실행에서 검색어당 최대 페이지 수")
+    parser.add_argument("--standin", action="store_true", help="법제처 API 대신 로컬 대역 서버 사용")
+    args = parser.parse_args(argv)
+
+    standin = base_url = None
+    if args.standin:
+        from benchmarks.standins import MolegStandIn
+        standin = MolegStandIn().start()
+        base_url = standin.url
+    crawler = PrecedentCrawler(args.query, args.output, display=args.display, concurrency=args.concurrency,
+                               rate_per_sec=args.rate, shard_size=args.shard_size, max_pages=args.max_pages,
+                               base_url=base_url, api_key="standin" if standin else None)
+    try:
+        stats = asyncio.run(crawler.run())
+    finally:
+        if standin is not None:
+            standin.stop()
+    print(f"🏁 판례 수집 완료: {json.dumps(stats, ensure_ascii=False)}")
+    return 0 if not stats["failed"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
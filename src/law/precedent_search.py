@@ -2,11 +2,12 @@ import os
 import requests
 import json
 import xml.etree.ElementTree as ET 
-from dotenv import load_dotenv
 
-# 환경 설정
-load_dotenv()
-MOLEG_API_KEY = os.getenv("MOLEG_API_KEY") 
+# 환경 설정: API 키는 실제로 API를 호출할 때 .env에서 읽는다 (law/config.py)
+from .config import moleg_api_key
+
+# 법제처 Open API 주소를 바꿀 때 사용 (수집기 테스트용 로컬 대역 서버 등)
+MOLEG_BASE_URL = os.getenv("MOLEG_BASE_URL", "http://www.law.go.kr")
 
 def search_precedent_list(query, display, page): 
     """
@@ -18,20 +19,14 @@ def search_precedent_list(query, display, page):
     :return: (판례 목록 리스트, 총 검색 개수)
     """
     url = (
-        f"http://www.law.go.kr/DRF/lawSearch.do?OC={MOLEG_API_KEY}&target=prec"
+        f"{MOLEG_BASE_URL}/DRF/lawSearch.do?OC={moleg_api_key()}&target=prec"
         f"&type=JSON&query={query}&display={display}&page={page}"
     )
     
     try:
         response = requests.get(url, timeout=10)
         response.raise_for_status()
-        data = response.json()
-        
-        prec_search = data.get("PrecSearch", {})
-        precedents = prec_search.get("prec", [])
-        total_count = int(prec_search.get("totalCnt", 0))
-        
-        return precedents, total_count
+        return parse_precedent_list(response.json())
     except requests.exceptions.RequestException as e:
         print(f"⚠️ 판례 목록 요청 실패 (쿼리: {query}, 페이지: {page}): {e}")
         return [], 0
@@ -42,6 +37,52 @@ def search_precedent_list(query, display, page):
         print(f"⚠️ 판례 목록 검색 중 일반 오류: {e}")
         return [], 0
 
+def parse_precedent_list(data):
+    """목록 API JSON 응답 -> (판례 목록 리스트, 총 검색 개수). 결과가 1건이면 prec가 dict로 오므로 리스트로 맞춘다"""
+    prec_search = data.get("PrecSearch", {})
+    precedents = prec_search.get("prec", [])
+    if isinstance(precedents, dict):
+        precedents = [precedents]
+    total_count = int(prec_search.get("totalCnt", 0))
+    return precedents, total_count
+
+def parse_precedent_detail(xml_content):
+    """
+    상세 API XML 응답 -> (판결요지 리스트, 판시사항 텍스트). 내용이 없으면 (None, None)
+    XML이 깨져 있으면 ET.ParseError를 그대로 올린다.
+    """
+    root = ET.fromstring(xml_content)
+    
+    # 1. 판시사항 추출 및 HTML <br/> 태그 처리
+    holding_elem = root.find('판시사항')
+    holding = holding_elem.text.strip().replace('<br/>', '\n') if holding_elem is not None and holding_elem.text else ""
+    
+    # 2. 판결요지 추출 (요지, 요지1, 요지2... 형태를 모두 포함하여 리스트로 정리)
+    summary_list = []
+    
+    # <판결요지> 태그의 내용 추출
+    summary_elem = root.find('판결요지')
+    if summary_elem is not None and summary_elem.text:
+        summary_list.append(summary_elem.text.strip())
+    
+    # 혹시 모를 요지N 형태의 태그 추출
+    i = 1
+    while True:
+        yoji_elem = root.find(f'요지{i}')
+        if yoji_elem is not None and yoji_elem.text:
+            summary_list.append(yoji_elem.text.strip())
+            i += 1
+        else:
+            break
+    
+    # 최종 리스트 정리: <br/> 태그를 개행 문자로 치환 및 공백 정리
+    summary_list = [s.replace('<br/>', '\n').strip() for s in summary_list if s.strip()]
+    
+    if not summary_list and not holding:
+        return None, None
+
+    return summary_list, holding
+
 def get_precedent_detail_text(prec_id):
     """
     [상세 검색] 판례일련번호(prec_id)를 사용하여 상세 판결 내용(판결요지, 판시사항)을 조회하고 반환합니다.
@@ -53,44 +94,14 @@ def get_precedent_detail_text(prec_id):
 
     # 상세 요청 URL: type=XML로 설정하여 판례 상세 전문을 요청
     url = (
-        f"http://www.law.go.kr/DRF/lawService.do?OC={MOLEG_API_KEY}&target=prec"
+        f"{MOLEG_BASE_URL}/DRF/lawService.do?OC={moleg_api_key()}&target=prec"
         f"&ID={prec_id}&type=XML" 
     )
 
     try:
         response = requests.get(url, timeout=10)
         response.raise_for_status()
-        root = ET.fromstring(response.content)
-        
-        # 1. 판시사항 추출 및 HTML <br/> 태그 처리
-        holding_elem = root.find('판시사항')
-        holding = holding_elem.text.strip().replace('<br/>', '\n') if holding_elem is not None and holding_elem.text else ""
-        
-        # 2. 판결요지 추출 (요지, 요지1, 요지2... 형태를 모두 포함하여 리스트로 정리)
-        summary_list = []
-        
-        # <판결요지> 태그의 내용 추출
-        summary_elem = root.find('판결요지')
-        if summary_elem is not None and summary_elem.text:
-            summary_list.append(summary_elem.text.strip())
-        
-        # 혹시 모를 요지N 형태의 태그 추출
-        i = 1
-        while True:
-            yoji_elem = root.find(f'요지{i}')
-            if yoji_elem is not None and yoji_elem.text:
-                summary_list.append(yoji_elem.text.strip())
-                i += 1
-            else:
-                break
-        
-        # 최종 리스트 정리: <br/> 태그를 개행 문자로 치환 및 공백 정리
-        summary_list = [s.replace('<br/>', '\n').strip() for s in summary_list if s.strip()]
-        
-        if not summary_list and not holding:
-            return None, None
-
-        return summary_list, holding
+        return parse_precedent_detail(response.content)
 
     except requests.exceptions.RequestException as e:
         print(f"⚠️ 판례 상세 요청 실패 (ID:{prec_id}): {e}")
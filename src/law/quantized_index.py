@@ -0,0 +1,210 @@
+import argparse
+import os
+import shutil
+import time
+
+import faiss
+import numpy as np
+
+# 벡터 저장 방식: flat(float32, 기본) / sq8(차원당 1byte) / fp16(차원당 2byte)
+STORAGE_KINDS = ("flat", "sq8", "fp16")
+INDEX_STORAGE = os.getenv("SAFESIGN_INDEX_STORAGE", "flat").lower()
+# 양자화 인덱스에서 k * RERANK_FACTOR개 후보를 뽑은 뒤 원본 벡터로 다시 정렬
+RERANK_FACTOR = int(os.getenv("SAFESIGN_RERANK_FACTOR", "4"))
+# 재정렬용 float32 원본 벡터 (index.faiss 옆에 저장, 검색 시 mmap으로 후보 행만 읽음)
+FULL_VECTORS_FILE = "vectors.f32.npy"
+
+_QTYPES = {"sq8": faiss.ScalarQuantizer.QT_8bit, "fp16": faiss.ScalarQuantizer.QT_fp16}
+
+
+def index_storage(index) -> str:
+    """FAISS 인덱스의 저장 방식 이름"""
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        for name, qtype in _QTYPES.items():
+            if index.sq.qtype == qtype:
+                return name
+    return "flat"
+
+
+def index_bytes(index) -> int:
+    """직렬화된 인덱스 크기(byte) = 워커가 메모리에 올리는 벡터 저장소 크기"""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def build_quantized(vectors, storage):
+    """float32 벡터로 SQ8/fp16 인덱스를 만든다 (langchain FAISS 기본값과 같은 L2 거리)"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = faiss.IndexScalarQuantizer(vectors.shape[1], _QTYPES[storage], faiss.METRIC_L2)
+    # sq8은 차원별 최솟값/범위를 학습해야 한다 (fp16은 학습할 것이 없음)
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def quantize_vectorstore(vectorstore, db_path, storage=INDEX_STORAGE):
+    """
+    langchain FAISS 저장소의 flat 인덱스를 SQ8/fp16 인덱스로 바꾸고, 원본 벡터는 db_path에 따로 저장합니다.
+    이후 vectorstore.save_local(db_path)를 호출하면 index.faiss에는 양자화된 벡터만 들어갑니다.
+    """
+    if storage == "flat":
+        return vectorstore
+    if storage not in _QTYPES:
+        raise ValueError(f"지원하지 않는 저장 방식입니다: {storage} (가능: {', '.join(STORAGE_KINDS)})")
+    vectors = vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal)
+    os.makedirs(db_path, exist_ok=True)
+    np.save(os.path.join(db_path, FULL_VECTORS_FILE), vectors)
+    vectorstore.index = build_quantized(vectors, storage)
+    print(f"🗜️ 벡터 저장 방식: {storage} ({vectors.nbytes / 1024:.0f}KB -> {index_bytes(vectorstore.index) / 1024:.0f}KB)")
+    return vectorstore
+
+
+def load_full_vectors(db_path):
+    """재정렬용 원본 벡터를 mmap으로 연다 (없으면 None). 검색할 때 후보 행만 디스크에서 읽힌다."""
+    path = os.path.join(db_path, FULL_VECTORS_FILE)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def search_positions(index, query_vector, k, full_vectors=None, rerank_factor=RERANK_FACTOR):
+    """
+    인덱스 내 위치(position) k개를 가까운 순으로 반환합니다.
+    양자화 인덱스이고 원본 벡터가 있으면 k * rerank_factor개 후보를 원본 벡터의 정확한 L2 거리로 다시 정렬합니다.
+    """
+    query = np.asarray([query_vector], dtype=np.float32)
+    if full_vectors is None or index_storage(index) == "flat":
+        _, positions = index.search(query, k)
+        return [int(p) for p in positions[0] if p >= 0]
+
+    _, positions = index.search(query, k * rerank_factor)
+    candidates = np.sort(positions[0][positions[0] >= 0])
+    if len(candidates) == 0:
+        return []
+    exact = np.asarray(full_vectors[candidates], dtype=np.float32)
+    distances = ((exact - query) ** 2).sum(axis=1)
+    return [int(candidates[i]) for i in np.argsort(distances, kind="stable")[:k]]
+
+
+def search_by_vector(vectorstore, query_vector, k, full_vectors=None, rerank_factor=RERANK_FACTOR):
+    """vectorstore.similarity_search_by_vector와 같은 Document 리스트 반환 (양자화 인덱스면 재정렬 포함)"""
+    if full_vectors is None or index_storage(vectorstore.index) == "flat":
+        return vectorstore.similarity_search_by_vector(query_vector, k=k)
+    docs = []
+    for position in search_positions(vectorstore.index, query_vector, k, full_vectors, rerank_factor):
+        doc_id = vectorstore.index_to_docstore_id[position]
+        doc = vectorstore.docstore.search(doc_id)
+        if not isinstance(doc, str):  # docstore는 못 찾으면 안내 문자열을 돌려준다
+            docs.append(doc)
+    return docs
+
+
+# ==========================================
+# 🛠️ 변환 / 보고서 도구
+# ==========================================
+def _load(db_path):
+    """FAISS 인덱스와 원본 벡터만 읽는다 (임베딩 모델이 필요 없음)"""
+    index = faiss.read_index(os.path.join(db_path, "index.faiss"))
+    full_vectors = load_full_vectors(db_path)
+    if full_vectors is None:
+        if index_storage(index) != "flat":
+            raise FileNotFoundError(f"{db_path}에 재정렬용 원본 벡터({FULL_VECTORS_FILE})가 없습니다.")
+        full_vectors = index.reconstruct_n(0, index.ntotal)
+    return index, np.asarray(full_vectors, dtype=np.float32)
+
+
+def convert(args):
+    """기존 flat DB를 SQ8/fp16 DB로 복사 변환 (index.pkl은 그대로 복사)"""
+    index, vectors = _load(args.db)
+    out = args.out or f"{args.db.rstrip('/')}_{args.storage}"
+    os.makedirs(out, exist_ok=True)
+    if os.path.exists(os.path.join(args.db, "index.pkl")):
+        shutil.copy(os.path.join(args.db, "index.pkl"), os.path.join(out, "index.pkl"))
+    np.save(os.path.join(out, FULL_VECTORS_FILE), vectors)
+    quantized = build_quantized(vectors, args.storage)
+    faiss.write_index(quantized, os.path.join(out, "index.faiss"))
+    print(f"✅ {args.db} -> {out} ({index_bytes(index) / 1024:.0f}KB -> {index_bytes(quantized) / 1024:.0f}KB)")
+
+
+def _queries(args, vectors):
+    """질의 벡터: 기본은 합성 조항을 실제 임베딩 모델로 인코딩, --self-queries면 저장된 벡터에 잡음을 더해 사용"""
+    rng = np.random.default_rng(args.seed)
+    if args.self_queries:
+        picked = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+        noise = rng.normal(scale=picked.std() * 0.3, size=picked.shape).astype(np.float32)
+        return picked + noise
+    from benchmarks.synthetic import generate_clauses
+    from .shared_resources import get_embeddings
+    return np.asarray(get_embeddings().embed_documents(generate_clauses(args.queries, seed=args.seed)), dtype=np.float32)
+
+
+def report(args):
+    """
+    저장 방식별 메모리 감소율과, 원본(flat) 검색 대비 top-k 일치율(재정렬 전/후), 검색 시간을 출력합니다.
+    """
+    from benchmarks.common import run_metadata, summarize, write_report
+
+    results = {"metadata": run_metadata(args), "stores": {}}
+    for db_path in args.db:
+        _, vectors = _load(db_path)
+        flat = faiss.IndexFlatL2(vectors.shape[1])
+        flat.add(vectors)
+        queries = _queries(args, vectors)
+        truth = [set(search_positions(flat, q, args.k)) for q in queries]
+        store = {"vectors": int(flat.ntotal), "dim": int(vectors.shape[1]), "flat_bytes": index_bytes(flat)}
+
+        print(f"\n📦 {db_path} ({flat.ntotal}건, {store['flat_bytes'] / 1024:.0f}KB)")
+        print(f"{'storage':<8} {'KB':>8} {'감소':>7} {f'top{args.k}':>8} {'rerank':>8} {'p50(ms)':>9}")
+        for storage in args.storage:
+            index = build_quantized(vectors, storage)
+            raw_overlap, rerank_overlap, latencies = [], [], []
+            for query, expected in zip(queries, truth):
+                raw_overlap.append(len(expected & set(search_positions(index, query, args.k))) / args.k)
+                start = time.perf_counter()
+                reranked = search_positions(index, query, args.k, vectors, args.rerank_factor)
+                latencies.append(time.perf_counter() - start)
+                rerank_overlap.append(len(expected & set(reranked)) / args.k)
+            size = index_bytes(index)
+            row = {
+                "bytes": size,
+                "reduction": 1 - size / store["flat_bytes"],
+                f"top{args.k}_agreement": sum(raw_overlap) / len(raw_overlap),
+                f"top{args.k}_agreement_reranked": sum(rerank_overlap) / len(rerank_overlap),
+                "search_latency_sec": summarize(latencies),
+            }
+            store[storage] = row
+            print(f"{storage:<8} {size / 1024:>8.0f} {row['reduction']:>7.1%} {row[f'top{args.k}_agreement']:>8.3f}"
+                  f" {row[f'top{args.k}_agreement_reranked']:>8.3f} {row['search_latency_sec']['p50'] * 1000:>9.2f}")
+        results["stores"][db_path] = store
+
+    if args.output:
+        write_report(args.output, results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FAISS 벡터 저장 방식(SQ8/fp16) 변환 및 비교")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = sub.add_parser("convert", help="기존 flat DB를 양자화 DB로 변환")
+    convert_parser.add_argument("--db", required=True)
+    convert_parser.add_argument("--storage", choices=["sq8", "fp16"], default="sq8")
+    convert_parser.add_argument("--out", help="출력 경로 (기본: <db>_<storage>)")
+
+    report_parser = sub.add_parser("report", help="메모리 감소율과 top-k 일치율 보고")
+    report_parser.add_argument("--db", nargs="+", default=["../data/faiss_law_db", "../data/faiss_precedent_db"])
+    report_parser.add_argument("--storage", nargs="+", choices=["sq8", "fp16"], default=["sq8", "fp16"])
+    report_parser.add_argument("--queries", type=int, default=100)
+    report_parser.add_argument("--seed", type=int, default=0)
+    report_parser.add_argument("--k", type=int, default=5)
+    report_parser.add_argument("--rerank-factor", type=int, default=RERANK_FACTOR)
+    report_parser.add_argument("--self-queries", action="store_true", help="임베딩 모델 없이 저장된 벡터+잡음을 질의로 사용")
+    report_parser.add_argument("--output", help="결과 JSON 경로 ('-'이면 표준출력)")
+
+    args = parser.parse_args(argv)
+    if args.command == "convert":
+        convert(args)
+    else:
+        report(args)
+
+
+if __name__ == "__main__":
+    main()
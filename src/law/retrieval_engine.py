@@ -0,0 +1,205 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import faiss
+import numpy as np
+
+from .doc_store import DOC_STORE, DOC_STORE_KINDS, load_doc_store
+from .legal_context import DB_PATH as LAW_DB_PATH, LawContextManager
+from .precedent_context import DB_PATH as PRECEDENT_DB_PATH, PrecedentContextManager
+from .quantized_index import INDEX_STORAGE, RERANK_FACTOR, build_quantized
+from .shared_resources import forget_vectorstore, get_embeddings
+from metrics import STAGE_SECONDS, embedding_labels
+from tracing import set_attributes, start_span
+
+SOURCE_TYPES = ("law", "precedent")
+# 조항 판별에 쓰는 기본 구성: 법령 2건 + 판례 1건
+DEFAULT_K_BY_SOURCE = {"law": 2, "precedent": 1}
+# 출처별 top-k를 한 번의 검색으로 채우기 위해 필요한 개수의 몇 배를 먼저 뽑는다
+OVERFETCH = 4
+
+
+@dataclass
+class RetrievalResult:
+    source_type: str            # "law" / "precedent"
+    doc_id: str                 # 원래 DB의 docstore ID
+    content: str                # max_chars를 주고 검색하면 앞부분 발췌
+    score: float                # L2 거리 (langchain similarity_search_with_score와 같이 작을수록 유사)
+    metadata: Dict = field(default_factory=dict)
+
+
+class UnifiedRetriever:
+    """
+    법령/판례 DB를 FAISS 인덱스 하나에 모아 두고, 질의 한 번에 출처별 top-k("법령 2건 + 판례 1건")를 돌려줍니다.
+    질의 임베딩, 초기화 확인, 검색이 조항마다 한 번씩만 일어납니다.
+
+    각 DB의 구축/로드는 기존 LawContextManager / PrecedentContextManager가 그대로 맡고,
+    여기서는 두 DB의 벡터를 출처 순서대로 이어 붙인다. (인덱스 위치 [start, end) 구간이 곧 출처)
+    SAFESIGN_INDEX_STORAGE가 sq8/fp16이면 통합 인덱스도 양자화하고 각 DB의 원본 벡터(mmap)로 재정렬합니다.
+    SAFESIGN_DOC_STORE=zstd이면 문서를 Document로 들고 있지 않고 DB별 압축 저장소(doc_store.py)에서 top-k만 꺼냅니다.
+    """
+    def __init__(self, embeddings=None, storage=INDEX_STORAGE, doc_store=DOC_STORE):
+        if doc_store not in DOC_STORE_KINDS:
+            raise ValueError(f"지원하지 않는 문서 저장 방식입니다: {doc_store} (가능: {', '.join(DOC_STORE_KINDS)})")
+        self.embeddings = embeddings or get_embeddings()
+        self.storage = storage
+        self.doc_store = doc_store
+        self.index = None
+        self.docs = []
+        self.doc_ids = []
+        self.stores = {}            # source_type -> CompressedDocStore (doc_store가 zstd일 때만)
+        self.ranges = {}            # source_type -> (start, end)
+        self.full_vectors = {}      # source_type -> 재정렬용 원본 벡터 (양자화 저장일 때만)
+
+    def initialize_database(self):
+        if self.index is not None:
+            return
+        managers = {
+            "law": (LawContextManager(embeddings=self.embeddings, storage=self.storage), LAW_DB_PATH),
+            "precedent": (PrecedentContextManager(embeddings=self.embeddings, storage=self.storage), PRECEDENT_DB_PATH),
+        }
+        all_vectors = []
+        total = 0
+        for source_type in SOURCE_TYPES:
+            manager, db_path = managers[source_type]
+            manager.initialize_database()
+            start = total
+            if manager.vectorstore is not None:
+                vectorstore = manager.vectorstore
+                n = vectorstore.index.ntotal
+                if self.doc_store == "zstd":
+                    self.stores[source_type] = load_doc_store(db_path, vectorstore)
+                else:
+                    ids = [vectorstore.index_to_docstore_id[i] for i in range(n)]
+                    self.doc_ids.extend(ids)
+                    self.docs.extend(vectorstore.docstore.search(doc_id) for doc_id in ids)
+                total += n
+                if manager.full_vectors is not None:
+                    self.full_vectors[source_type] = manager.full_vectors
+                    all_vectors.append(np.asarray(manager.full_vectors, dtype=np.float32))
+                else:
+                    all_vectors.append(vectorstore.index.reconstruct_n(0, n))
+                # 벡터는 통합 인덱스로 옮겼으므로 개별 DB 캐시는 내린다
+                forget_vectorstore(db_path, self.embeddings)
+            self.ranges[source_type] = (start, total)
+
+        if not all_vectors:
+            print("⚠️ 법령/판례 DB가 모두 없어 검색을 수행할 수 없습니다.")
+            return
+        vectors = np.concatenate(all_vectors)
+        if self.storage == "flat" or len(self.full_vectors) < len(all_vectors):
+            self.index = faiss.IndexFlatL2(vectors.shape[1])
+            self.index.add(vectors)
+            self.full_vectors = {}
+        else:
+            self.index = build_quantized(vectors, self.storage)
+        counts = ", ".join(f"{s} {end - start}건" for s, (start, end) in self.ranges.items())
+        print(f"✅ [초기화] 통합 검색 인덱스 준비 완료 ({counts}, 저장 방식: {self.storage if self.full_vectors else 'flat'}, "
+              f"문서: {self.doc_store})")
+
+    # ---- 검색 ----
+    def _source_of(self, position):
+        for source_type, (start, end) in self.ranges.items():
+            if start <= position < end:
+                return source_type, position - start
+        raise IndexError(position)
+
+    def _search(self, query, k, start=None, end=None):
+        """(위치, 거리) 목록. start/end를 주면 해당 출처 구간 안에서만 검색"""
+        params = faiss.SearchParameters(sel=faiss.IDSelectorRange(start, end)) if start is not None else None
+        distances, positions = self.index.search(query, k, params=params)
+        return [(int(p), float(d)) for p, d in zip(positions[0], distances[0]) if p >= 0]
+
+    def _rank(self, query, candidates, k):
+        """출처 하나의 후보를 거리순 k개로 자른다 (양자화 인덱스면 원본 벡터의 정확한 거리로 다시 계산)"""
+        if self.full_vectors and candidates:
+            rows = []
+            for position, _ in candidates:
+                source_type, local = self._source_of(position)
+                rows.append(np.asarray(self.full_vectors[source_type][local], dtype=np.float32))
+            exact = ((np.stack(rows) - query) ** 2).sum(axis=1)
+            candidates = [(position, float(d)) for (position, _), d in zip(candidates, exact)]
+        return sorted(candidates, key=lambda item: item[1])[:k]
+
+    def _document(self, source_type, position, max_chars=None):
+        """(doc_id, 본문, 메타데이터). 압축 저장소면 이 문서만 압축을 푼다"""
+        if self.stores:
+            store, local = self.stores[source_type], position - self.ranges[source_type][0]
+            return store.doc_id(local), store.text(local, max_chars), store.metadata(local)
+        doc = self.docs[position]
+        content = doc.page_content if max_chars is None else doc.page_content[:max_chars]
+        return self.doc_ids[position], content, dict(doc.metadata)
+
+    def search_by_vector(self, query_vector, k_by_source=None, max_chars=None) -> List[RetrievalResult]:
+        """
+        질의 벡터로 출처별 top-k 검색. 결과는 출처 순서(법령 -> 판례), 출처 안에서는 가까운 순.
+        max_chars를 주면 본문은 앞부분 max_chars자만 돌려준다.
+        """
+        k_by_source = {s: k for s, k in (k_by_source or DEFAULT_K_BY_SOURCE).items() if k > 0}
+        unknown = set(k_by_source) - set(SOURCE_TYPES)
+        if unknown:
+            raise ValueError(f"알 수 없는 source_type: {sorted(unknown)} (가능: {', '.join(SOURCE_TYPES)})")
+        if self.index is None or not k_by_source:
+            return []
+
+        query = np.asarray([query_vector], dtype=np.float32)
+        rerank = RERANK_FACTOR if self.full_vectors else 1
+        fetch = min(sum(k_by_source.values()) * OVERFETCH * rerank, self.index.ntotal)
+        grouped = {source_type: [] for source_type in k_by_source}
+        for position, distance in self._search(query, fetch):
+            source_type, _ = self._source_of(position)
+            if source_type in grouped:
+                grouped[source_type].append((position, distance))
+
+        results = []
+        for source_type, k in k_by_source.items():
+            start, end = self.ranges[source_type]
+            candidates = grouped[source_type]
+            # 상위 후보가 다른 출처에 몰려 모자라면 이 출처 구간에서만 다시 검색
+            if len(candidates) < k * rerank and len(candidates) < end - start:
+                candidates = self._search(query, min(k * rerank, end - start), start, end)
+            for position, distance in self._rank(query, candidates, k):
+                doc_id, content, metadata = self._document(source_type, position, max_chars)
+                results.append(RetrievalResult(
+                    source_type=source_type, doc_id=doc_id, content=content, score=distance, metadata=metadata,
+                ))
+        return results
+
+    def search(self, query, k_by_source=None, max_chars=None) -> List[RetrievalResult]:
+        """질의 문장으로 출처별 top-k 검색 (예: {"law": 2, "precedent": 1}, max_chars를 주면 본문 발췌)"""
+        k_by_source = k_by_source or DEFAULT_K_BY_SOURCE
+        if self.index is None:
+            self.initialize_database()
+        with start_span("retrieval", **{"retrieval.query_length": len(query), "retrieval.index_storage": self.storage,
+                                        **{f"retrieval.k.{s}": k for s, k in k_by_source.items()}}):
+            with STAGE_SECONDS.time(stage="embedding", store="unified", **embedding_labels(self.embeddings)):
+                query_vector = self.embeddings.embed_query(query)
+            with STAGE_SECONDS.time(stage="faiss_search", backend="faiss", store="unified"):
+                results = self.search_by_vector(query_vector, k_by_source, max_chars)
+            set_attributes(**{"retrieval.doc_ids": [
+                f"{r.source_type}:{r.metadata.get('case_number') or r.doc_id}" for r in results
+            ]})
+        return results
+
+    # ---- 기존 LawContextManager / PrecedentContextManager 호환 ----
+    def search_relevant_laws(self, query, k=2, max_chars=None):
+        return [r.content for r in self.search(query, {"law": k}, max_chars)]
+
+    def search_relevant_precedents(self, query, k=2, max_chars=None):
+        return [r.content for r in self.search(query, {"precedent": k}, max_chars)]
+
+
+_lock = threading.Lock()
+_retrievers = {}
+
+
+def get_retriever(embeddings=None) -> UnifiedRetriever:
+    """임베딩 객체당 하나의 통합 검색 엔진을 만들어 재사용 (요청마다 detector를 만들어도 인덱스는 한 번만 구성)"""
+    embeddings = embeddings or get_embeddings()
+    with _lock:
+        retriever = _retrievers.get(id(embeddings))
+        if retriever is None:
+            retriever = _retrievers[id(embeddings)] = UnifiedRetriever(embeddings)
+        retriever.initialize_database()
+        return retriever
@@ -0,0 +1,75 @@
+import os
+import threading
+
+# 법령/판례 DB가 함께 쓰는 임베딩 모델 (기존 FAISS 인덱스를 만들 때 쓴 모델과 같아야 함)
+EMBEDDING_MODEL_NAME = "jhgan/ko-sbert-nli"
+# 질의 인코더 실행 방식: torch(기본, HuggingFaceEmbeddings) / onnx-int8(law.onnx_embeddings, CPU 전용 노드용)
+EMBEDDING_BACKENDS = ("torch", "onnx-int8")
+EMBEDDING_BACKEND = os.getenv("SAFESIGN_EMBEDDING_BACKEND", "torch").lower()
+
+_lock = threading.Lock()
+_embeddings = {}
+_vectorstores = {}
+_default_embeddings = None
+
+
+def set_default_embeddings(embeddings):
+    """get_embeddings()가 모델 대신 돌려줄 임베딩 지정 (벤치마크/오프라인 실행에서 가짜 임베딩 주입용, None이면 해제)"""
+    global _default_embeddings
+    _default_embeddings = embeddings
+
+
+def get_embeddings(model_name=EMBEDDING_MODEL_NAME, backend=None):
+    """
+    프로세스당 한 번만 임베딩 모델을 불러와 재사용합니다.
+    (요청마다 detector를 만들어도 모델 로드는 첫 요청 또는 warmup에서 한 번만 일어남)
+    """
+    if _default_embeddings is not None:
+        return _default_embeddings
+    backend = backend or EMBEDDING_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"지원하지 않는 임베딩 백엔드입니다: {backend} (가능: {', '.join(EMBEDDING_BACKENDS)})")
+    with _lock:
+        key = (backend, model_name)
+        if key not in _embeddings:
+            if backend == "onnx-int8":
+                # ONNX 모델은 python -m law.onnx_embeddings export 로 미리 만들어 둔 것을 사용
+                from .onnx_embeddings import OnnxEmbeddings
+                _embeddings[key] = OnnxEmbeddings()
+            else:
+                # sentence-transformers/torch는 실제로 모델이 필요할 때 불러온다
+                from langchain_huggingface import HuggingFaceEmbeddings
+                _embeddings[key] = HuggingFaceEmbeddings(model_name=model_name)
+        return _embeddings[key]
+
+
+def _key(db_path, embeddings):
+    return os.path.abspath(db_path), id(embeddings)
+
+
+def load_vectorstore(db_path, embeddings):
+    """
+    로컬 FAISS DB를 (경로, 임베딩 객체) 단위로 한 번만 불러와 재사용합니다.
+    DB가 없으면 None, 로드에 실패하면 예외를 그대로 올립니다.
+    """
+    if not (os.path.exists(db_path) and os.path.isdir(db_path)):
+        return None
+    with _lock:
+        key = _key(db_path, embeddings)
+        if key not in _vectorstores:
+            from langchain_community.vectorstores import FAISS
+            # 로컬 DB 로드 (allow_dangerous_deserialization=True 설정)
+            _vectorstores[key] = FAISS.load_local(db_path, embeddings, allow_dangerous_deserialization=True)
+        return _vectorstores[key]
+
+
+def remember_vectorstore(db_path, embeddings, vectorstore):
+    """새로 구축해 저장한 DB를 이후 detector들이 다시 읽지 않도록 등록"""
+    with _lock:
+        _vectorstores[_key(db_path, embeddings)] = vectorstore
+
+
+def forget_vectorstore(db_path, embeddings):
+    """캐시에서 DB를 내린다 (통합 검색 엔진이 벡터를 옮겨 담은 뒤 같은 벡터를 두 벌 들고 있지 않도록)"""
+    with _lock:
+        _vectorstores.pop(_key(db_path, embeddings), None)
@@ -0,0 +1,257 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+LLM 호출 녹화/재생 (cassette)
+
+실제 Gemini/Ollama 실행에서 프롬프트 → 응답 쌍과 지연 시간을 JSONL 파일에 녹화해 두고,
+네트워크 없이 그대로 재생하여 LLM 이외 구간(검색, 청킹, 집계)의 성능을 재현 가능하게 측정합니다.
+두 어댑터 모두 DeepEvalBaseLLM이므로 detector의 evaluator_llm 자리에 그대로 넣으면 됩니다.
+
+    # 녹화 (실제 모델 필요)
+    python llm_cassette.py record --backend ollama --model hf.co/LiquidAI/LFM2-8B-A1B-GGUF:Q4_K_M --output ../data/cassettes/ollama.jsonl
+
+    # 재생 (오프라인)
+    llm = ReplayLLM("../data/cassettes/ollama.jsonl", timing="original")
+    detector = ToxicClauseDetectorOllama(evaluator_llm=llm)
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from deepeval.models.base_model import DeepEvalBaseLLM
+
+from structured_output import accepts_schema
+
+CASSETTE_VERSION = 1
+
+
+def prompt_key(prompt: str) -> str:
+    """카세트 조회 키 (프롬프트 원문의 SHA-256)"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def _as_text(response):
+    """구조화 출력(pydantic 객체)은 JSON 문자열로 녹화"""
+    return response.model_dump_json() if hasattr(response, "model_dump_json") else response
+
+
+class CassetteMissError(KeyError):
+    """재생 중 녹화되지 않은 프롬프트가 들어온 경우"""
+
+
+class RecordingLLM(DeepEvalBaseLLM):
+    """
+    실제 LLM 어댑터를 감싸서 호출마다 (프롬프트, 응답, 지연 시간)을 카세트 파일에 한 줄씩 추가합니다.
+    예외가 난 호출은 녹화하지 않고 그대로 다시 던집니다.
+    """
+    def __init__(self, inner: DeepEvalBaseLLM, cassette_path: str):
+        self.inner = inner
+        self.cassette_path = cassette_path
+        self.record_count = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(cassette_path)), exist_ok=True)
+
+    def load_model(self):
+        return self.inner.load_model()
+
+    def _record(self, prompt, response, latency_sec):
+        entry = {
+            "version": CASSETTE_VERSION,
+            "key": prompt_key(prompt),
+            "model": self.inner.get_model_name(),
+            "prompt": prompt,
+            "response": response,
+            "latency_sec": latency_sec,
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.cassette_path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.record_count += 1
+
+    def _schema_kwargs(self, schema):
+        # 스키마를 받는 어댑터에는 그대로 넘겨 녹화도 구조화 출력으로 한다 (재생 시에는 텍스트를 다시 검증)
+        return {"schema": schema} if schema is not None and accepts_schema(self.inner) else {}
+
+    def generate(self, prompt: str, schema=None):
+        start = time.perf_counter()
+        response = self.inner.generate(prompt, **self._schema_kwargs(schema))
+        self._record(prompt, _as_text(response), time.perf_counter() - start)
+        return response
+
+    async def a_generate(self, prompt: str, schema=None):
+        start = time.perf_counter()
+        response = await self.inner.a_generate(prompt, **self._schema_kwargs(schema))
+        self._record(prompt, _as_text(response), time.perf_counter() - start)
+        return response
+
+    def get_model_name(self):
+        return self.inner.get_model_name()
+
+
+class ReplayLLM(DeepEvalBaseLLM):
+    """
+    카세트 파일의 응답을 돌려주는 오프라인 LLM.
+
+    timing="instant"  : 지연 없이 즉시 응답
+    timing="original" : 녹화된 지연 시간 * speed 만큼 기다린 뒤 응답
+
+    같은 프롬프트가 여러 번 녹화되어 있으면 녹화 순서대로 돌려주고, 다 쓰면 마지막 응답을 반복합니다.
+    녹화되지 않은 프롬프트는 fallback LLM이 있으면 그쪽으로 넘기고, 없으면 CassetteMissError를 던집니다.
+    """
+    def __init__(self, cassette_path: str, timing="instant", speed=1.0, fallback: DeepEvalBaseLLM = None):
+        if timing not in ("instant", "original"):
+            raise ValueError(f"timing은 'instant' 또는 'original'이어야 합니다: {timing}")
+        self.cassette_path = cassette_path
+        self.timing = timing
+        self.speed = speed
+        self.fallback = fallback
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = defaultdict(list)
+        self._cursor = defaultdict(int)
+        self.model_name = "replay"
+
+        with open(cassette_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._entries[entry["key"]].append(entry)
+                self.model_name = entry.get("model") or self.model_name
+        print(f"📼 카세트 로드 완료: {cassette_path} (프롬프트 {len(self._entries)}종)")
+
+    def load_model(self):
+        return self.model_name
+
+    def _lookup(self, prompt):
+        key = prompt_key(prompt)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                return None
+            index = min(self._cursor[key], len(entries) - 1)
+            self._cursor[key] += 1
+            self.hits += 1
+            return entries[index]
+
+    def _delay(self, entry):
+        if self.timing == "instant":
+            return 0.0
+        return entry.get("latency_sec", 0.0) * self.speed
+
+    def _miss(self, prompt):
+        return CassetteMissError(f"카세트에 없는 프롬프트입니다 (key={prompt_key(prompt)[:12]}): {prompt[:80]!r}")
+
+    def generate(self, prompt: str) -> str:
+        entry = self._lookup(prompt)
+        if entry is None:
+            if self.fallback is None:
+                raise self._miss(prompt)
+            return self.fallback.generate(prompt)
+        delay = self._delay(entry)
+        if delay:
+            time.sleep(delay)
+        return entry["response"]
+
+    async def a_generate(self, prompt: str) -> str:
+        entry = self._lookup(prompt)
+        if entry is None:
+            if self.fallback is None:
+                raise self._miss(prompt)
+            return await self.fallback.a_generate(prompt)
+        delay = self._delay(entry)
+        if delay:
+            await asyncio.sleep(delay)
+        return entry["response"]
+
+    def get_model_name(self):
+        return self.model_name
+
+
+def _load_clauses(args):
+    if args.contract:
+        from clause_segmenter import parse_text_to_chunks
+        with open(args.contract, encoding="utf-8") as f:
+            return parse_text_to_chunks(f.read())
+    from benchmarks.synthetic import generate_clauses
+    return generate_clauses(args.clauses, seed=args.seed)
+
+
+def record(args):
+    """실제 backend로 detect + 개선안 생성을 한 번 돌리면서 모든 LLM 호출을 녹화"""
+    if args.backend == "gemini":
+        from llm_service import LLM_gemini
+        from toxic_detector import GeminiDeepEvalAdapter, ToxicClauseDetector
+        api_key = args.api_key or os.getenv("GEMINI_API_KEY")
+        inner = GeminiDeepEvalAdapter(LLM_gemini(gemini_api_key=api_key, model=args.model or "gemini-2.5-flash-lite"))
+        recorder = RecordingLLM(inner, args.output)
+        detector = ToxicClauseDetector(api_key=api_key, evaluator_llm=recorder)
+    else:
+        from ollama_detctor import OllamaDeepEvalAdapter, ToxicClauseDetectorOllama
+        model = args.model or "hf.co/LiquidAI/LFM2-8B-A1B-GGUF:Q4_K_M"
+        recorder = RecordingLLM(OllamaDeepEvalAdapter(model_name=model), args.output)
+        detector = ToxicClauseDetectorOllama(model_name=model, evaluator_llm=recorder)
+
+    clauses = _load_clauses(args)
+    results = detector.detect(clauses, max_concurrent=args.max_concurrent)
+    if not args.skip_suggestions:
+        for res in results:
+            if res["is_toxic"]:
+                detector.generate_easy_suggestion(res)
+    print(f"📼 녹화 완료: {args.output} ({recorder.record_count}건)")
+
+
+def info(args):
+    """카세트 파일 요약 (호출 수, 모델, 녹화 지연 시간 합계)"""
+    entries = []
+    with open(args.cassette, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    latencies = [e.get("latency_sec", 0.0) for e in entries]
+    print(json.dumps({
+        "entries": len(entries),
+        "unique_prompts": len({e["key"] for e in entries}),
+        "models": sorted({e.get("model", "") for e in entries}),
+        "total_latency_sec": sum(latencies),
+        "max_latency_sec": max(latencies) if latencies else 0.0,
+    }, ensure_ascii=False, indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LLM 호출 녹화/재생 카세트 도구")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="실제 LLM으로 detect를 실행하며 카세트 녹화")
+    rec.add_argument("--backend", choices=["ollama", "gemini"], default="ollama")
+    rec.add_argument("--model", default=None)
+    rec.add_argument("--api-key", default=None, help="Gemini API 키 (기본: GEMINI_API_KEY)")
+    rec.add_argument("--contract", default=None, help="계약서 텍스트 파일 (없으면 합성 조항 사용)")
+    rec.add_argument("--clauses", type=int, default=20)
+    rec.add_argument("--seed", type=int, default=0)
+    rec.add_argument("--max-concurrent", type=int, default=1)
+    rec.add_argument("--skip-suggestions", action="store_true", help="개선안 생성 호출은 녹화하지 않음")
+    rec.add_argument("--output", required=True, help="카세트 JSONL 경로 (이미 있으면 뒤에 추가)")
+
+    inf = sub.add_parser("info", help="카세트 파일 요약")
+    inf.add_argument("cassette")
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        record(args)
+    else:
+        info(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from deepeval.models.base_model import DeepEvalBaseLLM
+
+from metrics import STAGE_SECONDS, STRUCTURED_OUTPUT_FAILURES, STRUCTURED_RETRIES
+from structured_output import JUDGE_MAX_RETRIES, StructuredOutputError, accepts_schema, parse_structured
+from tracing import start_span
+from usage import usage_stage
+
+# count_llm_calls() 범위마다 하나씩 쌓이는 호출 수 카운터 (스레드/요청마다 따로 센다)
+_call_counters: ContextVar[tuple] = ContextVar("safesign_llm_call_counters", default=())
+_counter_lock = threading.Lock()
+
+
+class CallCounter:
+    def __init__(self):
+        self.count = 0
+
+
+@contextmanager
+def count_llm_calls():
+    """
+    이 범위(같은 context) 안에서 InstrumentedLLM이 불린 횟수를 센다 (재시도 포함).
+    여러 조항을 동시에 판별해도 다른 조항의 호출이 섞이지 않는다.
+    """
+    counter = CallCounter()
+    token = _call_counters.set(_call_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _call_counters.reset(token)
+
+
+class InstrumentedLLM(DeepEvalBaseLLM):
+    """
+    DeepEval 모델을 감싸서 호출마다 소요 시간을 STAGE_SECONDS{stage=...}에 기록하고 'llm.<stage>' span을 남깁니다.
+    호출 중에는 usage_stage(stage)가 설정되어 토큰 사용량도 같은 단계로 집계됩니다.
+    G-Eval 채점용 모델로 넘기면 Gemini(evaluate 병렬)와 Ollama(순차) 모두 LLM 호출 단위로 judge 시간이 잡힙니다.
+    (실패 횟수는 결과를 해석하는 detector 쪽에서 센다)
+
+    schema를 주면(G-Eval의 {score, reason}) 안쪽 모델에 그대로 넘기고, 스키마를 모르는 모델이면 텍스트를 받아 검증합니다.
+    검증에 실패한 응답은 버리고 최대 max_retries번 다시 생성합니다.
+    """
+    def __init__(self, inner: DeepEvalBaseLLM, stage: str, backend: str, max_retries: int = JUDGE_MAX_RETRIES):
+        self.inner = inner
+        self.stage = stage
+        self.backend = backend
+        self.max_retries = max_retries
+        self._inner_accepts_schema = accepts_schema(inner)
+        # 전체 누적 호출 수 (조항 하나의 호출 수는 count_llm_calls()로 센다)
+        self.call_count = 0
+        self._lock = threading.Lock()
+
+    def load_model(self):
+        return self.inner.load_model()
+
+    def _labels(self):
+        return {"stage": self.stage, "backend": self.backend, "model": self.inner.get_model_name()}
+
+    def _span(self, prompt):
+        with self._lock:
+            self.call_count += 1
+        counters = _call_counters.get()
+        if counters:
+            with _counter_lock:
+                for counter in counters:
+                    counter.count += 1
+        return start_span(f"llm.{self.stage}", **{
+            "llm.backend": self.backend,
+            "llm.model": self.inner.get_model_name(),
+            "llm.prompt_length": len(prompt),
+        })
+
+    def _schema_kwargs(self, schema):
+        return {"schema": schema} if self._inner_accepts_schema else {}
+
+    def _reject(self, span, error):
+        """스키마에 맞지 않는 응답을 기록하고 버린다"""
+        STRUCTURED_OUTPUT_FAILURES.inc(backend=self.backend, model=self.inner.get_model_name(), stage=self.stage)
+        span.set_attribute("llm.structured_output_error", str(error)[:200])
+        print(f"⚠️ [{self.stage}] 스키마에 맞지 않는 응답, 다시 생성합니다: {error}")
+
+    def _give_up(self, schema):
+        STRUCTURED_RETRIES.observe(self.max_retries, backend=self.backend, stage=self.stage)
+        return StructuredOutputError(f"{self.max_retries + 1}번 생성했지만 {schema.__name__} 스키마에 맞는 응답을 받지 못했습니다.")
+
+    def generate(self, prompt: str, schema=None):
+        if schema is None:
+            with self._span(prompt) as span, usage_stage(self.stage), STAGE_SECONDS.time(**self._labels()):
+                response = self.inner.generate(prompt)
+                span.set_attribute("llm.response_length", len(response or ""))
+                return response
+
+        for attempt in range(self.max_retries + 1):
+            with self._span(prompt) as span, usage_stage(self.stage), STAGE_SECONDS.time(**self._labels()):
+                try:
+                    result = parse_structured(self.inner.generate(prompt, **self._schema_kwargs(schema)), schema)
+                except StructuredOutputError as e:
+                    self._reject(span, e)
+                    continue
+            STRUCTURED_RETRIES.observe(attempt, backend=self.backend, stage=self.stage)
+            return result
+        raise self._give_up(schema)
+
+    async def a_generate(self, prompt: str, schema=None):
+        if schema is None:
+            with self._span(prompt) as span, usage_stage(self.stage), STAGE_SECONDS.time(**self._labels()):
+                response = await self.inner.a_generate(prompt)
+                span.set_attribute("llm.response_length", len(response or ""))
+                return response
+
+        for attempt in range(self.max_retries + 1):
+            with self._span(prompt) as span, usage_stage(self.stage), STAGE_SECONDS.time(**self._labels()):
+                try:
+                    result = parse_structured(await self.inner.a_generate(prompt, **self._schema_kwargs(schema)), schema)
+                except StructuredOutputError as e:
+                    self._reject(span, e)
+                    continue
+            STRUCTURED_RETRIES.observe(attempt, backend=self.backend, stage=self.stage)
+            return result
+        raise self._give_up(schema)
+
+    def get_model_name(self):
+        return self.inner.get_model_name()
@@ -3,20 +3,22 @@
 # LICENSE file in the root directory of this source tree.
 from google import genai
 from google.genai import types
+import contextvars
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 
-# 1. gemini 객체 만들기
-class LLM_gemini():
-    # 사용자의 API Key와 사용할 모델을 입력
-    def __init__(self, gemini_api_key, model):
-        self.GEMINI_API_KEY = gemini_api_key
-        self.model_name = model
-        self.client = genai.Client(api_key=self.GEMINI_API_KEY)
+from pdf_splitter import count_pdf_pages, split_pdf_pages, stitch_page_texts
+from gemini_pool import get_client_pool
+from gemini_scheduler import estimate_pdf_tokens, estimate_tokens, get_scheduler, total_tokens
+from metrics import FAILURES, STAGE_SECONDS
+from usage import record_gemini_usage
 
-    # pdf를 text로 추출하는 함수
-    # 아직까지는 pdf를 text로 추출할 때만 gemini를 사용하기 때문에 client를 함수 내부에서 생성했다.
-    # 입력값은 pdf_bytes = st.file_uploader().read()
-    def pdf_to_text(self, pdf_file_bytes):
-        extraction_prompt = """
+# PDF 텍스트 추출용 프롬프트
+# 프롬프트를 수정하면 EXTRACTION_PROMPT_VERSION도 올려야 추출 캐시가 새로 만들어진다.
+EXTRACTION_PROMPT_VERSION = "v1"
+EXTRACTION_PROMPT = """
         당신은 법률 문서 텍스트 추출 전문가입니다. 
         제공된 PDF 파일의 내용을 읽고, 아래 [출력 양식]에 맞춰 텍스트만 정확하게 추출하세요.
         
@@ -35,27 +37,182 @@ class LLM_gemini():
         1. 월 급여는...
         2. 위 급여에는...
         """
-        
-        response = self.client.models.generate_content(
-                model=self.model_name,
+
+# 페이지 분할 추출 시 덧붙이는 프롬프트
+PAGE_RANGE_PROMPT = """
+        [추가 규칙 - 페이지 분할 추출]
+        이 파일은 전체 {total}페이지 문서 중 {start}~{end}페이지만 잘라낸 것입니다.
+        - 페이지가 조항 중간에서 시작하면 제목을 새로 만들지 말고 본문부터 그대로 적으십시오.
+        - 페이지가 조항 중간에서 끝나면 요약하지 말고 보이는 곳까지만 적으십시오.
+        """
+
+
+def extraction_prompt_version(pages_per_chunk=None):
+    """추출 캐시 키에 들어갈 프롬프트 버전 (페이지 분할 추출은 프롬프트가 달라 별도 버전)"""
+    if pages_per_chunk:
+        return f"{EXTRACTION_PROMPT_VERSION}-pages{pages_per_chunk}"
+    return EXTRACTION_PROMPT_VERSION
+
+# 1. gemini 객체 만들기
+class LLM_gemini():
+    # 사용자의 API Key와 사용할 모델을 입력
+    # genai.Client는 요청마다 만들지 않고 (API Key, 모델) 단위 풀에서 재사용한다.
+    # 모든 호출은 API Key별 스케줄러(RPM/TPM 한도, 적응형 동시 호출 수, 429/5xx 재시도)를 거친다. (gemini_scheduler.py)
+    def __init__(self, gemini_api_key, model, pool=None, scheduler=None):
+        self.GEMINI_API_KEY = gemini_api_key
+        self.model_name = model
+        self.pool = pool or get_client_pool()
+        self.scheduler = scheduler or get_scheduler(gemini_api_key)
+
+    @property
+    def client(self):
+        return self.pool.get_client(self.GEMINI_API_KEY, self.model_name)
+
+    def _generate_content(self, kind, estimated_tokens, contents, config=None, stage=None):
+        """스케줄러를 거쳐 generate_content 호출 (재시도마다 풀에서 클라이언트를 새로 빌리고, 성공한 호출만 사용량 기록)"""
+        def call():
+            with self.pool.lease(self.GEMINI_API_KEY, self.model_name) as client:
+                start = time.perf_counter()
+                response = client.models.generate_content(model=self.model_name, contents=contents, config=config)
+            record_gemini_usage(self.model_name, response, time.perf_counter() - start, stage=stage)
+            return response
+        return self.scheduler.run(kind, estimated_tokens, call, used_tokens=total_tokens)
+
+    # pdf를 text로 추출하는 함수
+    # 아직까지는 pdf를 text로 추출할 때만 gemini를 사용하기 때문에 client를 함수 내부에서 생성했다.
+    # 입력값은 pdf_bytes = st.file_uploader().read()
+    # pages_per_chunk를 지정하면 PDF를 페이지 단위로 나누어 병렬로 추출한다. (대용량 스캔본용)
+    def pdf_to_text(self, pdf_file_bytes, pages_per_chunk=None, max_concurrent=4, on_progress=None):
+        if pages_per_chunk:
+            return self.pdf_to_text_parallel(pdf_file_bytes, pages_per_chunk, max_concurrent, on_progress)
+
+        with self._track_extraction():
+            response = self._generate_content(
+                "pdf", estimate_pdf_tokens(count_pdf_pages(pdf_file_bytes)),
                 contents=[
                     genai.types.Part.from_bytes(data=pdf_file_bytes, mime_type="application/pdf"),
-                    extraction_prompt 
-                ]
+                    EXTRACTION_PROMPT
+                ],
+                stage="pdf_extraction",
             )
         return response.text
-    
+
+    @contextmanager
+    def _track_extraction(self):
+        """PDF 추출 전체 소요 시간과 실패 횟수를 지표로 기록"""
+        with STAGE_SECONDS.time(stage="pdf_extraction", backend="gemini", model=self.model_name):
+            try:
+                yield
+            except Exception:
+                FAILURES.inc(stage="pdf_extraction", backend="gemini")
+                raise
+
+    def pdf_to_text_parallel(self, pdf_file_bytes, pages_per_chunk=2, max_concurrent=4, on_progress=None):
+        """
+        PDF를 페이지 범위로 나누어 최대 max_concurrent개씩 동시에 추출한 뒤, 페이지 순서대로 이어 붙입니다.
+        on_progress(완료된 페이지 수, 전체 페이지 수, (시작 페이지, 끝 페이지))가 범위마다 호출됩니다.
+        """
+        page_ranges = split_pdf_pages(pdf_file_bytes, pages_per_chunk)
+        total_pages = page_ranges[-1][1] if page_ranges else 0
+
+        def extract_range(page_range):
+            start, end, chunk_bytes = page_range
+            response = self._generate_content(
+                "pdf", estimate_pdf_tokens(end - start + 1),
+                contents=[
+                    genai.types.Part.from_bytes(data=chunk_bytes, mime_type="application/pdf"),
+                    EXTRACTION_PROMPT + PAGE_RANGE_PROMPT.format(start=start, end=end, total=total_pages)
+                ],
+                stage="pdf_extraction",
+            )
+            return response.text or ""
+
+        page_texts = [""] * len(page_ranges)
+        done_pages = 0
+        with self._track_extraction(), ThreadPoolExecutor(max_workers=max(1, max_concurrent)) as executor:
+            # 사용량 집계 범위(contextvar)가 워커 스레드에도 적용되도록 작업마다 context를 복사해서 실행
+            futures = {
+                executor.submit(contextvars.copy_context().run, extract_range, page_range): i
+                for i, page_range in enumerate(page_ranges)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                page_texts[i] = future.result()
+                start, end, _ = page_ranges[i]
+                done_pages += end - start + 1
+                if on_progress:
+                    on_progress(done_pages, total_pages, (start, end))
+
+        return stitch_page_texts(page_texts)
+
+    def _stream_content(self, kind, estimated_tokens, contents, config=None, stage=None):
+        """
+        스케줄러를 거쳐 generate_content_stream 호출, 텍스트 조각을 받는 대로 yield 합니다.
+        첫 조각을 받기 전에 실패하면 스케줄러 규칙대로 재시도하고, 이미 내보낸 뒤의 실패는 중복 텍스트가 생기므로 그대로 올린다.
+        """
+        for attempt in itertools.count():
+            yielded = False
+            try:
+                with self.scheduler.slot(kind, estimated_tokens) as usage, \
+                        self.pool.lease(self.GEMINI_API_KEY, self.model_name) as client:
+                    start = time.perf_counter()
+                    stream = client.models.generate_content_stream(model=self.model_name, contents=contents, config=config)
+                    last_chunk = None
+                    for chunk in stream:
+                        last_chunk = chunk
+                        if chunk.text:
+                            yielded = True
+                            yield chunk.text
+                    # 스트리밍 응답은 마지막 조각의 usage_metadata에 전체 사용량이 들어 있다
+                    if last_chunk is not None:
+                        usage["tokens"] = total_tokens(last_chunk)
+                        record_gemini_usage(self.model_name, last_chunk, time.perf_counter() - start, stage=stage)
+                return
+            except Exception as e:
+                if yielded or not self.scheduler.retry_after_error(kind, e, attempt):
+                    raise
+
+    def pdf_to_text_stream(self, pdf_file_bytes):
+        """
+        PDF 추출 결과를 Gemini 스트리밍 API로 받아 도착하는 대로 텍스트 조각을 yield 합니다.
+        (추출이 끝나기 전에 완성된 조항부터 분석을 시작하기 위함)
+        """
+        with self._track_extraction():
+            yield from self._stream_content(
+                "pdf", estimate_pdf_tokens(count_pdf_pages(pdf_file_bytes)),
+                contents=[
+                    genai.types.Part.from_bytes(data=pdf_file_bytes, mime_type="application/pdf"),
+                    EXTRACTION_PROMPT
+                ],
+                stage="pdf_extraction",
+            )
+
     # prompt에 맞는 텍스트를 출력하는 함수
     # toxic_detector.py에서 필요하다.
-    def generate(self,prompt):
+    # response_schema(pydantic 모델)를 주면 JSON 출력을 스키마에 맞게 제한한다 (response.parsed에 객체가 담김)
+    # max_output_tokens를 주면 출력 토큰 수를 제한한다 (점수만 받는 판별 등)
+    def generate(self,prompt, response_schema=None, max_output_tokens=None):
+        structured = {"response_mime_type": "application/json", "response_schema": response_schema} if response_schema else {}
+        if max_output_tokens:
+            structured["max_output_tokens"] = max_output_tokens
         # [수정] config에 temperature=0.0 추가
-        response = self.client.models.generate_content(
-            model=self.model_name,
+        # 토큰 사용량은 호출한 쪽의 usage_stage(judge / suggestion 등)로 기록된다
+        return self._generate_content(
+            "generate", estimate_tokens(prompt, max_output_tokens),
             contents=prompt,
             config=types.GenerateContentConfig(
-                temperature=0.0  # 0.0으로 설정하면 가장 논리적이고 일관된 답변을 줍니다.
-            )
+                temperature=0.0,  # 0.0으로 설정하면 가장 논리적이고 일관된 답변을 줍니다.
+                **structured
+            ),
         )
-        return response
-    
 
+    def generate_stream(self, prompt):
+        """
+        generate의 스트리밍 버전: 응답 텍스트 조각을 받는 대로 yield 합니다. (개선안을 토큰 단위로 보여주기 위함)
+        스트림은 받는 쪽 속도에 따라 길어지므로 일반 호출의 기준 지연과 섞이지 않게 "stream" 종류로 스케줄링한다.
+        """
+        yield from self._stream_content(
+            "stream", estimate_tokens(prompt),
+            contents=prompt,
+            config=types.GenerateContentConfig(temperature=0.0),
+        )
@@ -0,0 +1,301 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+단계별 지연 시간/처리량 지표 (Prometheus 텍스트 형식)
+
+외부 의존성 없이 Counter / Gauge / Histogram 을 제공하며, fast_api의 GET /metrics 에서
+REGISTRY.render() 결과를 그대로 내보냅니다. 지표는 프로세스 단위이므로
+uvicorn worker를 여러 개 띄우면 worker마다 따로 수집됩니다.
+
+    with STAGE_SECONDS.time(stage="judge", backend="ollama", model=model_name):
+        ...
+    CLAUSES_PROCESSED.inc(backend="ollama", model=model_name, outcome="toxic")
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# LLM 호출(수 초~수십 초)과 FAISS 검색(수 ms)을 모두 담을 수 있는 구간
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+
+    def _key(self, labels) -> Tuple:
+        unknown = set(labels) - set(self.labelnames)
+        if unknown:
+            raise ValueError(f"{self.name}: 정의되지 않은 label {sorted(unknown)}")
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _label_text(self, key: Tuple, extra: Tuple = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """단조 증가 카운터"""
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counter는 감소할 수 없습니다.")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        return [f"{self.name}{self._label_text(key)} {_format_value(v)}" for key, v in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """현재 값 (진행 중인 요청 수 등)"""
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self):
+        return [f"{self.name}{self._label_text(key)} {_format_value(v)}" for key, v in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """누적 버킷 히스토그램 (_bucket, _sum, _count)"""
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """블록 실행 시간(초)을 기록. 예외가 나도 기록한다."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, **labels) -> Dict:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if state is None:
+                return {"count": 0, "sum": 0.0}
+            return {"count": state["count"], "sum": state["sum"]}
+
+    def _samples(self):
+        lines = []
+        for key, state in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._label_text(key, (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {state['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"이미 등록된 지표입니다: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# stage: pdf_extraction / chunking / embedding / faiss_search / judge / suggestion
+# store: 검색 단계에서만 사용 (law / precedent)
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "safesign_stage_duration_seconds", "단계별 소요 시간(초)", ["stage", "backend", "model", "store"]
+))
+CLAUSES_PROCESSED = REGISTRY.register(Counter(
+    "safesign_clauses_processed_total", "판별을 마친 조항(판별 단위) 수", ["backend", "model", "outcome"]
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "safesign_cache_lookups_total", "캐시 조회 수 (result=hit/miss)", ["cache", "result"]
+))
+FAILURES = REGISTRY.register(Counter(
+    "safesign_failures_total", "단계별 실패 수", ["stage", "backend"]
+))
+LLM_CALLS = REGISTRY.register(Counter(
+    "safesign_llm_calls_total", "사용량이 기록된 LLM 호출 수", ["backend", "model", "stage"]
+))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "safesign_llm_tokens_total", "LLM 토큰 사용량 (kind=prompt/output)", ["backend", "model", "stage", "kind"]
+))
+LLM_COST_USD = REGISTRY.register(Counter(
+    "safesign_llm_estimated_cost_usd_total", "단가표 기준 추정 LLM 비용(USD)", ["backend", "model", "stage"]
+))
+# phase: prompt_eval(프롬프트 처리) / eval(생성) / load(모델 적재). 응답에 단계별 시간이 있는 Ollama만 기록
+LLM_PHASE_SECONDS = REGISTRY.register(Counter(
+    "safesign_llm_phase_seconds_total", "LLM 호출의 단계별 처리 시간 합(초)", ["backend", "model", "stage", "phase"]
+))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "safesign_in_flight_requests", "처리 중인 HTTP 요청 수 (스트리밍 응답은 전송이 끝날 때까지)", ["endpoint"]
+))
+STRUCTURED_OUTPUT_FAILURES = REGISTRY.register(Counter(
+    "safesign_structured_output_failures_total", "스키마에 맞지 않아 버리고 다시 생성한 LLM 응답 수", ["backend", "model", "stage"]
+))
+# 판별(judge)은 조항마다 구조화 출력 호출이 한 번이므로 조항당 재시도 수가 된다
+STRUCTURED_RETRIES = REGISTRY.register(Histogram(
+    "safesign_llm_structured_retries", "구조화 출력 호출 한 번에 필요했던 재시도 수", ["backend", "stage"], buckets=(0, 1, 2, 3, 5)
+))
+JUDGE_REASONS = REGISTRY.register(Counter(
+    "safesign_judge_reasons_total", "2단계 판별에서 판단 이유 처리 방식별 조항 수 (generated/skipped/deferred)", ["backend", "outcome"]
+))
+HEDGE_CALLS = REGISTRY.register(Counter(
+    "safesign_hedge_calls_total",
+    "헤징 대상 LLM 호출 결과 (outcome=primary/primary_won/secondary_won/timeout/error)", ["primary", "secondary", "outcome"]
+))
+HEDGE_DELAY = REGISTRY.register(Gauge(
+    "safesign_hedge_delay_seconds", "현재 헤징 지연 (primary 최근 지연 시간의 백분위, 초)", ["primary"]
+))
+OLLAMA_MODEL_LOADS = REGISTRY.register(Counter(
+    "safesign_ollama_model_loads_total", "Ollama 모델 적재 횟수 (reason=preload/request, request는 유휴 후 재적재)", ["model", "reason"]
+))
+OLLAMA_MODEL_LOAD_SECONDS = REGISTRY.register(Histogram(
+    "safesign_ollama_model_load_seconds", "Ollama 모델 적재 시간(초, 응답의 load_duration)", ["model", "reason"]
+))
+OLLAMA_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "safesign_ollama_queue_wait_seconds", "Ollama 호출 슬롯을 기다린 시간(초)", ["priority"]
+))
+OLLAMA_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "safesign_ollama_queue_depth", "Ollama 호출 슬롯을 기다리는 요청 수", ["priority"]
+))
+GEMINI_CONCURRENCY_LIMIT = REGISTRY.register(Gauge(
+    "safesign_gemini_concurrency_limit",
+    "Gemini 동시 호출 수 한도의 Key 종류별 합계 (AIMD로 조정, key_class=server(GEMINI_API_KEY)/user)", ["key_class"]
+))
+GEMINI_SCHEDULER_WAIT = REGISTRY.register(Histogram(
+    "safesign_gemini_scheduler_wait_seconds", "Gemini 호출이 동시 호출 자리와 RPM/TPM 여유를 기다린 시간(초)", ["kind"]
+))
+GEMINI_RETRIES = REGISTRY.register(Counter(
+    "safesign_gemini_retries_total", "Gemini 호출 재시도 횟수 (reason=rate_limited/server_error/timeout)", ["kind", "reason"]
+))
+OLLAMA_HOST_IN_FLIGHT = REGISTRY.register(Gauge(
+    "safesign_ollama_host_in_flight", "Ollama 서버별 처리 중인 호출 수", ["host"]
+))
+OLLAMA_HOST_UP = REGISTRY.register(Gauge(
+    "safesign_ollama_host_up", "Ollama 서버 상태 (1=라우팅 대상, 0=헬스 체크 실패로 제외)", ["host"]
+))
+OLLAMA_HOST_REQUESTS = REGISTRY.register(Counter(
+    "safesign_ollama_host_requests_total", "Ollama 서버별 호출 결과 (outcome=ok/error/host_error/cancelled, host_error는 다른 서버로 재시도)", ["host", "outcome"]
+))
+
+
+def embedding_labels(embeddings) -> Dict[str, str]:
+    """임베딩 객체에서 backend/model label 값을 뽑는다 (HuggingFaceEmbeddings, 가짜 임베딩 등)"""
+    return {
+        "backend": type(embeddings).__name__,
+        "model": getattr(embeddings, "model_name", "") or "",
+    }
+
+
+class InFlightMiddleware:
+    """
+    요청 시작부터 응답 본문 전송이 끝날 때까지 IN_FLIGHT 게이지를 올려 둔다.
+    (StreamingResponse도 마지막 이벤트까지 포함되도록 순수 ASGI 미들웨어로 구현)
+    """
+    def __init__(self, app, endpoints=(), exclude=("/metrics",)):
+        self.app = app
+        self.endpoints = set(endpoints)
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or path in self.exclude:
+            await self.app(scope, receive, send)
+            return
+        # 임의 경로로 label이 무한히 늘어나지 않도록 등록된 엔드포인트만 그대로 쓴다
+        endpoint = path if not self.endpoints or path in self.endpoints else "other"
+        with IN_FLIGHT.track_inprogress(endpoint=endpoint):
+            await self.app(scope, receive, send)
@@ -1,10 +1,9 @@
+import copy
 import os
 import time
 from typing import List, Dict, Union
-from dotenv import load_dotenv
 
-# Ollama & DeepEval Imports
-import ollama
+# DeepEval Imports
 from deepeval.metrics import GEval
 from deepeval.test_case import LLMTestCase, LLMTestCaseParams
 from deepeval.models.base_model import DeepEvalBaseLLM
@@ -12,10 +11,16 @@ from deepeval.metrics.g_eval import Rubric
 from deepeval.evaluate import AsyncConfig
 
 # Project Modules
-from law.legal_context import LawContextManager
-from law.precedent_context import PrecedentContextManager
-
-load_dotenv()
+from metrics import CLAUSES_PROCESSED, FAILURES, STAGE_SECONDS
+from llm_instrumentation import InstrumentedLLM, count_llm_calls
+from tracing import set_attributes, start_span
+from usage import record_ollama_usage, usage_scope, usage_stage
+from ollama_manager import get_ollama_manager, ollama_priority
+from structured_output import current_output_token_budget, parse_structured
+from two_phase_judge import DEFERRED_REASON_ITEM, JUDGE_MODE, TwoPhaseJudge, check_judge_mode
+from deadline import clause_deadline
+from hedging import HEDGE_BACKEND, HEDGE_MODEL, HedgedLLM
+from law.retrieval_engine import get_retriever
 
 # --- 1. DeepEval용 Ollama 어댑터 (ollama.chat 사용) ---
 class OllamaDeepEvalAdapter(DeepEvalBaseLLM):
@@ -30,45 +35,70 @@ class OllamaDeepEvalAdapter(DeepEvalBaseLLM):
     def load_model(self):
         return self.model_name
 
-    def generate(self, prompt: str) -> str:
+    def _chat(self, prompt: str, **kwargs):
         """
-        공식 ollama.chat 함수를 사용하여 답변을 생성합니다.
+        공식 ollama chat을 사용하여 답변을 생성합니다.
+        (keep_alive 고정과 우선순위 큐를 위해 공유 OllamaBackendManager를 거친다)
         """
-        try:
-            response = ollama.chat(
-                model=self.model_name,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                stream=False
-            )
-            return response['message']['content']
-        except Exception as e:
-            return f"Ollama Generation Error: {e}"
-
-    async def a_generate(self, prompt: str) -> str:
-        return self.generate(prompt)
+        budget = current_output_token_budget()
+        if budget:
+            kwargs["options"] = {**kwargs.get("options", {}), "num_predict": budget}
+        response = get_ollama_manager().chat(
+            model=self.model_name,
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt,
+                }
+            ],
+            **kwargs,
+        )
+        # prompt_eval_count / eval_count / total_duration 기록
+        record_ollama_usage(self.model_name, response)
+        return response['message']['content']
+
+    def generate(self, prompt: str, schema=None):
+        if schema is not None:
+            # format에 JSON 스키마를 주면 Ollama가 스키마에 맞는 토큰만 생성한다 (판별 결과 {score, reason})
+            return parse_structured(self._chat(prompt, format=schema.model_json_schema()), schema)
+        # 실패를 문자열로 바꿔 돌려주면 헤징(hedging.py)이 성공으로 보고 다른 백엔드로 넘기지 않으므로 그대로 올린다
+        return self._chat(prompt)
+
+    def generate_stream(self, prompt: str):
+        """ollama chat(stream=True) 응답 조각을 받는 대로 yield (개선안 스트리밍)"""
+        last_chunk = None
+        for chunk in get_ollama_manager().chat_stream(model=self.model_name, messages=[{"role": "user", "content": prompt}]):
+            last_chunk = chunk
+            if chunk['message']['content']:
+                yield chunk['message']['content']
+        # 사용량은 마지막(done) 조각에 들어 있다
+        if last_chunk is not None:
+            record_ollama_usage(self.model_name, last_chunk)
+
+    async def a_generate(self, prompt: str, schema=None):
+        return self.generate(prompt, schema)
 
     def get_model_name(self):
         return self.model_name
 
 # --- 2. 독소조항 판별기 (Ollama 버전) ---
 class ToxicClauseDetectorOllama:
-    def __init__(self, model_name="llama3"):
+    # evaluator_llm / embeddings를 넘기면 기본 Ollama 어댑터, 임베딩 모델 대신 사용 (벤치마크, 오프라인 실행용)
+    # judge_mode="two-phase"면 점수만 먼저 받고 이유는 기준 점수 이상인 조항만 생성 (two_phase_judge.py)
+    # hedge_backend="gemini"면 Ollama가 늦을 때 Gemini(hedge_api_key 또는 GEMINI_API_KEY)로 헤징 (hedging.py)
+    def __init__(self, model_name="llama3", evaluator_llm=None, embeddings=None, judge_mode=JUDGE_MODE,
+                 hedge_backend=HEDGE_BACKEND, hedge_api_key=None):
         print(f"🛡️ ToxicClauseDetector (Ollama: {model_name}) 초기화 중...")
+        self.judge_mode = check_judge_mode(judge_mode)
         
-        # Ollama 어댑터 연결
-        self.evaluator_llm = OllamaDeepEvalAdapter(model_name=model_name)
-        
-        # DB 매니저 초기화 (RAG)
-        self.law_manager = LawContextManager()
-        self.law_manager.initialize_database()
+        # Ollama 어댑터 연결 (호출마다 요청/조항 마감 시각까지만 기다리고, 설정되어 있으면 예비 백엔드로 헤징)
+        secondary = None if evaluator_llm else self._hedge_llm(hedge_backend, hedge_api_key)
+        self.evaluator_llm = HedgedLLM(evaluator_llm or OllamaDeepEvalAdapter(model_name=model_name), secondary)
         
-        self.precedent_manager = PrecedentContextManager()
-        self.precedent_manager.initialize_database()
+        # 법령/판례 통합 검색 엔진 (RAG, 프로세스당 한 번 구성)
+        self.retriever = get_retriever(embeddings)
+        # 기존 코드 호환: search_relevant_laws / search_relevant_precedents를 그대로 제공
+        self.law_manager = self.precedent_manager = self.retriever
 
         # [평가 기준] - Gemini 버전과 동일
         self.toxic_criteria = """
@@ -108,23 +138,43 @@ class ToxicClauseDetectorOllama:
         ]
         
         # G-Eval Metric 객체 생성
+        # 심사위원 호출은 InstrumentedLLM으로 감싸서 호출 시간/span/호출 수를 기록
+        self.judge_llm = InstrumentedLLM(self.evaluator_llm, stage="judge", backend="ollama")
         self.toxic_metric = GEval(
             name="Toxicity Score (Ollama)",
             criteria=self.toxic_criteria,
             rubric=self.rubric,
             evaluation_steps=self.evaluation_steps,
-            model=self.evaluator_llm, # Ollama가 심사위원
+            model=self.judge_llm, # Ollama가 심사위원
             threshold=5, 
             evaluation_params=[LLMTestCaseParams.INPUT, LLMTestCaseParams.RETRIEVAL_CONTEXT]
         )
+        self.two_phase = None
+        if self.judge_mode == "two-phase":
+            self.two_phase = TwoPhaseJudge(self.judge_llm, self.toxic_criteria, self.evaluation_steps, self.rubric, backend="ollama")
+
+    @staticmethod
+    def _hedge_llm(hedge_backend, api_key):
+        """헤징용 예비 백엔드 (현재는 Gemini만 지원, 키가 없으면 헤징 없이 타임아웃만 적용)"""
+        if not hedge_backend:
+            return None
+        if hedge_backend != "gemini":
+            raise ValueError(f"지원하지 않는 헤징 백엔드입니다: {hedge_backend} (가능: gemini)")
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            print("⚠️ Gemini API Key가 없어 헤징 없이 타임아웃만 적용합니다.")
+            return None
+        from llm_service import LLM_gemini
+        from toxic_detector import GeminiDeepEvalAdapter
+        return GeminiDeepEvalAdapter(LLM_gemini(gemini_api_key=api_key, model=HEDGE_MODEL))
 
     def _retrieve_context(self, clause_text):
-        # 1. 법령 검색
-        laws = self.law_manager.search_relevant_laws(clause_text, k=2)
+        # 법령 2건 + 판례 1건을 한 번에 검색
+        results = self.retriever.search(clause_text, {"law": 2, "precedent": 1})
+        laws = [r.content for r in results if r.source_type == "law"]
         law_text = "\n".join(laws) if laws else "관련 법령 검색 결과 없음"
 
-        # 2. 판례 검색
-        precedents = self.precedent_manager.search_relevant_precedents(clause_text, k=1)
+        precedents = [r.content for r in results if r.source_type == "precedent"]
         precedent_text = precedents[0] if precedents else "관련 판례 검색 결과 없음"
 
         return f"=== [관련 법령] ===\n{law_text}\n\n=== [관련 판례] ===\n{precedent_text}"
@@ -141,69 +191,142 @@ class ToxicClauseDetectorOllama:
         # 순차 처리 Loop
         for i, text in enumerate(clause_texts):
             print(f"   Processing Clause {i+1}/{len(clause_texts)}...", end="\r")
-            
-            # 1. RAG 검색
-            retrieved_context = self._retrieve_context(text)
-            original_map[text] = retrieved_context
-            
-            # 2. Test Case 생성
-            test_case = LLMTestCase(
-                input=text,
-                actual_output="평가 대상",
-                retrieval_context=[retrieved_context]
-            )
-
-            # 3. 평가 실행 (Try-Except로 보호)
+            # 조항 타임아웃 = 남은 요청 예산을 남은 조항 수로 나눈 값 (멈춘 호출 하나가 뒤 조항을 모두 붙잡지 않도록)
+            with start_span("clause", **{"clause.index": i, "clause.length": len(text), "llm.backend": "ollama"}), \
+                    usage_scope() as clause_usage, clause_deadline(len(clause_texts) - i):
+                result = self._detect_one(i, text, original_map)
+            result["usage"] = clause_usage.summary()
+            formatted_results.append(result)
+
+        print("\n✅ 모든 평가가 완료되었습니다.")
+        return formatted_results
+
+    def _detect_one(self, i, text, original_map):
+        """조항 하나에 대한 검색 + 판별 (detect의 순차 Loop 본문)"""
+        # 1. RAG 검색
+        retrieved_context = self._retrieve_context(text)
+        original_map[text] = retrieved_context
+
+        # 2. Test Case 생성
+        test_case = LLMTestCase(
+            input=text,
+            actual_output="평가 대상",
+            retrieval_context=[retrieved_context]
+        )
+
+        # 3. 평가 실행 (Try-Except로 보호)
+        # 같은 detector로 여러 조항을 동시에 판별할 수 있으므로 (/upload/analyze judge_concurrency>1)
+        # 호출 수는 이 조항의 context에서만 세고, G-Eval은 호출마다 복사본으로 채점해 score/reason이 섞이지 않게 한다.
+        # (얕은 복사: 채점 모델(judge_llm)은 공유하고 measure가 기록하는 score/reason 등 속성만 따로 둔다)
+        reason_deferred = False
+        with count_llm_calls() as call_counter:
             try:
-                self.toxic_metric.measure(test_case)
-                
-                # 성공 시 데이터 추출
-                metric_score = self.toxic_metric.score
-                metric_reason = self.toxic_metric.reason
-                
-                # 점수 보정 (0.0~1.0 -> 0~10)
-                risk_score = metric_score
-                if risk_score <= 1.0:
-                    risk_score *= 10
-                
+                if self.two_phase:
+                    risk_score, metric_reason, reason_deferred = self.two_phase.judge(text, retrieved_context)
+                else:
+                    metric = copy.copy(self.toxic_metric)
+                    metric.measure(test_case)
+
+                    # 성공 시 데이터 추출
+                    metric_score = metric.score
+                    metric_reason = metric.reason
+
+                    # 점수 보정 (0.0~1.0 -> 0~10)
+                    risk_score = metric_score
+                    if risk_score <= 1.0:
+                        risk_score *= 10
+
                 is_toxic = risk_score >= 4.0
+                outcome = "toxic" if is_toxic else "safe"
 
+            except TimeoutError as e:
+                # 제한 시간 초과 (DeadlineExceeded) - 다음 조항으로 넘어간다
+                print(f"\n⏰ [Skip Clause {i+1}] 판별 시간 초과: {e}")
+                risk_score = 0
+                is_toxic = False
+                metric_reason = f"판별 시간 초과: {e}"
+                outcome = "timeout"
+                FAILURES.inc(stage="judge", backend="ollama")
             except Exception as e:
                 # 실패 시
                 print(f"\n⚠️ [Skip Clause {i+1}] 모델 응답 오류: {e}")
                 risk_score = 0
                 is_toxic = False
                 metric_reason = f"Ollama 모델 출력 오류 (JSON Parsing Failed): {e}"
+                outcome = "error"
+                FAILURES.inc(stage="judge", backend="ollama")
 
-            # 결과 저장
-            formatted_results.append({
-                "clause": text,
-                "is_toxic": is_toxic,
-                "risk_score": round(risk_score, 1),
-                "reason": metric_reason,
-                "context_used": retrieved_context
-            })
-
-        print("\n✅ 모든 평가가 완료되었습니다.")
-        return formatted_results
+        CLAUSES_PROCESSED.inc(backend="ollama", model=self.evaluator_llm.get_model_name(), outcome=outcome)
+        judge_calls = call_counter.count
+        # 2단계 판별은 이유까지 생성하면 정상적으로 두 번 호출한다
+        expected_calls = self.two_phase.expected_calls(risk_score) if self.two_phase else 1
+        set_attributes(**{
+            "judge.mode": self.judge_mode,
+            "judge.outcome": outcome,
+            "judge.risk_score": float(risk_score),
+            "judge.llm_calls": judge_calls,
+            "judge.retry_count": max(0, judge_calls - expected_calls),
+        })
 
-    def generate_easy_suggestion(self, detection_result):
-        """Ollama를 이용해 쉬운 해석 및 수정 제안 생성"""
-        if not detection_result['is_toxic']:
-            return "✅ **안전한 조항입니다.**"
+        # 결과 저장
+        result = {
+            "index": i,
+            "clause": text,
+            "is_toxic": is_toxic,
+            "risk_score": round(risk_score, 1),
+            "reason": metric_reason,
+            "context_used": retrieved_context,
+            # safe / toxic만 실제 판별 결과 (timeout / error는 점수 0으로 채운 자리 표시)
+            "outcome": outcome,
+        }
+        if reason_deferred:
+            result["reason_deferred"] = True
+        return result
 
-        prompt = f"""
+    def _suggestion_prompt(self, detection_result):
+        return f"""
         당신은 근로자 편인 법률 전문가입니다. 다음 독소조항을 분석하세요.
         
         [원문]: {detection_result['clause']}
         [위험 판단 이유]: {detection_result['reason']}
         [법적 근거]: {detection_result['context_used']}
 
-        다음 두 가지를 마크다운 형식으로 작성해주세요 (한국어):
+        다음 항목을 마크다운 형식으로 작성해주세요 (한국어):
         1. **⚠️ 쉬운 해석**: 근로자가 이해하기 쉽게 1~2문장으로 요약.
         2. **💡 수정 제안**: 법에 맞는 공정한 조항 예시.
+        {DEFERRED_REASON_ITEM if detection_result.get('reason_deferred') else ""}
+        """
+
+    def generate_easy_suggestion(self, detection_result):
+        """Ollama를 이용해 쉬운 해석 및 수정 제안 생성"""
+        if not detection_result['is_toxic']:
+            return "✅ **안전한 조항입니다.**"
+
+        prompt = self._suggestion_prompt(detection_result)
+        # 개선안은 조항 판별(interactive)보다 낮은 우선순위로 Ollama 슬롯을 받는다
+        with start_span("suggestion", **{"llm.backend": "ollama", "llm.prompt_length": len(prompt)}), usage_stage("suggestion"), \
+                ollama_priority("suggestion"), \
+                STAGE_SECONDS.time(stage="suggestion", backend="ollama", model=self.evaluator_llm.get_model_name()):
+            return self.evaluator_llm.generate(prompt)
+
+    def generate_easy_suggestion_stream(self, detection_result):
+        """
+        generate_easy_suggestion의 스트리밍 버전: Ollama stream=True 응답 조각을 생성되는 대로 yield 합니다.
+        (스트리밍을 지원하지 않는 모델은 전체 결과를 한 번에 yield)
         """
-        return self.evaluator_llm.generate(prompt)
+        if not detection_result['is_toxic']:
+            yield "✅ **안전한 조항입니다.**"
+            return
+
+        prompt = self._suggestion_prompt(detection_result)
+        stream = getattr(self.evaluator_llm, "generate_stream", None)
+        with start_span("suggestion", **{"llm.backend": "ollama", "llm.prompt_length": len(prompt), "llm.stream": stream is not None}), \
+                usage_stage("suggestion"), ollama_priority("suggestion"), \
+                STAGE_SECONDS.time(stage="suggestion", backend="ollama", model=self.evaluator_llm.get_model_name()):
+            if stream is None:
+                yield self.evaluator_llm.generate(prompt)
+            else:
+                yield from stream(prompt)
 
 # --- 실행 테스트 ---
 if __name__ == "__main__":
@@ -0,0 +1,406 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Ollama 모델 수명 관리 + 우선순위 호출 큐
+
+- 설정된 모델을 시작 시 미리 적재하고, 모든 호출에 keep_alive를 명시해 유휴 후 언로드되지 않게 고정합니다.
+  (keep_alive를 빼고 호출하면 Ollama 기본값 5분으로 다시 설정되어 한동안 쉬면 다음 계약서가 모델 적재를 기다림)
+- 서버마다 동시 호출 수(OLLAMA_NUM_PARALLEL과 맞춤)를 제한하고, 빈 자리는 우선순위가 높은 호출부터 받습니다.
+  interactive(조항 판별) > suggestion(개선안) > batch(일괄 작업), 같은 우선순위는 먼저 온 순서.
+- 응답의 load_duration으로 모델 적재 이벤트를 지표로 남깁니다.
+- 여러 Ollama 서버(SAFESIGN_OLLAMA_HOSTS)를 풀로 묶어, 호출마다 (처리 중 호출 수 + 1) x 최근 지연이 가장 작은 서버로 보냅니다.
+  연결 실패/5xx가 난 서버는 라우팅에서 빼고 다른 서버로 다시 호출하며, 헬스 체크(/api/ps)가 성공하면 다시 넣습니다.
+
+    with ollama_priority("suggestion"):
+        detector.generate_easy_suggestion(result)
+
+환경변수
+  SAFESIGN_OLLAMA_MODELS          적재/고정할 모델 (쉼표 구분, 기본: 판별 모델)
+  SAFESIGN_OLLAMA_KEEP_ALIVE      keep_alive 값 (기본 -1 = 언로드하지 않음, 예: 30m)
+  SAFESIGN_OLLAMA_HOSTS           Ollama 서버 주소 (쉼표 구분, 기본: OLLAMA_HOST 하나)
+  SAFESIGN_OLLAMA_MAX_CONCURRENT  서버 하나당 동시 호출 수 (기본 OLLAMA_NUM_PARALLEL 또는 1)
+  SAFESIGN_OLLAMA_PRELOAD         0이면 서버 시작 시 적재하지 않음
+  SAFESIGN_OLLAMA_TIMEOUT_SEC     HTTP 호출 하나의 최대 시간 (기본 300, 0이면 제한 없음. 멈춘 호출이 슬롯을 계속 잡고 있지 않도록)
+  SAFESIGN_OLLAMA_HEALTH_INTERVAL_SEC  서버가 2대 이상일 때 헬스 체크 주기 (기본 10, 0이면 끔)
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+import ollama
+
+from deadline import DeadlineExceeded, remaining_sec
+from detectors import DEFAULT_OLLAMA_MODEL
+from metrics import (OLLAMA_HOST_IN_FLIGHT, OLLAMA_HOST_REQUESTS, OLLAMA_HOST_UP, OLLAMA_MODEL_LOAD_SECONDS, OLLAMA_MODEL_LOADS,
+                     OLLAMA_QUEUE_DEPTH, OLLAMA_QUEUE_WAIT)
+
+OLLAMA_MODELS = [m.strip() for m in os.getenv("SAFESIGN_OLLAMA_MODELS", DEFAULT_OLLAMA_MODEL).split(",") if m.strip()]
+OLLAMA_KEEP_ALIVE = os.getenv("SAFESIGN_OLLAMA_KEEP_ALIVE", "-1")
+OLLAMA_MAX_CONCURRENT = int(os.getenv("SAFESIGN_OLLAMA_MAX_CONCURRENT", os.getenv("OLLAMA_NUM_PARALLEL", "1")))
+OLLAMA_PRELOAD = os.getenv("SAFESIGN_OLLAMA_PRELOAD", "1") != "0"
+OLLAMA_TIMEOUT_SEC = float(os.getenv("SAFESIGN_OLLAMA_TIMEOUT_SEC", "300"))
+OLLAMA_HOSTS = [h.strip() for h in os.getenv("SAFESIGN_OLLAMA_HOSTS", "").split(",") if h.strip()]
+OLLAMA_HEALTH_INTERVAL_SEC = float(os.getenv("SAFESIGN_OLLAMA_HEALTH_INTERVAL_SEC", "10"))
+
+# 숫자가 작을수록 먼저 슬롯을 받는다
+PRIORITIES = {"interactive": 0, "suggestion": 1, "batch": 2}
+# 이보다 짧은 load_duration은 이미 적재된 모델의 준비 시간으로 보고 적재 이벤트로 세지 않는다
+LOAD_EVENT_MIN_SEC = 0.5
+# 서버별 최근 지연의 지수 이동 평균 가중치 (새 표본 비중)
+LATENCY_EWMA_ALPHA = 0.3
+
+_priority: ContextVar[str] = ContextVar("safesign_ollama_priority", default="interactive")
+
+
+@contextmanager
+def ollama_priority(priority: str):
+    """블록 안의 Ollama 호출 우선순위 지정 (interactive / suggestion / batch)"""
+    if priority not in PRIORITIES:
+        raise ValueError(f"알 수 없는 우선순위입니다: {priority} (가능: {', '.join(PRIORITIES)})")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class PriorityLimiter:
+    """동시 실행 수를 limit으로 제한하고, 자리가 나면 (우선순위, 도착 순서)가 가장 앞선 대기자에게 준다"""
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._active = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, priority: int, timeout=None):
+        """
+        슬롯을 받을 때까지 기다린다. timeout(초) 안에 받지 못하면 대기열에서 빠지고 DeadlineExceeded
+        (마감이 지난 호출이 줄에 남아 있다가 뒤늦게 쓸모없는 생성으로 슬롯을 잡지 않도록)
+        """
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            while self._active >= self.limit or self._waiting[0] != ticket:
+                wait_sec = None if give_up_at is None else give_up_at - time.monotonic()
+                if wait_sec is not None and wait_sec <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    # 맨 앞이 바뀌었을 수 있으므로 남은 대기자를 깨운다
+                    self._cond.notify_all()
+                    raise DeadlineExceeded(f"Ollama 호출 슬롯을 {timeout:.1f}초 안에 받지 못했습니다.")
+                self._cond.wait(wait_sec)
+            heapq.heappop(self._waiting)
+            self._active += 1
+            # 자리가 더 남아 있으면 다음 대기자도 깨운다
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int, timeout=None):
+        self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def _load_seconds(response) -> float:
+    """ollama 응답(dict 또는 pydantic 객체)의 load_duration(ns)을 초로"""
+    try:
+        value = response["load_duration"]
+    except (KeyError, TypeError):
+        value = getattr(response, "load_duration", None)
+    return (value or 0) / 1e9
+
+
+def _slot_timeout():
+    """슬롯 대기 한도: 요청/조항 마감까지 남은 시간 (이미 지났으면 0, 마감이 없으면 None)"""
+    remaining = remaining_sec()
+    return None if remaining is None else max(0.0, remaining)
+
+
+def _is_host_failure(error) -> bool:
+    """서버 자체의 문제(연결 실패, 타임아웃, 5xx)인지. 모델 없음 같은 4xx는 다른 서버로 보내도 같으므로 제외"""
+    if isinstance(error, (ConnectionError, httpx.TransportError)):
+        return True
+    return isinstance(error, ollama.ResponseError) and error.status_code >= 500
+
+
+class OllamaHost:
+    """풀에 속한 Ollama 서버 하나 (상태 값은 OllamaHostPool의 lock 안에서만 바꾼다)"""
+    def __init__(self, url, timeout=OLLAMA_TIMEOUT_SEC, max_concurrent=OLLAMA_MAX_CONCURRENT):
+        # url이 None이면 OLLAMA_HOST 환경변수 (없으면 localhost:11434)
+        self.url = url or os.getenv("OLLAMA_HOST") or "localhost:11434"
+        self.client = ollama.Client(host=url, timeout=timeout or None)
+        # 이 서버의 동시 호출 슬롯 (전체 합으로 제한하면 한 서버에 슬롯 수보다 많은 호출이 몰릴 수 있다)
+        self.limiter = PriorityLimiter(max_concurrent)
+        # 이 서버로 보낸 호출 수 (슬롯을 기다리는 호출 포함)
+        self.in_flight = 0
+        self.latency_sec = None
+        self.healthy = True
+        self.last_error = None
+
+    def expected_wait(self, default_latency) -> float:
+        """이 서버로 보냈을 때의 예상 소요 시간: (앞선 호출 수 / 슬롯 수 + 1) x 최근 지연"""
+        latency = self.latency_sec if self.latency_sec is not None else default_latency
+        return (self.in_flight // self.limiter.limit + 1) * latency
+
+
+class OllamaHostPool:
+    """
+    처리 중 호출 수와 최근 지연으로 가장 한가한 서버를 고르고, 실패한 서버는 헬스 체크가 성공할 때까지 뺀다.
+    서버가 2대 이상이면 백그라운드 스레드가 health_interval마다 모든 서버의 /api/ps를 확인한다.
+    """
+    def __init__(self, urls=None, timeout=OLLAMA_TIMEOUT_SEC, health_interval=OLLAMA_HEALTH_INTERVAL_SEC, max_concurrent=OLLAMA_MAX_CONCURRENT):
+        self.hosts = [OllamaHost(url, timeout, max_concurrent) for url in (urls or [None])]
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._rotation = itertools.count()
+        self._health_thread = None
+        for host in self.hosts:
+            OLLAMA_HOST_UP.set(1, host=host.url)
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def acquire(self, exclude=()) -> OllamaHost:
+        """
+        예상 소요 시간이 가장 짧은 정상 서버를 골라 처리 중 호출 수를 올린다 (같으면 돌아가며).
+        정상 서버가 없으면 빼 둔 서버 중에서라도 고른다 (모두 실패로 보일 때 호출 자체를 막지 않도록)
+        """
+        self._start_health_checks()
+        with self._lock:
+            candidates = [h for h in self.hosts if h not in exclude and h.healthy] or [h for h in self.hosts if h not in exclude] or self.hosts
+            measured = [h.latency_sec for h in self.hosts if h.latency_sec is not None]
+            # 아직 지연 기록이 없는 서버는 다른 서버 평균으로 가정 (0으로 두면 첫 응답 전까지 호출이 몰림)
+            default_latency = sum(measured) / len(measured) if measured else 1.0
+            offset = next(self._rotation)
+            rotated = candidates[offset % len(candidates):] + candidates[:offset % len(candidates)]
+            host = min(rotated, key=lambda h: h.expected_wait(default_latency))
+            host.in_flight += 1
+        OLLAMA_HOST_IN_FLIGHT.inc(host=host.url)
+        return host
+
+    def release(self, host: OllamaHost, elapsed=None, error=None):
+        """호출이 끝난 서버를 돌려준다. 성공이면 지연을 기록하고, 서버 문제로 실패했으면 라우팅에서 뺀다"""
+        with self._lock:
+            host.in_flight -= 1
+            if error is None and elapsed is not None:
+                host.latency_sec = elapsed if host.latency_sec is None else (
+                    LATENCY_EWMA_ALPHA * elapsed + (1 - LATENCY_EWMA_ALPHA) * host.latency_sec)
+        OLLAMA_HOST_IN_FLIGHT.dec(host=host.url)
+        if error is None:
+            # elapsed 없이 돌려받으면 스트림을 받는 쪽이 중간에 그만둔 호출
+            OLLAMA_HOST_REQUESTS.inc(host=host.url, outcome="ok" if elapsed is not None else "cancelled")
+        elif _is_host_failure(error):
+            OLLAMA_HOST_REQUESTS.inc(host=host.url, outcome="host_error")
+            self.mark_down(host, error)
+        else:
+            OLLAMA_HOST_REQUESTS.inc(host=host.url, outcome="error")
+
+    def mark_down(self, host: OllamaHost, error):
+        if len(self.hosts) < 2:
+            # 서버가 하나뿐이면 뺄 곳이 없으므로 상태만 기록
+            host.last_error = str(error)
+            return
+        with self._lock:
+            was_healthy, host.healthy, host.last_error = host.healthy, False, str(error)
+        OLLAMA_HOST_UP.set(0, host=host.url)
+        if was_healthy:
+            print(f"⚠️ Ollama 서버 {host.url} 라우팅 제외: {error}")
+
+    def mark_up(self, host: OllamaHost):
+        with self._lock:
+            was_healthy, host.healthy, host.last_error = host.healthy, True, None
+        OLLAMA_HOST_UP.set(1, host=host.url)
+        if not was_healthy:
+            print(f"✅ Ollama 서버 {host.url} 헬스 체크 통과, 라우팅 복귀")
+
+    def check_health(self):
+        """모든 서버의 /api/ps를 호출해 상태를 갱신"""
+        for host in self.hosts:
+            try:
+                host.client.ps()
+            except Exception as e:
+                self.mark_down(host, e)
+            else:
+                self.mark_up(host)
+
+    def status(self):
+        """서버별 상태: 정상 여부, 처리 중 호출 수, 최근 지연(초), 마지막 오류"""
+        with self._lock:
+            return {h.url: {"healthy": h.healthy, "in_flight": h.in_flight, "latency_sec": h.latency_sec, "last_error": h.last_error}
+                    for h in self.hosts}
+
+    def _start_health_checks(self):
+        if len(self.hosts) < 2 or self.health_interval <= 0 or self._health_thread is not None:
+            return
+        with self._lock:
+            if self._health_thread is not None:
+                return
+            self._health_thread = threading.Thread(target=self._health_loop, daemon=True, name="safesign-ollama-health")
+        self._health_thread.start()
+
+    def _health_loop(self):
+        while True:
+            time.sleep(self.health_interval)
+            self.check_health()
+
+
+class OllamaBackendManager:
+    def __init__(self, models=None, keep_alive=OLLAMA_KEEP_ALIVE, max_concurrent=OLLAMA_MAX_CONCURRENT, hosts=None, timeout=OLLAMA_TIMEOUT_SEC):
+        self.models = list(models or OLLAMA_MODELS)
+        self.keep_alive = keep_alive
+        # hosts를 주지 않으면 SAFESIGN_OLLAMA_HOSTS, 그것도 없으면 OLLAMA_HOST 하나
+        # max_concurrent는 서버 하나당 슬롯 수 (서버마다 우선순위 큐를 따로 둔다)
+        self.pool = OllamaHostPool(hosts or OLLAMA_HOSTS, timeout=timeout, max_concurrent=max_concurrent)
+
+    def _record_load(self, model, response, reason):
+        load_sec = _load_seconds(response)
+        if load_sec < LOAD_EVENT_MIN_SEC:
+            return
+        OLLAMA_MODEL_LOADS.inc(model=model, reason=reason)
+        OLLAMA_MODEL_LOAD_SECONDS.observe(load_sec, model=model, reason=reason)
+        if reason != "preload":
+            print(f"⚠️ Ollama 모델 재적재 발생: {model} ({load_sec:.1f}s) - keep_alive 설정을 확인하세요.")
+
+    def preload(self, models=None):
+        """
+        모든 서버에 모델을 올리고 keep_alive로 고정합니다. (빈 프롬프트 generate = 응답 생성 없이 적재만)
+        모델별 소요 시간(초, 서버 중 가장 오래 걸린 값)을 반환하며, 실패한 모델/서버는 건너뛰고 출력만 합니다.
+        """
+        timings = {}
+        for model in models or self.models:
+            for host in self.pool.hosts:
+                start = time.perf_counter()
+                try:
+                    response = host.client.generate(model=model, prompt="", keep_alive=self.keep_alive)
+                except Exception as e:
+                    print(f"⚠️ Ollama 모델 적재 실패: {model} @ {host.url} ({e})")
+                    if _is_host_failure(e):
+                        self.pool.mark_down(host, e)
+                    continue
+                elapsed = time.perf_counter() - start
+                timings[model] = max(timings.get(model, 0.0), elapsed)
+                self._record_load(model, response, "preload")
+                print(f"📌 Ollama 모델 적재/고정: {model} @ {host.url} ({elapsed:.1f}s, keep_alive={self.keep_alive})")
+        return timings
+
+    def loaded_models(self):
+        """서버별로 현재 메모리에 올라가 있는 모델 이름 목록 (/api/ps)"""
+        loaded = {}
+        for host in self.pool.hosts:
+            response = host.client.ps()
+            models = response["models"] if isinstance(response, dict) else response.models
+            loaded[host.url] = [m["model"] if isinstance(m, dict) else m.model for m in models]
+        return loaded
+
+    def chat(self, model, messages, priority=None, **kwargs):
+        """
+        가장 한가한 서버를 골라 그 서버의 우선순위 큐에서 슬롯을 받은 뒤 ollama chat 호출 (keep_alive는 항상 명시).
+        priority를 주지 않으면 ollama_priority()로 지정한 값, 그것도 없으면 interactive.
+        서버 문제로 실패하면 아직 시도하지 않은 서버로 다시 호출합니다.
+        """
+        priority = priority or _priority.get()
+        response = self._chat_with_failover(model, messages, priority, **kwargs)
+        self._record_load(model, response, "request")
+        return response
+
+    def chat_stream(self, model, messages, priority=None, **kwargs):
+        """
+        chat의 stream=True 버전: 응답 조각을 받는 대로 yield 합니다. (마지막 조각에 사용량과 load_duration이 들어 있다)
+        슬롯과 서버는 스트림이 끝날 때까지 잡고 있고, 서버 문제로 실패하면 첫 조각을 받기 전까지만 다른 서버로 다시 호출합니다.
+        """
+        priority = priority or _priority.get()
+        tried = []
+        while True:
+            host = self.pool.acquire(exclude=tried)
+            last_chunk = None
+            try:
+                with self._host_slot(host, priority):
+                    start = time.perf_counter()
+                    for chunk in host.client.chat(model=model, messages=messages, keep_alive=self.keep_alive, stream=True, **kwargs):
+                        last_chunk = chunk
+                        yield chunk
+            except GeneratorExit:
+                # 받는 쪽이 중간에 그만둔 경우 (서버 문제가 아니므로 지연도 오류도 기록하지 않음)
+                self.pool.release(host)
+                raise
+            except DeadlineExceeded:
+                # 슬롯을 받기 전에 마감이 지남 (서버 문제가 아님)
+                self.pool.release(host)
+                raise
+            except Exception as e:
+                self.pool.release(host, error=e)
+                tried.append(host)
+                if last_chunk is not None or not _is_host_failure(e) or len(tried) >= len(self.pool):
+                    raise
+                print(f"🔁 Ollama 서버 {host.url} 스트림 호출 실패, 다른 서버로 재시도: {e}")
+                continue
+            self.pool.release(host, elapsed=time.perf_counter() - start)
+            if last_chunk is not None:
+                self._record_load(model, last_chunk, "request")
+            return
+
+    @contextmanager
+    def _host_slot(self, host: OllamaHost, priority):
+        """
+        host의 우선순위 큐에서 요청/조항 마감까지 남은 시간 안에서만 슬롯을 기다린다 (마감이 없으면 무제한).
+        슬롯을 받은 뒤 마감이 이미 지났으면 Ollama를 호출하지 않고 슬롯을 돌려준 뒤 DeadlineExceeded
+        """
+        wait_start = time.perf_counter()
+        with OLLAMA_QUEUE_DEPTH.track_inprogress(priority=priority):
+            host.limiter.acquire(PRIORITIES[priority], timeout=_slot_timeout())
+        try:
+            OLLAMA_QUEUE_WAIT.observe(time.perf_counter() - wait_start, priority=priority)
+            if _slot_timeout() == 0:
+                raise DeadlineExceeded("Ollama 호출 슬롯을 받았을 때 이미 마감이 지났습니다.")
+            yield
+        finally:
+            host.limiter.release()
+
+    def _chat_with_failover(self, model, messages, priority, **kwargs):
+        tried = []
+        while True:
+            host = self.pool.acquire(exclude=tried)
+            try:
+                with self._host_slot(host, priority):
+                    start = time.perf_counter()
+                    response = host.client.chat(model=model, messages=messages, keep_alive=self.keep_alive, **kwargs)
+            except DeadlineExceeded:
+                self.pool.release(host)
+                raise
+            except Exception as e:
+                self.pool.release(host, error=e)
+                tried.append(host)
+                if not _is_host_failure(e) or len(tried) >= len(self.pool):
+                    raise
+                print(f"🔁 Ollama 서버 {host.url} 호출 실패, 다른 서버로 재시도: {e}")
+                continue
+            self.pool.release(host, elapsed=time.perf_counter() - start)
+            return response
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_ollama_manager() -> OllamaBackendManager:
+    """프로세스 전체에서 공유하는 manager (우선순위 큐가 모든 detector 호출에 걸리도록 하나만 둔다)"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = OllamaBackendManager()
+        return _manager
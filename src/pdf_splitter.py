@@ -0,0 +1,128 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import io
+import re
+from typing import List, Optional, Tuple
+
+from pypdf import PdfReader, PdfWriter
+
+# 페이지 경계에서 잘린 조항 제목("제1" / "2조")을 찾기 위한 패턴
+_TAIL_HEADER_PATTERN = re.compile(r'제\s*(\d*)\s*$')
+_HEAD_HEADER_PATTERN = re.compile(r'^\s*(\d*)\s*조')
+# 복구한 "제N조" 뒤가 조항 제목 모양인지: 가지 조항(의2) 다음에 괄호로 시작하는 제목 또는 줄 끝
+_HEADER_TITLE_PATTERN = re.compile(r'^(?:의\s*\d+)?[ \t]*(?:[(（\[【]|\n|$)')
+_ARTICLE_HEADER_PATTERN = re.compile(r'^\s*(제\s*\d+\s*조[^\n]*)', re.MULTILINE)
+
+
+def count_pdf_pages(pdf_bytes: bytes) -> int:
+    """PDF의 전체 페이지 수를 반환합니다."""
+    return len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+
+def split_pdf_pages(pdf_bytes: bytes, pages_per_chunk: int = 2) -> List[Tuple[int, int, bytes]]:
+    """
+    PDF를 pages_per_chunk 페이지 단위로 잘라 (시작 페이지, 끝 페이지, PDF bytes) 리스트로 반환합니다.
+    페이지 번호는 1부터 시작하며 끝 페이지를 포함합니다.
+    """
+    if pages_per_chunk < 1:
+        raise ValueError("pages_per_chunk는 1 이상이어야 합니다.")
+
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    total_pages = len(reader.pages)
+
+    page_ranges = []
+    for start in range(0, total_pages, pages_per_chunk):
+        end = min(start + pages_per_chunk, total_pages)
+        writer = PdfWriter()
+        for page_index in range(start, end):
+            writer.add_page(reader.pages[page_index])
+
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        page_ranges.append((start + 1, end, buffer.getvalue()))
+
+    return page_ranges
+
+
+def _normalize_header(header: str) -> str:
+    return re.sub(r'\s+', '', header.split('(')[0])
+
+
+def _last_header(text: str) -> Optional[str]:
+    headers = _ARTICLE_HEADER_PATTERN.findall(text)
+    return headers[-1] if headers else None
+
+
+def _join_pages(prev_text: str, next_text: str, prev_header: Optional[str] = None, line_prefix: str = "") -> Tuple[str, str]:
+    """
+    두 페이지 텍스트를 이어 붙이면서 경계에 걸친 조항 제목을 복구합니다.
+    이어 붙인 결과를 (앞 페이지 쪽, 다음 페이지 쪽) 두 조각으로 돌려주며, 앞 조각은 이후 경계에서 바뀌지 않습니다.
+    prev_header는 prev_text보다 앞에 나온 마지막 조항 제목, line_prefix는 prev_text 바로 앞(같은 줄)의 텍스트입니다.
+    """
+    prev_text = prev_text.rstrip()
+    next_text = next_text.lstrip()
+    if not prev_text:
+        return "", next_text
+    if not next_text:
+        return prev_text, ""
+
+    # 1. "제1" | "2조 (임금)" 처럼 조항 번호가 페이지 경계에서 끊긴 경우
+    tail = _TAIL_HEADER_PATTERN.search(prev_text)
+    head = _HEAD_HEADER_PATTERN.match(next_text)
+    if tail and head and (tail.group(1) or head.group(1)):
+        header = f"제{tail.group(1)}{head.group(1)}조"
+        before = prev_text[:tail.start()]
+        after = next_text[head.end():]
+        # 줄 첫머리에서 시작하고 뒤에 제목이 오는 경우만 새 조항 제목으로 본다
+        at_line_start = (not before and not line_prefix.strip()) or before.rstrip(" \t").endswith("\n")
+        if at_line_start and _HEADER_TITLE_PATTERN.match(after):
+            # 앞 조각 전체가 끊긴 제목이었으면 구분자만 돌려준다 (그 앞 텍스트와는 stitch_page_texts에서 맞춤)
+            return before.rstrip() + "\n\n", header + after
+        # 본문 중의 조항 인용("... 제" | "3조에 따라")이 끊긴 경우: 제목으로 만들지 않고 같은 줄로 이어 붙인다
+        return before, header + after
+
+    # 2. 다음 페이지가 직전 조항의 제목을 반복한 경우 (모델이 제목을 다시 적는 경우)
+    next_header = _ARTICLE_HEADER_PATTERN.match(next_text)
+    prev_header = _last_header(line_prefix + prev_text) or prev_header
+    if next_header and prev_header and _normalize_header(next_header.group(1)) == _normalize_header(prev_header):
+        return prev_text + "\n", next_text[next_header.end():].lstrip()
+
+    # 3. 다음 페이지가 새 조항으로 시작하면 빈 줄로, 아니면 같은 조항의 본문으로 이어 붙임
+    if next_header:
+        return prev_text + "\n\n", next_text
+    return prev_text + "\n", next_text
+
+
+def stitch_page_texts(page_texts: List[str]) -> str:
+    """
+    페이지 순서대로 정렬된 추출 결과를 하나의 텍스트로 합칩니다.
+    경계마다 직전 페이지 조각과 그 앞 줄, 지금까지의 마지막 조항 제목만 보므로 페이지 수에 대해 선형 시간입니다.
+    """
+    pieces = []          # 확정된 조각 (이후 경계에서 바뀌지 않음)
+    tail = ""            # 다음 경계에서 바뀔 수 있는 마지막 페이지 조각
+    last_header = None   # pieces 안의 마지막 조항 제목
+    line = ""            # pieces의 마지막 줄 (tail과 같은 줄로 이어지는 부분)
+    for text in page_texts:
+        committed, next_part = _join_pages(tail, text or "", last_header, line)
+        if not next_part:
+            # 빈 페이지: 지금 조각을 그대로 둔다
+            tail = committed
+            continue
+        if committed and not committed.strip():
+            # 직전 페이지 조각 전체가 끊긴 제목("제1")이었으면 그 앞의 구분자를 빈 줄로 바꾼다 (문서 맨 앞이면 없음)
+            if pieces:
+                pieces[-1] = pieces[-1].rstrip() + committed
+                line = ""
+            committed = ""
+        if next_part.rstrip().isdigit():
+            # 숫자만 있는 페이지("제" | "1" | "2조 ...")는 다음 경계에서 앞 페이지와 함께 제목이 될 수 있어 확정하지 않는다
+            tail = committed + next_part
+            continue
+        if committed:
+            last_header = _last_header(line + committed) or last_header
+            pieces.append(committed)
+            line = (line + committed).rsplit("\n", 1)[-1]
+        tail = next_part
+    pieces.append(tail)
+    return "".join(pieces)
@@ -0,0 +1,165 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import asyncio
+import contextvars
+import threading
+import time
+
+from clause_segmenter import MAX_JUDGE_UNIT_CHARS, ClauseSegmenter, build_judge_units, aggregate_unit_results
+from deadline import request_deadline
+from metrics import FAILURES, STAGE_SECONDS
+from tracing import start_span, use_span
+from usage import UsageTracker, usage_scope
+
+_STREAM_END = object()
+
+
+async def iterate_in_thread(make_iterator, context=None):
+    """
+    동기 이터레이터(Gemini/Ollama 스트림 등)를 별도 스레드에서 돌리면서
+    이벤트 루프를 막지 않고 async for로 받을 수 있게 해줍니다.
+    context(contextvars.Context)를 주면 그 context에서, 없으면 현재 context를 복사해서 실행합니다.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def worker():
+        try:
+            for item in make_iterator():
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+
+    # 사용량 집계 범위/trace span 같은 contextvar가 워커 스레드에도 적용되도록 현재 context에서 실행
+    threading.Thread(target=(context or contextvars.copy_context()).run, args=(worker,), daemon=True).start()
+
+    while True:
+        item = await queue.get()
+        if item is _STREAM_END:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+async def stream_upload_and_analyze(text_stream, load_detector, judge_concurrency=1, max_unit_chars=MAX_JUDGE_UNIT_CHARS, parent_span=None, deadline=None):
+    """
+    OCR 스트림(text_stream: 텍스트 조각 async 이터레이터)을 읽으면서 완성된 '제N조' 조항을
+    바로 검색/판별 작업으로 넘깁니다. 추출과 판별이 겹쳐서 진행되므로 전체 지연 시간이
+    (OCR + 판별)이 아니라 max(OCR, 판별)에 가까워집니다.
+
+    load_detector: detector를 만드는 동기 함수 (OCR과 동시에 별도 스레드에서 로딩)
+    max_unit_chars보다 긴 조항은 항/호 단위로 나누어 판별한 뒤 조항 단위로 합칩니다.
+    yield 되는 값은 /analyze와 같은 형식의 이벤트 dict 입니다. (개선안은 생성 중에 suggestion_delta 이벤트로도 전송)
+    parent_span을 주면 조항별 'clause' span이 그 아래에 붙습니다.
+    complete 이벤트의 'usage'는 추출 + 판별 + 개선안 전체의 LLM 사용량, 조항별 결과의 'usage'는 해당 조항 몫입니다.
+    deadline(deadline.deadline_after)을 주면 모든 조항의 판별/개선안 호출이 그 시각까지만 기다립니다.
+    """
+    events = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, judge_concurrency))
+    detector_task = asyncio.ensure_future(asyncio.to_thread(load_detector))
+    segmenter = ClauseSegmenter()
+    results = []
+    judge_tasks = []
+    request_usage = UsageTracker()
+
+    async def judge(clause_id, segment):
+        # 태스크마다 context가 복사되므로 여기서 연 span은 이 조항의 작업(스레드 포함)에만 적용된다
+        if parent_span is not None:
+            with use_span(parent_span, end_on_exit=False), start_span("clause", **{"clause.id": clause_id, "clause.length": segment.end - segment.start}):
+                await judge_clause(clause_id, segment)
+        else:
+            await judge_clause(clause_id, segment)
+
+    async def judge_clause(clause_id, segment):
+        with usage_scope(request_usage), usage_scope() as clause_usage, request_deadline(deadline):
+            await judge_clause_scoped(clause_id, segment, clause_usage)
+
+    async def judge_clause_scoped(clause_id, segment, clause_usage):
+        try:
+            detector = await detector_task
+            async with semaphore:
+                units = build_judge_units([segment], max_unit_chars)
+                unit_results = await asyncio.to_thread(detector.detect, [unit.text for unit in units], 1)
+                detected = aggregate_unit_results([segment], units, unit_results)
+                if not detected:
+                    raise RuntimeError("판별 결과가 비어 있습니다.")
+                res = detected[0]
+                res['id'] = clause_id
+                res['suggestion'] = ""
+                if res['is_toxic']:
+                    try:
+                        # 개선안은 토큰이 생성되는 대로 suggestion_delta 이벤트로 먼저 보내고, 합친 결과를 clause 이벤트에 담는다
+                        pieces = []
+                        async for delta in iterate_in_thread(lambda: detector.generate_easy_suggestion_stream(res)):
+                            pieces.append(delta)
+                            await events.put({"status": "suggestion_delta", "id": clause_id, "delta": delta})
+                        res['suggestion'] = "".join(pieces)
+                    except Exception:
+                        FAILURES.inc(stage="suggestion")
+                        res['suggestion'] = "개선안 생성 실패"
+                # 판별 + 개선안을 합친 이 조항의 사용량
+                res['usage'] = clause_usage.summary()
+            results.append(res)
+            await events.put({"status": "clause", "result": res})
+        except Exception as e:
+            FAILURES.inc(stage="judge")
+            await events.put({"status": "clause_error", "id": clause_id, "message": f"조항 {clause_id} 분석 오류: {str(e)}"})
+
+    def dispatch(segments):
+        for segment in segments:
+            clause_id = len(judge_tasks) + 1
+            judge_tasks.append(asyncio.ensure_future(judge(clause_id, segment)))
+
+    async def read_ocr():
+        with usage_scope(request_usage):
+            await read_ocr_scoped()
+
+    async def read_ocr_scoped():
+        # 조항 분할은 OCR 조각이 올 때마다 조금씩 일어나므로 합계를 한 번만 기록
+        chunking_sec = 0.0
+        try:
+            async for text in text_stream:
+                start = time.perf_counter()
+                segments = segmenter.feed(text)
+                chunking_sec += time.perf_counter() - start
+                dispatch(segments)
+            start = time.perf_counter()
+            segments = segmenter.flush()
+            chunking_sec += time.perf_counter() - start
+            STAGE_SECONDS.observe(chunking_sec, stage="chunking", backend="local")
+            dispatch(segments)
+            await events.put({"status": "extracted", "text": segmenter.text, "total": len(judge_tasks)})
+        except Exception as e:
+            await events.put({"status": "error", "message": f"텍스트 추출 오류: {str(e)}"})
+
+    ocr_task = asyncio.ensure_future(read_ocr())
+    yield {"status": "progress", "message": "텍스트 추출과 조항 분석을 동시에 진행 중..."}
+
+    try:
+        extraction_done = False
+        while not extraction_done or any(not t.done() for t in judge_tasks) or not events.empty():
+            event = await events.get()
+            if event["status"] == "extracted":
+                extraction_done = True
+                yield {"status": "progress", "current": len(results), "total": event["total"],
+                       "message": f"텍스트 추출 완료. 총 {event['total']}개 조항 중 {len(results)}개 분석 완료"}
+                extracted_event = event
+                continue
+            if event["status"] == "error":
+                yield event
+                return
+            if event["status"] == "clause":
+                yield {"status": "progress", "current": len(results), "total": len(judge_tasks),
+                       "message": f"조항 {event['result']['id']} 분석 완료"}
+            yield event
+
+        results.sort(key=lambda r: r['id'])
+        yield {"status": "complete", "text": extracted_event["text"], "results": results, "usage": request_usage.summary()}
+    finally:
+        for task in [ocr_task, detector_task, *judge_tasks]:
+            if not task.done():
+                task.cancel()
@@ -2,7 +2,6 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 import streamlit as st
-import re
 import os
 import time
 from dotenv import load_dotenv
@@ -12,6 +11,7 @@ from dotenv import load_dotenv
 from toxic_detector import ToxicClauseDetector
 from ollama_detctor import ToxicClauseDetectorOllama
 from llm_service import LLM_gemini
+from clause_segmenter import parse_text_to_chunks
 
 # --- 1. 페이지 설정 ---
 st.set_page_config(
@@ -47,12 +47,6 @@ def get_dummy_contract_text():
 제5조 (해고) "갑"은 "을"의 업무 성과가 저조하다고 판단될 경우 즉시 해고할 수 있다.
 """
 
-def parse_text_to_chunks(text):
-    if not text: return []
-    split_pattern = r'(?=\n\s*제\s*\d+\s*조)'
-    chunks = re.split(split_pattern, text)
-    return [c.strip() for c in chunks if len(c.strip()) > 10]
-
 # --- 3. 메인 어플리케이션 --- 
 def main():
     # 사이드바 설정
@@ -0,0 +1,79 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+LLM 구조화 출력(JSON 스키마) 도우미
+
+G-Eval은 채점 결과를 {score, reason} 스키마(pydantic 모델)로 요청합니다. (model.generate(prompt, schema=ReasonScore))
+- Ollama: chat(format=<JSON schema>)로 디코딩 자체를 스키마에 맞는 토큰으로 제한
+- Gemini: response_mime_type="application/json" + response_schema
+스키마를 지원하지 않는 모델(가짜/녹화 LLM)은 응답 텍스트에서 JSON 객체를 찾아 같은 스키마로 검증합니다.
+
+스키마에 맞지 않는 응답은 InstrumentedLLM이 최대 JUDGE_MAX_RETRIES번 다시 생성하며,
+호출마다 필요했던 재시도 수를 safesign_llm_structured_retries 지표로 남깁니다.
+
+출력 토큰 상한은 output_token_budget()으로 지정하면 어댑터가 Ollama num_predict / Gemini max_output_tokens로 넘깁니다.
+(contextvar라 InstrumentedLLM, RecordingLLM 같은 래퍼의 시그니처를 바꾸지 않아도 안쪽 어댑터까지 전달됨)
+
+    with output_token_budget(16):
+        llm.generate(prompt, schema=ScoreOnly)
+
+환경변수
+  SAFESIGN_JUDGE_MAX_RETRIES  스키마 검증 실패 시 재생성 횟수 (기본 2)
+"""
+import inspect
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from pydantic import BaseModel, ValidationError
+
+JUDGE_MAX_RETRIES = int(os.getenv("SAFESIGN_JUDGE_MAX_RETRIES", "2"))
+
+_max_output_tokens: ContextVar[Optional[int]] = ContextVar("safesign_max_output_tokens", default=None)
+
+
+class StructuredOutputError(ValueError):
+    """LLM 응답이 요청한 스키마에 맞지 않는 경우"""
+
+
+@contextmanager
+def output_token_budget(max_tokens: Optional[int]):
+    """블록 안의 LLM 호출 출력 토큰 상한 (None이면 모델 기본값)"""
+    token = _max_output_tokens.set(max_tokens)
+    try:
+        yield
+    finally:
+        _max_output_tokens.reset(token)
+
+
+def current_output_token_budget() -> Optional[int]:
+    return _max_output_tokens.get()
+
+
+def accepts_schema(llm) -> bool:
+    """DeepEval 모델의 generate가 schema 인자를 받는지 (받지 않으면 텍스트로 받아 직접 검증)"""
+    try:
+        return "schema" in inspect.signature(llm.generate).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_structured(output, schema):
+    """
+    LLM 응답(스키마 객체 또는 텍스트)을 schema 객체로 변환합니다.
+    텍스트는 앞뒤 설명이나 ```json 코드 블록이 붙어 있어도 첫 '{'부터 마지막 '}'까지를 검증합니다.
+    """
+    if isinstance(output, schema):
+        return output
+    if isinstance(output, BaseModel):
+        output = output.model_dump_json()
+    text = (output or "").strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise StructuredOutputError(f"JSON 객체가 없는 응답입니다: {text[:80]!r}")
+    try:
+        return schema.model_validate_json(text[start:end + 1])
+    except ValidationError as e:
+        raise StructuredOutputError(f"{schema.__name__} 스키마 검증 실패 ({e.error_count()}건): {text[:80]!r}") from e
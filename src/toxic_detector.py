@@ -1,8 +1,11 @@
 # Copyright (c) 2025 SafeSign Team
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
+import asyncio
+import contextvars
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Union
 from dotenv import load_dotenv
 
@@ -15,8 +18,13 @@ from deepeval.metrics.g_eval import Rubric
 from deepeval.evaluate import AsyncConfig, DisplayConfig
 
 from llm_service import LLM_gemini
-from law.legal_context import LawContextManager
-from law.precedent_context import PrecedentContextManager
+from metrics import CLAUSES_PROCESSED, FAILURES, STAGE_SECONDS
+from llm_instrumentation import InstrumentedLLM
+from structured_output import current_output_token_budget, parse_structured
+from two_phase_judge import DEFERRED_REASON_ITEM, JUDGE_MODE, TwoPhaseJudge, check_judge_mode
+from tracing import start_span
+from usage import usage_stage
+from law.retrieval_engine import get_retriever
 
 # --- 1. DeepEval용 Gemini 어댑터 ---
 class GeminiDeepEvalAdapter(DeepEvalBaseLLM):
@@ -27,32 +35,44 @@ class GeminiDeepEvalAdapter(DeepEvalBaseLLM):
     def load_model(self):
         return self.llm_service.client
 
-    def generate(self, prompt: str) -> str:
+    def generate(self, prompt: str, schema=None):
+        if schema is not None:
+            # response_schema로 Gemini가 스키마에 맞는 JSON만 출력하도록 제한 (판별 결과 {score, reason})
+            response = self.llm_service.generate(prompt, response_schema=schema, max_output_tokens=current_output_token_budget())
+            parsed = getattr(response, 'parsed', None)
+            return parsed if isinstance(parsed, schema) else parse_structured(response.text, schema)
         response = self.llm_service.generate(prompt)
         return response.text if hasattr(response, 'text') else str(response)
 
-    async def a_generate(self, prompt: str) -> str:
-        return self.generate(prompt)
+    def generate_stream(self, prompt: str):
+        """응답 텍스트 조각을 받는 대로 yield (개선안 스트리밍)"""
+        yield from self.llm_service.generate_stream(prompt)
+
+    async def a_generate(self, prompt: str, schema=None):
+        # 스케줄러가 한도/백오프로 기다리는 동안 DeepEval 이벤트 루프(다른 조항 판별)를 막지 않도록 스레드에서 호출
+        return await asyncio.to_thread(self.generate, prompt, schema)
 
     def get_model_name(self):
         return self.model_name
 
 # --- 2. 독소조항 판별기 클래스 ---
 class ToxicClauseDetector:
-    def __init__(self, api_key=None):
+    # evaluator_llm / embeddings를 넘기면 기본 Gemini 어댑터, 임베딩 모델 대신 사용 (벤치마크, 오프라인 실행용)
+    # judge_mode="two-phase"면 점수만 먼저 받고 이유는 기준 점수 이상인 조항만 생성 (two_phase_judge.py)
+    def __init__(self, api_key=None, evaluator_llm=None, embeddings=None, judge_mode=JUDGE_MODE):
         print("🛡️ ToxicClauseDetector (Parallel) 초기화 중...")
+        self.judge_mode = check_judge_mode(judge_mode)
         
         if not api_key:
             api_key = os.getenv("GEMINI_API_KEY")
         
         self.llm_service = LLM_gemini(gemini_api_key=api_key, model="gemini-2.5-flash-lite")
-        self.evaluator_llm = GeminiDeepEvalAdapter(self.llm_service)
+        self.evaluator_llm = evaluator_llm or GeminiDeepEvalAdapter(self.llm_service)
         
-        # DB 매니저
-        self.law_manager = LawContextManager()
-        self.precedent_manager = PrecedentContextManager()
-        self.law_manager.initialize_database()
-        self.precedent_manager.initialize_database()
+        # 법령/판례 통합 검색 엔진 (프로세스당 한 번 구성)
+        self.retriever = get_retriever(embeddings)
+        # 기존 코드 호환: search_relevant_laws / search_relevant_precedents를 그대로 제공
+        self.law_manager = self.precedent_manager = self.retriever
 
         # [User Original Prompt & Logic] - 수정하지 않음
         self.toxic_criteria = """
@@ -93,38 +113,50 @@ class ToxicClauseDetector:
         ]
         
         # Metric 객체 초기화 (재사용)
+        self.judge_llm = InstrumentedLLM(self.evaluator_llm, stage="judge", backend="gemini")  # 호출 시간 기록
         self.toxic_metric = GEval(
             name="Toxicity Score",
             criteria=self.toxic_criteria,
             rubric=self.rubric,
             evaluation_steps=self.evaluation_steps,
-            model=self.evaluator_llm,
+            model=self.judge_llm,
             threshold=5, 
             evaluation_params=[LLMTestCaseParams.INPUT, LLMTestCaseParams.RETRIEVAL_CONTEXT]
         )
+        self.two_phase = None
+        if self.judge_mode == "two-phase":
+            self.two_phase = TwoPhaseJudge(self.judge_llm, self.toxic_criteria, self.evaluation_steps, self.rubric, backend="gemini")
 
     def _retrieve_context(self, clause_text):
-        laws = self.law_manager.search_relevant_laws(clause_text, k=2)
+        # 법령 2건 + 판례 1건을 한 번에 검색
+        results = self.retriever.search(clause_text, {"law": 2, "precedent": 1})
+        laws = [r.content for r in results if r.source_type == "law"]
         law_text = "\n".join(laws) if laws else "관련 법령 검색 결과 없음 (일반 법률 지식으로 판단 요망)"
 
-        precedents = self.precedent_manager.search_relevant_precedents(clause_text, k=1)
+        precedents = [r.content for r in results if r.source_type == "precedent"]
         precedent_text = precedents[0] if precedents else "관련 판례 검색 결과 없음"
 
         return f"=== [관련 법령] ===\n{law_text}\n\n=== [관련 판례] ===\n{precedent_text}"
 
     # 함수명 'detect' 유지 (Input: List[str]로 변경됨)
-    def detect(self, clause_texts: List[str], max_concurrent: int = 5) -> List[Dict]:
+    def detect(self, clause_texts: List[str], max_concurrent: int = None) -> List[Dict]:
         """
         [병렬 처리] 여러 조항을 리스트로 받아 DeepEval evaluate 함수로 한 번에 처리.
+        max_concurrent는 동시에 판별할 조항 수의 상한이고 (기본: API Key 스케줄러 상한),
+        실제로 동시에 나가는 Gemini 호출 수는 스케줄러가 429/지연을 보고 조정합니다.
         """
+        max_concurrent = max_concurrent or self.llm_service.scheduler.max_concurrency
         print(f"🚀 총 {len(clause_texts)}개 조항에 대한 병렬 평가 시작...")
         
         test_cases = []
         original_map = {} # 결과 매핑용
+        # 결과의 'index'(입력 순서)를 찾기 위한 텍스트 -> 입력 위치들 (같은 텍스트가 여러 번 들어와도 하나씩 배정)
+        indices_by_text = {}
 
         # 1. Test Case 생성 (Retrieval 수행)
-        for text in clause_texts:
-            retrieved_context = self._retrieve_context(text)
+        for i, text in enumerate(clause_texts):
+            with start_span("clause.retrieval", **{"clause.index": i, "clause.length": len(text), "llm.backend": "gemini"}):
+                retrieved_context = self._retrieve_context(text)
             test_case = LLMTestCase(
                 input=text,
                 actual_output="평가 대상",
@@ -132,16 +164,23 @@ class ToxicClauseDetector:
             )
             test_cases.append(test_case)
             original_map[text] = retrieved_context
+            indices_by_text.setdefault(text, []).append(i)
+        if self.two_phase:
+            return self._detect_two_phase(clause_texts, original_map, max_concurrent)
+
         # 2. 병렬 평가 실행 (evaluate)
-        eval_results = evaluate(
-            test_cases=test_cases,
-            metrics=[self.toxic_metric],
-            async_config=AsyncConfig(max_concurrent=max_concurrent), # 병렬 처리 개수
-            display_config=DisplayConfig(False,False,False)
-        )
+        # 조항별 LLM 호출은 evaluate 내부에서 병렬로 일어나므로 'llm.judge' span이 이 span 아래에 모인다
+        with start_span("judge.batch", **{"judge.clauses": len(test_cases), "judge.max_concurrent": max_concurrent}):
+            eval_results = evaluate(
+                test_cases=test_cases,
+                metrics=[self.toxic_metric],
+                async_config=AsyncConfig(max_concurrent=max_concurrent), # 병렬 처리 개수
+                display_config=DisplayConfig(False,False,False)
+            )
 
         # 3. 결과 포맷팅 (수정된 로직)
         formatted_results = []
+        model_name = self.evaluator_llm.get_model_name()
         
         # [핵심] eval_results 객체에서 진짜 결과 리스트(.test_results)를 꺼냅니다.
         if hasattr(eval_results, 'test_results'):
@@ -173,32 +212,109 @@ class ToxicClauseDetector:
             is_toxic = risk_score >= 4.0
 
             formatted_results.append({
+                "index": indices_by_text[clause_text].pop(0),
                 "clause": clause_text,
                 "is_toxic": is_toxic,
                 "risk_score": round(risk_score, 1),
                 "reason": metric_data.reason,
-                "context_used": original_map.get(clause_text, "")
+                "context_used": original_map.get(clause_text, ""),
+                "outcome": "toxic" if is_toxic else "safe",
             })
+            CLAUSES_PROCESSED.inc(backend="gemini", model=model_name, outcome="toxic" if is_toxic else "safe")
+        # evaluate는 끝난 순서로 결과를 돌려줄 수 있으므로 입력 순서로 맞춘다
+        formatted_results.sort(key=lambda res: res["index"])
+
+        # 결과가 돌아오지 않은 조항은 실패로 센다
+        missing = len(clause_texts) - len(formatted_results)
+        if missing > 0:
+            FAILURES.inc(missing, stage="judge", backend="gemini")
+            CLAUSES_PROCESSED.inc(missing, backend="gemini", model=model_name, outcome="error")
 
         return formatted_results
 
-    def generate_easy_suggestion(self, detection_result):
-        if not detection_result['is_toxic']:
-            return "✅ **안전한 조항입니다.**"
+    def _detect_two_phase(self, clause_texts, original_map, max_concurrent):
+        """2단계 판별: 조항별 점수(+필요하면 이유)를 최대 max_concurrent개씩 동시에 요청"""
+        model_name = self.evaluator_llm.get_model_name()
+
+        def judge(text):
+            try:
+                return self.two_phase.judge(text, original_map[text])
+            except Exception as e:
+                print(f"⚠️ [2단계 판별 실패] {text[:30]}...: {e}")
+                return None
+
+        with start_span("judge.batch", **{"judge.clauses": len(clause_texts), "judge.max_concurrent": max_concurrent, "judge.mode": self.judge_mode}), \
+                ThreadPoolExecutor(max_workers=max(1, max_concurrent)) as executor:
+            # 사용량 집계 범위/부모 span(contextvar)이 워커 스레드에도 적용되도록 작업마다 context를 복사해서 실행
+            judged = list(executor.map(lambda text: contextvars.copy_context().run(judge, text), clause_texts))
+
+        formatted_results = []
+        for index, (text, verdict) in enumerate(zip(clause_texts, judged)):
+            if verdict is None:
+                continue
+            risk_score, reason, reason_deferred = verdict
+            is_toxic = risk_score >= 4.0
+            result = {
+                "index": index,
+                "clause": text,
+                "is_toxic": is_toxic,
+                "risk_score": round(risk_score, 1),
+                "reason": reason,
+                "context_used": original_map[text],
+                "outcome": "toxic" if is_toxic else "safe",
+            }
+            if reason_deferred:
+                result["reason_deferred"] = True
+            formatted_results.append(result)
+            CLAUSES_PROCESSED.inc(backend="gemini", model=model_name, outcome="toxic" if is_toxic else "safe")
+
+        missing = len(clause_texts) - len(formatted_results)
+        if missing > 0:
+            FAILURES.inc(missing, stage="judge", backend="gemini")
+            CLAUSES_PROCESSED.inc(missing, backend="gemini", model=model_name, outcome="error")
+        return formatted_results
 
-        prompt = f"""
+    def _suggestion_prompt(self, detection_result):
+        return f"""
         당신은 근로자 편인 법률 전문가입니다. 다음 독소조항을 분석하세요.
         
         [원문]: {detection_result['clause']}
         [이유]: {detection_result['reason']}
         [근거]: {detection_result['context_used']}
 
-        다음 두 가지를 마크다운으로 작성:
+        다음 항목을 마크다운으로 작성:
         1. **⚠️ 쉬운 해석**: 근로자가 이해하기 쉽게 1~2문장으로 '왜 위험한지' 설명 및 요약.
         2. **💡 수정 제안**: 법에 맞는 공정한 조항 예시.
+        {DEFERRED_REASON_ITEM if detection_result.get('reason_deferred') else ""}
         """
-        response = self.llm_service.generate(prompt)
-        return response.text if hasattr(response, 'text') else str(response)
+
+    def generate_easy_suggestion(self, detection_result):
+        if not detection_result['is_toxic']:
+            return "✅ **안전한 조항입니다.**"
+
+        prompt = self._suggestion_prompt(detection_result)
+        # 심사위원과 같은 어댑터를 사용 (기본값은 self.llm_service를 감싼 Gemini 어댑터)
+        with start_span("suggestion", **{"llm.backend": "gemini", "llm.prompt_length": len(prompt)}), usage_stage("suggestion"), \
+                STAGE_SECONDS.time(stage="suggestion", backend="gemini", model=self.evaluator_llm.get_model_name()):
+            return self.evaluator_llm.generate(prompt)
+
+    def generate_easy_suggestion_stream(self, detection_result):
+        """
+        generate_easy_suggestion의 스트리밍 버전: 개선안 텍스트 조각을 생성되는 대로 yield 합니다.
+        (이어 붙이면 generate_easy_suggestion과 같은 결과. 스트리밍을 지원하지 않는 모델은 전체 결과를 한 번에 yield)
+        """
+        if not detection_result['is_toxic']:
+            yield "✅ **안전한 조항입니다.**"
+            return
+
+        prompt = self._suggestion_prompt(detection_result)
+        stream = getattr(self.evaluator_llm, "generate_stream", None)
+        with start_span("suggestion", **{"llm.backend": "gemini", "llm.prompt_length": len(prompt), "llm.stream": stream is not None}), \
+                usage_stage("suggestion"), STAGE_SECONDS.time(stage="suggestion", backend="gemini", model=self.evaluator_llm.get_model_name()):
+            if stream is None:
+                yield self.evaluator_llm.generate(prompt)
+            else:
+                yield from stream(prompt)
 
 # --- 3. 테스트 코드 ---
 if __name__ == "__main__":
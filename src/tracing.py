@@ -0,0 +1,203 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+요청/조항 단위 트레이싱 (OpenTelemetry)
+
+/analyze 요청마다 루트 span을 만들고, 조항마다 검색(법령/판례), 판별(judge), 개선안(suggestion) span을 붙입니다.
+집계 지표(metrics.py)로는 알 수 없는 "어느 계약서의 어느 조항, 어느 단계가 느렸는지"를 확인하기 위함입니다.
+
+환경변수
+  SAFESIGN_TRACING      off(기본) / file / otlp
+  SAFESIGN_TRACE_FILE   file 모드 출력 경로 (기본 ../data/traces/spans.jsonl)
+  SAFESIGN_TRACE_FILE_MAX_MB  file 모드 파일 크기 상한 (기본 100, 넘으면 spans.jsonl.1로 옮기고 새 파일에 기록)
+  OTEL_EXPORTER_OTLP_ENDPOINT  otlp 모드 수집기 주소 (기본 http://localhost:4317)
+
+느린 span 확인
+    python tracing.py top --file ../data/traces/spans.jsonl --n 20
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+
+TRACING_MODE = os.getenv("SAFESIGN_TRACING", "off").lower()
+TRACE_FILE = os.getenv("SAFESIGN_TRACE_FILE", "../data/traces/spans.jsonl")
+TRACE_FILE_MAX_BYTES = int(float(os.getenv("SAFESIGN_TRACE_FILE_MAX_MB", "100")) * 1024 * 1024)
+SERVICE_NAME = "safesign"
+
+logger = logging.getLogger(__name__)
+
+_provider_lock = threading.Lock()
+_tracer = None
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """
+    끝난 span을 한 줄에 하나씩 JSON으로 파일에 추가합니다.
+    파일이 max_bytes를 넘으면 path.1로 옮기고(이전 path.1은 삭제) 새 파일에 기록하므로 디스크 사용량은 약 2 x max_bytes 이하
+    """
+    def __init__(self, path=TRACE_FILE, max_bytes=TRACE_FILE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @staticmethod
+    def _to_dict(span):
+        context = span.get_span_context()
+        return {
+            "name": span.name,
+            "trace_id": format(context.trace_id, "032x"),
+            "span_id": format(context.span_id, "016x"),
+            "parent_id": format(span.parent.span_id, "016x") if span.parent else None,
+            "start_ns": span.start_time,
+            "end_ns": span.end_time,
+            "duration_ms": (span.end_time - span.start_time) / 1e6 if span.end_time else None,
+            "status": span.status.status_code.name,
+            "attributes": {k: (list(v) if isinstance(v, tuple) else v) for k, v in (span.attributes or {}).items()},
+            "events": [{"name": e.name, "attributes": dict(e.attributes or {})} for e in span.events],
+        }
+
+    def export(self, spans):
+        lines = "".join(json.dumps(self._to_dict(span), ensure_ascii=False) + "\n" for span in spans)
+        try:
+            with self._lock:
+                self._rotate_if_full()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+        except OSError as e:
+            logger.warning("trace 파일 기록 실패: %s", e)
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def _rotate_if_full(self):
+        # self._lock을 잡은 상태에서 호출해야 한다.
+        if self.max_bytes > 0 and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            os.replace(self.path, self.path + ".1")
+
+    def shutdown(self):
+        pass
+
+
+def _make_exporter():
+    if TRACING_MODE == "otlp":
+        # otlp 모드에서만 gRPC exporter를 불러온다
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    return JsonLinesSpanExporter(TRACE_FILE)
+
+
+def get_tracer():
+    """프로세스당 한 번 TracerProvider를 구성하고 tracer를 돌려준다 (off면 아무것도 기록하지 않는 tracer)"""
+    global _tracer
+    if _tracer is not None:
+        return _tracer
+    with _provider_lock:
+        if _tracer is None:
+            if TRACING_MODE == "off":
+                _tracer = trace.NoOpTracer()
+            else:
+                provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+                provider.add_span_processor(BatchSpanProcessor(_make_exporter()))
+                atexit.register(provider.shutdown)
+                _tracer = provider.get_tracer("safesign")
+                logger.info("트레이싱 활성화: %s (%s)", TRACING_MODE, TRACE_FILE if TRACING_MODE == "file" else "OTLP")
+    return _tracer
+
+
+def _clean(attributes):
+    """OpenTelemetry가 받을 수 있는 값(str/bool/int/float 및 그 리스트)만 남긴다"""
+    cleaned = {}
+    for key, value in attributes.items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            cleaned[key] = [v if isinstance(v, (str, bool, int, float)) else str(v) for v in value]
+        elif isinstance(value, (str, bool, int, float)):
+            cleaned[key] = value
+        else:
+            cleaned[key] = str(value)
+    return cleaned
+
+
+@contextmanager
+def start_span(name, **attributes):
+    """현재 span의 자식 span을 만들고 현재 span으로 설정 (예외는 span에 기록된 뒤 그대로 전파)"""
+    with get_tracer().start_as_current_span(name, attributes=_clean(attributes)) as span:
+        yield span
+
+
+def set_attributes(**attributes):
+    """현재 span에 속성 추가 (span이 없으면 무시됨)"""
+    trace.get_current_span().set_attributes(_clean(attributes))
+
+
+def start_root_span(name, **attributes):
+    """
+    스트리밍 응답용 루트 span. 제너레이터의 yield를 넘나들며 current로 두면 context 해제가 꼬이므로
+    직접 end() 해야 하며, 동기 구간에서만 trace.use_span(span)으로 감싸서 사용한다.
+    """
+    return get_tracer().start_span(name, attributes=_clean(attributes))
+
+
+use_span = trace.use_span
+
+
+async def end_span_after(span, events):
+    """스트리밍 응답 제너레이터가 끝나거나 중간에 끊기면 루트 span을 닫는다"""
+    try:
+        async for event in events:
+            yield event
+    finally:
+        span.end()
+
+
+def top(args):
+    """span 이름별 지연 시간 분포와 가장 느린 span 목록 출력"""
+    spans = []
+    with open(args.file, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                spans.append(json.loads(line))
+
+    by_name = defaultdict(list)
+    for span in spans:
+        if span["duration_ms"] is not None:
+            by_name[span["name"]].append(span["duration_ms"])
+
+    print(f"{'span':<28} {'count':>6} {'p50(ms)':>10} {'p95(ms)':>10} {'max(ms)':>10}")
+    for name, values in sorted(by_name.items(), key=lambda item: -sum(item[1])):
+        values.sort()
+        p50 = values[len(values) // 2]
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        print(f"{name:<28} {len(values):>6} {p50:>10.1f} {p95:>10.1f} {values[-1]:>10.1f}")
+
+    print(f"\n🐢 가장 느린 span {args.n}개")
+    for span in sorted(spans, key=lambda s: -(s["duration_ms"] or 0))[:args.n]:
+        attrs = span["attributes"]
+        label = attrs.get("clause.id", attrs.get("clause.index", ""))
+        print(f"  {span['duration_ms']:>10.1f}ms  {span['name']:<24} trace={span['trace_id'][:8]} clause={label} {attrs}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SafeSign trace 파일 분석")
+    sub = parser.add_subparsers(dest="command", required=True)
+    top_parser = sub.add_parser("top", help="span별 지연 시간 요약 및 가장 느린 span")
+    top_parser.add_argument("--file", default=TRACE_FILE)
+    top_parser.add_argument("--n", type=int, default=10)
+    args = parser.parse_args(argv)
+    top(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+2단계 판별: 점수를 먼저 받고, 판단 이유는 필요한 조항만 생성
+
+G-Eval 판별은 조항마다 점수와 긴 이유를 함께 생성하지만, 0~2점 조항의 이유는 화면에서 거의 읽히지 않고
+로컬 모델에서는 출력 토큰 수가 지연 시간을 좌우합니다.
+1단계: 같은 기준/단계/루브릭으로 {"score": 정수}만 요청 (출력 토큰 상한 SCORE_MAX_TOKENS)
+2단계: 점수가 REASON_THRESHOLD 이상인 조항만
+  - call       : 이유만 따로 생성하는 두 번째 호출
+  - suggestion : 이유를 만들지 않고 generate_easy_suggestion이 개선안과 함께 작성 (결과에 reason_deferred=True)
+
+절약된 출력 토큰은 python -m benchmarks.judge_tokens 로 G-Eval 방식과 비교해 확인합니다.
+
+환경변수
+  SAFESIGN_JUDGE_MODE          geval(기본, 점수+이유 한 번에) / two-phase
+  SAFESIGN_REASON_THRESHOLD    이 점수 이상인 조항만 이유 생성 (기본 4.0 = 독소조항 기준)
+  SAFESIGN_REASON_MODE         call(기본) / suggestion
+  SAFESIGN_SCORE_MAX_TOKENS    1단계 출력 토큰 상한 (기본 16)
+"""
+import os
+from typing import Tuple
+
+from pydantic import BaseModel, Field
+
+from metrics import JUDGE_REASONS
+from structured_output import output_token_budget
+
+JUDGE_MODES = ("geval", "two-phase")
+JUDGE_MODE = os.getenv("SAFESIGN_JUDGE_MODE", "geval").lower()
+REASON_MODES = ("call", "suggestion")
+REASON_MODE = os.getenv("SAFESIGN_REASON_MODE", "call").lower()
+REASON_THRESHOLD = float(os.getenv("SAFESIGN_REASON_THRESHOLD", "4.0"))
+SCORE_MAX_TOKENS = int(os.getenv("SAFESIGN_SCORE_MAX_TOKENS", "16"))
+
+# reason_mode=suggestion일 때 개선안 프롬프트에 덧붙이는 항목
+DEFERRED_REASON_ITEM = "3. **🔍 판단 근거**: 이 조항이 위험한 이유를 관련 법령/판례를 들어 2~3문장으로 설명."
+
+
+class ScoreOnly(BaseModel):
+    score: int = Field(ge=0, le=10)
+
+
+class ReasonOnly(BaseModel):
+    reason: str
+
+
+SCORE_PROMPT = """{criteria}
+
+[평가 단계]
+{steps}
+
+[점수 기준]
+{rubric}
+
+[조항]
+{clause}
+
+[관련 법령/판례]
+{context}
+
+위 기준에 따라 이 조항의 위험 점수를 0~10 사이 정수로 매기세요.
+설명 없이 JSON 한 줄로만 답하세요: {{"score": <정수>}}
+"""
+
+REASON_PROMPT = """{criteria}
+
+[점수 기준]
+{rubric}
+
+[조항]
+{clause}
+
+[관련 법령/판례]
+{context}
+
+이 조항은 위 기준으로 {score}점을 받았습니다. 이 점수를 준 근거를 관련 법령/판례를 들어 2~3문장으로 설명하세요.
+JSON으로만 답하세요: {{"reason": "<설명>"}}
+"""
+
+
+def check_judge_mode(judge_mode):
+    if judge_mode not in JUDGE_MODES:
+        raise ValueError(f"지원하지 않는 판별 방식입니다: {judge_mode} (가능: {', '.join(JUDGE_MODES)})")
+    return judge_mode
+
+
+class TwoPhaseJudge:
+    """
+    G-Eval과 같은 기준(criteria, evaluation_steps, rubric)으로 점수 -> (필요하면) 이유 순서로 판별합니다.
+    llm은 detector의 judge_llm(InstrumentedLLM)이라 호출 시간/토큰/재시도가 judge 단계로 기록됩니다.
+    """
+    def __init__(self, llm, criteria, evaluation_steps, rubric, backend,
+                 reason_threshold=REASON_THRESHOLD, reason_mode=REASON_MODE, score_max_tokens=SCORE_MAX_TOKENS):
+        if reason_mode not in REASON_MODES:
+            raise ValueError(f"지원하지 않는 이유 생성 방식입니다: {reason_mode} (가능: {', '.join(REASON_MODES)})")
+        self.llm = llm
+        self.backend = backend
+        self.reason_threshold = reason_threshold
+        self.reason_mode = reason_mode
+        self.score_max_tokens = score_max_tokens
+        self.criteria = criteria.strip()
+        self.steps = "\n".join(f"{i}. {step}" for i, step in enumerate(evaluation_steps, 1))
+        self.rubric = "\n".join(f"{r.score_range[0]}~{r.score_range[1]}점: {r.expected_outcome}" for r in rubric)
+
+    def score(self, clause, context) -> float:
+        prompt = SCORE_PROMPT.format(criteria=self.criteria, steps=self.steps, rubric=self.rubric, clause=clause, context=context)
+        with output_token_budget(self.score_max_tokens):
+            return float(self.llm.generate(prompt, schema=ScoreOnly).score)
+
+    def reason(self, clause, context, score) -> str:
+        prompt = REASON_PROMPT.format(criteria=self.criteria, rubric=self.rubric, clause=clause, context=context, score=f"{score:g}")
+        return self.llm.generate(prompt, schema=ReasonOnly).reason
+
+    def expected_calls(self, score) -> int:
+        """재시도가 없을 때의 LLM 호출 수 (점수 1번 + 이유를 따로 생성하면 1번)"""
+        return 2 if self.reason_mode == "call" and score >= self.reason_threshold else 1
+
+    def judge(self, clause, context) -> Tuple[float, str, bool]:
+        """(0~10 점수, 이유, 이유를 개선안 생성으로 미뤘는지)"""
+        score = self.score(clause, context)
+        if score < self.reason_threshold:
+            JUDGE_REASONS.inc(backend=self.backend, outcome="skipped")
+            return score, f"위험 점수 {score:g}점 (이유 생성 기준 {self.reason_threshold:g}점 미만이라 판단 이유를 생략했습니다)", False
+        if self.reason_mode == "suggestion":
+            JUDGE_REASONS.inc(backend=self.backend, outcome="deferred")
+            return score, f"위험 점수 {score:g}점 (판단 근거는 개선안에 함께 작성됩니다)", True
+        JUDGE_REASONS.inc(backend=self.backend, outcome="generated")
+        return score, self.reason(clause, context, score), False
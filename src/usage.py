@@ -0,0 +1,171 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+LLM 토큰/시간 사용량 집계
+
+Gemini(usage_metadata)와 Ollama(prompt_eval_count, eval_count, *_duration) 응답에서 사용량을 꺼내
+현재 열려 있는 모든 집계 범위(요청 단위, 조항 단위)에 더하고 지표로도 내보냅니다.
+Ollama는 전체 시간(duration_sec) 외에 프롬프트 처리(prompt_eval_sec), 생성(eval_sec), 모델 적재(load_sec) 시간을 나누어 남깁니다.
+
+    with usage_scope(request_usage), usage_scope() as clause_usage:
+        detector.detect([...])
+    clause_usage.summary()   # {"calls": 1, "prompt_tokens": ..., "by_stage": {"judge": {...}}}
+
+범위는 contextvar로 전달되므로 asyncio 태스크와 asyncio.to_thread에는 따라가지만,
+직접 만든 threading.Thread에는 contextvars.copy_context()로 넘겨줘야 합니다.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from metrics import LLM_CALLS, LLM_COST_USD, LLM_PHASE_SECONDS, LLM_TOKENS
+
+# 100만 토큰당 (입력, 출력) USD 단가. 추정치이며 SAFESIGN_LLM_PRICES(JSON)로 덮어쓸 수 있다.
+# 로컬 Ollama 모델은 단가 0으로 본다.
+DEFAULT_PRICES_PER_MILLION = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+}
+PRICES_PER_MILLION = {
+    **DEFAULT_PRICES_PER_MILLION,
+    **{model: tuple(price) for model, price in json.loads(os.getenv("SAFESIGN_LLM_PRICES", "{}")).items()},
+}
+
+_FIELDS = ("calls", "prompt_tokens", "output_tokens", "total_tokens", "duration_sec", "estimated_cost_usd",
+           "prompt_eval_sec", "eval_sec", "load_sec")
+# Ollama 응답의 단계별 시간 필드(ns) -> 집계 필드 (지표의 phase 라벨은 집계 필드에서 _sec를 뗀 값)
+_OLLAMA_PHASES = {"prompt_eval_duration": "prompt_eval_sec", "eval_duration": "eval_sec", "load_duration": "load_sec"}
+
+_scopes: ContextVar[tuple] = ContextVar("safesign_usage_scopes", default=())
+_stage: ContextVar[str] = ContextVar("safesign_usage_stage", default="generate")
+
+
+def estimate_cost(model: str, prompt_tokens: int, output_tokens: int) -> float:
+    input_price, output_price = PRICES_PER_MILLION.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def _empty():
+    return {field: 0 for field in _FIELDS}
+
+
+class UsageTracker:
+    """단계(stage)별 LLM 사용량 합계"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_stage: Dict[str, Dict] = {}
+
+    def add(self, stage: str, prompt_tokens: int, output_tokens: int, duration_sec: float, cost_usd: float,
+            phases: Optional[Dict[str, float]] = None):
+        """phases: 단계별 시간(초) {"prompt_eval_sec": ..., "eval_sec": ..., "load_sec": ...} (Ollama만)"""
+        with self._lock:
+            totals = self._by_stage.setdefault(stage, _empty())
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["output_tokens"] += output_tokens
+            totals["total_tokens"] += prompt_tokens + output_tokens
+            totals["duration_sec"] += duration_sec
+            totals["estimated_cost_usd"] += cost_usd
+            for field, seconds in (phases or {}).items():
+                totals[field] += seconds
+
+    def summary(self) -> Dict:
+        with self._lock:
+            by_stage = {stage: dict(totals) for stage, totals in self._by_stage.items()}
+        overall = _empty()
+        for totals in by_stage.values():
+            for field in _FIELDS:
+                overall[field] += totals[field]
+        overall["by_stage"] = by_stage
+        return overall
+
+
+def merge_summaries(summaries: List[Optional[Dict]]) -> Dict:
+    """UsageTracker.summary() 결과 여러 개를 합친다 (긴 조항을 나누어 판별한 경우 등)"""
+    merged = _empty()
+    merged["by_stage"] = {}
+    for summary in summaries:
+        if not summary:
+            continue
+        for field in _FIELDS:
+            merged[field] += summary.get(field, 0)
+        for stage, totals in summary.get("by_stage", {}).items():
+            target = merged["by_stage"].setdefault(stage, _empty())
+            for field in _FIELDS:
+                target[field] += totals.get(field, 0)
+    return merged
+
+
+@contextmanager
+def usage_scope(tracker: Optional[UsageTracker] = None):
+    """블록 안에서 일어난 LLM 호출을 tracker에 모은다 (바깥 범위에도 계속 더해짐)"""
+    tracker = tracker or UsageTracker()
+    token = _scopes.set(_scopes.get() + (tracker,))
+    try:
+        yield tracker
+    finally:
+        _scopes.reset(token)
+
+
+@contextmanager
+def usage_stage(stage: str):
+    """블록 안의 LLM 호출을 어떤 단계(judge, suggestion, pdf_extraction 등)로 기록할지 지정"""
+    token = _stage.set(stage)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+def record_usage(backend: str, model: str, prompt_tokens: int, output_tokens: int, duration_sec: float = 0.0, stage: str = None,
+                 phases: Optional[Dict[str, float]] = None):
+    """
+    LLM 호출 한 번의 사용량을 현재 열린 모든 범위와 지표에 기록 (stage를 주지 않으면 usage_stage 값)
+    phases는 duration_sec를 나눈 단계별 시간(초)입니다 (prompt_eval_sec / eval_sec / load_sec).
+    """
+    prompt_tokens, output_tokens = int(prompt_tokens or 0), int(output_tokens or 0)
+    stage = stage or _stage.get()
+    cost = estimate_cost(model, prompt_tokens, output_tokens)
+
+    LLM_CALLS.inc(backend=backend, model=model, stage=stage)
+    LLM_TOKENS.inc(prompt_tokens, backend=backend, model=model, stage=stage, kind="prompt")
+    LLM_TOKENS.inc(output_tokens, backend=backend, model=model, stage=stage, kind="output")
+    if cost:
+        LLM_COST_USD.inc(cost, backend=backend, model=model, stage=stage)
+    for field, seconds in (phases or {}).items():
+        LLM_PHASE_SECONDS.inc(seconds, backend=backend, model=model, stage=stage, phase=field[:-len("_sec")])
+
+    for tracker in _scopes.get():
+        tracker.add(stage, prompt_tokens, output_tokens, duration_sec, cost, phases)
+
+
+def _field(response, name):
+    """ollama 응답(dict 또는 pydantic 객체)에서 필드를 꺼낸다"""
+    try:
+        return response[name]
+    except (KeyError, TypeError):
+        return getattr(response, name, None)
+
+
+def record_ollama_usage(model: str, response):
+    """
+    ollama.chat / generate 응답의 prompt_eval_count, eval_count와
+    total_duration / prompt_eval_duration / eval_duration / load_duration(ns) 기록
+    """
+    total_ns = _field(response, "total_duration") or 0
+    phases = {field: (_field(response, name) or 0) / 1e9 for name, field in _OLLAMA_PHASES.items()}
+    record_usage("ollama", model, _field(response, "prompt_eval_count"), _field(response, "eval_count"), total_ns / 1e9,
+                 phases=phases)
+
+
+def record_gemini_usage(model: str, response, duration_sec: float = 0.0, stage: str = None):
+    """Gemini 응답의 usage_metadata 기록 (thinking 토큰은 출력 토큰에 포함)"""
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is None:
+        return
+    output_tokens = (getattr(metadata, "candidates_token_count", 0) or 0) + (getattr(metadata, "thoughts_token_count", 0) or 0)
+    record_usage("gemini", model, getattr(metadata, "prompt_token_count", 0), output_tokens, duration_sec, stage)
@@ -0,0 +1,230 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+배포용 warmup / import 시간 점검
+
+run: 선택한 판별 백엔드가 쓰는 모듈, 임베딩 모델, 법령/판례 FAISS DB, LLM을 미리 불러오고 단계별 소요 시간을 출력합니다.
+     (컨테이너 이미지 빌드나 워커 시작 직후 실행해 모델 다운로드/디스크 캐시/Ollama 모델 적재를 끝내 둠)
+import-budget: 새 프로세스에서 `import fast_api` 시간을 재고, 예산을 넘거나 무거운 모듈이
+     import 시점에 불려오면 0이 아닌 코드로 종료합니다. (CI에서 import 시간 회귀 확인용, tests/test_import_budget.py도 같은 측정을 사용)
+
+    python warmup.py run --backend ollama --keep-alive -1
+    python warmup.py run --backend gemini --api-key $GEMINI_API_KEY --json ../data/warmup.json
+    python warmup.py import-budget --budget 1.5 --top 15
+
+fast_api는 SAFESIGN_WARMUP_ON_STARTUP=1 이면 서버 시작 시 같은 단계를 백그라운드로 실행합니다.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from detectors import DEFAULT_OLLAMA_MODEL, DETECTOR_BACKEND, DETECTOR_BACKENDS, detector_class
+
+# fast_api import 시점에 불려오면 안 되는 모듈 (백엔드가 정해진 뒤에만 필요)
+HEAVY_MODULES = (
+    "deepeval", "langchain_community", "langchain_huggingface", "sentence_transformers", "torch",
+    "faiss", "datasets", "onnxruntime", "ollama", "google.genai", "ollama_detctor", "toxic_detector", "llm_service",
+)
+DEFAULT_IMPORT_BUDGET_SEC = 1.5
+# gemini 백엔드에서 미리 클라이언트를 만들어 둘 모델 (PDF 추출, 판별)
+GEMINI_MODELS = ("gemini-2.5-flash", "gemini-2.5-flash-lite")
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import fast_api
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def _step(report, name, fn):
+    """단계 하나를 실행하고 소요 시간/결과를 report에 추가 (실패해도 다음 단계는 계속)"""
+    start = time.perf_counter()
+    try:
+        detail = fn()
+        status = "skipped" if detail is None else "ok"
+    except Exception as e:
+        detail, status = f"{type(e).__name__}: {e}", "failed"
+    seconds = time.perf_counter() - start
+    report.append({"step": name, "status": status, "seconds": round(seconds, 3), "detail": detail or ""})
+    icon = {"ok": "✅", "skipped": "⏭️", "failed": "❌"}[status]
+    print(f"{icon} [warmup] {name:<22} {seconds:>7.2f}s  {detail or ''}")
+    return status
+
+
+def run_warmup(backend=None, model_name=None, api_key=None, keep_alive=None, load_llm=True):
+    """
+    백엔드가 쓰는 자원을 순서대로 불러오고 [{step, status, seconds, detail}, ...]를 반환합니다.
+    임베딩/FAISS DB는 law.shared_resources 캐시에 남으므로 같은 프로세스의 detector 생성이 빨라집니다.
+    """
+    backend = backend or DETECTOR_BACKEND
+    model_name = model_name or DEFAULT_OLLAMA_MODEL
+    report = []
+    state = {}
+
+    def import_detector():
+        cls = detector_class(backend)
+        return f"{cls.__module__}.{cls.__name__}"
+
+    def load_embeddings():
+        from law.shared_resources import get_embeddings
+        state["embeddings"] = get_embeddings()
+        return getattr(state["embeddings"], "model_name", type(state["embeddings"]).__name__)
+
+    def first_query():
+        # 첫 encode에서 토크나이저/torch 커널 초기화가 일어나므로 미리 한 번 돌린다
+        vector = state["embeddings"].embed_query("근로계약서 워밍업")
+        return f"dim={len(vector)}"
+
+    def load_store(module_name):
+        def load():
+            import importlib
+            from law.shared_resources import load_vectorstore
+            db_path = importlib.import_module(module_name).DB_PATH
+            vectorstore = load_vectorstore(db_path, state["embeddings"])
+            if vectorstore is None:
+                return None
+            return f"{vectorstore.index.ntotal}건 ({db_path})"
+        return load
+
+    def build_retriever():
+        # 위에서 불러온 두 DB를 통합 인덱스로 옮긴다 (detector가 쓰는 검색 엔진)
+        from law.retrieval_engine import get_retriever
+        retriever = get_retriever(state["embeddings"])
+        if retriever.index is None:
+            return None
+        return f"{retriever.index.ntotal}건 ({retriever.storage if retriever.full_vectors else 'flat'})"
+
+    def load_ollama():
+        # 서버가 쓰는 공유 manager로 적재해야 같은 keep_alive로 고정된다
+        from ollama_manager import get_ollama_manager
+        manager = get_ollama_manager()
+        if keep_alive:
+            manager.keep_alive = keep_alive
+        models = list(dict.fromkeys([model_name, *manager.models]))
+        timings = manager.preload(models)
+        if not timings:
+            raise RuntimeError(f"Ollama 모델 적재 실패: {', '.join(models)}")
+        return ", ".join(f"{m} {t:.1f}s" for m, t in timings.items()) + f" (keep_alive={manager.keep_alive})"
+
+    def load_gemini():
+        if not api_key:
+            return None
+        from gemini_pool import get_client_pool
+        for model in GEMINI_MODELS:
+            get_client_pool().get_client(api_key, model)
+        return f"client pool 준비 ({', '.join(GEMINI_MODELS)})"
+
+    print(f"🔥 warmup 시작 (backend={backend})")
+    total_start = time.perf_counter()
+    _step(report, "import.detector", import_detector)
+    if _step(report, "embeddings.load", load_embeddings) == "ok":
+        _step(report, "embeddings.first_query", first_query)
+        _step(report, "faiss.law", load_store("law.legal_context"))
+        _step(report, "faiss.precedent", load_store("law.precedent_context"))
+        _step(report, "retrieval.unified", build_retriever)
+    if load_llm:
+        _step(report, "llm.ollama" if backend == "ollama" else "llm.gemini", load_ollama if backend == "ollama" else load_gemini)
+    print(f"🔥 warmup 완료 ({time.perf_counter() - total_start:.2f}s)")
+    return report
+
+
+def _parse_importtime(stderr, top):
+    """-X importtime 출력에서 fast_api가 직접 import한 모듈 중 누적 시간이 큰 top개를 뽑는다"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 중첩 깊이마다 두 칸씩 들여쓰기됨 (최상위는 한 칸) -> 깊이 1 = fast_api 등 최상위 모듈이 직접 import한 모듈
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth != 1:
+            continue
+        rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def measure_import(repeat=3):
+    """
+    새 프로세스에서 `python -X importtime`으로 fast_api를 import해 repeat번 중 가장 빠른 결과를 반환합니다.
+    ({"seconds", "modules"}, importtime 출력). import가 실패하면 RuntimeError
+    """
+    results = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _IMPORT_PROBE],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"fast_api import 실패:\n{proc.stderr[-2000:]}")
+        results.append((json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr))
+    return min(results, key=lambda item: item[0]["seconds"])
+
+
+def heavy_modules_loaded(probe):
+    """import 시점에 불려온 HEAVY_MODULES"""
+    loaded = set(probe["modules"])
+    return [name for name in HEAVY_MODULES if name in loaded]
+
+
+def import_budget(args):
+    """새 프로세스에서 fast_api import 시간/무거운 모듈 확인 (repeat번 중 최솟값을 예산과 비교)"""
+    try:
+        probe, stderr = measure_import(args.repeat)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    heavy = heavy_modules_loaded(probe)
+
+    print(f"⏱️ import fast_api: {probe['seconds']:.3f}s (예산 {args.budget:.2f}s, {args.repeat}회 중 최소)")
+    for seconds, name in _parse_importtime(stderr, args.top):
+        print(f"   {seconds:>7.3f}s  {name}")
+
+    failed = False
+    if heavy:
+        print(f"❌ import 시점에 불려온 무거운 모듈: {', '.join(heavy)}")
+        failed = True
+    if probe["seconds"] > args.budget:
+        print(f"❌ import 시간이 예산을 넘었습니다: {probe['seconds']:.3f}s > {args.budget:.2f}s")
+        failed = True
+    if not failed:
+        print("✅ import 시간 예산 통과")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SafeSign warmup / import 시간 점검")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="모델/인덱스 미리 불러오기")
+    run_parser.add_argument("--backend", choices=DETECTOR_BACKENDS, default=DETECTOR_BACKEND)
+    run_parser.add_argument("--model", default=DEFAULT_OLLAMA_MODEL, help="Ollama 판별 모델")
+    run_parser.add_argument("--api-key", default=os.getenv("GEMINI_API_KEY"), help="gemini 백엔드용 API Key")
+    run_parser.add_argument("--keep-alive", help="Ollama 모델을 메모리에 유지할 시간 (기본 SAFESIGN_OLLAMA_KEEP_ALIVE)")
+    run_parser.add_argument("--skip-llm", action="store_true", help="LLM 적재 단계 생략 (임베딩/인덱스만)")
+    run_parser.add_argument("--json", help="단계별 결과를 저장할 JSON 경로")
+
+    budget_parser = sub.add_parser("import-budget", help="fast_api import 시간 예산 확인")
+    budget_parser.add_argument("--budget", type=float, default=DEFAULT_IMPORT_BUDGET_SEC, help="허용 import 시간(초)")
+    budget_parser.add_argument("--repeat", type=int, default=3)
+    budget_parser.add_argument("--top", type=int, default=10, help="누적 import 시간이 큰 모듈 출력 개수")
+
+    args = parser.parse_args(argv)
+    if args.command == "import-budget":
+        return import_budget(args)
+
+    report = run_warmup(args.backend, args.model, args.api_key, args.keep_alive, load_llm=not args.skip_llm)
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"backend": args.backend, "steps": report}, f, ensure_ascii=False, indent=2)
+    return 1 if any(step["status"] == "failed" for step in report) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+src/의 모듈은 평면 구조(import ollama_manager, from law import ...)이고 데이터 경로가 ../data 기준이므로,
+src를 import 경로에 넣고 src에서 실행하는 것처럼 작업 디렉터리를 맞춘다.
+"""
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+@pytest.fixture(autouse=True)
+def _run_from_src(monkeypatch):
+    monkeypatch.chdir(SRC_DIR)
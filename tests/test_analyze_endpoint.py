@@ -0,0 +1,71 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+/analyze: 판별기가 일부 조항의 결과를 돌려주지 않아도 조항이 빠지거나 번호가 밀리지 않는지 확인한다.
+"""
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient
+
+import fast_api
+
+CONTRACT = (
+    "제1조 (목적) 이 계약은 근로조건을 정함을 목적으로 한다.\n"
+    "제2조 (임금) 임금은 월 250만원으로 한다.\n"
+    "제3조 (근로시간) 근로시간은 1일 8시간으로 한다.\n"
+)
+
+
+class DroppingDetector:
+    """두 번째 판별 단위의 결과를 돌려주지 않는 판별기 (DeepEval/2단계 판별 호출이 실패한 경우)"""
+    def __init__(self, drop=(1,)):
+        self.drop = set(drop)
+        self.judged = []
+
+    def detect(self, texts, max_concurrent):
+        self.judged.append(list(texts))
+        return [{"index": i, "clause": text, "is_toxic": False, "risk_score": 1.0, "reason": "문제 없음",
+                 "context_used": "", "outcome": "safe"} for i, text in enumerate(texts) if i not in self.drop]
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    fake = DroppingDetector()
+    monkeypatch.setattr(fast_api, "create_detector", lambda *args, **kwargs: fake)
+    return fake
+
+
+def analyze(client, **body):
+    response = client.post("/analyze", json={"api_key": "test", "text": CONTRACT, **body})
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+    assert events[-1]["status"] == "complete", events[-1]
+    return events
+
+
+def test_missing_verdict_is_kept_as_error(detector):
+    events = analyze(TestClient(fast_api.app))
+    results = events[-1]["results"]
+
+    assert [res["id"] for res in results] == [1, 2, 3]
+    assert [res["outcome"] for res in results] == ["safe", "error", "safe"]
+    assert results[1]["clause"].startswith("제2조")
+    assert results[1]["is_toxic"] is False
+
+
+def test_missing_verdict_is_judged_again_in_session(detector):
+    client = TestClient(fast_api.app)
+    session_id = analyze(client)[-1]["session_id"]
+
+    detector.drop.clear()
+    results = analyze(client, session_id=session_id)[-1]["results"]
+
+    # 결과가 빠졌던 제2조만 다시 판별하고 나머지는 이전 결과를 쓴다
+    assert len(detector.judged[-1]) == 1
+    assert detector.judged[-1][0].startswith("제2조")
+    assert [(res["outcome"], res["carried_over"]) for res in results] == [("safe", True), ("safe", False), ("safe", True)]
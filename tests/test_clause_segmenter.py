@@ -0,0 +1,120 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+clause_segmenter: 스트림 분할, 항 표시 인식, 긴 조항의 판별 단위, 판별 단위 결과 합치기
+"""
+from clause_segmenter import (ClauseSegmenter, aggregate_unit_results, build_judge_units, parse_text_to_chunks,
+                              segment_contract)
+
+CONTRACT = (
+    "근로계약서\n갑과 을은 다음과 같이 근로계약을 체결한다.\n"
+    "제1조 (목적) 이 계약은 근로조건을 정함을 목적으로 한다.\n"
+    "제2조 (임금) ① 임금은 월 250만원으로 한다.\n② 임금은 매월 25일에 지급한다.\n"
+    "제3조 (근로시간)\n① 근로시간은 1일 8시간으로 한다. 다만, 제2조 ②항에 따른 지급일에는 예외로 한다.\n"
+    "② 휴게시간은 1시간으로 한다.\n"
+    "제3조의2 (수습) 수습 기간은 3개월로 한다.\n"
+)
+
+
+def records(segments):
+    return [(r.level, r.number, r.start, r.end, r.text) for segment in segments for r in segment.iter_records()]
+
+
+def test_streamed_feed_matches_whole_text():
+    whole = segment_contract(CONTRACT)
+    segmenter = ClauseSegmenter()
+    streamed = []
+    for i in range(0, len(CONTRACT), 7):
+        streamed.extend(segmenter.feed(CONTRACT[i:i + 7]))
+        assert segmenter.text == CONTRACT[:i + 7]
+    streamed.extend(segmenter.flush())
+
+    assert records(streamed) == records(whole)
+    assert segmenter.text == CONTRACT
+    for record in (r for segment in streamed for r in segment.iter_records()):
+        assert CONTRACT[record.start:record.end] == record.text
+
+
+def test_article_and_paragraph_numbers():
+    segments = segment_contract(CONTRACT)
+    assert [(s.level, s.number) for s in segments] == [("preamble", None), ("article", "1"), ("article", "2"),
+                                                         ("article", "3"), ("article", "3의2")]
+    # 제목 바로 뒤의 ①도 항으로 본다
+    assert [p.number for p in segments[2].children] == ["①", "②"]
+
+
+def test_punctuated_and_parenthesized_headers():
+    text = ("제1조. 목적\n이 계약은 근로조건을 정한다.\n제2조: 임금\n① 임금은 월 250만원으로 한다.\n"
+            "제3조에 따라 지급일은 매월 25일로 한다.\n제4조 (근로시간) 1일 8시간으로 한다.\n제5조·수습 3개월로 한다.\n")
+    segments = segment_contract(text)
+    assert [s.number for s in segments] == ["1", "2", "4", "5"]
+    assert segments[1].text.endswith("제3조에 따라 지급일은 매월 25일로 한다.")
+    assert [p.number for p in segments[1].children] == ["①"]
+    assert segments[2].title == "근로시간"
+    assert len(parse_text_to_chunks(text)) == 4
+
+    # 스트림으로 넣어도 "제2조" 다음의 구두점이 늦게 와서 제목을 놓치지 않는다
+    segmenter = ClauseSegmenter()
+    streamed = []
+    for i in range(0, len(text), 3):
+        streamed.extend(segmenter.feed(text[i:i + 3]))
+    streamed.extend(segmenter.flush())
+    assert records(streamed) == records(segments)
+
+
+def test_inline_circled_reference_is_not_a_paragraph():
+    article = segment_contract(CONTRACT)[3]
+    assert [p.number for p in article.children] == ["①", "②"]
+    assert "제2조 ②항에 따른" in article.children[0].text
+
+
+def test_long_article_units_keep_original_positions():
+    body = "".join(f"{'①②③④⑤'[i]} 근로자는 회사의 지시에 따라 업무를 수행하여야 한다. " * 3 + "\n" for i in range(5))
+    text = "계약서 서문입니다. 다음과 같이 정한다.\n제7조 (업무) " + body
+    segments = segment_contract(text)
+    units = build_judge_units(segments, max_unit_chars=120)
+
+    article_units = [unit for unit in units if unit.article_index == 1]
+    assert len(article_units) > 1
+    for unit in article_units:
+        assert unit.text == "제7조 (업무)\n" + text[unit.start:unit.end]
+        assert len(unit.text) <= 120
+
+
+def judged(index, text, is_toxic, score, outcome=None):
+    result = {"index": index, "clause": text, "is_toxic": is_toxic, "risk_score": score, "reason": f"r{index}",
+              "context_used": ""}
+    if outcome:
+        result["outcome"] = outcome
+    return result
+
+
+def test_aggregate_matches_duplicate_text_units_by_index():
+    text = "제1조 (기타) 회사의 지시에 따른다.\n제1조 (기타) 회사의 지시에 따른다.\n"
+    segments = segment_contract(text)
+    units = build_judge_units(segments)
+    assert units[0].text == units[1].text
+
+    # 결과가 입력 순서와 다르게 와도 index로 연결
+    results = aggregate_unit_results(segments, units, [
+        judged(1, units[1].text, False, 1.0, "safe"),
+        judged(0, units[0].text, True, 8.0, "toxic"),
+    ])
+    assert [(r["start"], r["is_toxic"], r["outcome"]) for r in results] == [(segments[0].start, True, "toxic"),
+                                                                           (segments[1].start, False, "safe")]
+    assert all("index" not in r for r in results)
+
+
+def test_aggregate_skips_missing_and_marks_partial_failures():
+    body = "".join(f"{'①②③'[i]} 근로자는 회사의 지시에 따라 업무를 수행하여야 한다. " * 3 + "\n" for i in range(3))
+    text = "제1조 (임금) 임금은 매월 지급한다.\n제2조 (업무) " + body
+    segments = segment_contract(text)
+    units = build_judge_units(segments, max_unit_chars=120)
+    long_units = [i for i, unit in enumerate(units) if unit.article_index == 1]
+    assert len(long_units) > 1
+
+    # 첫 조항 결과는 빠지고, 긴 조항은 조각 하나만 판별됨
+    results = aggregate_unit_results(segments, units, [judged(long_units[0], units[long_units[0]].text, True, 7.0, "toxic")])
+    assert [r["start"] for r in results] == [segments[1].start]
+    assert results[0]["outcome"] == "error"
@@ -0,0 +1,112 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+contract_session: 이전 분석과 비교한 조항 추가/수정/유지/삭제 판정, 이전 결과 이어 쓰기, 세션 저장소의 Key 확인과 만료
+"""
+import pytest
+
+from clause_segmenter import segment_contract
+from contract_session import ContractSessionStore, clause_hash
+from metrics import CACHE_LOOKUPS
+
+CONFIG = "ollama|test-model|1200"
+ORIGINAL = (
+    "제1조 (목적) 이 계약은 근로조건을 정함을 목적으로 한다.\n"
+    "제2조 (임금) 임금은 월 250만원으로 한다.\n"
+    "제3조 (손해배상) 근로자는 모든 손해를 배상한다.\n"
+)
+
+
+def judged(segments, outcomes=None):
+    """분석이 끝난 조항 결과 (개선안과 사용량까지 채워진 형태)"""
+    outcomes = outcomes or ["safe"] * len(segments)
+    return [{"id": i + 1, "clause": segment.text, "start": segment.start, "end": segment.end, "outcome": outcome,
+             "is_toxic": outcome == "toxic", "suggestion": f"개선안 {i + 1}", "usage": {"calls": 1}, "carried_over": False}
+            for i, (segment, outcome) in enumerate(zip(segments, outcomes))]
+
+
+@pytest.fixture
+def session():
+    session = ContractSessionStore().get_or_create(None, "key-a")
+    segments = segment_contract(ORIGINAL)
+    session.remember(segments, judged(segments), CONFIG)
+    return session
+
+
+def test_first_analysis_judges_everything():
+    session = ContractSessionStore().get_or_create(None, "key-a")
+    diff = session.diff(segment_contract(ORIGINAL), CONFIG)
+    assert (diff.added, diff.modified, diff.unchanged, diff.removed) == ([0, 1, 2], [], [], 0)
+
+
+def test_diff_classifies_added_modified_unchanged_removed(session):
+    edited = (
+        "제1조 (목적)   이 계약은 근로조건을\n정함을 목적으로 한다.\n"   # 공백/줄바꿈만 바뀜
+        "제2조 (임금) 임금은 월 300만원으로 한다.\n"                      # 본문 수정
+        "제4조 (휴가) 연차 유급휴가는 법에 따른다.\n"                      # 새 조항 (제3조 삭제)
+    )
+    hits = CACHE_LOOKUPS.value(cache="clause_session", result="hit")
+    misses = CACHE_LOOKUPS.value(cache="clause_session", result="miss")
+
+    diff = session.diff(segment_contract(edited), CONFIG)
+
+    assert (diff.added, diff.modified, diff.unchanged, diff.removed) == ([2], [1], [0], 2)
+    assert diff.changed == [1, 2]
+    assert diff.summary() == {"added": 1, "modified": 1, "unchanged": 1, "removed": 2}
+    assert CACHE_LOOKUPS.value(cache="clause_session", result="hit") == hits + 1
+    assert CACHE_LOOKUPS.value(cache="clause_session", result="miss") == misses + 2
+
+
+def test_config_change_judges_everything_again(session):
+    diff = session.diff(segment_contract(ORIGINAL), "gemini|gemini-2.5-flash|1200")
+    assert (diff.added, diff.unchanged, diff.removed) == ([0, 1, 2], [], 3)
+
+
+def test_carried_result_moves_to_new_position_without_usage(session):
+    moved = segment_contract("서문입니다.\n\n" + ORIGINAL)
+    diff = session.diff(moved, CONFIG)
+    index = diff.unchanged[-1]
+    segment = moved[index]
+
+    result = session.carried_result(segment, clause_id=7)
+
+    assert (result["id"], result["start"], result["end"]) == (7, segment.start, segment.end)
+    assert result["carried_over"] is True
+    assert result["suggestion"] == "개선안 3"
+    assert "usage" not in result
+    # 돌려준 결과를 고쳐도 세션에 기억된 결과는 그대로다
+    result["suggestion"] = "바뀜"
+    assert session.carried_result(segment, clause_id=7)["suggestion"] == "개선안 3"
+
+
+def test_only_judged_outcomes_are_remembered():
+    session = ContractSessionStore().get_or_create(None, "key-a")
+    segments = segment_contract(ORIGINAL)
+    session.remember(segments, judged(segments, ["safe", "timeout", "toxic"]), CONFIG)
+
+    assert session.revision == 1
+    assert set(session.results) == {clause_hash(segments[0].text), clause_hash(segments[2].text)}
+    diff = session.diff(segments, CONFIG)
+    # 시간 초과로 채웠던 조항은 다시 판별한다 (조 번호는 기억하지 않았으므로 추가로 본다)
+    assert (diff.added, diff.modified, diff.unchanged) == ([1], [], [0, 2])
+
+
+def test_store_checks_api_key_and_expires():
+    store = ContractSessionStore(ttl_sec=60, max_sessions=2)
+    first = store.get_or_create(None, "key-a")
+    assert store.get_or_create(first.session_id, "key-a") is first
+    # 다른 API Key로는 같은 세션 ID를 써도 새 세션
+    other = store.get_or_create(first.session_id, "key-b")
+    assert other is not first and other.session_id != first.session_id
+
+    # 최대 개수를 넘으면 가장 오래 쓰지 않은 세션(first)부터 지운다
+    store.get_or_create(None, "key-c")
+    assert len(store) == 2
+    assert store.get_or_create(first.session_id, "key-a") is not first
+
+    # 보관 기간 동안 쓰지 않은 세션은 다음 요청 때 정리된다
+    for stale in list(store._sessions.values()):
+        stale.updated_at -= 120
+    store.get_or_create(None, "key-d")
+    assert len(store) == 1
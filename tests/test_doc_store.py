@@ -0,0 +1,104 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+law.doc_store: 압축 문서 저장소의 저장/다시 열기, 발췌 읽기, 이어 쓰기, 여러 스레드의 동시 읽기
+"""
+import mmap
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from law import doc_store
+from law.doc_store import RECORDS_FILE, CompressedDocStore
+
+FIELDS = ["case_name", "court", "page"]
+
+
+def make_documents(n):
+    return [(f"[사건번호] 2020다{1000 + i}\n[판결요지] 근로자는 회사의 지시에 따라 {i}번째 업무를 수행한다. " * 5,
+             {"case_name": ["해고", "임금", "퇴직금"][i % 3], "court": "대법원", "page": i if i % 4 else None},
+             f"doc-{i}")
+            for i in range(n)]
+
+
+def build(path, documents):
+    # 사전 학습(DICT_MIN_SAMPLES개 이상)까지 거치도록 본문 표본을 넘긴다
+    store = CompressedDocStore.create(str(path), FIELDS, [text.encode("utf-8") for text, _, _ in documents])
+    for text, metadata, doc_id in documents:
+        store.append(text, metadata, doc_id)
+    store.close()
+    return CompressedDocStore(str(path))
+
+
+def test_round_trip_after_reopen(tmp_path):
+    documents = make_documents(150)
+    store = build(tmp_path, documents)
+
+    assert len(store) == len(documents)
+    for position, (text, metadata, doc_id) in enumerate(documents):
+        assert store.text(position) == text
+        assert store.doc_id(position) == doc_id
+        # 값이 None인 메타데이터는 저장하지 않는다
+        assert store.metadata(position) == {key: value for key, value in metadata.items() if value is not None}
+    assert store.text(3, max_chars=12) == documents[3][0][:12]
+    assert store.raw_bytes() == sum(len(text.encode("utf-8")) for text, _, _ in documents)
+    store.close()
+
+
+def test_append_after_reopen_and_torn_tail(tmp_path):
+    documents = make_documents(120)
+    store = build(tmp_path, documents[:100])
+    for text, metadata, doc_id in documents[100:]:
+        store.append(text, metadata, doc_id)
+    # 쓰는 중에도 방금 쓴 문서를 읽을 수 있다 (파일이 커지면 다시 매핑)
+    assert store.text(119) == documents[119][0]
+    store.close()
+
+    # 레코드를 쓰다 멈춘 꼬리는 다시 열 때 버린다
+    with open(os.path.join(str(tmp_path), RECORDS_FILE), "ab") as f:
+        f.write(b"\x00" * 5)
+    store = CompressedDocStore(str(tmp_path))
+    assert len(store) == 120
+    assert [store.doc_id(i) for i in (0, 99, 100, 119)] == ["doc-0", "doc-99", "doc-100", "doc-119"]
+    store.close()
+
+
+def test_concurrent_first_reads_share_one_mapping(tmp_path, monkeypatch):
+    documents = make_documents(200)
+    build(tmp_path, documents).close()
+    workers = 8
+    # 매핑 전 flush와 mmap 생성에 시간이 걸리게 해, 먼저 매핑을 끝낸 스레드가 읽는 동안 다른 스레드가 다시 매핑하게 만든다
+    flush = doc_store._AppendOnlyFile.flush
+
+    def slow_flush(self):
+        time.sleep(random.uniform(0, 0.003))
+        flush(self)
+
+    def slow_mmap(*args, **kwargs):
+        time.sleep(random.uniform(0, 0.003))
+        return mmap.mmap(*args, **kwargs)
+
+    monkeypatch.setattr(doc_store._AppendOnlyFile, "flush", slow_flush)
+    monkeypatch.setattr(doc_store, "mmap", SimpleNamespace(mmap=slow_mmap, ACCESS_READ=mmap.ACCESS_READ))
+
+    for _ in range(20):
+        # 새로 연 저장소는 아직 매핑이 없어서, 동시에 들어온 첫 읽기들이 다시 매핑을 두고 경쟁한다
+        store = CompressedDocStore(str(tmp_path))
+        barrier = threading.Barrier(workers)
+
+        def read_all(offset):
+            barrier.wait()
+            return [store.text((offset + i) % len(documents), max_chars=200 if i % 2 else None)
+                    for i in range(len(documents))]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(read_all, range(workers)))
+        for offset, texts in enumerate(results):
+            for i, text in enumerate(texts):
+                expected = documents[(offset + i) % len(documents)][0]
+                assert text == (expected[:200] if i % 2 else expected)
+        store.close()
@@ -0,0 +1,52 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+extraction_cache: 캐시 키(PDF 내용 + 모델 + 프롬프트 버전), 저장/조회, 용량 초과 시 LRU 삭제
+"""
+import os
+
+from extraction_cache import ExtractionCache
+from metrics import CACHE_LOOKUPS
+
+
+def test_key_depends_on_content_model_and_prompt_version():
+    key = ExtractionCache.make_key(b"%PDF-1.4 a", "gemini-2.5-flash", "v1")
+    assert key == ExtractionCache.make_key(b"%PDF-1.4 a", "gemini-2.5-flash", "v1")
+    assert len({
+        key,
+        ExtractionCache.make_key(b"%PDF-1.4 b", "gemini-2.5-flash", "v1"),
+        ExtractionCache.make_key(b"%PDF-1.4 a", "gemini-2.5-flash-lite", "v1"),
+        ExtractionCache.make_key(b"%PDF-1.4 a", "gemini-2.5-flash", "v2"),
+    }) == 4
+
+
+def test_round_trip_and_hit_miss_metrics(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    key = ExtractionCache.make_key(b"pdf", "model", "v1")
+    hits, misses = CACHE_LOOKUPS.value(cache="extraction", result="hit"), CACHE_LOOKUPS.value(cache="extraction", result="miss")
+
+    assert cache.get(key) is None
+    cache.put(key, "제1조 (목적) 본문")
+    cache.put(ExtractionCache.make_key(b"pdf", "model", "v2"), None)
+    assert cache.get(key) == "제1조 (목적) 본문"
+
+    assert CACHE_LOOKUPS.value(cache="extraction", result="hit") == hits + 1
+    assert CACHE_LOOKUPS.value(cache="extraction", result="miss") == misses + 1
+    # 임시 파일은 남지 않고, None은 저장하지 않는다
+    assert os.listdir(cache.cache_dir) == [f"{key}.txt"]
+
+
+def test_evicts_least_recently_used_over_budget(tmp_path):
+    cache = ExtractionCache(str(tmp_path), max_bytes=250)
+    keys = [ExtractionCache.make_key(str(i).encode(), "model", "v1") for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.put(key, "가" * 33)  # 99 bytes
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    # 먼저 저장한 항목을 읽으면 최근 사용으로 갱신되어, 초과 시 두 번째 항목이 먼저 지워진다
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[2], "가" * 33)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
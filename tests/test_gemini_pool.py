@@ -0,0 +1,82 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+gemini_pool: (API Key, 모델)별 클라이언트 재사용, API Key별 동시 요청 제한, 유휴 클라이언트/슬롯 정리
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+import gemini_pool
+from gemini_pool import GeminiClientPool
+
+
+class FakeClient:
+    def __init__(self, api_key=None, http_options=None):
+        self.api_key = api_key
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def _fake_genai(monkeypatch):
+    monkeypatch.setattr(gemini_pool.genai, "Client", FakeClient)
+
+
+def test_clients_are_reused_per_key_and_model():
+    pool = GeminiClientPool()
+    client = pool.get_client("key-a", "gemini-2.5-flash")
+    assert pool.get_client("key-a", "gemini-2.5-flash") is client
+    with pool.lease("key-a", "gemini-2.5-flash") as leased:
+        assert leased is client
+    assert pool.get_client("key-a", "gemini-2.5-flash-lite") is not client
+    assert pool.get_client("key-b", "gemini-2.5-flash").api_key == "key-b"
+
+
+def test_lease_limits_concurrency_per_key():
+    pool = GeminiClientPool(max_concurrent_per_key=2)
+    active = {"key-a": 0, "key-b": 0}
+    peak = {"key-a": 0, "key-b": 0}
+    lock = threading.Lock()
+
+    def call(api_key):
+        with pool.lease(api_key, "gemini-2.5-flash"):
+            with lock:
+                active[api_key] += 1
+                peak[api_key] = max(peak[api_key], active[api_key])
+            time.sleep(0.02)
+            with lock:
+                active[api_key] -= 1
+
+    with ThreadPoolExecutor(max_workers=12) as executor:
+        list(executor.map(call, ["key-a"] * 6 + ["key-b"] * 6))
+    assert peak == {"key-a": 2, "key-b": 2}
+
+
+def test_evict_idle_skips_clients_in_use():
+    pool = GeminiClientPool(idle_timeout=0)
+    idle = pool.get_client("key-idle", "gemini-2.5-flash")
+    with pool.lease("key-busy", "gemini-2.5-flash") as busy:
+        assert pool.evict_idle() == 1
+        assert idle.closed and not busy.closed
+        # 사용 중인 API Key의 슬롯은 남아 있다
+        assert set(pool._key_slots) == {"key-busy"}
+    assert pool.evict_idle() == 1
+    assert busy.closed
+    assert pool._clients == {} and pool._key_slots == {}
+    # 정리된 뒤에는 새 클라이언트를 만든다
+    assert pool.get_client("key-idle", "gemini-2.5-flash") is not idle
+
+
+def test_close_all_closes_every_client():
+    pool = GeminiClientPool()
+    clients = [pool.get_client(f"key-{i}", "gemini-2.5-flash") for i in range(3)]
+    pool.close_all()
+    assert all(client.closed for client in clients)
@@ -0,0 +1,195 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+gemini_scheduler: RPM/TPM 토큰 버킷, AIMD 동시 호출 수 조정, 재시도 가능한 오류 분류와 백오프, Key별 스케줄러 정리
+"""
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+pytest.importorskip("google.genai")
+
+import gemini_scheduler
+from deadline import deadline_after, request_deadline
+from gemini_scheduler import KeyScheduler, TokenBucket, retry_reason
+from metrics import GEMINI_CONCURRENCY_LIMIT, GEMINI_RETRIES
+
+
+class FakeClock:
+    """gemini_scheduler가 쓰는 time 모듈 대신: monotonic은 직접 움직이고 sleep은 기록만 한다"""
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(gemini_scheduler, "time", clock)
+    return clock
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+class ServerError(Exception):
+    def __init__(self):
+        super().__init__("503 Service Unavailable")
+        self.response = SimpleNamespace(status_code=503)
+
+
+def test_token_bucket_reserves_and_refills(clock):
+    bucket = TokenBucket(60)  # 초당 1개
+    assert [bucket.reserve(1) for _ in range(60)] == [0.0] * 60
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    assert bucket.reserve(1) == pytest.approx(2.0)
+    clock.now += 2
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    # 한도보다 큰 요청도 한 번에 버킷 전체 이상은 기다리지 않는다
+    clock.now += 3600
+    assert bucket.reserve(10_000) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+    tokens = TokenBucket(600)
+    tokens.reserve(500)
+    tokens.adjust(-300)  # 추정보다 적게 썼으면 돌려받는다
+    assert tokens.tokens == pytest.approx(400)
+    tokens.adjust(-10_000)
+    assert tokens.tokens == 600
+    assert TokenBucket(0).reserve(10**9) == 0.0
+
+
+@pytest.mark.parametrize("error, reason", [
+    (RateLimited(), "rate_limited"),
+    (ServerError(), "server_error"),
+    (httpx.ReadTimeout("느림"), "timeout"),
+    (ConnectionError(), "timeout"),
+    (ValueError("잘못된 요청"), None),
+    (SimpleNamespace(code=400), None),
+])
+def test_retry_reason(error, reason):
+    assert retry_reason(error) == reason
+
+
+def test_aimd_grows_additively_and_halves_once_per_burst(clock):
+    scheduler = KeyScheduler("user-key-aimd", initial_concurrency=2, max_concurrency=4)
+    for _ in range(2):
+        with scheduler.slot("judge", 100):
+            clock.now += 1.0
+    assert scheduler.limit == pytest.approx(2 + 1 / 2 + 1 / 2.5)
+    for _ in range(10):
+        with scheduler.slot("judge", 100):
+            clock.now += 1.0
+    assert scheduler.limit == 4
+
+    # 같은 순간 함께 나갔던 호출들이 모두 429를 받아도 한 번만 줄인다
+    for _ in range(3):
+        with pytest.raises(RateLimited), scheduler.slot("judge", 100):
+            raise RateLimited()
+    assert scheduler.limit == 2
+    clock.now += 1.5  # 기준 지연(1초)이 지나면 다시 줄일 수 있다
+    with pytest.raises(ServerError), scheduler.slot("judge", 100):
+        raise ServerError()
+    assert scheduler.limit == 1
+    clock.now += 1.5
+    with pytest.raises(RateLimited), scheduler.slot("judge", 100):
+        raise RateLimited()
+    assert scheduler.limit == 1
+    # 재시도 대상이 아닌 오류는 한도를 바꾸지 않는다
+    with pytest.raises(ValueError), scheduler.slot("judge", 100):
+        raise ValueError()
+    assert scheduler.limit == 1 and scheduler.in_flight == 0
+
+
+def test_slow_responses_shrink_the_limit(clock):
+    scheduler = KeyScheduler("user-key-latency", initial_concurrency=4, max_concurrency=8)
+    scheduler.acquire("judge", 0)
+    scheduler.release("judge", 0, latency_sec=1.0)
+    assert scheduler.baseline_sec == {"judge": 1.0}
+    limit = scheduler.limit
+    clock.now += 10
+    scheduler.acquire("judge", 0)
+    scheduler.release("judge", 0, latency_sec=3.5)
+    assert scheduler.limit == pytest.approx(limit * 0.9)
+    # PDF 추출처럼 원래 오래 걸리는 종류는 따로 기준 지연을 잡는다
+    scheduler.acquire("pdf", 0)
+    scheduler.release("pdf", 0, latency_sec=20.0)
+    assert scheduler.limit > limit * 0.9
+    assert scheduler.baseline_sec["pdf"] == 20.0
+
+
+def test_run_retries_with_backoff_and_reconciles_tokens(clock, monkeypatch):
+    monkeypatch.setattr(gemini_scheduler, "backoff_sec", lambda attempt: 0.5 * 2 ** attempt)
+    scheduler = KeyScheduler("user-key-retry", tpm=10_000, max_retries=2)
+    retries = GEMINI_RETRIES.value(kind="judge", reason="rate_limited")
+    outcomes = [RateLimited(), RateLimited(), SimpleNamespace(tokens=700)]
+
+    def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert scheduler.run("judge", 1000, call, used_tokens=lambda r: r.tokens).tokens == 700
+    assert clock.sleeps == [0.5, 1.0]
+    assert GEMINI_RETRIES.value(kind="judge", reason="rate_limited") == retries + 2
+    # 추정 1000 토큰을 세 번 차감하고, 성공한 호출만 실제 사용량(700)으로 맞춘다
+    assert scheduler.tokens.tokens == pytest.approx(10_000 - 3000 + 300)
+
+    outcomes[:] = [RateLimited()] * 3
+    with pytest.raises(RateLimited):
+        scheduler.run("judge", 1, call)
+    assert outcomes == []
+
+
+def test_no_retry_past_deadline(clock, monkeypatch):
+    # 마감 시각은 deadline 모듈의 실제 시계 기준
+    scheduler = KeyScheduler("user-key-deadline", max_retries=5)
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise RateLimited()
+
+    with request_deadline(time.monotonic() - 1), pytest.raises(RateLimited):
+        scheduler.run("judge", 1, call)
+    assert len(calls) == 1
+
+    # 백오프는 남은 시간보다 길게 기다리지 않는다
+    monkeypatch.setattr(gemini_scheduler, "backoff_sec", lambda attempt: 60.0)
+    with request_deadline(deadline_after(5)):
+        assert scheduler.retry_after_error("judge", RateLimited(), 0)
+    assert len(clock.sleeps) == 1 and 0 < clock.sleeps[0] <= 5
+
+
+def test_schedulers_are_shared_and_evicted(monkeypatch):
+    monkeypatch.setattr(gemini_scheduler, "_schedulers", gemini_scheduler.OrderedDict())
+    before = GEMINI_CONCURRENCY_LIMIT.value(key_class="user")
+    first = gemini_scheduler.get_scheduler("user-key-a")
+    assert gemini_scheduler.get_scheduler("user-key-a") is first
+    busy = gemini_scheduler.get_scheduler("user-key-b")
+    busy.acquire("judge", 0)
+    gemini_scheduler.get_scheduler("user-key-c")
+    assert GEMINI_CONCURRENCY_LIMIT.value(key_class="user") == pytest.approx(before + 3 * first.limit)
+
+    with gemini_scheduler._schedulers_lock:
+        gemini_scheduler._evict_schedulers(idle_sec=0, max_keys=1000)
+    # 호출 중인 Key와 가장 최근 Key는 남고, 정리된 Key의 한도는 지표에서 빠진다
+    assert list(gemini_scheduler._schedulers) == ["user-key-b", "user-key-c"]
+    assert GEMINI_CONCURRENCY_LIMIT.value(key_class="user") == pytest.approx(before + 2 * first.limit)
+    busy.release("judge", 0)
+    for scheduler in gemini_scheduler._schedulers.values():
+        scheduler.close()
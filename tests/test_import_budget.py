@@ -0,0 +1,39 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+`import fast_api` 시간 예산: warmup.py import-budget과 같은 측정(python -X importtime, 새 프로세스)을 쓴다.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import SRC_DIR
+from warmup import DEFAULT_IMPORT_BUDGET_SEC, heavy_modules_loaded, measure_import
+
+pytest.importorskip("fastapi")
+
+IMPORT_BUDGET_SEC = float(os.getenv("SAFESIGN_IMPORT_BUDGET_SEC", DEFAULT_IMPORT_BUDGET_SEC))
+
+
+def test_import_fast_api_within_budget():
+    probe, _ = measure_import(repeat=3)
+    assert heavy_modules_loaded(probe) == []
+    assert probe["seconds"] <= IMPORT_BUDGET_SEC
+
+
+def test_dotenv_loaded_before_settings_are_read(tmp_path):
+    # fast_api가 import하는 deadline 모듈은 import 시점에 SAFESIGN_REQUEST_BUDGET_SEC를 읽는다
+    env = {key: value for key, value in os.environ.items() if key != "SAFESIGN_REQUEST_BUDGET_SEC"}
+    probe = (
+        "import dotenv.main\n"
+        f"dotenv.main.find_dotenv = lambda *args, **kwargs: {str(tmp_path / '.env')!r}\n"
+        "import fast_api, deadline\n"
+        "print(deadline.REQUEST_BUDGET_SEC)\n"
+    )
+    (tmp_path / ".env").write_text("SAFESIGN_REQUEST_BUDGET_SEC=42\n", encoding="utf-8")
+    proc = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, cwd=SRC_DIR, env=env)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    assert proc.stdout.strip().splitlines()[-1] == "42.0"
@@ -0,0 +1,121 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+llm_cassette: 녹화 파일 형식, 같은 프롬프트의 재생 순서, 녹화되지 않은 프롬프트 처리
+"""
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("deepeval")
+
+from deepeval.models.base_model import DeepEvalBaseLLM
+from pydantic import BaseModel
+
+import llm_cassette
+from llm_cassette import CassetteMissError, RecordingLLM, ReplayLLM, prompt_key
+
+
+class Verdict(BaseModel):
+    is_toxic: bool
+    risk_score: float
+
+
+class ScriptedLLM(DeepEvalBaseLLM):
+    """프롬프트마다 정해 둔 응답을 순서대로 돌려주는 LLM"""
+    def __init__(self, script):
+        self.script = {prompt: list(responses) for prompt, responses in script.items()}
+        self.schemas = []
+
+    def load_model(self):
+        return "scripted"
+
+    def generate(self, prompt, schema=None):
+        self.schemas.append(schema)
+        response = self.script[prompt].pop(0)
+        return schema(**json.loads(response)) if schema is not None else response
+
+    async def a_generate(self, prompt, schema=None):
+        return self.generate(prompt, schema=schema)
+
+    def get_model_name(self):
+        return "scripted-model"
+
+
+def record(path, script, calls):
+    recorder = RecordingLLM(ScriptedLLM(script), str(path))
+    for prompt in calls:
+        recorder.generate(prompt)
+    return recorder
+
+
+def test_recording_writes_one_line_per_call(tmp_path):
+    path = tmp_path / "nested" / "cassette.jsonl"
+    recorder = RecordingLLM(ScriptedLLM({"제1조": ['{"is_toxic": true, "risk_score": 8}']}), str(path))
+    response = recorder.generate("제1조", schema=Verdict)
+
+    # 스키마를 받는 어댑터에는 스키마를 넘기고, 녹화는 JSON 텍스트로 한다
+    assert recorder.inner.schemas == [Verdict]
+    assert response == Verdict(is_toxic=True, risk_score=8)
+    entries = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert recorder.record_count == len(entries) == 1
+    assert entries[0]["key"] == prompt_key("제1조")
+    assert entries[0]["model"] == "scripted-model"
+    assert json.loads(entries[0]["response"]) == {"is_toxic": True, "risk_score": 8.0}
+    assert entries[0]["latency_sec"] >= 0
+
+
+def test_failed_calls_are_not_recorded(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    recorder = RecordingLLM(ScriptedLLM({"제1조": []}), str(path))
+    with pytest.raises(IndexError):
+        recorder.generate("제1조")
+    assert recorder.record_count == 0
+    assert not path.exists()
+
+
+def test_replay_returns_recordings_in_order_then_repeats_last(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    record(path, {"제1조": ["첫 번째", "두 번째"], "제2조": ["다른 조항"]}, ["제1조", "제2조", "제1조"])
+
+    replay = ReplayLLM(str(path))
+    assert replay.get_model_name() == "scripted-model"
+    assert replay.generate("제1조") == "첫 번째"
+    assert asyncio.run(replay.a_generate("제1조")) == "두 번째"
+    assert replay.generate("제1조") == "두 번째"
+    assert replay.generate("제2조") == "다른 조항"
+    assert (replay.hits, replay.misses) == (4, 0)
+
+
+def test_miss_raises_or_falls_back(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    record(path, {"제1조": ["녹화된 응답"]}, ["제1조"])
+
+    replay = ReplayLLM(str(path))
+    with pytest.raises(CassetteMissError):
+        replay.generate("제9조")
+    with pytest.raises(KeyError):
+        asyncio.run(replay.a_generate("제9조"))
+    assert (replay.hits, replay.misses) == (0, 2)
+
+    fallback = ScriptedLLM({"제9조": ["대체 응답", "비동기 대체 응답"]})
+    replay = ReplayLLM(str(path), fallback=fallback)
+    assert replay.generate("제9조") == "대체 응답"
+    assert asyncio.run(replay.a_generate("제9조")) == "비동기 대체 응답"
+    assert replay.generate("제1조") == "녹화된 응답"
+
+
+def test_original_timing_scales_recorded_latency(tmp_path, monkeypatch):
+    path = tmp_path / "cassette.jsonl"
+    path.write_text(json.dumps({"key": prompt_key("제1조"), "response": "응답", "latency_sec": 2.0}) + "\n\n",
+                    encoding="utf-8")
+    sleeps = []
+    monkeypatch.setattr(llm_cassette.time, "sleep", sleeps.append)
+
+    assert ReplayLLM(str(path), timing="original", speed=0.5).generate("제1조") == "응답"
+    assert ReplayLLM(str(path)).generate("제1조") == "응답"
+    assert sleeps == [1.0]
+    with pytest.raises(ValueError):
+        ReplayLLM(str(path), timing="realtime")
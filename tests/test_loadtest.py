@@ -0,0 +1,80 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+benchmarks.loadtest: 포화 지점 판단, 지연 시간 요약, /analyze 스트림 측정, Gemini 대역 서버의 분당 요청 한도
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.common import percentile, summarize
+from benchmarks.loadtest import find_saturation, run_analyze
+from benchmarks.standins import GeminiStandIn
+
+
+def level(concurrency, rps, error_rate=0.0):
+    return {"concurrency": concurrency, "throughput_rps": rps, "error_rate": error_rate}
+
+
+@pytest.mark.parametrize("levels, expected", [
+    # 처리량 증가율이 10% 미만이 된 직전 단계
+    ([level(1, 2.0), level(2, 3.9), level(4, 4.1), level(8, 4.0)], 2),
+    # 오류율이 기준을 넘은 직전 단계 (첫 단계부터 넘으면 그 단계)
+    ([level(1, 2.0), level(2, 3.9), level(4, 7.5, error_rate=0.05)], 2),
+    ([level(1, 2.0, error_rate=0.5)], 1),
+    # 끝까지 처리량이 늘면 포화 지점 없음
+    ([level(1, 2.0), level(2, 3.9), level(4, 7.5)], None),
+])
+def test_find_saturation(levels, expected):
+    assert find_saturation(levels) == expected
+
+
+def test_percentile_and_summary():
+    values = [0.1 * i for i in range(1, 11)]
+    assert percentile(values, 50) == pytest.approx(0.55)
+    assert percentile(values, 100) == pytest.approx(1.0)
+    assert percentile([], 95) == 0.0
+    summary = summarize(values)
+    assert summary["count"] == 10
+    assert (summary["min"], summary["max"]) == pytest.approx((0.1, 1.0))
+    assert summary["p95"] == pytest.approx(0.955)
+    assert summarize([]) == {"count": 0}
+
+
+def test_gemini_standin_rate_limit():
+    server = GeminiStandIn(contract_articles=3, rpm_limit=2).start()
+    try:
+        url = f"{server.url}/v1beta/models/gemini-2.5-flash:generateContent"
+        body = {"contents": [{"parts": [{"text": "근로계약서 조항을 JSON으로 채점하세요."}]}]}
+        responses = [httpx.post(url, json=body, timeout=5) for _ in range(3)]
+    finally:
+        server.stop()
+
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert responses[0].json() == responses[1].json()
+    assert responses[0].json()["usageMetadata"]["promptTokenCount"] > 0
+    assert server.rate_limited_count == 1
+
+
+def test_run_analyze_measures_stream(monkeypatch):
+    pytest.importorskip("fastapi")
+    import fast_api
+
+    class SafeDetector:
+        def detect(self, texts, max_concurrent):
+            return [{"index": i, "clause": text, "is_toxic": False, "risk_score": 1.0, "reason": "", "context_used": "",
+                     "outcome": "safe"} for i, text in enumerate(texts)]
+
+    monkeypatch.setattr(fast_api, "create_detector", lambda *args, **kwargs: SafeDetector())
+
+    async def run():
+        transport = httpx.ASGITransport(app=fast_api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            return await run_analyze(client, "제1조 (목적) 이 계약은 근로조건을 정한다.\n제2조 (임금) 월 250만원.\n")
+
+    record = asyncio.run(run())
+    assert record["endpoint"] == "analyze"
+    assert record["ok"] is True
+    assert 0 <= record["ttfe"] <= record["ttc"]
@@ -0,0 +1,110 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+metrics: Counter/Gauge/Histogram 값과 Prometheus 텍스트 출력, 진행 중 요청 미들웨어, GET /metrics
+"""
+import asyncio
+
+import pytest
+
+from metrics import IN_FLIGHT, Counter, Gauge, Histogram, InFlightMiddleware, Registry
+
+
+def test_counter_renders_sorted_escaped_labels():
+    counter = Counter("test_calls_total", "호출 수", ["stage", "model"])
+    counter.inc(stage="judge", model='a"b')
+    counter.inc(2.5, stage="judge", model='a"b')
+    counter.inc(stage="chunking")
+
+    assert counter.value(stage="judge", model='a"b') == 3.5
+    assert counter.value(stage="embedding") == 0
+    assert counter.render() == [
+        "# HELP test_calls_total 호출 수",
+        "# TYPE test_calls_total counter",
+        'test_calls_total{stage="chunking",model=""} 1',
+        'test_calls_total{stage="judge",model="a\\"b"} 3.5',
+    ]
+    with pytest.raises(ValueError):
+        counter.inc(-1, stage="judge")
+    with pytest.raises(ValueError):
+        counter.inc(backend="ollama")
+
+
+def test_gauge_tracks_in_progress():
+    gauge = Gauge("test_in_flight", "진행 중", ["endpoint"])
+    with gauge.track_inprogress(endpoint="/analyze"):
+        with gauge.track_inprogress(endpoint="/analyze"):
+            assert gauge.value(endpoint="/analyze") == 2
+    assert gauge.value(endpoint="/analyze") == 0
+    gauge.set(0.25, endpoint="/upload")
+    assert gauge.render()[-1] == 'test_in_flight{endpoint="/upload"} 0.25'
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "소요 시간", ["stage"], buckets=(1, 0.1))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, stage="judge")
+    with pytest.raises(RuntimeError):
+        with histogram.time(stage="search"):
+            raise RuntimeError("실패해도 기록")
+
+    assert histogram.snapshot(stage="judge") == {"count": 4, "sum": pytest.approx(4.25)}
+    assert histogram.snapshot(stage="search")["count"] == 1
+    assert histogram.snapshot(stage="suggestion") == {"count": 0, "sum": 0.0}
+    judge_lines = [line for line in histogram.render() if 'stage="judge"' in line]
+    assert judge_lines == [
+        'test_seconds_bucket{stage="judge",le="0.1"} 1',
+        'test_seconds_bucket{stage="judge",le="1"} 3',
+        'test_seconds_bucket{stage="judge",le="+Inf"} 4',
+        'test_seconds_sum{stage="judge"} 4.25',
+        'test_seconds_count{stage="judge"} 4',
+    ]
+
+
+def test_registry_renders_all_and_rejects_duplicates():
+    registry = Registry()
+    registry.register(Counter("test_a_total", "a")).inc()
+    registry.register(Gauge("test_b", "b"))
+    with pytest.raises(ValueError):
+        registry.register(Counter("test_a_total", "a"))
+
+    text = registry.render()
+    assert text.endswith("\n")
+    assert "test_a_total 1\n# HELP test_b b\n# TYPE test_b gauge\n" in text
+
+
+def test_in_flight_middleware_counts_until_response_ends():
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append((IN_FLIGHT.value(endpoint="/analyze"), IN_FLIGHT.value(endpoint="other")))
+
+    middleware = InFlightMiddleware(app, endpoints=["/analyze"])
+    before, other = IN_FLIGHT.value(endpoint="/analyze"), IN_FLIGHT.value(endpoint="other")
+
+    async def call(path, scope_type="http"):
+        await middleware({"type": scope_type, "path": path}, None, None)
+
+    asyncio.run(call("/analyze"))
+    asyncio.run(call("/random/path"))
+    asyncio.run(call("/metrics"))
+    asyncio.run(call("/analyze", scope_type="lifespan"))
+
+    assert seen[0][0] == before + 1
+    # 등록되지 않은 경로는 other로 묶고, /metrics와 HTTP가 아닌 요청은 세지 않는다
+    assert seen[1][1] == other + 1
+    assert seen[2] == seen[3] == (before, other)
+    assert IN_FLIGHT.value(endpoint="/analyze") == before
+
+
+def test_metrics_endpoint_exposes_registry():
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    import fast_api
+
+    response = TestClient(fast_api.app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE safesign_stage_duration_seconds histogram" in response.text
+    assert "# TYPE safesign_in_flight_requests gauge" in response.text
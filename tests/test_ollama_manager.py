@@ -0,0 +1,147 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+ollama_manager의 여러 서버 풀: 로컬 Ollama 대역 서버 두 대로 장애 서버 우회, 복귀, 서버별 동시 호출 제한을 확인한다.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.standins import OllamaStandIn
+from deadline import DeadlineExceeded, deadline_after, request_deadline
+from ollama_manager import OllamaBackendManager
+
+MODEL = "test-model"
+MESSAGES = [{"role": "user", "content": "근로자는 회사의 요구에 따라 언제든지 야간 근무를 해야 한다."}]
+
+
+class CountingOllamaStandIn(OllamaStandIn):
+    """정상 응답한 호출 수와 동시에 처리한 호출 수의 최댓값을 센다"""
+    def __init__(self, **kwargs):
+        super().__init__(models=(MODEL,), **kwargs)
+        self.served = 0
+        self.active = 0
+        self.max_active = 0
+        self._count_lock = threading.Lock()
+
+    def handle_post(self, handler):
+        available = self.available
+        with self._count_lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            super().handle_post(handler)
+        finally:
+            with self._count_lock:
+                self.active -= 1
+                if available:
+                    self.served += 1
+
+
+@pytest.fixture
+def servers():
+    started = [CountingOllamaStandIn().start(), CountingOllamaStandIn().start()]
+    yield started
+    for server in started:
+        server.stop()
+
+
+def make_manager(servers, max_concurrent=1):
+    manager = OllamaBackendManager(models=[MODEL], keep_alive="-1", max_concurrent=max_concurrent,
+                                   hosts=[server.url for server in servers], timeout=5)
+    # 헬스 체크는 테스트에서 직접 호출한다
+    manager.pool.health_interval = 0
+    return manager
+
+
+def test_failover_to_healthy_host(servers):
+    down, up = servers
+    down.available = False
+    manager = make_manager(servers)
+
+    for _ in range(4):
+        response = manager.chat(MODEL, MESSAGES)
+        assert response["message"]["content"]
+
+    assert up.served == 4
+    assert down.served == 0
+    status = manager.pool.status()
+    assert status[down.url]["healthy"] is False
+    assert status[up.url]["healthy"] is True
+    # 라우팅에서 뺀 뒤에는 장애 서버로 다시 보내지 않는다 (첫 실패 한 번만)
+    assert down.request_count == 1
+
+
+def test_host_rejoins_after_health_check(servers):
+    flaky, steady = servers
+    flaky.available = False
+    manager = make_manager(servers)
+    manager.chat(MODEL, MESSAGES)
+    assert manager.pool.status()[flaky.url]["healthy"] is False
+
+    # 아직 장애 중이면 헬스 체크를 해도 빠진 채로 남는다
+    manager.pool.check_health()
+    assert manager.pool.status()[flaky.url]["healthy"] is False
+
+    flaky.available = True
+    manager.pool.check_health()
+    assert manager.pool.status()[flaky.url]["healthy"] is True
+
+    for _ in range(6):
+        manager.chat(MODEL, MESSAGES)
+    assert flaky.served > 0
+    assert steady.served > 0
+
+
+def test_stream_fails_over_before_first_chunk(servers):
+    down, up = servers
+    down.available = False
+    manager = make_manager(servers)
+
+    for _ in range(2):
+        chunks = list(manager.chat_stream(MODEL, MESSAGES))
+        assert chunks[-1]["done"] is True
+    assert up.served == 2
+    assert manager.pool.status()[down.url]["healthy"] is False
+
+
+def test_all_hosts_down_raises(servers):
+    for server in servers:
+        server.available = False
+    manager = make_manager(servers)
+    with pytest.raises(Exception):
+        manager.chat(MODEL, MESSAGES)
+
+
+def test_concurrency_is_limited_per_host(servers):
+    for server in servers:
+        server.latency_sec = 0.2
+    manager = make_manager(servers, max_concurrent=1)
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(lambda _: manager.chat(MODEL, MESSAGES), range(6)))
+
+    assert [server.max_active for server in servers] == [1, 1]
+    assert sum(server.served for server in servers) == 6
+
+
+def test_queued_call_gives_up_at_deadline(servers):
+    only = servers[:1]
+    only[0].latency_sec = 0.5
+    manager = make_manager(only, max_concurrent=1)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        busy = executor.submit(manager.chat, MODEL, MESSAGES)
+        time.sleep(0.1)
+        start = time.monotonic()
+        with request_deadline(deadline_after(0.1)), pytest.raises(DeadlineExceeded):
+            manager.chat(MODEL, MESSAGES)
+        assert time.monotonic() - start < 0.4
+        busy.result()
+
+    # 마감이 지난 호출은 Ollama에 보내지 않는다
+    assert only[0].request_count == 1
+    assert only[0].served == 1
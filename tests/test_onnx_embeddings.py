@@ -0,0 +1,110 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+law.onnx_embeddings: 패딩을 제외한 mean pooling, 배치 분할, 모델 파일 확인, get_embeddings의 onnx-int8 선택.
+onnxruntime/transformers 대신 같은 인터페이스의 가짜 모듈로 실행한다.
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain_core.embeddings")
+
+from law import shared_resources
+from law.onnx_embeddings import INT8_FILE, ONNX_DIR, OnnxEmbeddings
+
+
+class FakeTokenizer:
+    """글자 하나를 토큰 하나로 보고, 배치에서 가장 긴 문장 길이에 맞춰 0으로 패딩한다"""
+    calls = []
+
+    @classmethod
+    def from_pretrained(cls, model_dir):
+        return cls()
+
+    def __call__(self, texts, padding, truncation, max_length, return_tensors):
+        self.calls.append(list(texts))
+        length = min(max(len(text) for text in texts), max_length)
+        ids = np.zeros((len(texts), length), dtype=np.int32)
+        mask = np.zeros((len(texts), length), dtype=np.int32)
+        for row, text in enumerate(texts):
+            tokens = [ord(ch) % 100 + 1 for ch in text[:length]]
+            ids[row, :len(tokens)] = tokens
+            mask[row, :len(tokens)] = 1
+        return {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+
+
+class FakeSession:
+    """토큰마다 [token_id, 1] 은닉 벡터를 내는 모델 (패딩 토큰은 [0, 1])"""
+    def __init__(self, path, options, providers):
+        self.path = path
+        self.feeds = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+    def run(self, output_names, feeds):
+        self.feeds.append(feeds)
+        ids = feeds["input_ids"].astype(np.float32)
+        return [np.stack([ids, np.ones_like(ids)], axis=-1)]
+
+
+@pytest.fixture
+def fake_runtime(monkeypatch, tmp_path):
+    FakeTokenizer.calls = []
+    ort = SimpleNamespace(
+        SessionOptions=lambda: SimpleNamespace(),
+        GraphOptimizationLevel=SimpleNamespace(ORT_ENABLE_ALL="all"),
+        InferenceSession=FakeSession,
+    )
+    monkeypatch.setitem(sys.modules, "onnxruntime", ort)
+    monkeypatch.setitem(sys.modules, "transformers", SimpleNamespace(AutoTokenizer=FakeTokenizer))
+    (tmp_path / INT8_FILE).write_bytes(b"onnx")
+    return tmp_path
+
+
+def token(ch):
+    return ord(ch) % 100 + 1
+
+
+def test_mean_pooling_ignores_padding(fake_runtime):
+    embeddings = OnnxEmbeddings(str(fake_runtime), batch_size=2)
+    vectors = embeddings.embed_documents(["가나", "다", "라마바"])
+
+    assert vectors == [
+        pytest.approx([(token("가") + token("나")) / 2, 1.0]),
+        pytest.approx([token("다"), 1.0]),
+        pytest.approx([(token("라") + token("마") + token("바")) / 3, 1.0]),
+    ]
+    assert FakeTokenizer.calls == [["가나", "다"], ["라마바"]]
+    # 모델이 받는 입력만, int64로 넘긴다
+    assert all(set(feeds) == {"input_ids", "attention_mask"} for feeds in embeddings.session.feeds)
+    assert all(array.dtype == np.int64 for feeds in embeddings.session.feeds for array in feeds.values())
+    assert embeddings.embed_query("다") == vectors[1]
+    assert embeddings.model_name.endswith("@model.int8")
+
+
+def test_missing_model_file_points_to_export(fake_runtime):
+    with pytest.raises(FileNotFoundError, match="export"):
+        OnnxEmbeddings(str(fake_runtime / "없는 폴더"))
+
+
+def test_get_embeddings_selects_onnx_backend(fake_runtime, monkeypatch):
+    # 기본 경로(../data/onnx_encoder)가 임시 폴더를 가리키도록 실행 위치를 옮긴다
+    model_dir = fake_runtime / "data" / "onnx_encoder"
+    model_dir.mkdir(parents=True)
+    (model_dir / INT8_FILE).write_bytes(b"onnx")
+    (fake_runtime / "src").mkdir()
+    monkeypatch.chdir(fake_runtime / "src")
+    monkeypatch.setattr(shared_resources, "_embeddings", {})
+
+    embeddings = shared_resources.get_embeddings(backend="onnx-int8")
+    assert isinstance(embeddings, OnnxEmbeddings)
+    assert embeddings.session.path == os.path.join(ONNX_DIR, INT8_FILE)
+    assert shared_resources.get_embeddings(backend="onnx-int8") is embeddings
+    with pytest.raises(ValueError):
+        shared_resources.get_embeddings(backend="tensorrt")
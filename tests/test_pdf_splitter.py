@@ -0,0 +1,59 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+pdf_splitter.stitch_page_texts: 페이지별 추출 결과를 이어 붙일 때 경계에 걸친 조항 제목 복구
+"""
+import pytest
+
+from pdf_splitter import stitch_page_texts
+
+
+@pytest.mark.parametrize("pages, expected", [
+    # 조항 번호가 페이지 경계에서 끊긴 제목
+    (["제1조 (목적) 본문이다.\n제1", "2조 (임금) 임금은 매월 지급한다."],
+     "제1조 (목적) 본문이다.\n\n제12조 (임금) 임금은 매월 지급한다."),
+    (["제1조(목적) 본문이다.\n제", "2조(임금) 임금은 매월 지급한다."],
+     "제1조(목적) 본문이다.\n\n제2조(임금) 임금은 매월 지급한다."),
+    (["제1조 본문이다.\n제3", "조의2 【수습】 수습 기간은 3개월로 한다."],
+     "제1조 본문이다.\n\n제3조의2 【수습】 수습 기간은 3개월로 한다."),
+    (["제1조 본문이다.\n제", "2조\n임금은 매월 지급한다."],
+     "제1조 본문이다.\n\n제2조\n임금은 매월 지급한다."),
+])
+def test_split_article_header_is_repaired(pages, expected):
+    assert stitch_page_texts(pages) == expected
+
+
+@pytest.mark.parametrize("pages, expected", [
+    # 본문 중의 조항 인용이 끊긴 경우는 새 조항으로 만들지 않는다
+    (["제1조 본문 제", "3조에 따라 처리한다"], "제1조 본문 제3조에 따라 처리한다"),
+    (["제1조 본문 제1", "2조 (임금)에 따른다"], "제1조 본문 제12조 (임금)에 따른다"),
+    # 줄 첫머리라도 뒤에 제목이 없으면 인용으로 본다
+    (["제1조 본문이다.\n제", "3조에 따라 처리한다"], "제1조 본문이다.\n제3조에 따라 처리한다"),
+])
+def test_split_cross_reference_stays_inline(pages, expected):
+    assert stitch_page_texts(pages) == expected
+
+
+def test_repeated_header_on_next_page_is_dropped():
+    pages = ["제1조 (목적)\n이 계약은", "제1조 (목적)\n근로조건을 정한다."]
+    assert stitch_page_texts(pages) == "제1조 (목적)\n이 계약은\n근로조건을 정한다."
+
+
+def test_pages_join_as_new_article_or_continuation():
+    assert stitch_page_texts(["제1조 본문이다.", "제2조 (임금) 매월 지급한다."]) == "제1조 본문이다.\n\n제2조 (임금) 매월 지급한다."
+    assert stitch_page_texts(["제1조 본문이", "이어진다.", ""]) == "제1조 본문이\n이어진다."
+
+
+def test_header_split_over_three_pages():
+    pages = ["제1조 (목적) 본문이다.\n제", "1", "2조 (임금) 임금은 매월 지급한다."]
+    assert stitch_page_texts(pages) == "제1조 (목적) 본문이다.\n\n제12조 (임금) 임금은 매월 지급한다."
+
+
+def test_many_pages_repair_every_boundary():
+    pages, articles = [], []
+    for i in range(1, 2001):
+        pages.append(f"제{i}조 (항목) 근로자는 회사의 지시에 따른다.\n제")
+        pages.append(f"{i}조의2 (항목) 본문이다.")
+        articles.extend([f"제{i}조 (항목) 근로자는 회사의 지시에 따른다.", f"제{i}조의2 (항목) 본문이다."])
+    assert stitch_page_texts(pages) == "\n\n".join(articles)
@@ -0,0 +1,176 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+law.precedent_crawler: 로컬 법제처 대역 서버(MolegStandIn)로 중단 후 이어서 수집, 판례일련번호 중복 제거,
+샤드 교체, 429/5xx 재시도를 확인한다.
+"""
+import json
+import os
+
+import pytest
+
+from benchmarks.standins import MolegStandIn
+from law import precedent_crawler
+from law.precedent_crawler import CHECKPOINT_FILE, PrecedentCrawler, iter_shard_records, shard_paths
+
+# 합성 판례 200건 중 사건명에 '해고'가 들어간 판례 80건, '임금' 80건 (둘 다 들어간 판례 40건)
+QUERY_MATCHES = {"해고": 80, "임금": 80}
+BOTH_QUERIES_UNIQUE = 120
+
+
+class Interrupted(Exception):
+    """수집 도중 프로세스가 멈춘 상황 흉내"""
+
+
+@pytest.fixture
+def moleg():
+    server = MolegStandIn(precedents=200).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch):
+    # 재시도 백오프(jitter)를 0초로
+    monkeypatch.setattr(precedent_crawler.random, "uniform", lambda low, high: 0.0)
+
+
+def make_crawler(moleg, output_dir, queries=("해고",), **kwargs):
+    options = {"display": 10, "concurrency": 4, "rate_per_sec": 0, "shard_size": 1000, "base_url": moleg.url, "api_key": "test"}
+    options.update(kwargs)
+    return PrecedentCrawler(list(queries), str(output_dir), **options)
+
+
+def record_ids(output_dir):
+    return [record["id"] for record in iter_shard_records(str(output_dir))]
+
+
+def load_checkpoint(output_dir):
+    with open(os.path.join(str(output_dir), CHECKPOINT_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.asyncio
+async def test_resume_after_interrupted_crawl(moleg, tmp_path, monkeypatch):
+    crawler = make_crawler(moleg, tmp_path)
+    save_checkpoint = crawler._save_checkpoint
+    saves = []
+
+    def save_then_crash(checkpoint):
+        # 3페이지의 판례를 샤드에 기록한 직후, 체크포인트를 갱신하기 전에 멈춘다
+        saves.append(checkpoint["queries"]["해고"]["next_page"])
+        if len(saves) == 3:
+            raise Interrupted()
+        save_checkpoint(checkpoint)
+
+    monkeypatch.setattr(crawler, "_save_checkpoint", save_then_crash)
+    with pytest.raises(Interrupted):
+        await crawler.run()
+    assert len(record_ids(tmp_path)) == 30
+    assert load_checkpoint(tmp_path)["queries"]["해고"]["next_page"] == 3
+
+    resumed = make_crawler(moleg, tmp_path)
+    stats = await resumed.run()
+
+    ids = record_ids(tmp_path)
+    assert len(ids) == QUERY_MATCHES["해고"]
+    assert len(set(ids)) == len(ids)
+    # 3페이지 목록은 다시 받지만, 이미 기록된 판례의 상세는 다시 조회하지 않는다
+    assert stats["written"] == QUERY_MATCHES["해고"] - 30
+    assert stats["duplicates"] == 10
+    assert moleg.detail_requests == QUERY_MATCHES["해고"]
+    assert load_checkpoint(tmp_path)["queries"]["해고"]["done"] is True
+
+
+@pytest.mark.asyncio
+async def test_completed_query_is_not_crawled_again(moleg, tmp_path):
+    await make_crawler(moleg, tmp_path, max_pages=2).run()
+    assert len(record_ids(tmp_path)) == 20
+
+    await make_crawler(moleg, tmp_path).run()
+    requests_after_first_runs = moleg.request_count
+    stats = await make_crawler(moleg, tmp_path).run()
+
+    assert len(record_ids(tmp_path)) == QUERY_MATCHES["해고"]
+    assert stats["list_requests"] == 0
+    assert moleg.request_count == requests_after_first_runs
+
+
+@pytest.mark.asyncio
+async def test_dedup_by_precedent_serial_number(moleg, tmp_path):
+    stats = await make_crawler(moleg, tmp_path, queries=("해고", "임금")).run()
+
+    ids = record_ids(tmp_path)
+    assert len(ids) == BOTH_QUERIES_UNIQUE
+    assert len(set(ids)) == len(ids)
+    assert stats["duplicates"] == sum(QUERY_MATCHES.values()) - BOTH_QUERIES_UNIQUE
+    assert moleg.detail_requests == BOTH_QUERIES_UNIQUE
+    # 레코드 id는 판례일련번호이고 메타데이터에도 남는다
+    records = list(iter_shard_records(str(tmp_path)))
+    assert all(record["metadata"]["판례일련번호"] == record["id"] for record in records)
+
+
+@pytest.mark.asyncio
+async def test_shard_rotation_and_append_on_resume(moleg, tmp_path):
+    await make_crawler(moleg, tmp_path, shard_size=7, max_pages=2).run()
+    sizes = [sum(1 for _ in open(path, encoding="utf-8")) for path in shard_paths(str(tmp_path))]
+    assert sizes == [7, 7, 6]
+
+    # 이어서 실행하면 마지막 샤드를 먼저 채운 뒤 새 샤드로 넘어간다
+    await make_crawler(moleg, tmp_path, shard_size=7, max_pages=1).run()
+    paths = shard_paths(str(tmp_path))
+    sizes = [sum(1 for _ in open(path, encoding="utf-8")) for path in paths]
+    assert sizes == [7, 7, 7, 7, 2]
+    assert [os.path.basename(path) for path in paths] == [f"precedents-{i:05d}.jsonl" for i in range(5)]
+    assert len(set(record_ids(tmp_path))) == 30
+
+
+@pytest.mark.asyncio
+async def test_retry_after_429_and_5xx(moleg, tmp_path):
+    moleg.scripted_failures.extend([429, 503, 500])
+    stats = await make_crawler(moleg, tmp_path).run()
+
+    assert stats["retries"] == 3
+    assert stats["failed"] == 0
+    assert len(record_ids(tmp_path)) == QUERY_MATCHES["해고"]
+
+
+@pytest.mark.asyncio
+async def test_list_failure_after_retries_resumes_next_run(moleg, tmp_path):
+    # 첫 목록 요청이 재시도(max_retries=2)까지 모두 429
+    moleg.scripted_failures.extend([429, 429, 429])
+    stats = await make_crawler(moleg, tmp_path, max_retries=2).run()
+
+    assert stats["list_requests"] == 3
+    assert stats["written"] == 0
+    # 끝낸 페이지가 없으므로 체크포인트도 없고, 다음 실행은 1페이지부터
+    assert not os.path.exists(os.path.join(str(tmp_path), CHECKPOINT_FILE))
+
+    await make_crawler(moleg, tmp_path, max_retries=2).run()
+    assert len(record_ids(tmp_path)) == QUERY_MATCHES["해고"]
+
+
+@pytest.mark.asyncio
+async def test_failed_detail_is_retried_next_run(moleg, tmp_path):
+    crawler = make_crawler(moleg, tmp_path, max_retries=1, max_pages=1, concurrency=1)
+    # 목록 요청은 통과시키고, 첫 상세 요청과 그 재시도를 실패시킨다
+    fetch_list = crawler._fetch_list
+
+    async def fetch_list_then_fail_detail(session, query, page):
+        result = await fetch_list(session, query, page)
+        moleg.scripted_failures.extend([502, 502])
+        return result
+
+    crawler._fetch_list = fetch_list_then_fail_detail
+    stats = await crawler.run()
+    assert stats["failed"] == 1
+    assert stats["written"] == 9
+    failed = load_checkpoint(tmp_path)["failed"]
+    assert len(failed) == 1
+
+    stats = await make_crawler(moleg, tmp_path, max_pages=1).run()
+    assert load_checkpoint(tmp_path)["failed"] == {}
+    ids = record_ids(tmp_path)
+    assert set(failed) <= set(ids)
+    assert len(set(ids)) == len(ids) == 20
@@ -0,0 +1,93 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+law.quantized_index: SQ8/fp16 인덱스 생성, 원본 벡터 저장/mmap 로드, 후보 재정렬(rerank) 결과가 정확한 L2 순서와 같은지
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+from law.quantized_index import (FULL_VECTORS_FILE, build_quantized, index_storage, load_full_vectors,
+                                 quantize_vectorstore, search_by_vector, search_positions)
+
+DIM = 8
+
+
+def make_vectors():
+    """질의 바로 옆에 양자화 오차보다 촘촘하게 붙은 5개 + 멀리 떨어진 벡터들"""
+    rng = np.random.default_rng(0)
+    far = rng.uniform(-1, 1, size=(60, DIM)).astype(np.float32) + 3
+    near = np.zeros((5, DIM), dtype=np.float32)
+    near[:, 0] = [0.004, 0.001, 0.005, 0.002, 0.003]
+    return np.concatenate([far, near]), np.zeros(DIM, dtype=np.float32)
+
+
+def flat_index(vectors):
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    return index
+
+
+class FakeVectorStore:
+    """langchain FAISS 저장소에서 검색에 쓰는 속성만 흉내 낸다"""
+    def __init__(self, vectors):
+        self.index = flat_index(vectors)
+        self.index_to_docstore_id = {i: f"doc-{i}" for i in range(len(vectors))}
+        self.docs = {f"doc-{i}": SimpleNamespace(id=f"doc-{i}") for i in range(len(vectors))}
+        self.docstore = SimpleNamespace(search=lambda doc_id: self.docs.get(doc_id, f"ID {doc_id} not found."))
+        self.flat_searches = 0
+
+    def similarity_search_by_vector(self, query_vector, k):
+        self.flat_searches += 1
+        return [self.docs[f"doc-{p}"] for p in search_positions(self.index, query_vector, k)]
+
+
+@pytest.mark.parametrize("storage", ["sq8", "fp16"])
+def test_rerank_restores_exact_order(storage):
+    vectors, query = make_vectors()
+    index = build_quantized(vectors, storage)
+    exact = search_positions(flat_index(vectors), query, 3)
+
+    assert index_storage(index) == storage
+    assert index_storage(flat_index(vectors)) == "flat"
+    assert exact == [61, 63, 64]
+    assert search_positions(index, query, 3, full_vectors=vectors, rerank_factor=2) == exact
+    # 원본 벡터가 없으면 양자화 인덱스 결과를 그대로 쓴다
+    assert set(search_positions(index, query, 3)) <= set(range(60, 65))
+
+
+def test_quantize_vectorstore_saves_full_vectors(tmp_path):
+    vectors, query = make_vectors()
+    store = FakeVectorStore(vectors)
+    assert quantize_vectorstore(store, str(tmp_path / "flat"), "flat").index is store.index
+    assert not (tmp_path / "flat").exists()
+    with pytest.raises(ValueError):
+        quantize_vectorstore(store, str(tmp_path / "pq"), "pq")
+
+    db_path = str(tmp_path / "sq8")
+    quantize_vectorstore(store, db_path, "sq8")
+    full_vectors = load_full_vectors(db_path)
+
+    assert index_storage(store.index) == "sq8"
+    assert isinstance(full_vectors, np.memmap)
+    np.testing.assert_array_equal(full_vectors, vectors)
+    assert load_full_vectors(str(tmp_path / "flat")) is None
+    assert (tmp_path / "sq8" / FULL_VECTORS_FILE).exists()
+
+
+def test_search_by_vector_maps_positions_to_documents():
+    vectors, query = make_vectors()
+    store = FakeVectorStore(vectors)
+
+    # flat 인덱스는 기존 검색 경로를 그대로 탄다
+    assert [doc.id for doc in search_by_vector(store, query, 2, vectors)] == ["doc-61", "doc-63"]
+    assert store.flat_searches == 1
+
+    store.index = build_quantized(vectors, "sq8")
+    del store.docs["doc-63"]  # docstore에서 못 찾은 문서는 건너뛴다
+    assert [doc.id for doc in search_by_vector(store, query, 3, vectors)] == ["doc-61", "doc-64"]
+    assert store.flat_searches == 1
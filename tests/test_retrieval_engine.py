@@ -0,0 +1,138 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+law.retrieval_engine: 법령/판례 벡터를 한 인덱스에 모은 뒤 출처별 top-k, 모자란 출처의 구간 재검색,
+양자화 인덱스의 원본 벡터 재정렬, 압축 문서 저장소에서 꺼내기
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from law import retrieval_engine
+from law.retrieval_engine import UnifiedRetriever
+
+DIM = 4
+
+
+class FakeVectorStore:
+    def __init__(self, prefix, vectors):
+        self.index = faiss.IndexFlatL2(DIM)
+        self.index.add(vectors)
+        self.index_to_docstore_id = {i: f"{prefix}-{i}" for i in range(len(vectors))}
+        self.documents = {
+            f"{prefix}-{i}": SimpleNamespace(page_content=f"{prefix} 본문 {i}번 " * 3, metadata={"source": prefix, "order": i})
+            for i in range(len(vectors))
+        }
+        self.docstore = SimpleNamespace(search=self.documents.get)
+
+
+def make_stores():
+    """법령 40건은 질의(원점) 가까이, 판례 5건은 멀리 두어 한 번의 검색 후보가 법령으로만 채워지게 한다"""
+    law = np.zeros((40, DIM), dtype=np.float32)
+    law[:, 0] = np.linspace(0.5, 2.0, 40)[::-1]
+    precedent = np.full((5, DIM), 5.0, dtype=np.float32)
+    precedent[:, 1] = [0.4, 0.1, 0.3, 0.0, 0.2]
+    return {"law": (FakeVectorStore("law", law), law), "precedent": (FakeVectorStore("precedent", precedent), precedent)}
+
+
+@pytest.fixture
+def managers(monkeypatch, tmp_path):
+    """두 context manager를 이미 DB를 불러온 가짜로 바꾼다. options["full_vectors"]이면 재정렬용 원본 벡터도 넘긴다."""
+    stores = make_stores()
+    options = {"full_vectors": False}
+
+    def factory(source_type):
+        def create(embeddings, storage):
+            vectorstore, vectors = stores[source_type]
+            return SimpleNamespace(vectorstore=vectorstore, full_vectors=vectors if options["full_vectors"] else None,
+                                   initialize_database=lambda: None)
+        return create
+
+    monkeypatch.setattr(retrieval_engine, "LawContextManager", factory("law"))
+    monkeypatch.setattr(retrieval_engine, "PrecedentContextManager", factory("precedent"))
+    monkeypatch.setattr(retrieval_engine, "LAW_DB_PATH", str(tmp_path / "law"))
+    monkeypatch.setattr(retrieval_engine, "PRECEDENT_DB_PATH", str(tmp_path / "precedent"))
+    return stores, options
+
+
+def exact_top(vectors, query, k):
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    order = np.argsort(distances, kind="stable")[:k]
+    return [int(i) for i in order], [float(distances[i]) for i in order]
+
+
+def test_per_source_top_k_from_one_index(managers):
+    stores, _ = managers
+    retriever = UnifiedRetriever(embeddings=object(), storage="flat")
+    retriever.initialize_database()
+    query = np.zeros(DIM, dtype=np.float32)
+
+    assert retriever.ranges == {"law": (0, 40), "precedent": (40, 45)}
+    results = retriever.search_by_vector(query, {"law": 2, "precedent": 1}, max_chars=10)
+
+    law_ids, law_scores = exact_top(stores["law"][1], query, 2)
+    precedent_ids, precedent_scores = exact_top(stores["precedent"][1], query, 1)
+    # 판례는 첫 검색 후보에 없어서 판례 구간에서만 다시 검색한 결과
+    assert [(r.source_type, r.doc_id) for r in results] == (
+        [("law", f"law-{i}") for i in law_ids] + [("precedent", f"precedent-{i}") for i in precedent_ids]
+    )
+    assert [r.score for r in results] == pytest.approx(law_scores + precedent_scores)
+    assert results[0].content == "law 본문 39번 "[:10]
+    assert results[-1].metadata == {"source": "precedent", "order": 3}
+
+
+def test_validates_sources_and_skips_empty_requests(managers):
+    retriever = UnifiedRetriever(embeddings=object(), storage="flat")
+    assert retriever.search_by_vector(np.zeros(DIM), {"law": 1}) == []
+    retriever.initialize_database()
+    with pytest.raises(ValueError):
+        retriever.search_by_vector(np.zeros(DIM), {"statute": 1})
+    assert [r.source_type for r in retriever.search_by_vector(np.zeros(DIM), {"law": 0, "precedent": 2})] == ["precedent"] * 2
+    with pytest.raises(ValueError):
+        UnifiedRetriever(embeddings=object(), doc_store="sqlite")
+
+
+def test_quantized_index_reranks_with_full_vectors(managers):
+    stores, options = managers
+    options["full_vectors"] = True
+    retriever = UnifiedRetriever(embeddings=object(), storage="sq8")
+    retriever.initialize_database()
+    query = np.zeros(DIM, dtype=np.float32)
+
+    assert isinstance(retriever.index, faiss.IndexScalarQuantizer)
+    results = retriever.search_by_vector(query, {"law": 3, "precedent": 2})
+    law_ids, law_scores = exact_top(stores["law"][1], query, 3)
+    precedent_ids, precedent_scores = exact_top(stores["precedent"][1], query, 2)
+    assert [r.doc_id for r in results] == [f"law-{i}" for i in law_ids] + [f"precedent-{i}" for i in precedent_ids]
+    # 점수는 양자화 거리 대신 원본 벡터의 정확한 거리
+    assert [r.score for r in results] == pytest.approx(law_scores + precedent_scores, rel=1e-5)
+
+
+def test_quantized_storage_falls_back_to_flat_without_full_vectors(managers):
+    retriever = UnifiedRetriever(embeddings=object(), storage="sq8")
+    retriever.initialize_database()
+    assert isinstance(retriever.index, faiss.IndexFlatL2)
+    assert not isinstance(retriever.index, faiss.IndexScalarQuantizer)
+    assert retriever.full_vectors == {}
+
+
+def test_compressed_doc_store_and_manager_compatibility(managers):
+    pytest.importorskip("zstandard")
+    stores, _ = managers
+
+    class Embeddings:
+        def embed_query(self, text):
+            return [0.0] * DIM
+
+    retriever = UnifiedRetriever(embeddings=Embeddings(), storage="flat", doc_store="zstd")
+    assert retriever.docs == []
+    precedents = retriever.search("근로시간", {"precedent": 2})
+    assert [r.doc_id for r in precedents] == ["precedent-3", "precedent-1"]
+    assert precedents[0].content == stores["precedent"][0].documents["precedent-3"].page_content
+    assert precedents[0].metadata["order"] == 3
+    assert retriever.search_relevant_laws("근로시간", k=1, max_chars=8) == ["law 본문 39번 "[:8]]
@@ -0,0 +1,144 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+structured_output / llm_instrumentation: 응답 텍스트의 스키마 검증, 스키마 불일치 시 재생성과 재시도 수 지표, 출력 토큰 상한
+"""
+import asyncio
+
+import pytest
+from pydantic import BaseModel
+
+from metrics import STRUCTURED_OUTPUT_FAILURES, STRUCTURED_RETRIES
+from structured_output import (StructuredOutputError, accepts_schema, current_output_token_budget, output_token_budget,
+                               parse_structured)
+
+
+class ReasonScore(BaseModel):
+    score: float
+    reason: str
+
+
+class Other(BaseModel):
+    score: float
+    reason: str
+    extra: int = 0
+
+
+@pytest.mark.parametrize("output", [
+    '{"score": 7, "reason": "과도한 위약금"}',
+    '채점 결과입니다.\n```json\n{"score": 7, "reason": "과도한 위약금"}\n```\n이상입니다.',
+    Other(score=7, reason="과도한 위약금"),
+])
+def test_parse_structured_accepts_wrapped_json(output):
+    assert parse_structured(output, ReasonScore) == ReasonScore(score=7, reason="과도한 위약금")
+
+
+@pytest.mark.parametrize("output", [None, "", "점수는 7점입니다.", '{"score": "높음", "reason": "x"}', '{"score": 7}'])
+def test_parse_structured_rejects_mismatched_output(output):
+    with pytest.raises(StructuredOutputError):
+        parse_structured(output, ReasonScore)
+
+
+def test_parse_structured_returns_schema_object_as_is():
+    result = ReasonScore(score=1, reason="")
+    assert parse_structured(result, ReasonScore) is result
+
+
+def test_accepts_schema_and_token_budget():
+    class WithSchema:
+        def generate(self, prompt, schema=None):
+            pass
+
+    class TextOnly:
+        def generate(self, prompt):
+            pass
+
+    assert accepts_schema(WithSchema())
+    assert not accepts_schema(TextOnly())
+
+    assert current_output_token_budget() is None
+    with output_token_budget(64):
+        with output_token_budget(16):
+            assert current_output_token_budget() == 16
+        assert current_output_token_budget() == 64
+    assert current_output_token_budget() is None
+
+
+@pytest.fixture
+def scripted_llm():
+    pytest.importorskip("deepeval")
+    from deepeval.models.base_model import DeepEvalBaseLLM
+
+    class ScriptedLLM(DeepEvalBaseLLM):
+        """미리 정한 응답을 순서대로 돌려주는 텍스트 전용 LLM"""
+        def __init__(self, responses):
+            self.responses = list(responses)
+            self.prompts = []
+
+        def load_model(self):
+            return self
+
+        def generate(self, prompt):
+            self.prompts.append(prompt)
+            return self.responses.pop(0)
+
+        async def a_generate(self, prompt):
+            return self.generate(prompt)
+
+        def get_model_name(self):
+            return "scripted-structured"
+
+    return ScriptedLLM
+
+
+def retry_state(backend, stage="judge"):
+    return (STRUCTURED_RETRIES.snapshot(backend=backend, stage=stage),
+            STRUCTURED_OUTPUT_FAILURES.value(backend=backend, model="scripted-structured", stage=stage))
+
+
+def test_invalid_responses_are_regenerated_and_counted(scripted_llm):
+    from llm_instrumentation import InstrumentedLLM, count_llm_calls
+
+    backend = "structured-test-retry"
+    inner = scripted_llm(["점수를 매길 수 없습니다.", '{"score": 3}', '{"score": 8, "reason": "일방적 해지"}'])
+    llm = InstrumentedLLM(inner, stage="judge", backend=backend, max_retries=2)
+    (retries, failures) = retry_state(backend)
+
+    with count_llm_calls() as calls:
+        result = llm.generate("제5조를 채점하세요.", schema=ReasonScore)
+
+    assert result == ReasonScore(score=8, reason="일방적 해지")
+    assert calls.count == llm.call_count == 3
+    assert inner.prompts == ["제5조를 채점하세요."] * 3
+    after, after_failures = retry_state(backend)
+    assert (after["count"], after["sum"]) == (retries["count"] + 1, retries["sum"] + 2)
+    assert after_failures == failures + 2
+
+
+def test_gives_up_after_max_retries(scripted_llm):
+    from llm_instrumentation import InstrumentedLLM
+
+    backend = "structured-test-give-up"
+    llm = InstrumentedLLM(scripted_llm(["없음", "없음", "{}", "남는 응답"]), stage="judge", backend=backend, max_retries=1)
+    (retries, failures) = retry_state(backend)
+
+    with pytest.raises(StructuredOutputError, match="2번 생성"):
+        asyncio.run(llm.a_generate("제5조를 채점하세요.", schema=ReasonScore))
+
+    after, after_failures = retry_state(backend)
+    assert (after["count"], after["sum"]) == (retries["count"] + 1, retries["sum"] + 1)
+    assert after_failures == failures + 2
+    assert llm.inner.responses == ["{}", "남는 응답"]
+
+
+def test_first_valid_response_records_zero_retries(scripted_llm):
+    from llm_instrumentation import InstrumentedLLM
+
+    backend = "structured-test-first"
+    llm = InstrumentedLLM(scripted_llm(['{"score": 1, "reason": "문제 없음"}', "자유 형식 응답"]), stage="judge",
+                          backend=backend)
+    assert asyncio.run(llm.a_generate("제1조", schema=ReasonScore)).score == 1
+    # schema 없는 호출은 텍스트를 그대로 돌려주고 재시도 지표에 남기지 않는다
+    assert llm.generate("제1조") == "자유 형식 응답"
+    assert STRUCTURED_RETRIES.snapshot(backend=backend, stage="judge") == {"count": 1, "sum": 0.0}
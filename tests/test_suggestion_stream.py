@@ -0,0 +1,183 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+개선안 스트리밍: /analyze와 업로드 파이프라인의 suggestion_delta 이벤트, 스트림 스레드로 넘어가는 context,
+Gemini 스트림의 첫 조각 전 재시도
+"""
+import asyncio
+import contextvars
+import json
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient
+
+import fast_api
+from deadline import remaining_sec
+from metrics import FAILURES
+from streaming_pipeline import iterate_in_thread, stream_upload_and_analyze
+from usage import record_ollama_usage
+
+CONTRACT = (
+    "제1조 (목적) 이 계약은 근로조건을 정함을 목적으로 한다.\n"
+    "제2조 (손해배상) 근로자는 퇴사 시 후임자를 구하지 못하면 모든 손해를 배상한다.\n"
+)
+PIECES = ["1. **수정 조항**: ", "근로자의 고의·과실로 ", "발생한 손해에 한하여 배상한다."]
+
+
+class StreamingDetector:
+    """'손해'가 들어간 조항을 독소조항으로 판별하고, 개선안은 PIECES를 조각으로 나눠 보낸다"""
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.remaining = []
+
+    def detect(self, texts, max_concurrent):
+        return [{"index": i, "clause": text, "is_toxic": "손해" in text, "risk_score": 8.0 if "손해" in text else 1.0,
+                 "reason": "", "context_used": "", "outcome": "toxic" if "손해" in text else "safe"}
+                for i, text in enumerate(texts)]
+
+    def generate_easy_suggestion_stream(self, result):
+        self.remaining.append(remaining_sec())
+        record_ollama_usage("suggestion-stream-test", {"prompt_eval_count": 50, "eval_count": 20})
+        for i, piece in enumerate(PIECES):
+            if i == self.fail_after:
+                raise RuntimeError("스트림이 끊겼습니다.")
+            yield piece
+
+
+def analyze(detector, monkeypatch):
+    monkeypatch.setattr(fast_api, "create_detector", lambda *args, **kwargs: detector)
+    response = TestClient(fast_api.app).post("/analyze", json={"api_key": "test", "text": CONTRACT, "budget_sec": 60})
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_analyze_streams_suggestion_deltas(monkeypatch):
+    detector = StreamingDetector()
+    events = analyze(detector, monkeypatch)
+
+    deltas = [event for event in events if event["status"] == "suggestion_delta"]
+    assert [(event["id"], event["delta"]) for event in deltas] == [(2, piece) for piece in PIECES]
+    complete = events[-1]
+    assert complete["status"] == "complete"
+    assert events.index(deltas[-1]) < len(events) - 1
+    results = complete["results"]
+    assert [res["suggestion"] for res in results] == ["", "".join(PIECES)]
+    # 스트림 스레드에서도 요청 마감 시각이 적용되고, 기록한 사용량이 요청/조항 범위에 들어간다
+    assert len(detector.remaining) == 1 and 0 < detector.remaining[0] <= 60
+    assert results[1]["usage"]["calls"] == 1
+    assert complete["usage"]["calls"] == 1
+
+
+def test_broken_suggestion_stream_is_marked_failed(monkeypatch):
+    failures = FAILURES.value(stage="suggestion", backend="ollama")
+    events = analyze(StreamingDetector(fail_after=1), monkeypatch)
+
+    assert [event["delta"] for event in events if event["status"] == "suggestion_delta"] == PIECES[:1]
+    assert events[-1]["results"][1]["suggestion"] == "개선안 생성 실패"
+    assert FAILURES.value(stage="suggestion", backend="ollama") == failures + 1
+
+
+def test_pipeline_sends_deltas_before_clause_event():
+    async def text_stream():
+        for piece in (CONTRACT[:30], CONTRACT[30:]):
+            yield piece
+
+    async def collect():
+        return [event async for event in stream_upload_and_analyze(text_stream(), StreamingDetector)]
+
+    events = asyncio.run(collect())
+    statuses = [(event["status"], event.get("id") or event.get("result", {}).get("id")) for event in events
+                if event["status"] in ("suggestion_delta", "clause")]
+    toxic_clause = [item for item in statuses if item[1] == 2]
+    assert toxic_clause == [("suggestion_delta", 2)] * len(PIECES) + [("clause", 2)]
+    clause = next(event["result"] for event in events if event["status"] == "clause" and event["result"]["id"] == 2)
+    assert clause["suggestion"] == "".join(PIECES)
+    assert clause["usage"]["calls"] == 1
+
+
+def test_iterate_in_thread_runs_in_given_context():
+    marker = contextvars.ContextVar("marker", default="기본값")
+
+    def values():
+        yield marker.get()
+        raise ValueError("중간 실패")
+
+    async def collect():
+        token = marker.set("요청 범위")
+        context = contextvars.copy_context()
+        marker.reset(token)
+        seen = []
+        threads = threading.active_count()
+        with pytest.raises(ValueError):
+            async for value in iterate_in_thread(values, context):
+                seen.append(value)
+        # 워커 스레드가 종료 신호까지 넣고 끝난 뒤에 이벤트 루프를 닫는다
+        while threading.active_count() > threads:
+            await asyncio.sleep(0.01)
+        return seen
+
+    assert asyncio.run(collect()) == ["요청 범위"]
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+class FakeStreamModels:
+    def __init__(self, attempts):
+        self.attempts = list(attempts)
+
+    def generate_content_stream(self, model, contents, config=None):
+        attempt = self.attempts.pop(0)
+        for item in attempt:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+class FakePool:
+    def __init__(self, models):
+        self.client = SimpleNamespace(models=models)
+
+    @contextmanager
+    def lease(self, api_key, model):
+        yield self.client
+
+
+def chunk(text, total=None):
+    metadata = SimpleNamespace(prompt_token_count=10, candidates_token_count=5, thoughts_token_count=0,
+                               total_token_count=total) if total else None
+    return SimpleNamespace(text=text, usage_metadata=metadata)
+
+
+def test_gemini_stream_retries_only_before_first_chunk(monkeypatch):
+    pytest.importorskip("google.genai")
+    import gemini_scheduler
+    from llm_service import LLM_gemini
+
+    monkeypatch.setattr(gemini_scheduler, "backoff_sec", lambda attempt: 0.0)
+    scheduler = gemini_scheduler.KeyScheduler("user-key-stream", max_retries=3)
+    models = FakeStreamModels([
+        [RateLimited()],
+        [chunk("개선안 "), chunk(""), chunk("본문", total=15)],
+        [chunk("앞부분"), RateLimited()],
+    ])
+    llm = LLM_gemini("user-key-stream", "gemini-2.5-flash", pool=FakePool(models), scheduler=scheduler)
+
+    assert list(llm.generate_stream("개선안을 작성하세요.")) == ["개선안 ", "본문"]
+    assert scheduler.in_flight == 0
+
+    # 이미 조각을 내보낸 뒤의 실패는 중복 텍스트가 생기므로 재시도하지 않는다
+    received = []
+    with pytest.raises(RateLimited):
+        for piece in llm.generate_stream("개선안을 작성하세요."):
+            received.append(piece)
+    assert received == ["앞부분"]
+    assert models.attempts == []
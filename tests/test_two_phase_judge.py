@@ -0,0 +1,88 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+two_phase_judge: 점수 기준 이상인 조항만 이유를 생성(call) 또는 개선안으로 미루고(suggestion), 1단계 출력 토큰 상한을 건다
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from metrics import JUDGE_REASONS
+from structured_output import current_output_token_budget
+from two_phase_judge import ReasonOnly, ScoreOnly, TwoPhaseJudge, check_judge_mode
+
+RUBRIC = [
+    SimpleNamespace(score_range=(0, 3), expected_outcome="문제 없음"),
+    SimpleNamespace(score_range=(4, 10), expected_outcome="독소조항"),
+]
+
+
+class ScriptedJudgeLLM:
+    """점수 요청에는 정해 둔 점수, 이유 요청에는 고정 문장을 돌려주고 호출마다 (스키마, 토큰 상한)을 남긴다"""
+    def __init__(self, score):
+        self.score = score
+        self.calls = []
+
+    def generate(self, prompt, schema=None):
+        self.calls.append((schema, current_output_token_budget()))
+        if schema is ScoreOnly:
+            return ScoreOnly(score=self.score)
+        return ReasonOnly(reason="근로기준법 제17조 위반 소지가 있습니다.")
+
+
+def make_judge(score, reason_mode="call", backend="two-phase-test"):
+    llm = ScriptedJudgeLLM(score)
+    judge = TwoPhaseJudge(llm, "  근로자에게 불리한 조항인지 평가  ", ["조항을 읽는다", "법령과 비교한다"], RUBRIC,
+                          backend=backend, reason_threshold=4.0, reason_mode=reason_mode, score_max_tokens=16)
+    return judge, llm
+
+
+def reasons(backend):
+    return {outcome: JUDGE_REASONS.value(backend=backend, outcome=outcome) for outcome in ("generated", "skipped", "deferred")}
+
+
+@pytest.mark.parametrize("score, reason_mode, outcome, calls", [
+    (3, "call", "skipped", 1),
+    (4, "call", "generated", 2),
+    (9, "suggestion", "deferred", 1),
+    (2, "suggestion", "skipped", 1),
+])
+def test_reason_only_at_or_above_threshold(score, reason_mode, outcome, calls):
+    backend = f"two-phase-test-{reason_mode}-{score}"
+    judge, llm = make_judge(score, reason_mode, backend)
+    before = reasons(backend)
+
+    result_score, reason, deferred = judge.judge("제7조 회사는 언제든 해고할 수 있다.", "근로기준법 제23조")
+
+    assert result_score == float(score)
+    assert deferred is (outcome == "deferred")
+    assert len(llm.calls) == calls == judge.expected_calls(score)
+    assert reasons(backend) == {k: v + (k == outcome) for k, v in before.items()}
+    if outcome == "generated":
+        assert reason == "근로기준법 제17조 위반 소지가 있습니다."
+    else:
+        assert f"{score}점" in reason
+
+
+def test_score_call_is_token_capped_and_reason_call_is_not():
+    judge, llm = make_judge(6)
+    judge.judge("제7조", "")
+    assert llm.calls == [(ScoreOnly, 16), (ReasonOnly, None)]
+
+
+def test_prompts_share_geval_criteria_steps_and_rubric():
+    judge, _ = make_judge(0)
+    assert judge.criteria == "근로자에게 불리한 조항인지 평가"
+    assert judge.steps == "1. 조항을 읽는다\n2. 법령과 비교한다"
+    assert judge.rubric == "0~3점: 문제 없음\n4~10점: 독소조항"
+
+
+def test_invalid_modes_are_rejected():
+    assert check_judge_mode("two-phase") == "two-phase"
+    with pytest.raises(ValueError):
+        check_judge_mode("single")
+    with pytest.raises(ValueError):
+        make_judge(5, reason_mode="inline")
+    with pytest.raises(ValueError):
+        ScoreOnly(score=11)
@@ -0,0 +1,90 @@
+# Copyright (c) 2025 SafeSign
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+usage: Ollama/Gemini 응답의 토큰·시간 사용량이 요청/조항 범위와 지표에 어떻게 쌓이는지 확인한다.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from metrics import LLM_CALLS, LLM_PHASE_SECONDS, LLM_TOKENS
+from usage import (UsageTracker, estimate_cost, merge_summaries, record_gemini_usage, record_ollama_usage, usage_scope,
+                   usage_stage)
+
+OLLAMA_RESPONSE = {
+    "prompt_eval_count": 120, "eval_count": 30,
+    "total_duration": 2_000_000_000, "load_duration": 500_000_000,
+    "prompt_eval_duration": 400_000_000, "eval_duration": 1_000_000_000,
+}
+
+
+def test_ollama_phases_reach_every_open_scope_and_metrics():
+    model = "usage-test-ollama"
+    request_usage = UsageTracker()
+    with usage_scope(request_usage):
+        with usage_scope() as clause_usage, usage_stage("judge"):
+            record_ollama_usage(model, OLLAMA_RESPONSE)
+        # pydantic 응답 객체처럼 속성으로 들어와도 같은 값을 읽는다
+        with usage_stage("suggestion"):
+            record_ollama_usage(model, SimpleNamespace(**OLLAMA_RESPONSE))
+
+    clause = clause_usage.summary()
+    assert clause["calls"] == 1
+    assert (clause["prompt_tokens"], clause["output_tokens"], clause["total_tokens"]) == (120, 30, 150)
+    assert clause["duration_sec"] == pytest.approx(2.0)
+    assert (clause["prompt_eval_sec"], clause["eval_sec"], clause["load_sec"]) == pytest.approx((0.4, 1.0, 0.5))
+    assert clause["estimated_cost_usd"] == 0
+    assert set(clause["by_stage"]) == {"judge"}
+
+    request = request_usage.summary()
+    assert request["calls"] == 2
+    assert request["eval_sec"] == pytest.approx(2.0)
+    assert request["by_stage"]["suggestion"]["load_sec"] == pytest.approx(0.5)
+
+    assert LLM_CALLS.value(backend="ollama", model=model, stage="judge") == 1
+    assert LLM_TOKENS.value(backend="ollama", model=model, stage="judge", kind="prompt") == 120
+    assert LLM_PHASE_SECONDS.value(backend="ollama", model=model, stage="judge", phase="prompt_eval") == pytest.approx(0.4)
+    assert LLM_PHASE_SECONDS.value(backend="ollama", model=model, stage="suggestion", phase="load") == pytest.approx(0.5)
+
+
+def test_gemini_usage_counts_thinking_tokens_and_cost():
+    metadata = SimpleNamespace(prompt_token_count=1_000_000, candidates_token_count=200_000, thoughts_token_count=100_000)
+    with usage_scope() as usage:
+        record_gemini_usage("gemini-2.5-flash", SimpleNamespace(usage_metadata=metadata), duration_sec=1.5, stage="judge")
+        # usage_metadata가 없는 응답은 기록하지 않는다
+        record_gemini_usage("gemini-2.5-flash", SimpleNamespace(usage_metadata=None))
+
+    summary = usage.summary()
+    assert summary["calls"] == 1
+    assert summary["output_tokens"] == 300_000
+    assert summary["estimated_cost_usd"] == pytest.approx(estimate_cost("gemini-2.5-flash", 1_000_000, 300_000))
+    assert summary["estimated_cost_usd"] == pytest.approx(0.30 + 0.3 * 2.50)
+    # Gemini 응답에는 단계별 시간이 없다
+    assert summary["prompt_eval_sec"] == summary["eval_sec"] == summary["load_sec"] == 0
+
+
+def test_merge_summaries_adds_fields_and_stages():
+    first, second = UsageTracker(), UsageTracker()
+    with usage_scope(first), usage_stage("judge"):
+        record_ollama_usage("usage-test-merge", OLLAMA_RESPONSE)
+    with usage_scope(second), usage_stage("suggestion"):
+        record_ollama_usage("usage-test-merge", OLLAMA_RESPONSE)
+
+    merged = merge_summaries([first.summary(), None, second.summary()])
+    assert merged["calls"] == 2
+    assert merged["total_tokens"] == 300
+    assert merged["prompt_eval_sec"] == pytest.approx(0.8)
+    assert set(merged["by_stage"]) == {"judge", "suggestion"}
+    assert merged["by_stage"]["judge"]["eval_sec"] == pytest.approx(1.0)
+
+
+def test_scope_follows_to_thread_but_not_outside():
+    async def run():
+        with usage_scope() as usage:
+            await asyncio.to_thread(record_ollama_usage, "usage-test-thread", OLLAMA_RESPONSE)
+        record_ollama_usage("usage-test-thread", OLLAMA_RESPONSE)
+        return usage
+
+    assert asyncio.run(run()).summary()["calls"] == 1